@@ -0,0 +1,81 @@
+# AGGREGATE_ENABLED: records and bytes downstream analytics read from the summary topic instead of the
+# raw change events, and what the summaries add to broker writes (raw events are still produced), for a
+# fleet of simulated listeners over simulated hours (stepped clocks, no waiting), plus the summaries'
+# play time checked against the simulator's own.
+# Run from agent-producer/:  python -m benchmarks.bench_aggregate --machines 500 --hours 24 --interval 300
+from __future__ import annotations
+import argparse
+import json
+import time
+from pcmedia.dedupe import build_signature
+from src.media.aggregate import PlayAggregator
+from src.media.simulator import SimulatedPlayer
+
+EPOCH = 1_735_689_600.0   # 2025-01-01T00:00:00Z, wall time of simulated second 0
+
+def machine(index: int, hours: float, interval: float) -> dict:
+    now = [0.0]
+    player = SimulatedPlayer(seed=index, clock=lambda: now[0])
+    agg = PlayAggregator(f"pc-{index:04d}", interval, clock=lambda: now[0], wall=lambda: EPOCH + now[0])
+    horizon = hours * 3600.0
+    out = {"raw": 0, "raw_bytes": 0, "summaries": 0, "summary_bytes": 0, "played": 0.0, "summed": 0.0}
+    last_sig, playing_since = None, None
+
+    def flush(record) -> None:
+        if record is not None:
+            out["summaries"] += 1
+            out["summary_bytes"] += len(json.dumps(record).encode("utf-8"))
+            out["summed"] += sum(row[3] for row in record["tracks"])
+
+    while True:
+        at = min(player.next_change(), horizon)
+        while agg.next_deadline() <= at:   # the agent wakes up for each window close
+            now[0] = agg.next_deadline()
+            flush(agg.due())
+        now[0] = at
+        if playing_since is not None:
+            out["played"] += at - playing_since
+            playing_since = None
+        if at >= horizon:
+            break
+        snap = player.snapshot()
+        agg.observe(snap)
+        if snap is not None and snap["playbackStatus"] == "playing":
+            playing_since = at
+        sig = build_signature(snap) if snap else None
+        if snap and sig != last_sig:
+            out["raw"] += 1
+            out["raw_bytes"] += len(json.dumps(snap).encode("utf-8"))
+        last_sig = sig
+    flush(agg.summary())
+    return out
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--machines", type=int, default=500)
+    ap.add_argument("--hours", type=float, default=24.0, help="simulated listening time per machine")
+    ap.add_argument("--interval", type=float, default=300.0, help="AGGREGATE_INTERVAL_SEC")
+    args = ap.parse_args()
+
+    totals = {"raw": 0, "raw_bytes": 0, "summaries": 0, "summary_bytes": 0, "played": 0.0, "summed": 0.0}
+    t0 = time.perf_counter()
+    for i in range(args.machines):
+        for k, v in machine(i, args.hours, args.interval).items():
+            totals[k] += v
+    elapsed = time.perf_counter() - t0
+
+    raw, summaries = totals["raw"], max(totals["summaries"], 1)
+    error = abs(totals["summed"] - totals["played"]) / max(totals["played"], 1e-9)
+    print(f"[i] {args.machines} machines x {args.hours:g}h simulated, summaries every {args.interval:g}s "
+          f"(simulated in {elapsed:.1f}s)")
+    print(f"    raw change events : {raw:10d} records  {totals['raw_bytes'] / 1e6:9.2f} MB  (TOPIC, produced either way)")
+    print(f"    summary records   : {totals['summaries']:10d} records  {totals['summary_bytes'] / 1e6:9.2f} MB"
+          f"  (AGGREGATE_TOPIC)")
+    print(f"    analytics reads   : {raw / summaries:10.1f}x fewer records from the summary topic than from TOPIC")
+    print(f"    broker writes     : +{totals['summaries'] / max(raw, 1):.1%} records, "
+          f"+{totals['summary_bytes'] / max(totals['raw_bytes'], 1):.1%} bytes with aggregation on")
+    print(f"    play time         : {totals['played'] / 3600:10.1f} h simulated, {totals['summed'] / 3600:.1f} h "
+          f"in summaries (error {error:.3%})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# End-to-end: KafkaNowPlayingProducer.send() -> broker -> a plain consumer, for N machines (one
+# producer each, as in the field) at an offered rate. Latency runs from the intended send time to
+# receipt; CPU per message covers both sides (same process). See benchmarks/pcbench/loadgen.py.
+# Also reports produce requests (librdkafka statistics), which is what fleet-wide load costs the brokers.
+# Run from agent-producer/:  python -m benchmarks.bench_e2e --rate 2000 --machines 50 [--broker localhost:9025]
+#                            [--profile high-throughput] [--adaptive] [--kafka "linger.ms=50"] [--outbox]
+#                            [--json out.json]
+from __future__ import annotations
+import argparse
+import asyncio
+import dataclasses
+import tempfile
+import time
+from pcbench import loadgen
+from pcmedia.profiles import PROFILES
+from pcmedia.serde import Serde
+from src.config import build_kafka_config, get_settings, load_settings
+from src.kafka.producer import KafkaNowPlayingProducer
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    loadgen.add_common_args(ap)
+    ap.add_argument("--outbox", action="store_true", help="OUTBOX_ENABLED=true (AsyncOutboxProducer)")
+    ap.add_argument("--wire-format", default="json", choices=("json", "msgpack"))
+    ap.add_argument("--profile", default="balanced", choices=list(PROFILES), help="PRODUCER_PROFILE")
+    ap.add_argument("--adaptive", action="store_true", help="ADAPTIVE_LINGER=true")
+    args = ap.parse_args()
+
+    topic = loadgen.bench_topic("pc.activity.media", args.broker)
+    fake = loadgen.setup(args.broker, [topic], args.partitions)
+    base = dataclasses.replace(load_settings({}), brokers=args.broker, topic=topic, wire_format=args.wire_format,
+                               outbox_enabled=args.outbox, metrics_port=0,
+                               producer_profile=args.profile, adaptive_linger=args.adaptive)
+    get_settings.set(base)
+    kafka = {**build_kafka_config(), **loadgen.parse_overrides(args.kafka)}
+    stats = [loadgen.ProduceStats() for _ in range(args.machines)]
+    lat = loadgen.Latencies()
+    serde = Serde()
+    receiver = loadgen.Receiver(loadgen.make_consumer(args.broker, fake), [topic],
+                                lambda msg: lat.received(serde.decode(msg.value())["title"]))
+
+    async def load(outbox_root: str) -> loadgen.Meter:
+        producers, raw = [], []
+        for i in range(args.machines):
+            get_settings.set(dataclasses.replace(base, machine_key=f"pc-{i:04d}", outbox_dir=f"{outbox_root}/{i}"))
+            raw.append(loadgen.make_producer(args.broker, fake, stats[i].attach(kafka), args.partitions))
+            producers.append(KafkaNowPlayingProducer(raw[-1]))
+            if producers[-1].adaptive is not None:
+                stats[i].hooks.append(producers[-1].adaptive.on_stats)
+        get_settings.set(base)
+        with loadgen.Meter() as meter:
+            start = asyncio.get_running_loop().time() + 0.1
+            for i, due in enumerate(loadgen.schedule(args.rate, args.seconds, start)):
+                await loadgen.asleep_until(due)
+                payload = {"timestamp": "2025-01-01T00:00:00+00:00", "sourceApp": "Spotify.exe",
+                           "title": str(i), "artist": "Artist", "playbackStatus": "playing"}
+                lat.sent(str(i), due)
+                await producers[i % args.machines].send(payload)
+            await asyncio.gather(*(p.flush(10) for p in producers))
+            await asyncio.get_running_loop().run_in_executor(None, lat.wait, 10.0)
+        if fake is None:
+            time.sleep(loadgen.ProduceStats.INTERVAL_MS / 1000.0 + 0.2)   # final statistics
+            for p in raw:
+                p.poll(0)
+        return meter
+
+    with tempfile.TemporaryDirectory() as outbox_root:
+        meter = asyncio.run(load(outbox_root))
+    receiver.close()
+    stage = f"agent.producer[{args.profile}{'+adaptive' if args.adaptive else ''}]" + ("+outbox" if args.outbox else "")
+    loadgen.report(loadgen.result(stage, args, lat, meter, kafka, wire_format=args.wire_format,
+                                  **loadgen.request_counts(stats)), args.json)
+
+if __name__ == "__main__":
+    main()
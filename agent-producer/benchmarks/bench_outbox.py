@@ -0,0 +1,99 @@
+# Outbox benchmarks: append rate per fsync batch size, replay throughput, outage recovery.
+# Run from agent-producer/:  python -m benchmarks.bench_outbox --records 50000
+from __future__ import annotations
+import argparse
+import json
+import tempfile
+import threading
+import time
+from pcmedia.outbox import Outbox, OutboxProducer
+
+TOPIC = "pc.activity.media"
+VALUE = json.dumps({
+    "timestamp": "2025-01-01T00:00:00+00:00", "sourceApp": "Spotify.exe", "title": "Some Track",
+    "artist": "Some Artist", "album": "Some Album", "playbackStatus": "playing",
+}).encode("utf-8")
+
+class FlakyProducer:
+    """In-process stand-in for confluent_kafka.Producer; fails deliveries while `down`."""
+    def __init__(self) -> None:
+        self.down = False
+        self.delivered: list[bytes] = []
+        self._queue: list = []
+        self._lock = threading.Lock()  # send() and the outbox thread both poll
+
+    def produce(self, topic, key=None, value=None, on_delivery=None) -> None:
+        self._queue.append((value, on_delivery))
+
+    def poll(self, timeout: float = 0) -> int:
+        with self._lock:
+            queue, self._queue = self._queue, []
+            for value, cb in queue:
+                if self.down:
+                    cb("_MSG_TIMED_OUT", None)
+                else:
+                    self.delivered.append(value)
+                    cb(None, None)
+            return len(queue)
+
+    def flush(self, timeout: float = 0) -> int:
+        self.poll(0)
+        return 0
+
+def bench_append(n: int, fsync_every: int) -> float:
+    with tempfile.TemporaryDirectory() as d:
+        box = Outbox(d, fsync_every=fsync_every)
+        t0 = time.perf_counter()
+        for _ in range(n):
+            box.append(TOPIC, b"pc-01", VALUE)
+        box.sync()
+        elapsed = time.perf_counter() - t0
+        box.close()
+    return n / elapsed
+
+def bench_replay(n: int) -> float:
+    with tempfile.TemporaryDirectory() as d:
+        box = Outbox(d, fsync_every=4096, segment_bytes=1 << 20)
+        for _ in range(n):
+            box.append(TOPIC, b"pc-01", VALUE)
+        box.close()
+        box = Outbox(d)  # reopen as after a restart
+        t0 = time.perf_counter()
+        count = sum(1 for _ in box.read_from(box.acked + 1))
+        elapsed = time.perf_counter() - t0
+        box.close()
+    assert count == n, count
+    return n / elapsed
+
+def outage(n: int) -> str:
+    """Deliveries fail for the first half; everything must arrive, in order, after recovery."""
+    with tempfile.TemporaryDirectory() as d:
+        fake = FlakyProducer()
+        fake.down = True
+        sender = OutboxProducer(fake, Outbox(d), retry_backoff=0.05, poll_interval=0.01)
+        for i in range(n // 2):
+            sender.send(TOPIC, "pc-01", str(i).encode())
+        time.sleep(0.1)
+        fake.down = False
+        for i in range(n // 2, n):
+            sender.send(TOPIC, "pc-01", str(i).encode())
+        ok = sender.flush(10)
+        sender.close()
+        got = [int(v) for v in fake.delivered]
+        in_order = got == sorted(got) and set(got) == set(range(n))
+        return f"{len(set(got))}/{n} delivered, in order={in_order}, flushed={ok}"
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--records", type=int, default=50_000)
+    args = ap.parse_args()
+    n = args.records
+    print(f"[i] {n} records of {len(VALUE)} bytes")
+    for every in (1, 64, 1024):
+        m = n if every > 1 else min(n, 2000)
+        print(f"    append, fsync every {every:<5}: {bench_append(m, every):10.0f} rec/s")
+    print(f"    replay after restart     : {bench_replay(n):10.0f} rec/s")
+    print(f"    broker outage            : {outage(min(n, 2000))}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# Encode/decode CPU time and bytes on the wire: current JSON path vs schema-tagged msgpack.
+# Run from agent-producer/:  python -m benchmarks.bench_serde --events 200000
+from __future__ import annotations
+import argparse
+import json
+import time
+from pcmedia.serde import Serde
+
+MEDIA = {
+    "timestamp": "2025-01-01T12:34:56.789012+00:00",
+    "sourceApp": "Spotify.exe",
+    "title": "Bohemian Rhapsody - Remastered 2011",
+    "artist": "Queen",
+    "album": "A Night At The Opera",
+    "playbackStatus": "playing",
+}
+CONTROL = {"type": "control", "action": "lock", "target": "all", "by": "telegram:11111111",
+           "ts": "2025-01-01T12:34:56.789012+00:00"}
+
+def _time(fn, n: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n * 1e6
+
+def bench(name: str, subject: str, payload: dict, n: int) -> None:
+    topic = f"pc.activity.{subject}"
+    json_serde = Serde()
+    bin_serde = Serde(formats={topic: "msgpack"})
+    as_json = json_serde.encode(topic, subject, payload)
+    as_bin = bin_serde.encode(topic, subject, payload)
+    assert bin_serde.decode(as_bin) == payload and as_bin[:1] == b"\x00"
+
+    # Baseline is the code the services used before Serde existed.
+    legacy_enc = _time(lambda: json.dumps(payload, ensure_ascii=False).encode("utf-8"), n)
+    legacy_dec = _time(lambda: json.loads(as_json.decode("utf-8")), n)
+    bin_enc = _time(lambda: bin_serde.encode(topic, subject, payload), n)
+    bin_dec = _time(lambda: bin_serde.decode(as_bin), n)
+
+    print(f"[i] {name}")
+    print(f"    json    : {len(as_json):4d} B  encode {legacy_enc:6.2f} us  decode {legacy_dec:6.2f} us")
+    print(f"    msgpack : {len(as_bin):4d} B  encode {bin_enc:6.2f} us  decode {bin_dec:6.2f} us"
+          f"  ({100 * (1 - len(as_bin) / len(as_json)):.0f}% fewer bytes)")
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=200_000)
+    args = ap.parse_args()
+    bench("media event", "media", MEDIA, args.events)
+    bench("control event", "control", CONTROL, args.events)
+
+if __name__ == "__main__":
+    main()
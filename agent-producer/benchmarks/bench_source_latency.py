@@ -0,0 +1,113 @@
+# Detection latency and read cost: fixed polling vs adaptive polling vs push (events).
+# Runs on any OS with simulated media changes.
+# Run from agent-producer/:  python -m benchmarks.bench_source_latency --changes 10 --interval 0.5
+from __future__ import annotations
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from typing import Callable, Optional
+from pcmedia.coalesce import Coalescer
+from src.app import run
+from src.media.source import EventSource, FakeMediaSource, MediaSource, PollingSource
+
+def _no_coalescing() -> Coalescer:
+    """Measure detection latency only (coalescing would add its window on top)."""
+    return Coalescer(0, 0, suppress_statuses=())
+
+class RecordingProducer:
+    """Stands in for KafkaNowPlayingProducer; records when each payload was sent."""
+    def __init__(self) -> None:
+        self.sent: list[tuple[float, dict]] = []
+
+    async def send(self, payload: dict) -> None:
+        self.sent.append((time.monotonic(), payload))
+
+    async def flush(self, timeout: float = 5.0) -> None:
+        pass
+
+class SimulatedDesktop:
+    """Mutable now-playing state with a change hook, like the OS media session."""
+    def __init__(self) -> None:
+        self.state: dict = {"sourceApp": "Spotify.exe", "title": "Track 0", "artist": "A", "playbackStatus": "playing"}
+        self.reads = 0
+        self._wake: Optional[Callable[[], None]] = None
+
+    async def read(self) -> Optional[dict]:
+        self.reads += 1
+        return dict(self.state)
+
+    async def subscribe(self, wake: Callable[[], None]) -> Callable[[], None]:
+        self._wake = wake
+        return lambda: None
+
+    def change(self, i: int) -> None:
+        self.state = dict(self.state, title=f"Track {i}")
+        if self._wake:
+            self._wake()
+
+async def scenario(make_source: Callable[[SimulatedDesktop], MediaSource], changes: int,
+                   max_gap: float, idle: float, seed: int) -> tuple[list[float], int]:
+    rng = random.Random(seed)
+    desktop = SimulatedDesktop()
+    producer = RecordingProducer()
+    task = asyncio.create_task(run(producer=producer, source=make_source(desktop), coalescer=_no_coalescing()))
+    await asyncio.sleep(0.05)
+
+    changed_at: list[float] = []
+    for i in range(1, changes + 1):
+        await asyncio.sleep(rng.uniform(0, max_gap))
+        desktop.change(i)
+        changed_at.append(time.monotonic())
+    await asyncio.sleep(max_gap)
+    reads_before_idle = desktop.reads
+    await asyncio.sleep(idle)
+    idle_reads = desktop.reads - reads_before_idle
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    sent = {p["title"]: t for t, p in producer.sent}
+    latencies = [sent[f"Track {i}"] - t for i, t in enumerate(changed_at, 1) if f"Track {i}" in sent]
+    return latencies, idle_reads
+
+async def fake_pipeline(changes: int) -> list[float]:
+    """Latency of the app loop itself, fed by FakeMediaSource."""
+    source = FakeMediaSource()
+    producer = RecordingProducer()
+    task = asyncio.create_task(run(producer=producer, source=source, coalescer=_no_coalescing()))
+    for i in range(changes):
+        source.push({"title": f"Track {i}", "playbackStatus": "playing"})
+        await asyncio.sleep(0.001)
+    source.end()
+    await task
+    return [t - e for (t, _), e in zip(producer.sent, source.emitted_at)]
+
+def _fmt(name: str, latencies: list[float], idle_reads: Optional[int] = None, idle: float = 0) -> str:
+    p50 = statistics.median(latencies) * 1000
+    worst = max(latencies) * 1000
+    extra = f", {idle_reads} reads in {idle:.0f}s idle" if idle_reads is not None else ""
+    return f"    {name:<18}: p50 {p50:8.1f} ms  max {worst:8.1f} ms{extra}"
+
+async def main_async(args: argparse.Namespace) -> None:
+    modes = {
+        "fixed poll": lambda d: PollingSource(d.read, args.interval, args.interval),
+        "adaptive poll": lambda d: PollingSource(d.read, args.interval, args.interval * 15),
+        "events": lambda d: EventSource(d.read, d.subscribe, resync_interval=args.interval * 30),
+    }
+    print(f"[i] {args.changes} changes, poll interval {args.interval}s, idle window {args.idle}s")
+    for name, make in modes.items():
+        latencies, idle_reads = await scenario(make, args.changes, args.interval * 2, args.idle, args.seed)
+        print(_fmt(name, latencies, idle_reads, args.idle))
+    print(_fmt("fake source loop", await fake_pipeline(1000)))
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--changes", type=int, default=10)
+    ap.add_argument("--interval", type=float, default=0.5, help="stand-in for POLL_INTERVAL_SEC")
+    ap.add_argument("--idle", type=float, default=10.0)
+    ap.add_argument("--seed", type=int, default=7)
+    asyncio.run(main_async(ap.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,11 @@
 # Entry point
 import asyncio
+from pcmedia.logs import setup_logging
 from src.app import run
+from src.config import get_settings
 
 if __name__ == "__main__":
+    settings = get_settings()
+    setup_logging(settings.log_level, settings.log_format, settings.log_rate_per_sec,
+                  settings.log_burst, settings.log_sample, settings.log_queue_size)
     asyncio.run(run())
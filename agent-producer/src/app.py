@@ -1,32 +1,132 @@
 # Application wiring & loop.
 from __future__ import annotations
 import asyncio
-from src.config import settings
-from src.kafka.producer import KafkaNowPlayingProducer
-from src.media.win_now_playing import read_now_playing
-from src.utils.dedupe import build_signature
+import logging
+import time
+from typing import Optional, Protocol
+from pcmedia.coalesce import Coalescer
+from pcmedia.dedupe import parse_fields, signature_fn
+from pcmedia.metrics import REGISTRY, age_seconds, serve
+from src.config import get_settings
+from src.media.aggregate import PlayAggregator
+from src.media.backends import build_backend
+from src.media.source import MediaSource, build_source
 
-async def run() -> None:
-    producer = KafkaNowPlayingProducer()
-    print(f"[i] Kafka producer ready (brokers={settings.brokers}) topic={settings.topic}")
+log = logging.getLogger(__name__)
 
-    last_sig: str | None = None
+_SEND_DELAY = REGISTRY.histogram("media_send_delay_seconds", "Snapshot timestamp to producer.send() (coalescing wait)")
+_SENT = REGISTRY.counter("media_sent_total", "Media updates handed to the producer")
+_SUMMARIES = REGISTRY.counter("media_summaries_total", "Play-time summary records handed to the producer")
+
+class Sender(Protocol):
+    async def send(self, payload: dict) -> None: ...
+    async def send_summary(self, record: dict) -> None: ...   # only with an aggregator
+    async def flush(self, timeout: float = 5.0) -> None: ...
+
+async def run(producer: Optional[Sender] = None, source: Optional[MediaSource] = None,
+              coalescer: Optional[Coalescer] = None, aggregator: Optional[PlayAggregator] = None) -> None:
+    """
+    Forward distinct media snapshots from `source` to `producer`, debounced by
+    `coalescer` (all three injectable for tests). With AGGREGATE_ENABLED (or an
+    `aggregator`), every snapshot also feeds the play-time totals, sent as
+    summary records when each window closes.
+    """
+    settings = get_settings()
+    signature = signature_fn(parse_fields(settings.signature_fields))
+    serve(settings.metrics_port, settings.metrics_host)
+    if producer is None:
+        from src.kafka.producer import KafkaNowPlayingProducer
+        producer = KafkaNowPlayingProducer()
+    if source is None:
+        source = build_source(
+            settings.media_source,
+            build_backend(settings.platform_backend, settings.machine_key, settings.sim_seed, settings.sim_speed),
+            min_interval=settings.poll_interval_sec,
+            max_interval=settings.poll_max_interval_sec,
+            backoff=settings.poll_backoff,
+            resync_interval=settings.event_resync_sec,
+            signature=signature,
+        )
+    log.info("Kafka producer ready (brokers=%s) topic=%s source=%s", settings.brokers, settings.topic, type(source).__name__)
+
+    if coalescer is None:
+        coalescer = Coalescer(
+            settings.coalesce_window_ms / 1000.0,
+            settings.coalesce_max_delay_ms / 1000.0,
+            suppress_statuses=parse_fields(settings.coalesce_suppress_statuses, default=()),
+            signature=signature,
+        )
+    if aggregator is None and settings.aggregate_enabled:
+        aggregator = PlayAggregator(settings.machine_key, settings.aggregate_interval_sec)
+
+    async def emit_due(items) -> None:
+        for _, payload in items:
+            try:
+                await producer.send(payload)
+                _SENT.inc()
+                delay = age_seconds(payload.get("timestamp"))
+                if delay is not None:
+                    _SEND_DELAY.observe(delay)
+                log.info("→ %s", payload, extra={"event": "media.sent"})
+            except Exception as e:
+                log.warning("send error: %s", e, extra={"event": "media.send_failed"})
+
+    async def emit_summary(record: Optional[dict]) -> None:
+        if record is None:
+            return
+        try:
+            await producer.send_summary(record)
+            _SUMMARIES.inc()
+            log.info("→ summary of %d track(s)", len(record["tracks"]), extra={"event": "media.summary_sent"})
+        except Exception as e:
+            log.warning("summary send error: %s", e, extra={"event": "media.send_failed"})
+
+    last_sig = None
+    next_snapshot: Optional[asyncio.Future] = None
     try:
+        snapshots = source.snapshots()
         while True:
+            # Wait for the next snapshot, waking up early when a held update is due.
+            if next_snapshot is None:
+                next_snapshot = asyncio.ensure_future(snapshots.__anext__())
+            deadlines = [d for d in (coalescer.next_deadline(), aggregator and aggregator.next_deadline())
+                         if d is not None]
+            timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            done, _ = await asyncio.wait({next_snapshot}, timeout=timeout)
+            await emit_due(coalescer.due())
+            if aggregator is not None:
+                await emit_summary(aggregator.due())
+            if not done:
+                continue
+
+            task, next_snapshot = next_snapshot, None
             try:
-                data = await read_now_playing()
-                if data:
-                    sig = build_signature(data)
-                    if sig != last_sig:
-                        last_sig = sig
-                        producer.send(data)
-                        print(f"[→] {data}")
+                data = task.result()
+            except StopAsyncIteration:
+                break
             except Exception as e:
-                print(f"[warn] read/send error: {e}")
-
-            await asyncio.sleep(settings.poll_interval_sec)
+                log.warning("read error: %s", e, extra={"event": "media.read_failed"})
+                # A failed read ends the generator; start a fresh one after a pause.
+                await source.close()
+                await asyncio.sleep(settings.poll_interval_sec)
+                snapshots = source.snapshots()
+                continue
+            if aggregator is not None:
+                aggregator.observe(data)
+            if data:
+                sig = signature(data)
+                if sig != last_sig:
+                    last_sig = sig
+                    coalescer.offer(settings.machine_key, data)
+                    await emit_due(coalescer.due())
     except KeyboardInterrupt:
-        print("\n[!] Interrupted by user")
+        log.info("Interrupted by user")
     finally:
-        producer.flush(5)
-        print("[i] Producer flushed. Bye.")
+        if next_snapshot is not None:
+            next_snapshot.cancel()
+        await emit_due(coalescer.drain())
+        if aggregator is not None:
+            await emit_summary(aggregator.summary())
+        await source.close()
+        await producer.flush(5)
+        log.info("Producer flushed. Bye.")
@@ -1,41 +1,128 @@
-# Loads and validates environment variables; builds Kafka config.
+# Settings from environment variables (and .env), loaded on first use; builds Kafka config.
 from __future__ import annotations
 import os
 from dataclasses import dataclass
-from dotenv import load_dotenv
-
-load_dotenv()
+from typing import Mapping, Optional
+from pcmedia.envconfig import Lazy, env_field, load
+from pcmedia.metrics import record_kafka_stats
+from pcmedia.profiles import AdaptiveLinger, fan_out, profile_config, profile_name
 
 @dataclass(frozen=True)
 class Settings:
-    brokers: str = os.getenv("KAFKA_BROKERS", "localhost:9092")
-    topic: str = os.getenv("TOPIC", "pc.activity.media")
-    machine_key: str = os.getenv("MACHINE_KEY") or os.environ.get("COMPUTERNAME") or "pc"
+    brokers: str = env_field("KAFKA_BROKERS", "localhost:9092")
+    topic: str = env_field("TOPIC", "pc.activity.media")
+    machine_key: str = env_field(("MACHINE_KEY", "COMPUTERNAME"), "pc")
+
+    # Media source: "auto" (backend events, polling fallback), "events" or "poll"
+    media_source: str = env_field("MEDIA_SOURCE", "auto", parse=str.lower)
+    # Platform backend: "windows" (WinRT media session) or "sim" (seeded playback simulator, any OS);
+    # SIM_SEED defaults to a hash of MACHINE_KEY, SIM_SPEED compresses time (60: an hour per minute)
+    platform_backend: str = env_field("PLATFORM_BACKEND", "windows", parse=str.lower)
+    sim_seed: int | None = env_field("SIM_SEED", parse=int)
+    sim_speed: float = env_field("SIM_SPEED", 1.0)
+    poll_interval_sec: float = env_field("POLL_INTERVAL_SEC", 2.0)
+    poll_max_interval_sec: float = env_field("POLL_MAX_INTERVAL_SEC", 30.0)   # idle backoff ceiling
+    poll_backoff: float = env_field("POLL_BACKOFF", 1.5)
+    event_resync_sec: float = env_field("EVENT_RESYNC_SEC", 60.0)             # safety read in event mode
+    # Fields that define "a change" (e.g. add album, or drop playbackStatus to ignore status flaps)
+    signature_fields: str = env_field("SIGNATURE_FIELDS", "sourceApp,title,artist,playbackStatus")
+
+    # Coalescing: hold changes until quiet for the window (max delay caps the wait); 0 disables
+    coalesce_window_ms: int = env_field("COALESCE_WINDOW_MS", 500)
+    coalesce_max_delay_ms: int = env_field("COALESCE_MAX_DELAY_MS", 2000)
+    coalesce_suppress_statuses: str = env_field("COALESCE_SUPPRESS_STATUSES", "changing")
+    enable_idempotence: bool = env_field("ENABLE_IDEMPOTENCE", True)
+
+    # Aggregation (src/media/aggregate.py): per-track play seconds and play counts, one summary record
+    # per AGGREGATE_INTERVAL_SEC to AGGREGATE_TOPIC (keyed by MACHINE_KEY), in addition to the raw changes on TOPIC
+    aggregate_enabled: bool = env_field("AGGREGATE_ENABLED", False)
+    aggregate_topic: str = env_field("AGGREGATE_TOPIC", "pc.activity.media.summary")
+    aggregate_interval_sec: float = env_field("AGGREGATE_INTERVAL_SEC", 300.0)
+
+    # Producer tuning: PRODUCER_PROFILE low-latency | balanced | high-throughput (src/kafka/profiles.py);
+    # ADAPTIVE_LINGER holds records (up to ADAPTIVE_LINGER_MAX_MS) while the send rate can fill batches
+    producer_profile: str = env_field("PRODUCER_PROFILE", "balanced", parse=profile_name)
+    adaptive_linger: bool = env_field("ADAPTIVE_LINGER", False)
+    adaptive_linger_max_ms: float = env_field("ADAPTIVE_LINGER_MAX_MS", 100.0)
+    adaptive_target_batch: int = env_field("ADAPTIVE_TARGET_BATCH", 100)
+    adaptive_stats_interval_ms: int = env_field("ADAPTIVE_STATS_INTERVAL_MS", 1000)
+
+    # Wire format: WIRE_FORMAT default ("json" | "msgpack"), WIRE_FORMATS per topic ("topic=msgpack,...")
+    wire_format: str = env_field("WIRE_FORMAT", "json", parse=str.lower)
+    wire_formats: str = env_field("WIRE_FORMATS", "")
+    schema_registry_path: str | None = env_field("SCHEMA_REGISTRY_PATH")       # e.g., schemas.json
 
-    poll_interval_sec: float = float(os.getenv("POLL_INTERVAL_SEC", "2"))
-    enable_idempotence: bool = os.getenv("ENABLE_IDEMPOTENCE", "true").lower() != "false"
+    # Durable local outbox (records kept on disk until Kafka acks them); opt-in, see .env.template
+    outbox_enabled: bool = env_field("OUTBOX_ENABLED", False)
+    outbox_dir: str = env_field("OUTBOX_DIR", "")          # default: %LOCALAPPDATA%/pc-agent-media/outbox
+    outbox_segment_bytes: int = env_field("OUTBOX_SEGMENT_BYTES", 4 << 20)
+    outbox_fsync_every: int = env_field("OUTBOX_FSYNC_EVERY", 64)
+    outbox_fsync_interval_ms: int = env_field("OUTBOX_FSYNC_INTERVAL_MS", 200)
+    # Without the outbox: undelivered records allowed before send() waits (backpressure)
+    producer_max_in_flight: int = env_field("PRODUCER_MAX_IN_FLIGHT", 10000)
+
+    # Metrics: Prometheus text on http://METRICS_HOST:METRICS_PORT/metrics (0 disables)
+    metrics_port: int = env_field("METRICS_PORT", 0)
+    metrics_host: str = env_field("METRICS_HOST", "127.0.0.1")
+    kafka_stats_interval_ms: int = env_field("KAFKA_STATS_INTERVAL_MS", 15000)   # librdkafka stats (with metrics)
+
+    # Logging: JSON lines (or "text") from a background thread; LOG_RATE_PER_SEC/LOG_BURST cap each
+    # message type, LOG_SAMPLE keeps 1 in N of chatty events (e.g. "media.sent=0.1")
+    log_level: str = env_field("LOG_LEVEL", "INFO", parse=str.upper)
+    log_format: str = env_field("LOG_FORMAT", "json", parse=str.lower)
+    log_rate_per_sec: float = env_field("LOG_RATE_PER_SEC", 10.0)
+    log_burst: float = env_field("LOG_BURST", 20.0)
+    log_sample: str = env_field("LOG_SAMPLE", "")
+    log_queue_size: int = env_field("LOG_QUEUE_SIZE", 10000)
 
     # Optional security
-    security_protocol: str | None = os.getenv("KAFKA_SECURITY_PROTOCOL")     # e.g., SASL_SSL
-    sasl_mechanism: str | None     = os.getenv("KAFKA_SASL_MECHANISM")       # e.g., PLAIN
-    sasl_username: str | None      = os.getenv("KAFKA_SASL_USERNAME")
-    sasl_password: str | None      = os.getenv("KAFKA_SASL_PASSWORD")
-    ssl_ca_location: str | None    = os.getenv("KAFKA_SSL_CA_LOCATION")
+    security_protocol: str | None = env_field("KAFKA_SECURITY_PROTOCOL")     # e.g., SASL_SSL
+    sasl_mechanism: str | None     = env_field("KAFKA_SASL_MECHANISM")       # e.g., PLAIN
+    sasl_username: str | None      = env_field("KAFKA_SASL_USERNAME")
+    sasl_password: str | None      = env_field("KAFKA_SASL_PASSWORD")
+    ssl_ca_location: str | None    = env_field("KAFKA_SSL_CA_LOCATION")
+
+    def __post_init__(self) -> None:
+        if not self.outbox_dir:
+            base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+            object.__setattr__(self, "outbox_dir", os.path.join(base, "pc-agent-media", "outbox"))
+
+def load_settings(env: Optional[Mapping[str, str]] = None) -> Settings:
+    """Settings from `env` (default: the process environment, after reading .env)."""
+    return load(Settings, env)
+
+# The process-wide settings, loaded on first call; get_settings.set(...) swaps them (tests, benchmarks).
+get_settings = Lazy(load_settings)
 
-settings = Settings()
+def build_adaptive_linger() -> Optional[AdaptiveLinger]:
+    """The ADAPTIVE_LINGER controller (None when disabled); pass it to build_kafka_config()."""
+    settings = get_settings()
+    if not settings.adaptive_linger:
+        return None
+    return AdaptiveLinger(settings.adaptive_linger_max_ms, settings.adaptive_target_batch)
 
-def build_kafka_config() -> dict:
-    """Build confluent-kafka Producer config from settings."""
+def build_kafka_config(adaptive: Optional[AdaptiveLinger] = None) -> dict:
+    """Build confluent-kafka Producer config from settings (PRODUCER_PROFILE on top of the basics)."""
+    settings = get_settings()
     cfg = {
         "bootstrap.servers": settings.brokers,
         "client.id": "pc-agent-media-py",
-        "compression.type": "lz4",
         "socket.keepalive.enable": True,
-        "linger.ms": 10,
         "retries": 5,
         "acks": "all",
         "enable.idempotence": settings.enable_idempotence,
+        **profile_config(settings.producer_profile),
     }
+    hooks, interval = [], 0
+    if settings.metrics_port and settings.kafka_stats_interval_ms:
+        hooks.append(record_kafka_stats)
+        interval = settings.kafka_stats_interval_ms
+    if adaptive is not None:
+        hooks.append(adaptive.on_stats)
+        interval = min(interval or settings.adaptive_stats_interval_ms, settings.adaptive_stats_interval_ms)
+    if hooks:
+        cfg["statistics.interval.ms"] = interval
+        cfg["stats_cb"] = fan_out(hooks)
     if settings.security_protocol: cfg["security.protocol"] = settings.security_protocol
     if settings.sasl_mechanism:   cfg["sasl.mechanism"]     = settings.sasl_mechanism
     if settings.sasl_username:    cfg["sasl.username"]      = settings.sasl_username
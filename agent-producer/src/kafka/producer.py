@@ -1,23 +1,75 @@
 # Thin Kafka producer wrapper.
 from __future__ import annotations
-import json
+import logging
 from confluent_kafka import Producer
-from src.config import build_kafka_config, settings
+from pcmedia.aio import AsyncOutboxProducer, AsyncProducer
+from pcmedia.metrics import record_delivery
+from pcmedia.outbox import Outbox, OutboxProducer
+from pcmedia.profiles import LingerGate
+from pcmedia.serde import SchemaRegistry, Serde, parse_formats
+from src.config import build_adaptive_linger, build_kafka_config, get_settings
 
-class KafkaNowPlayingProducer:
-    """Encapsulates a confluent-kafka Producer with simple send method."""
-    def __init__(self) -> None:
-        self._producer = Producer(build_kafka_config())
+log = logging.getLogger(__name__)
 
-    def send(self, payload: dict) -> None:
-        """Send a JSON payload with machine_key as message key."""
-        self._producer.produce(
-            settings.topic,
-            key=settings.machine_key,
-            value=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+class KafkaNowPlayingProducer:
+    """
+    Encapsulates a confluent-kafka Producer with a coroutine send method that
+    never blocks the event loop (see src/kafka/aio.py).
+    With OUTBOX_ENABLED, records go through a local on-disk outbox first, so
+    they survive broker outages and restarts. `producer` may be an in-process stand-in.
+    With ADAPTIVE_LINGER, records pass through a LingerGate whose linger follows the
+    send rate (`adaptive` is fed by the stats callback of the producer built here;
+    an injected producer has to feed it itself).
+    """
+    def __init__(self, producer=None) -> None:
+        settings = get_settings()
+        self._topic = settings.topic
+        self._summary_topic = settings.aggregate_topic
+        self._key = settings.machine_key
+        self.adaptive = build_adaptive_linger()
+        if producer is None:
+            producer = Producer(build_kafka_config(self.adaptive))
+        self._producer = LingerGate(producer, self.adaptive) if self.adaptive is not None else producer
+        self._serde = Serde(
+            SchemaRegistry(settings.schema_registry_path),
+            parse_formats(settings.wire_formats),
+            default=settings.wire_format,
         )
-        # Drive delivery callbacks (non-blocking tick).
-        self._producer.poll(0)
+        self._aio: AsyncProducer | AsyncOutboxProducer
+        if settings.outbox_enabled:
+            self._aio = AsyncOutboxProducer(OutboxProducer(
+                self._producer,
+                Outbox(
+                    settings.outbox_dir,
+                    segment_bytes=settings.outbox_segment_bytes,
+                    fsync_every=settings.outbox_fsync_every,
+                    fsync_interval=settings.outbox_fsync_interval_ms / 1000.0,
+                ),
+            ))
+        else:
+            self._aio = AsyncProducer(
+                self._producer,
+                max_in_flight=settings.producer_max_in_flight,
+                on_delivery=_log_delivery_error,
+            )
+
+    async def send(self, payload: dict) -> None:
+        """
+        Queue a payload (JSON or binary, per WIRE_FORMAT) with machine_key as message key.
+        Returns once it is queued (or on disk, with the outbox); waits while the producer is saturated.
+        """
+        value = self._serde.encode(self._topic, "media", payload)
+        await self._aio.produce(self._topic, self._key, value)
+
+    async def send_summary(self, record: dict) -> None:
+        """Queue a play-time summary (src/media/aggregate.py) to AGGREGATE_TOPIC, same key and guarantees."""
+        value = self._serde.encode(self._summary_topic, "media_summary", record)
+        await self._aio.produce(self._summary_topic, self._key, value)
+
+    async def flush(self, timeout: float = 5.0) -> None:
+        await self._aio.close(timeout)
 
-    def flush(self, timeout: float = 5.0) -> None:
-        self._producer.flush(timeout)
+def _log_delivery_error(err, msg) -> None:
+    record_delivery(err, msg)
+    if err is not None:
+        log.warning("delivery failed: %s", err, extra={"event": "kafka.delivery_failed"})
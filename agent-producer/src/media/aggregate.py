@@ -0,0 +1,84 @@
+# Local play-time aggregation: periodic per-track summaries instead of rebuilding durations downstream.
+from __future__ import annotations
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+# One row of a summary's "tracks": seconds played in the window and plays started in it.
+TRACK_FIELDS: Tuple[str, ...] = ("sourceApp", "title", "artist", "seconds", "plays")
+
+Track = Tuple[str, str, str]   # (sourceApp, title, artist)
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="seconds")
+
+class PlayAggregator:
+    """
+    Per-track play time from playbackStatus transitions. observe() every snapshot
+    (None = no session); while the current track is "playing", the monotonic time
+    until the next snapshot is credited to it. A play is counted when a track
+    starts playing after a different track (or nothing) was playing: pause/resume
+    of the same track is one play.
+    Every `interval` seconds (due() once next_deadline() is reached) the window's
+    totals become one summary record and start again from zero; an empty window
+    (nothing played) produces no record.
+    """
+    def __init__(self, machine_key: str, interval: float = 300.0, clock: Callable[[], float] = time.monotonic,
+                 wall: Callable[[], float] = time.time) -> None:
+        self.machine_key = machine_key
+        self.interval = interval
+        self._clock = clock
+        self._wall = wall
+        self._tracks: Dict[Track, List[float]] = {}   # track -> [seconds, plays]
+        self._current: Optional[Track] = None          # track playing since _since
+        self._last_played: Optional[Track] = None
+        self._since = clock()
+        self._window_start = wall()
+        self._deadline = self._since + interval
+        # Counters (for metrics / benchmarks)
+        self.observed = 0
+        self.summaries = 0
+
+    def _credit(self, now: float) -> None:
+        if self._current is not None:
+            self._tracks.setdefault(self._current, [0.0, 0])[0] += now - self._since
+        self._since = now
+
+    def observe(self, payload: Optional[Dict]) -> None:
+        """Record the media state as of now (a snapshot or None)."""
+        self.observed += 1
+        self._credit(self._clock())
+        playing = payload is not None and payload.get("playbackStatus") == "playing"
+        track = (payload.get("sourceApp") or "", payload.get("title") or "", payload.get("artist") or "") \
+            if playing else None
+        if track is not None and track != self._last_played:
+            self._tracks.setdefault(track, [0.0, 0])[1] += 1
+            self._last_played = track
+        elif payload is None or payload.get("playbackStatus") not in ("playing", "paused"):
+            self._last_played = None   # stopped or skipping: playing the same track again is a new play
+        self._current = track
+
+    def next_deadline(self) -> float:
+        """Clock time at which the current window closes."""
+        return self._deadline
+
+    def due(self) -> Optional[Dict]:
+        """The summary of the window that just closed (None if it isn't over or nothing played)."""
+        now = self._clock()
+        if now < self._deadline:
+            return None
+        self._deadline = now + self.interval
+        return self.summary(now)
+
+    def summary(self, now: Optional[float] = None) -> Optional[Dict]:
+        """Close the window now (shutdown, or from due()) and return its record, if anything played."""
+        self._credit(self._clock() if now is None else now)
+        start, end = self._window_start, self._wall()
+        tracks, self._tracks, self._window_start = self._tracks, {}, end
+        rows = [[app, title, artist, round(seconds, 1), int(plays)]
+                for (app, title, artist), (seconds, plays) in tracks.items() if seconds >= 0.05 or plays]
+        if not rows:
+            return None
+        self.summaries += 1
+        return {"type": "summary", "machine": self.machine_key, "start": _iso(start), "end": _iso(end),
+                "tracks": rows}
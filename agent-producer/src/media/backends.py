@@ -0,0 +1,43 @@
+# Platform backends behind the media sources: WinRT (GSMTC) on Windows, a seeded simulator anywhere.
+from __future__ import annotations
+import zlib
+from typing import Callable, Optional, Protocol
+
+class MediaBackend(Protocol):
+    """What MediaSource implementations need from the platform."""
+    async def read(self) -> Optional[dict]:
+        """Current now-playing snapshot, or None without a media session."""
+        ...
+
+    async def subscribe(self, wake: Callable[[], None]) -> Callable[[], None]:
+        """Call `wake()` (from any thread) when the media state may have changed; returns an unsubscribe function."""
+        ...
+
+class WinRTBackend:
+    """GlobalSystemMediaTransportControls through winsdk (interactive Windows session only)."""
+    def __init__(self) -> None:
+        # Imported here: winsdk only exists on Windows.
+        from src.media import win_now_playing
+        self._win = win_now_playing
+
+    async def read(self) -> Optional[dict]:
+        return await self._win.read_now_playing()
+
+    async def subscribe(self, wake: Callable[[], None]) -> Callable[[], None]:
+        return await self._win.subscribe_changes(wake)
+
+BACKENDS = ("windows", "sim")
+
+def build_backend(name: str, machine_key: str = "", seed: Optional[int] = None, speed: float = 1.0) -> MediaBackend:
+    """
+    name: "windows" (WinRT) or "sim" (SimulatedPlayer seeded with `seed`, by default
+    derived from `machine_key` so every simulated machine plays its own stream).
+    """
+    if name == "windows":
+        return WinRTBackend()
+    if name == "sim":
+        from src.media.simulator import SimulatedBackend, SimulatedPlayer
+        if seed is None:
+            seed = zlib.crc32(machine_key.encode("utf-8"))
+        return SimulatedBackend(SimulatedPlayer(seed=seed, speed=speed))
+    raise ValueError(f"Unknown PLATFORM_BACKEND: {name} (expected one of {', '.join(BACKENDS)})")
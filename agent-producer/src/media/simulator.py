@@ -0,0 +1,119 @@
+# Seeded, headless now-playing simulator (PLATFORM_BACKEND=sim): load tests and profiling off Windows.
+from __future__ import annotations
+import asyncio
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Tuple
+
+# Where "sourceApp" comes from on real desktops (GSMTC app user model ids), most common first.
+SOURCE_APPS = ("Spotify.exe", "Microsoft.ZuneMusic_8wekyb3d8bbwe!Microsoft.ZuneMusic", "chrome.exe", "msedge.exe")
+
+class SimulatedPlayer:
+    """
+    A listener's media session as a seeded random walk: tracks of ~`mean_track_sec`
+    drawn from a skewed catalog (favourites repeat), a short "changing" status
+    between tracks, occasional pauses and idle stretches with no session at all.
+    The same seed gives the same sequence of states and durations; `speed`
+    divides every duration (speed=60: an hour of listening per minute).
+    """
+    def __init__(self, seed: int = 0, speed: float = 1.0, mean_track_sec: float = 210.0,
+                 pause_prob: float = 0.08, idle_prob: float = 0.03, mean_idle_sec: float = 900.0,
+                 catalog_size: int = 5000, clock: Callable[[], float] = time.monotonic) -> None:
+        self._rnd = random.Random(seed)
+        self._speed = speed
+        self._mean_track = mean_track_sec
+        self._pause_prob = pause_prob
+        self._idle_prob = idle_prob
+        self._mean_idle = mean_idle_sec
+        self.clock = clock
+        artists = [f"Artist {i}" for i in range(max(1, catalog_size // 10))]
+        self._catalog: List[Tuple[str, str, str]] = [
+            (self._rnd.choice(artists[: 20 + i // 20]), f"Track {i}", f"Album {i // 12}") for i in range(catalog_size)
+        ]
+        self._app = self._rnd.choices(SOURCE_APPS, weights=(70, 15, 10, 5))[0]
+        self._lock = threading.Lock()
+        self._track: Optional[Tuple[str, str, str]] = None
+        self._status: Optional[str] = None
+        self._remaining = 0.0        # playing time left in the current track (simulated seconds)
+        self._next_at = clock()
+        self.transitions = 0
+        self._advance(self._next_at)
+
+    def _duration(self, mean: float) -> float:
+        return self._rnd.expovariate(1.0 / mean)
+
+    def _step(self) -> float:
+        """Move to the next state; returns how long it lasts (simulated seconds)."""
+        r = self._rnd.random()
+        if self._status == "playing" and self._remaining > 0:
+            # Interrupted mid-track: pause and resume later.
+            self._status = "paused"
+            return self._duration(60.0)
+        if self._status == "paused":
+            self._status = "playing"
+            return self._play_for()
+        if self._status == "changing":
+            self._status = "playing"
+            self._remaining = max(30.0, self._rnd.gauss(self._mean_track, self._mean_track / 4))
+            return self._play_for()
+        if self._track is not None and r < self._idle_prob:
+            self._track = self._status = None
+            return self._duration(self._mean_idle)
+        fav = self._rnd.random() < 0.5
+        self._track = self._catalog[self._rnd.randrange(min(200, len(self._catalog)) if fav else len(self._catalog))]
+        self._status = "changing"
+        return 0.2
+
+    def _play_for(self) -> float:
+        if self._rnd.random() < self._pause_prob:
+            played = self._rnd.uniform(0.0, self._remaining)
+            self._remaining -= played
+            return played
+        played, self._remaining = self._remaining, 0.0
+        return played
+
+    def _advance(self, now: float) -> None:
+        while self._next_at <= now:
+            self._next_at += self._step() / self._speed
+            self.transitions += 1
+
+    def next_change(self) -> float:
+        """Clock time of the next state change."""
+        with self._lock:
+            self._advance(self.clock())
+            return self._next_at
+
+    def snapshot(self) -> Optional[dict]:
+        """Current state as read_now_playing() would return it (None: no media session)."""
+        with self._lock:
+            self._advance(self.clock())
+            if self._track is None:
+                return None
+            artist, title, album = self._track
+            return {
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "sourceApp": self._app,
+                "title": title,
+                "artist": artist,
+                "album": album,
+                "playbackStatus": self._status,
+            }
+
+class SimulatedBackend:
+    """MediaBackend over a SimulatedPlayer: change notifications fire at each state change."""
+    def __init__(self, player: SimulatedPlayer) -> None:
+        self.player = player
+
+    async def read(self) -> Optional[dict]:
+        return self.player.snapshot()
+
+    async def subscribe(self, wake: Callable[[], None]) -> Callable[[], None]:
+        async def notify() -> None:
+            while True:
+                await asyncio.sleep(max(0.0, self.player.next_change() - self.player.clock()))
+                wake()
+
+        task = asyncio.get_running_loop().create_task(notify())
+        return task.cancel
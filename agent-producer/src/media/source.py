@@ -0,0 +1,139 @@
+# Media source abstraction: push (OS change events), adaptive polling and a fake for tests.
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Optional
+from pcmedia.dedupe import Signature, build_signature
+from src.media.backends import MediaBackend
+
+log = logging.getLogger(__name__)
+
+Reader = Callable[[], Awaitable[Optional[dict]]]
+Wake = Callable[[], None]
+# Registers OS change callbacks that call wake() from any thread; returns an unsubscribe function.
+Subscribe = Callable[[Wake], Awaitable[Callable[[], None]]]
+
+class MediaSource(ABC):
+    """Yields now-playing snapshots (or None) whenever the media state may have changed."""
+    @abstractmethod
+    def snapshots(self) -> AsyncIterator[Optional[dict]]:
+        """An async generator of snapshots; a source without one can't be instantiated."""
+
+    async def close(self) -> None:
+        pass
+
+class PollingSource(MediaSource):
+    """
+    Adaptive polling: reads every `min_interval` while things change and backs off
+    by `backoff` (up to `max_interval`) while the snapshot stays the same.
+    """
+    def __init__(self, reader: Reader, min_interval: float = 2.0, max_interval: float = 30.0,
+                 backoff: float = 1.5, signature: Signature = build_signature) -> None:
+        self._reader = reader
+        self._signature = signature
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.backoff = backoff
+        self.interval = min_interval
+
+    async def snapshots(self) -> AsyncIterator[Optional[dict]]:
+        last_sig = None
+        while True:
+            data = await self._reader()
+            sig = self._signature(data) if data else None
+            if sig != last_sig:
+                last_sig = sig
+                self.interval = self.min_interval
+            else:
+                self.interval = min(self.max_interval, self.interval * self.backoff)
+            yield data
+            await asyncio.sleep(self.interval)
+
+class EventSource(MediaSource):
+    """
+    Push mode: each OS change notification triggers one read. A slow resync read
+    every `resync_interval` covers missed events. If subscribing fails, snapshots
+    come from `fallback` instead (when given).
+    """
+    def __init__(self, reader: Reader, subscribe: Subscribe, resync_interval: float = 30.0,
+                 fallback: Optional[MediaSource] = None) -> None:
+        self._reader = reader
+        self._subscribe = subscribe
+        self._unsubscribe: Optional[Callable[[], None]] = None
+        self._fallback = fallback
+        self.resync_interval = resync_interval
+
+    async def snapshots(self) -> AsyncIterator[Optional[dict]]:
+        loop = asyncio.get_running_loop()
+        woke = asyncio.Event()
+        try:
+            self._unsubscribe = await self._subscribe(lambda: loop.call_soon_threadsafe(woke.set))
+        except Exception as exc:
+            if self._fallback is None:
+                raise
+            log.warning("media events unavailable, falling back to polling: %s", exc)
+            async for data in self._fallback.snapshots():
+                yield data
+            return
+
+        yield await self._reader()
+        while True:
+            try:
+                await asyncio.wait_for(woke.wait(), timeout=self.resync_interval)
+            except asyncio.TimeoutError:
+                pass
+            # Clear before reading so events raised during the read are not lost.
+            woke.clear()
+            yield await self._reader()
+
+    async def close(self) -> None:
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+            self._unsubscribe = None
+
+class FakeMediaSource(MediaSource):
+    """
+    Scripted source for tests and benchmarks (runs anywhere).
+    `push()` injects a snapshot; `emitted_at` keeps the monotonic time each
+    snapshot was pushed so consumers can measure detection latency.
+    """
+    def __init__(self, script: Iterable[Optional[dict]] = ()) -> None:
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self.emitted_at: list[float] = []
+        for data in script:
+            self.push(data)
+
+    def push(self, data: Optional[dict]) -> None:
+        self.emitted_at.append(time.monotonic())
+        self._queue.put_nowait(data)
+
+    def end(self) -> None:
+        """Stop iteration once the queued snapshots are consumed."""
+        self._queue.put_nowait(StopAsyncIteration)
+
+    async def snapshots(self) -> AsyncIterator[Optional[dict]]:
+        while True:
+            data = await self._queue.get()
+            if data is StopAsyncIteration:
+                return
+            yield data
+
+def build_source(mode: str, backend: MediaBackend, min_interval: float, max_interval: float, backoff: float,
+                 resync_interval: float, signature: Signature = build_signature) -> MediaSource:
+    """
+    mode: "events" (backend push), "poll" (adaptive polling) or "auto"
+    (events, falling back to polling if subscriptions are unavailable).
+    """
+    if mode not in ("events", "poll", "auto"):
+        raise ValueError(f"Unknown MEDIA_SOURCE mode: {mode}")
+    polling = PollingSource(backend.read, min_interval, max_interval, backoff, signature)
+    if mode == "poll":
+        return polling
+    return EventSource(
+        backend.read,
+        backend.subscribe,
+        resync_interval,
+        fallback=polling if mode == "auto" else None,
+    )
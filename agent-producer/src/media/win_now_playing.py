@@ -1,22 +1,37 @@
 # Async reader for Windows GSMTC (winsdk).
 from __future__ import annotations
+import threading
 from datetime import datetime, timezone
+from typing import Callable, Optional
 from winsdk.windows.media.control import (
     GlobalSystemMediaTransportControlsSessionManager as MediaManager,
     GlobalSystemMediaTransportControlsSessionPlaybackStatus as PlaybackStatus,
 )
+from pcmedia.metrics import REGISTRY
+
+_STATUS_NAMES = {
+    int(PlaybackStatus.CLOSED):   "closed",
+    int(PlaybackStatus.OPENED):   "opened",
+    int(PlaybackStatus.CHANGING): "changing",
+    int(PlaybackStatus.STOPPED):  "stopped",
+    int(PlaybackStatus.PLAYING):  "playing",
+    int(PlaybackStatus.PAUSED):   "paused",
+}
+
+_READ_SECONDS = REGISTRY.histogram("media_read_seconds", "Time spent in WinRT media reads")
+
+_manager: Optional[MediaManager] = None
 
 def _status_name(status_enum: int) -> str:
     """Map PlaybackStatus enum to human-readable string."""
-    mapping = {
-        int(PlaybackStatus.CLOSED):   "closed",
-        int(PlaybackStatus.OPENED):   "opened",
-        int(PlaybackStatus.CHANGING): "changing",
-        int(PlaybackStatus.STOPPED):  "stopped",
-        int(PlaybackStatus.PLAYING):  "playing",
-        int(PlaybackStatus.PAUSED):   "paused",
-    }
-    return mapping.get(int(status_enum), str(status_enum))
+    return _STATUS_NAMES.get(int(status_enum), str(status_enum))
+
+async def get_manager() -> MediaManager:
+    """Request the session manager once and reuse it."""
+    global _manager
+    if _manager is None:
+        _manager = await MediaManager.request_async()
+    return _manager
 
 async def read_now_playing() -> dict | None:
     """
@@ -24,7 +39,11 @@ async def read_now_playing() -> dict | None:
     Returns a dict (without None values) or None if no session/info.
     NOTE: Must run in an interactive user session.
     """
-    mgr = await MediaManager.request_async()
+    with _READ_SECONDS.time():
+        return await _read_now_playing()
+
+async def _read_now_playing() -> dict | None:
+    mgr = await get_manager()
     session = mgr.get_current_session()
     if not session:
         return None
@@ -46,3 +65,50 @@ async def read_now_playing() -> dict | None:
     }
     # Remove None values
     return {k: v for k, v in payload.items() if v is not None}
+
+async def subscribe_changes(wake: Callable[[], None]) -> Callable[[], None]:
+    """
+    Call `wake()` (from a WinRT thread) on current-session, media-properties and
+    playback-info changes. Session handlers follow the current session.
+    Returns an unsubscribe function.
+    """
+    mgr = await get_manager()
+    lock = threading.Lock()
+    hooked: list[tuple] = []  # (session, media_token, playback_token)
+
+    def on_session_event(*_args) -> None:
+        wake()
+
+    def unhook_session() -> None:
+        for session, media_token, playback_token in hooked:
+            try:
+                session.remove_media_properties_changed(media_token)
+                session.remove_playback_info_changed(playback_token)
+            except Exception:
+                pass
+        hooked.clear()
+
+    def hook_current_session() -> None:
+        with lock:
+            unhook_session()
+            session = mgr.get_current_session()
+            if session:
+                hooked.append((
+                    session,
+                    session.add_media_properties_changed(on_session_event),
+                    session.add_playback_info_changed(on_session_event),
+                ))
+
+    def on_current_session_changed(*_args) -> None:
+        hook_current_session()
+        wake()
+
+    manager_token = mgr.add_current_session_changed(on_current_session_changed)
+    hook_current_session()
+
+    def unsubscribe() -> None:
+        mgr.remove_current_session_changed(manager_token)
+        with lock:
+            unhook_session()
+
+    return unsubscribe
@@ -0,0 +1,131 @@
+# Media sources against a scripted backend and the simulator: polling backoff, event wake-ups and
+# resyncs, and the "auto" fallback to polling. Intervals are milliseconds, so nothing waits long.
+from __future__ import annotations
+import asyncio
+from typing import Callable, List, Optional
+from src.media.backends import build_backend
+from src.media.simulator import SimulatedBackend, SimulatedPlayer
+from src.media.source import EventSource, FakeMediaSource, PollingSource, build_source
+
+def media(title: str, status: str = "playing") -> dict:
+    return {"sourceApp": "Spotify.exe", "title": title, "artist": "A", "playbackStatus": status}
+
+class ScriptedBackend:
+    """MediaBackend stand-in: read() walks `script` (then repeats its last entry); wake() is exposed."""
+    def __init__(self, script: List[Optional[dict]], subscribe_error: Optional[Exception] = None) -> None:
+        self._script = list(script)
+        self._subscribe_error = subscribe_error
+        self.reads = 0
+        self.wake: Optional[Callable[[], None]] = None
+        self.unsubscribed = False
+
+    async def read(self) -> Optional[dict]:
+        self.reads += 1
+        return self._script.pop(0) if len(self._script) > 1 else self._script[0]
+
+    async def subscribe(self, wake: Callable[[], None]) -> Callable[[], None]:
+        if self._subscribe_error is not None:
+            raise self._subscribe_error
+        self.wake = wake
+
+        def unsubscribe() -> None:
+            self.unsubscribed = True
+        return unsubscribe
+
+async def take(source, n: int, after=None) -> list:
+    """First `n` snapshots; `after(i)` runs once snapshot i was received (e.g. to raise an event)."""
+    out = []
+    gen = source.snapshots()
+    try:
+        async for data in gen:
+            out.append((data, getattr(source, "interval", None)))
+            if after is not None:
+                after(len(out) - 1)
+            if len(out) == n:
+                return out
+    finally:
+        await gen.aclose()
+        await source.close()
+    return out
+
+def test_polling_backs_off_while_unchanged_and_resets_on_change():
+    backend = ScriptedBackend([media("a"), media("a"), media("a"), media("a"), media("b"), media("b")])
+    source = PollingSource(backend.read, min_interval=0.001, max_interval=0.004, backoff=2.0)
+    got = asyncio.run(take(source, 6))
+    assert [d["title"] for d, _ in got] == ["a", "a", "a", "a", "b", "b"]
+    assert [i for _, i in got] == [0.001, 0.002, 0.004, 0.004, 0.001, 0.002]
+
+def test_polling_treats_a_session_ending_as_a_change():
+    backend = ScriptedBackend([media("a"), media("a"), None, None])
+    source = PollingSource(backend.read, min_interval=0.001, max_interval=0.01, backoff=2.0)
+    assert [i for _, i in asyncio.run(take(source, 4))] == [0.001, 0.002, 0.001, 0.002]
+
+def test_polling_on_the_simulator_resets_when_the_player_changes_state():
+    now = [0.0]
+    player = SimulatedPlayer(seed=3, clock=lambda: now[0])
+    source = PollingSource(SimulatedBackend(player).read, min_interval=0.001, max_interval=0.008, backoff=2.0)
+
+    def after(i: int) -> None:
+        if i == 3:
+            now[0] = player.next_change()   # next read sees a new state
+    got = asyncio.run(take(source, 5, after))
+    assert [i for _, i in got] == [0.001, 0.002, 0.004, 0.008, 0.001]
+
+def test_events_read_once_per_wake_up():
+    backend = ScriptedBackend([media("a"), media("b"), media("c")])
+    source = EventSource(backend.read, backend.subscribe, resync_interval=30.0)
+
+    async def run() -> list:
+        loop = asyncio.get_running_loop()
+        # wake() comes from an OS thread in production
+        def after(i: int) -> None:
+            if i < 2:
+                loop.run_in_executor(None, backend.wake)
+        return await asyncio.wait_for(take(source, 3, after), 5.0)
+    got = asyncio.run(run())
+    assert [d["title"] for d, _ in got] == ["a", "b", "c"]
+    assert backend.reads == 3 and backend.unsubscribed
+
+def test_events_resync_without_wake_ups():
+    backend = ScriptedBackend([media("a"), media("b")])
+    source = EventSource(backend.read, backend.subscribe, resync_interval=0.01)
+    got = asyncio.run(asyncio.wait_for(take(source, 3), 5.0))
+    assert [d["title"] for d, _ in got] == ["a", "b", "b"]
+
+def test_events_on_the_simulator_follow_its_state_changes():
+    backend = build_backend("sim", "pc-01", speed=20000.0)
+    start = backend.player.transitions
+    source = build_source("events", backend, 2.0, 30.0, 1.5, resync_interval=30.0)
+    got = asyncio.run(asyncio.wait_for(take(source, 5), 10.0))
+    assert len(got) == 5
+    assert backend.player.transitions >= start + 4   # each read after the first followed a change
+
+def test_events_without_fallback_raise_when_subscribing_fails():
+    backend = ScriptedBackend([media("a")], subscribe_error=OSError("no media session manager"))
+    source = build_source("events", backend, 0.001, 0.01, 2.0, resync_interval=30.0)
+    try:
+        asyncio.run(take(source, 1))
+    except OSError:
+        return
+    raise AssertionError("subscribe error was swallowed")
+
+def test_auto_falls_back_to_polling_when_subscribing_fails():
+    backend = ScriptedBackend([media("a"), media("a"), media("b")], subscribe_error=OSError("unavailable"))
+    source = build_source("auto", backend, 0.001, 0.01, 2.0, resync_interval=30.0)
+    got = asyncio.run(asyncio.wait_for(take(source, 3), 5.0))
+    assert [d["title"] for d, _ in got] == ["a", "a", "b"]
+    assert backend.reads == 3
+
+def test_auto_uses_events_on_the_simulator():
+    source = build_source("auto", build_backend("sim", "pc-01", speed=20000.0), 2.0, 30.0, 1.5, 30.0)
+    assert isinstance(source, EventSource)
+    assert len(asyncio.run(asyncio.wait_for(take(source, 3), 10.0))) == 3
+
+def test_fake_source_replays_its_script_and_ends():
+    async def run() -> list:
+        source = FakeMediaSource([media("a"), None])
+        source.push(media("b"))
+        source.end()
+        return [d async for d in source.snapshots()], source.emitted_at
+    got, emitted_at = asyncio.run(run())
+    assert got == [media("a"), None, media("b")] and len(emitted_at) == 3
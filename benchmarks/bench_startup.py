@@ -0,0 +1,80 @@
+# Startup cost of each service's entry point: `python -X importtime -c "import <entry>"` in a fresh
+# interpreter (from the service directory), repeated. Reports wall time against a bare interpreter, the entry module's
+# cumulative import time and the heaviest top-level packages (self time summed per package).
+# Importing the entry point must not read settings or connect to anything.
+#   python benchmarks/bench_startup.py [--service bot-consumer] [--entry main] [--runs 15]
+from __future__ import annotations
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICES = ["agent-producer", "bot-consumer", "device-handle-bot", "lock-device-consumer"]
+
+def default_entry(service_dir: str) -> str:
+    return "main" if os.path.exists(os.path.join(service_dir, "main.py")) else "consumer_lock"
+
+def run_once(service_dir: str, code: str, importtime: bool) -> Tuple[float, str]:
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=service_dir, capture_output=True, text=True)
+    elapsed = time.perf_counter() - t0
+    if proc.returncode != 0:
+        raise SystemExit(f"{code!r} failed:\n{proc.stderr[-2000:]}")
+    return elapsed, proc.stderr
+
+def parse(stderr: str) -> List[Tuple[str, int, int]]:
+    """-X importtime lines -> [(module, self us, cumulative us)] (nesting is in the name's indent)."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        head, cum_us, name = line.split("|", 2)
+        self_us = head.split(":", 1)[1]
+        rows.append((name.strip(), int(self_us), int(cum_us)))
+    return rows
+
+def measure(service_dir: str, entry: str, runs: int, top: int) -> None:
+    code = f"import {entry}"
+    run_once(service_dir, code, importtime=False)   # warm the .pyc and OS file caches
+    bare = [run_once(service_dir, "pass", importtime=False)[0] for _ in range(runs)]
+    wall = [run_once(service_dir, code, importtime=False)[0] for _ in range(runs)]
+    entry_us: List[int] = []
+    packages: Dict[str, List[int]] = defaultdict(list)
+    for _ in range(runs):
+        rows = parse(run_once(service_dir, code, importtime=True)[1])
+        entry_us.append(next(cum for name, _, cum in rows if name == entry))
+        per_run: Dict[str, int] = defaultdict(int)
+        for name, self_us, _ in rows:
+            per_run[name.split(".", 1)[0]] += self_us
+        for pkg, us in per_run.items():
+            packages[pkg].append(us)
+
+    print(f"[i] {os.path.basename(service_dir)}: import {entry} (median of {runs} fresh interpreters)")
+    print(f"    wall, bare interpreter      : {statistics.median(bare) * 1000:7.1f} ms")
+    print(f"    wall, interpreter + import  : {statistics.median(wall) * 1000:7.1f} ms")
+    print(f"    entry cumulative importtime : {statistics.median(entry_us) / 1000:7.1f} ms")
+    heaviest = sorted(packages.items(), key=lambda kv: -statistics.median(kv[1]))[:top]
+    print("    heaviest packages (self time, site's imports included):")
+    for pkg, samples in heaviest:
+        print(f"      {pkg:<28} {statistics.median(samples) / 1000:7.1f} ms")
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--service", action="append", choices=SERVICES, help="repeatable (default: every service)")
+    ap.add_argument("--entry", default=None, help="module to import (default: main, or consumer_lock)")
+    ap.add_argument("--runs", type=int, default=15)
+    ap.add_argument("--top", type=int, default=8)
+    args = ap.parse_args()
+
+    for service in args.service or SERVICES:
+        service_dir = os.path.join(ROOT, service)
+        measure(service_dir, args.entry or default_entry(service_dir), args.runs, args.top)
+
+if __name__ == "__main__":
+    main()
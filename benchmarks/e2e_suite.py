@@ -0,0 +1,131 @@
+# End-to-end benchmark suite: runs every service's benchmarks/bench_e2e.py (each in its own
+# interpreter, from its service directory) with the same load and collects the results in one JSON
+# file; `compare` flags regressions between two such files (or two single-stage results).
+#
+#   python benchmarks/e2e_suite.py run --broker fake --rate 1000 --seconds 10 --out base.json
+#   python benchmarks/e2e_suite.py run --kafka "linger.ms=50" --out linger50.json --baseline base.json
+#   python benchmarks/e2e_suite.py compare base.json linger50.json --threshold 15
+#
+# --broker fake uses an in-process broker per stage (Python-side cost and client behaviour such as
+# linger); a bootstrap list (e.g. the docker-compose.yml broker) measures the real thing, with
+# fresh topics per run.
+from __future__ import annotations
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (service directory, extra bench_e2e arguments)
+STAGES: List[Tuple[str, List[str]]] = [
+    ("agent-producer", []),
+    ("bot-consumer", []),
+    ("device-handle-bot", []),
+    ("lock-device-consumer", []),
+]
+
+# metric -> +1 when higher is better, -1 when lower is better
+METRICS = {
+    "throughput_per_sec": +1,
+    "msgs_per_request": +1,
+    "cpu_us_per_msg": -1,
+    "latency_ms.p50": -1,
+    "latency_ms.p99": -1,
+    "latency_ms.p999": -1,
+}
+
+def run_stage(service: str, extra: List[str], common: List[str]) -> dict:
+    with tempfile.TemporaryDirectory() as d:
+        out = os.path.join(d, "result.json")
+        cmd = [sys.executable, "-m", "benchmarks.bench_e2e", *common, *extra, "--json", out]
+        print(f"[>] {service}: {' '.join(cmd[1:])}", flush=True)
+        proc = subprocess.run(cmd, cwd=os.path.join(ROOT, service), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              text=True)
+        if proc.returncode != 0 or not os.path.exists(out):
+            raise SystemExit(f"{service} failed ({proc.returncode}):\n{proc.stderr[-2000:]}")
+        print("\n".join(line for line in proc.stdout.splitlines() if not line.startswith("    ->")))
+        with open(out, encoding="utf-8") as f:
+            return json.load(f)
+
+def stages_of(doc: dict) -> Dict[str, dict]:
+    """Stage name -> result, for a suite file or a single bench_e2e result."""
+    return {s["stage"]: s for s in doc.get("stages", [doc])}
+
+def metric(stage: dict, name: str):
+    value = stage["results"]
+    for part in name.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+def compare(old: dict, new: dict, threshold: float) -> int:
+    """Print a table of relative changes; returns the number of regressions beyond `threshold` %."""
+    regressions = 0
+    before, after = stages_of(old), stages_of(new)
+    print(f"[i] compare (regression: worse by more than {threshold:g}%)")
+    for name in sorted(before.keys() & after.keys()):
+        print(f"    {name}")
+        if metric(after[name], "lost"):
+            print(f"      lost messages          : {metric(after[name], 'lost')}   REGRESSION")
+            regressions += 1
+        for m, direction in METRICS.items():
+            a, b = metric(before[name], m), metric(after[name], m)
+            if not isinstance(a, (int, float)) or not isinstance(b, (int, float)) or a == 0:
+                continue
+            change = (b - a) / a * 100
+            worse = -change * direction > threshold
+            regressions += worse
+            print(f"      {m:<22} : {a:12.2f} -> {b:12.2f}  {change:+7.1f}%{'   REGRESSION' if worse else ''}")
+    for name in sorted(before.keys() ^ after.keys()):
+        print(f"    {name}: only in {'old' if name in before else 'new'} results")
+    return regressions
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    run = sub.add_parser("run", help="run every stage")
+    run.add_argument("--broker", default="fake")
+    run.add_argument("--rate", type=float, default=1000.0)
+    run.add_argument("--machines", type=int, default=None, help="default: each stage's own")
+    run.add_argument("--seconds", type=float, default=5.0)
+    run.add_argument("--partitions", type=int, default=6)
+    run.add_argument("--kafka", default="", help='producer overrides, e.g. "linger.ms=20,compression.type=zstd"')
+    run.add_argument("--only", default="", help="comma separated service directories")
+    run.add_argument("--label", default="")
+    run.add_argument("--out", default="e2e-results.json")
+    run.add_argument("--baseline", default="", help="compare against this earlier result")
+    run.add_argument("--threshold", type=float, default=10.0, help="regression threshold in %%")
+    cmp = sub.add_parser("compare", help="compare two result files")
+    cmp.add_argument("old")
+    cmp.add_argument("new")
+    cmp.add_argument("--threshold", type=float, default=10.0)
+    args = ap.parse_args()
+
+    if args.cmd == "compare":
+        with open(args.old, encoding="utf-8") as f_old, open(args.new, encoding="utf-8") as f_new:
+            sys.exit(1 if compare(json.load(f_old), json.load(f_new), args.threshold) else 0)
+
+    common = ["--broker", args.broker, "--rate", str(args.rate), "--seconds", str(args.seconds),
+              "--partitions", str(args.partitions), "--label", args.label]
+    if args.machines is not None:
+        common += ["--machines", str(args.machines)]
+    if args.kafka:
+        common += ["--kafka", args.kafka]
+    only = set(filter(None, args.only.split(",")))
+    results = [run_stage(service, extra, common) for service, extra in STAGES if not only or service in only]
+    doc = {"suite": "e2e", "label": args.label, "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+           "stages": results}
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=2)
+        f.write("\n")
+    print(f"[i] {len(results)} stages -> {args.out}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            sys.exit(1 if compare(json.load(f), doc, args.threshold) else 0)
+
+if __name__ == "__main__":
+    main()
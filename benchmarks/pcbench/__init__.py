@@ -0,0 +1 @@
+# Harness shared by the services' benchmarks: in-process broker (fake_kafka) and open-loop load (loadgen)
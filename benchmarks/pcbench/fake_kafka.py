@@ -0,0 +1,297 @@
+# In-process stand-ins for confluent_kafka.Consumer and Producer (benchmarks only; no broker needed)
+from __future__ import annotations
+import json
+import threading
+import time
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+class FakeMessage:
+    """Mimics confluent_kafka.Message for the accessors the services use."""
+    __slots__ = ("_topic", "_partition", "_offset", "_key", "_value", "_timestamp", "_headers", "_latency")
+
+    def __init__(self, topic: str, partition: int, offset: int, key: Optional[bytes], value: bytes,
+                 timestamp_ms: int = 0, headers: Optional[list] = None, latency: Optional[float] = None) -> None:
+        self._topic, self._partition, self._offset = topic, partition, offset
+        self._key, self._value, self._timestamp = key, value, timestamp_ms
+        self._headers = headers
+        self._latency = latency
+
+    def topic(self) -> str: return self._topic
+    def partition(self) -> int: return self._partition
+    def offset(self) -> int: return self._offset
+    def key(self) -> Optional[bytes]: return self._key
+    def value(self) -> bytes: return self._value
+    def timestamp(self) -> Tuple[int, int]: return (1, self._timestamp)  # TIMESTAMP_CREATE_TIME
+    def headers(self): return self._headers
+    def error(self): return None
+    def latency(self) -> Optional[float]: return self._latency
+
+class FakeBroker:
+    """
+    Partition logs indexed once, so many FakeConsumers (e.g. a simulated fleet) can share them.
+    Also live: FakeProducers append to it while FakeConsumers (in other threads) read.
+    """
+    def __init__(self, messages: List[FakeMessage] = ()) -> None:
+        self.log: Dict[Tuple[str, int], List[FakeMessage]] = {}
+        for m in messages:
+            self.log.setdefault((m.topic(), m.partition()), []).append(m)
+        self.appended = 0
+        self._cond = threading.Condition()
+
+    def create_topic(self, topic: str, partitions: int = 1) -> None:
+        """Empty partitions, so consumers can subscribe before anything is produced."""
+        with self._cond:
+            for p in range(partitions):
+                self.log.setdefault((topic, p), [])
+
+    def partitions(self, topic: str) -> int:
+        return sum(1 for t, _ in self.log if t == topic)
+
+    def append(self, topic: str, partition: int, key: Optional[bytes], value: bytes,
+               headers: Optional[list] = None, latency: Optional[float] = None) -> FakeMessage:
+        with self._cond:
+            log = self.log.setdefault((topic, partition), [])
+            msg = FakeMessage(topic, partition, len(log), key, value, int(time.time() * 1000), headers, latency)
+            log.append(msg)
+            self.appended += 1
+            self._cond.notify_all()
+        return msg
+
+    def wait(self, seen: int, timeout: float) -> None:
+        """Block until something is appended after `seen` (a previous `appended`) or `timeout` passes."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.appended != seen, timeout)
+
+class FakeConsumer:
+    """
+    Serves a pre-built list of messages (or a FakeBroker) through poll()/consume(),
+    honours subscribe()/assign() topic and partition selection, pause()/resume()/seek()
+    and records commits. `on_empty` is called once the log is exhausted (e.g. to stop
+    the consumer loop); without it, poll()/consume() on a live broker wait up to
+    `timeout` for new messages, like the real client.
+    """
+    def __init__(self, messages, on_empty: Optional[Callable[[], None]] = None) -> None:
+        broker = messages if isinstance(messages, FakeBroker) else FakeBroker(messages)
+        self._broker = broker
+        self._log = broker.log
+        self._pos = {tp: 0 for tp in self._log}
+        self._paused: set = set()
+        self._rr = list(self._log)
+        self.on_empty = on_empty
+        self.commits = 0
+        self.committed: Dict[Tuple[str, int], int] = {}
+
+    # ---- subscription / assignment ----
+    def subscribe(self, topics, on_assign=None, on_revoke=None, on_lost=None) -> None:
+        self._rr = [tp for tp in self._log if tp[0] in topics]
+        if on_assign is not None:
+            on_assign(self, self.assignment())
+
+    def assign(self, partitions) -> None:
+        self._rr = [(tp.topic, tp.partition) for tp in partitions if (tp.topic, tp.partition) in self._log]
+        for tp in partitions:
+            if tp.offset >= 0 and (tp.topic, tp.partition) in self._log:
+                self._pos[(tp.topic, tp.partition)] = tp.offset
+
+    def assignment(self):
+        from confluent_kafka import TopicPartition
+        return [TopicPartition(t, p) for t, p in self._rr]
+
+    def pause(self, partitions) -> None:
+        self._paused.update((tp.topic, tp.partition) for tp in partitions)
+
+    def resume(self, partitions) -> None:
+        self._paused.difference_update((tp.topic, tp.partition) for tp in partitions)
+
+    def seek(self, tp) -> None:
+        self._pos[(tp.topic, tp.partition)] = tp.offset
+
+    # ---- fetching ----
+    def consume(self, num_messages: int = 1, timeout: float = -1) -> List[FakeMessage]:
+        seen = self._broker.appended
+        out = self._fetch(num_messages)
+        if not out and self.on_empty is None and timeout != 0:
+            self._broker.wait(seen, timeout if timeout > 0 else None)
+            out = self._fetch(num_messages)
+        if not out and self.on_empty is not None:
+            self.on_empty()
+        return out
+
+    def _fetch(self, num_messages: int) -> List[FakeMessage]:
+        out: List[FakeMessage] = []
+        while len(out) < num_messages:
+            progressed = False
+            for tp in self._rr:
+                if tp in self._paused:
+                    continue
+                pos, log = self._pos[tp], self._log[tp]
+                if pos < len(log):
+                    take = min(num_messages - len(out), len(log) - pos)
+                    out.extend(log[pos:pos + take])
+                    self._pos[tp] = pos + take
+                    progressed = True
+                    if len(out) >= num_messages:
+                        break
+            if not progressed:
+                break
+        return out
+
+    def poll(self, timeout: float = -1) -> Optional[FakeMessage]:
+        batch = self.consume(1, timeout)
+        return batch[0] if batch else None
+
+    # ---- offsets ----
+    def get_watermark_offsets(self, partition, timeout: float = -1, cached: bool = False) -> Tuple[int, int]:
+        return 0, len(self._log.get((partition.topic, partition.partition), ()))
+
+    def offsets_for_times(self, partitions, timeout: float = -1):
+        """Earliest offset whose timestamp is >= tp.offset (ms) per partition; -1 past the end, like the broker."""
+        from confluent_kafka import TopicPartition
+        out = []
+        for tp in partitions:
+            log = self._log.get((tp.topic, tp.partition), [])
+            offset = next((m.offset() for m in log if m.timestamp()[1] >= tp.offset), -1)
+            out.append(TopicPartition(tp.topic, tp.partition, offset))
+        return out
+
+    def list_topics(self, topic: Optional[str] = None, timeout: float = -1):
+        """Topic -> partitions metadata, like the producer's."""
+        from types import SimpleNamespace
+        names = [topic] if topic else sorted({t for t, _ in self._log})
+        return SimpleNamespace(topics={
+            t: SimpleNamespace(error=None, partitions={p: None for p in range(self._broker.partitions(t))})
+            for t in names if self._broker.partitions(t)
+        })
+
+    def commit(self, message=None, offsets=None, asynchronous: bool = True):
+        self.commits += 1
+        for tp in offsets or []:
+            self.committed[(tp.topic, tp.partition)] = tp.offset
+
+    def close(self) -> None:
+        pass
+
+class FakeProducer:
+    """
+    Stands in for confluent_kafka.Producer on a FakeBroker. Like librdkafka, a background
+    thread appends queued records to the partition logs (once the oldest waited `linger_ms`,
+    as linger.ms does) and poll()/flush() only serve the delivery callbacks, from the calling
+    thread. Partitions follow the key (crc32, not librdkafka's murmur2) or round-robin, over
+    `partitions` for unknown topics.
+    Each send counts as one produce request per `batch_num_messages` records of its fullest
+    partition; `stats_cb` gets librdkafka-shaped statistics ("txmsgs" and per-broker
+    "req": {"Produce": n}) every `stats_interval_ms`, and once more on flush().
+    """
+    _instances = 0
+
+    def __init__(self, broker: FakeBroker, linger_ms: float = 0.0, partitions: int = 6,
+                 batch_num_messages: int = 10000, stats_cb: Optional[Callable[[str], None]] = None,
+                 stats_interval_ms: int = 0, name: str = "fake") -> None:
+        FakeProducer._instances += 1
+        self.broker = broker
+        self.name = f"{name}#producer-{FakeProducer._instances}"
+        self._linger = linger_ms / 1000.0
+        self._partitions = partitions
+        self._batch = max(1, batch_num_messages)
+        self.stats_cb = stats_cb
+        self._stats_interval = stats_interval_ms / 1000.0 if stats_cb is not None and stats_interval_ms else None
+        self._queue: List[tuple] = []
+        self._sending = 0
+        self._reports: List[tuple] = []
+        self._cond = threading.Condition()
+        self._rr = 0
+        self.produced = 0
+        self.delivered = 0
+        self.requests = 0
+        threading.Thread(target=self._send_loop, name="fake-producer", daemon=True).start()
+
+    def __len__(self) -> int:
+        return len(self._queue) + self._sending + len(self._reports)
+
+    def produce(self, topic: str, value=None, key=None, partition: int = -1, on_delivery=None,
+                headers=None, callback=None, **kwargs) -> None:
+        if isinstance(key, str):
+            key = key.encode("utf-8")
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        if partition < 0:
+            n = self.broker.partitions(topic) or self._partitions
+            if key is not None:
+                partition = zlib.crc32(key) % n
+            else:
+                partition, self._rr = self._rr % n, self._rr + 1
+        with self._cond:
+            self._queue.append((time.monotonic(), topic, partition, key, value, headers, on_delivery or callback))
+            self.produced += 1
+            self._cond.notify_all()
+
+    def _stats(self) -> str:
+        return json.dumps({"name": self.name, "ts": int(time.monotonic() * 1e6), "txmsgs": self.delivered,
+                           "brokers": {"fake:9092/1": {"req": {"Produce": self.requests}}}})
+
+    def _send_loop(self) -> None:
+        next_stats = time.monotonic() + self._stats_interval if self._stats_interval else None
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    if next_stats is not None and now >= next_stats:
+                        next_stats = now + self._stats_interval
+                        self._reports.append((self.stats_cb, self._stats()))
+                        self._cond.notify_all()
+                    if self._queue and now - self._queue[0][0] >= self._linger:
+                        break
+                    wake = [t for t in (next_stats, self._queue[0][0] + self._linger if self._queue else None)
+                            if t is not None]
+                    self._cond.wait(min(wake) - now if wake else None)
+                batch, self._queue = self._queue, []
+                self._sending = len(batch)
+            now = time.monotonic()
+            per_partition: Dict[Tuple[str, int], int] = {}
+            sent = []
+            for queued_at, topic, partition, key, value, headers, cb in batch:
+                per_partition[(topic, partition)] = per_partition.get((topic, partition), 0) + 1
+                sent.append((cb, self.broker.append(topic, partition, key, value, headers, now - queued_at)))
+            with self._cond:
+                self.delivered += len(batch)
+                self.requests += -(-max(per_partition.values()) // self._batch)
+                self._reports.extend(sent)
+                self._sending = 0
+                self._cond.notify_all()
+
+    def poll(self, timeout: float = 0) -> int:
+        with self._cond:
+            if not self._reports and timeout and timeout > 0:
+                self._cond.wait_for(lambda: self._reports, timeout)
+            reports, self._reports = self._reports, []
+        served = 0
+        for cb, item in reports:
+            if cb is self.stats_cb and isinstance(item, str):
+                cb(item)
+                continue
+            served += 1
+            if cb is not None:
+                cb(None, item)
+        return served
+
+    def flush(self, timeout: Optional[float] = None) -> int:
+        """Everything out now (linger ignored), then serve the callbacks; returns what is left."""
+        with self._cond:
+            if self._queue:
+                self._queue[0] = (float("-inf"),) + self._queue[0][1:]
+                self._cond.notify_all()
+            self._cond.wait_for(lambda: not self._queue and not self._sending, timeout)
+            if self.stats_cb is not None:
+                self._reports.append((self.stats_cb, self._stats()))
+        self.poll(0)
+        return len(self)
+
+    def list_topics(self, topic: Optional[str] = None, timeout: float = -1):
+        """Just enough metadata for routing.partition_count()."""
+        from types import SimpleNamespace
+        names = [topic] if topic else sorted({t for t, _ in self.broker.log})
+        return SimpleNamespace(topics={
+            t: SimpleNamespace(error=None, partitions={p: None for p in range(self.broker.partitions(t))})
+            for t in names if self.broker.partitions(t)
+        })
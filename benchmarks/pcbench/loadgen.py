@@ -0,0 +1,247 @@
+# Shared by every service's bench_e2e: open-loop load at a target rate, latency percentiles,
+# CPU per message and JSON results (compared across runs by benchmarks/e2e_suite.py at the repo root).
+# BROKER is "fake" (in-process FakeBroker) or a bootstrap list for a local broker (docker-compose.yml).
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional
+from pcbench.fake_kafka import FakeBroker, FakeConsumer, FakeProducer
+
+def add_common_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--broker", default="fake", help='"fake" (in-process) or bootstrap servers, e.g. localhost:9025')
+    ap.add_argument("--rate", type=float, default=1000.0, help="messages/s offered (open loop)")
+    ap.add_argument("--machines", type=int, default=50)
+    ap.add_argument("--seconds", type=float, default=5.0, help="load duration")
+    ap.add_argument("--partitions", type=int, default=6)
+    ap.add_argument("--batch-size", type=int, default=100, help="consumer BATCH_SIZE (1: single poll())")
+    ap.add_argument("--kafka", default="", help='producer overrides, e.g. "linger.ms=20,compression.type=zstd"')
+    ap.add_argument("--json", default="", help="write the result to this file")
+    ap.add_argument("--label", default="", help="free text stored with the result (e.g. a git sha)")
+
+def parse_overrides(spec: str) -> Dict[str, object]:
+    """ "linger.ms=20,compression.type=zstd" -> {"linger.ms": 20, "compression.type": "zstd"} """
+    out: Dict[str, object] = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        name, _, value = item.partition("=")
+        try:
+            out[name.strip()] = int(value)
+        except ValueError:
+            out[name.strip()] = {"true": True, "false": False}.get(value.strip().lower(), value.strip())
+    return out
+
+def bench_topic(base: str, broker: str) -> str:
+    """The topic itself on the fake broker; a fresh one per run on a real broker (no stale records)."""
+    return base if broker == "fake" else f"{base}.bench.{uuid.uuid4().hex[:8]}"
+
+def setup(broker: str, topics: List[str], partitions: int) -> Optional[FakeBroker]:
+    """
+    Create the run's topics: on a new FakeBroker (returned), or up front on the real
+    broker (auto-creation would give them a single partition; returns None).
+    """
+    if broker == "fake":
+        fake = FakeBroker()
+        for topic in topics:
+            fake.create_topic(topic, partitions)
+        return fake
+    from confluent_kafka.admin import AdminClient, NewTopic
+    admin = AdminClient({"bootstrap.servers": broker})
+    for topic, fut in admin.create_topics([NewTopic(t, partitions, 1) for t in topics]).items():
+        try:
+            fut.result(15)
+        except Exception as e:
+            if "TOPIC_ALREADY_EXISTS" not in str(e):
+                raise SystemExit(f"cannot create {topic} on {broker}: {e}")
+    return None
+
+def make_producer(broker: str, fake: Optional[FakeBroker], conf: Dict[str, object], partitions: int):
+    """
+    FakeProducer on the fake broker (honours linger.ms, batch.num.messages and the stats
+    callback), else confluent_kafka.Producer(conf).
+    """
+    if fake is not None:
+        return FakeProducer(fake, linger_ms=float(conf.get("linger.ms", 0)), partitions=partitions,
+                            batch_num_messages=int(conf.get("batch.num.messages", 10000)),
+                            stats_cb=conf.get("stats_cb"), stats_interval_ms=int(conf.get("statistics.interval.ms", 0)),
+                            name=str(conf.get("client.id", "fake")))
+    from confluent_kafka import Producer
+    return Producer({**conf, "bootstrap.servers": broker})
+
+class ProduceStats:
+    """
+    stats_cb for one bench producer: keeps its latest message and produce request counts
+    (librdkafka statistics) and passes the statistics on to `hooks` (e.g. AdaptiveLinger).
+    """
+    INTERVAL_MS = 1000
+
+    def __init__(self) -> None:
+        self.messages = 0
+        self.requests = 0
+        self.hooks: List[Callable[[str], None]] = []
+
+    def __call__(self, stats_json: str) -> None:
+        stats = json.loads(stats_json)
+        self.messages = int(stats.get("txmsgs", 0))
+        self.requests = sum(int(b.get("req", {}).get("Produce", 0)) for b in stats.get("brokers", {}).values())
+        for hook in self.hooks:
+            hook(stats_json)
+
+    def attach(self, conf: Dict[str, object]) -> Dict[str, object]:
+        """`conf` with this callback installed (statistics every INTERVAL_MS at most)."""
+        interval = min(int(conf.get("statistics.interval.ms") or self.INTERVAL_MS), self.INTERVAL_MS)
+        return {**conf, "stats_cb": self, "statistics.interval.ms": interval}
+
+def request_counts(stats: List[ProduceStats]) -> Dict[str, object]:
+    """Result fields: produce requests sent and messages per request, over every producer."""
+    messages, requests = sum(s.messages for s in stats), sum(s.requests for s in stats)
+    return {"produce_requests": requests, "msgs_per_request": round(messages / requests, 2) if requests else None}
+
+def make_consumer(broker: str, fake: Optional[FakeBroker]):
+    """A consumer reading the run's topics from the start (they are fresh), in a group of its own."""
+    if fake is not None:
+        return FakeConsumer(fake)
+    from confluent_kafka import Consumer
+    return Consumer({"bootstrap.servers": broker, "group.id": f"bench-{uuid.uuid4().hex[:8]}",
+                     "auto.offset.reset": "earliest", "enable.auto.commit": False})
+
+class Receiver:
+    """Reads `topics` in a background thread and hands every message to `on_message(msg)`."""
+    def __init__(self, consumer, topics: List[str], on_message: Callable[[object], None]) -> None:
+        self._c = consumer
+        self._on_message = on_message
+        self._stop = threading.Event()
+        self._c.subscribe(topics)
+        self._thread = threading.Thread(target=self._run, name="bench-receiver", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            for msg in self._c.consume(500, 0.1):
+                if not msg.error():
+                    self._on_message(msg)
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._c.close()
+
+def schedule(rate: float, seconds: float, start: float) -> Iterator[float]:
+    """Intended send times (monotonic) of an open-loop load: fixed rate, whatever the system does."""
+    n = int(rate * seconds)
+    for i in range(n):
+        yield start + i / rate
+
+def sleep_until(due: float) -> None:
+    delay = due - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+
+async def asleep_until(due: float) -> None:
+    delay = due - time.monotonic()
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+class Latencies:
+    """
+    End-to-end latency by message id. Latency runs from the *intended* send time, so
+    a stalled sender shows up in the tail instead of silently lowering the load
+    (coordinated omission). Thread-safe: senders and receivers may be different threads.
+    """
+    def __init__(self) -> None:
+        self._sent: Dict[str, float] = {}
+        self.samples: List[float] = []
+        self.duplicates = 0
+        self.first_at: Optional[float] = None   # first intended send
+        self.last_at = 0.0                      # last receipt
+        self._lock = threading.Lock()
+
+    def sent(self, msg_id: str, intended: float) -> None:
+        with self._lock:
+            self._sent[msg_id] = intended
+            if self.first_at is None:
+                self.first_at = intended
+
+    def received(self, msg_id: str, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            intended = self._sent.pop(msg_id, None)
+            if intended is None:
+                self.duplicates += 1
+                return
+            self.samples.append(now - intended)
+            self.last_at = now
+
+    @property
+    def pending(self) -> int:
+        return len(self._sent)
+
+    def wait(self, timeout: float) -> None:
+        """Until everything sent was received, or `timeout`."""
+        deadline = time.monotonic() + timeout
+        while self._sent and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list (q in 0..100)."""
+    if not ordered:
+        return float("nan")
+    rank = max(1, min(len(ordered), int(-(-q * len(ordered) // 100))))
+    return ordered[rank - 1]
+
+class Meter:
+    """Wall and process CPU time of the load window (CPU: every thread of this process)."""
+    def __enter__(self) -> "Meter":
+        self.wall0, self.cpu0 = time.monotonic(), time.process_time()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.wall = time.monotonic() - self.wall0
+        self.cpu = time.process_time() - self.cpu0
+
+def result(stage: str, args: argparse.Namespace, lat: Latencies, meter: Meter, kafka: Dict[str, object],
+           **extra) -> dict:
+    ordered = sorted(lat.samples)
+    received = len(ordered)
+    span = lat.last_at - lat.first_at if received else meter.wall
+    ms = lambda q: round(percentile(ordered, q) * 1000, 3)
+    return {
+        "stage": stage,
+        "label": args.label,
+        "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "host": {"python": sys.version.split()[0], "platform": platform.platform(), "cpus": os.cpu_count()},
+        "params": {"broker": args.broker, "rate": args.rate, "machines": args.machines, "seconds": args.seconds,
+                   "partitions": args.partitions, "batch_size": args.batch_size},
+        "kafka": {k: v for k, v in sorted(kafka.items()) if not callable(v)},
+        "results": {
+            "received": received,
+            "lost": lat.pending,
+            "duplicates": lat.duplicates,
+            "throughput_per_sec": round(received / span, 1) if span > 0 else 0.0,
+            "cpu_us_per_msg": round(meter.cpu / received * 1e6, 1) if received else None,
+            "latency_ms": {"p50": ms(50), "p99": ms(99), "p999": ms(99.9), "max": ms(100)},
+            **extra,
+        },
+    }
+
+def report(res: dict, path: str = "") -> None:
+    r, lat = res["results"], res["results"]["latency_ms"]
+    print(f"[i] {res['stage']} on {res['params']['broker']}: {res['params']['rate']:g} msg/s offered, "
+          f"{res['params']['machines']} machines, {res['params']['seconds']:g}s")
+    print(f"    received {r['received']}  lost {r['lost']}  duplicates {r['duplicates']}")
+    print(f"    throughput     : {r['throughput_per_sec']:10.1f} msg/s")
+    print(f"    CPU per message: {r['cpu_us_per_msg'] or 0:10.1f} us")
+    print(f"    latency p50 {lat['p50']:.2f} ms  p99 {lat['p99']:.2f} ms  p999 {lat['p999']:.2f} ms  max {lat['max']:.2f} ms")
+    if r.get("produce_requests") is not None:
+        print(f"    produce requests: {r['produce_requests']}  ({r['msgs_per_request']} msgs/request)")
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(res, f, indent=2)
+            f.write("\n")
+        print(f"    -> {path}")
@@ -0,0 +1,55 @@
+# Messages/second through KafkaNowPlayingConsumer: single poll() mode vs batch consume() mode.
+# Uses an in-process fake broker, so it measures Python-side overhead only.
+# Run from bot-consumer/:  python -m benchmarks.bench_consume --messages 200000
+from __future__ import annotations
+import argparse
+import json
+import time
+from pcbench.fake_kafka import FakeConsumer, FakeMessage
+from src.kafka.consumer import KafkaNowPlayingConsumer
+
+TOPIC = "pc.activity.media"
+
+def build_log(n: int, partitions: int, machines: int) -> list[FakeMessage]:
+    msgs, offsets = [], [0] * partitions
+    for i in range(n):
+        machine = i % machines
+        p = machine % partitions
+        value = json.dumps({
+            "timestamp": "2025-01-01T00:00:00+00:00", "sourceApp": "Spotify.exe",
+            "title": f"Track {i // machines}", "artist": "Artist", "playbackStatus": "playing",
+        }).encode("utf-8")
+        msgs.append(FakeMessage(TOPIC, p, offsets[p], f"pc-{machine}".encode(), value))
+        offsets[p] += 1
+    return msgs
+
+def run(msgs: list[FakeMessage], batch_size: int) -> tuple[float, int, int]:
+    handled = 0
+
+    def on_change(payload: dict, key: str) -> None:
+        nonlocal handled
+        handled += 1
+
+    fake = FakeConsumer(msgs)
+    consumer = KafkaNowPlayingConsumer("fake:9092", TOPIC, "bench", batch_size=batch_size, client=fake)
+    fake.on_empty = consumer.stop
+    t0 = time.perf_counter()
+    consumer.start(on_change)
+    return time.perf_counter() - t0, handled, fake.commits
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=200_000)
+    ap.add_argument("--partitions", type=int, default=6)
+    ap.add_argument("--machines", type=int, default=50)
+    args = ap.parse_args()
+    msgs = build_log(args.messages, args.partitions, args.machines)
+
+    print(f"[i] {args.messages} messages, {args.partitions} partitions")
+    for batch_size in (1, 100, 500):
+        elapsed, handled, commits = run(msgs, batch_size)
+        mode = "single poll()" if batch_size == 1 else f"batch x{batch_size}"
+        print(f"    {mode:<14}: {args.messages / elapsed:10.0f} msg/s  handled={handled} commits={commits}")
+
+if __name__ == "__main__":
+    main()
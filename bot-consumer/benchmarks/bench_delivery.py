@@ -0,0 +1,54 @@
+# Throughput benchmark: inline sends vs DeliveryPipeline against a local Bot API stand-in.
+# Run from bot-consumer/:  python -m benchmarks.bench_delivery --messages 400 --chats 8 --latency-ms 50
+from __future__ import annotations
+import argparse
+import time
+from benchmarks.fake_bot_api import FakeBotAPI
+from src.delivery.pipeline import DeliveryPipeline
+from src.telegram.client import TelegramClient
+from src.telegram.ratelimit import ChatRateLimiter
+
+def _payloads(n: int, chats: int) -> list[tuple[str, str]]:
+    return [(str(1000 + i % chats), f"<b>[NowPlaying]</b> Track {i}") for i in range(n)]
+
+def bench_inline(tg: TelegramClient, items: list[tuple[str, str]]) -> float:
+    t0 = time.perf_counter()
+    for chat_id, text in items:
+        tg.send_text_html(text, chat_id=chat_id)
+    return time.perf_counter() - t0
+
+def bench_pipeline(tg: TelegramClient, items: list[tuple[str, str]], workers: int, queue_size: int) -> float:
+    pipeline = DeliveryPipeline(workers=workers, max_pending=queue_size)
+    t0 = time.perf_counter()
+    for chat_id, text in items:
+        pipeline.submit(chat_id, lambda c=chat_id, t=text: tg.send_text_html(t, chat_id=c))
+    pipeline.join()
+    elapsed = time.perf_counter() - t0
+    pipeline.close()
+    return elapsed
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=400)
+    ap.add_argument("--chats", type=int, default=8)
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--queue-size", type=int, default=1000)
+    ap.add_argument("--latency-ms", type=float, default=50.0)
+    args = ap.parse_args()
+
+    items = _payloads(args.messages, args.chats)
+    with FakeBotAPI(latency_ms=args.latency_ms) as api:
+        # Rate limits off: this measures pipeline concurrency, not Bot API quotas.
+        tg = TelegramClient("bench-token", "0", api_base=api.base_url,
+                            limiter=ChatRateLimiter(global_rate=None, chat_rate=None))
+        inline = bench_inline(tg, items)
+        piped = bench_pipeline(tg, items, args.workers, args.queue_size)
+
+    n = len(items)
+    print(f"[i] {n} messages, {args.chats} chats, {args.latency_ms:.0f} ms Bot API latency")
+    print(f"    inline             : {n / inline:9.1f} msg/s ({inline:.2f}s)")
+    print(f"    pipeline x{args.workers:<3}      : {n / piped:9.1f} msg/s ({piped:.2f}s)")
+    tg.close()
+
+if __name__ == "__main__":
+    main()
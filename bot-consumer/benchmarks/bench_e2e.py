@@ -0,0 +1,57 @@
+# End-to-end: a producer configured like the agent's -> broker -> KafkaNowPlayingConsumer -> on_change,
+# for N machines at an offered rate. Latency runs from the intended send time to on_change(); CPU per
+# message covers both sides (same process). See benchmarks/pcbench/loadgen.py.
+# Run from bot-consumer/:  python -m benchmarks.bench_e2e --rate 2000 --machines 50 [--broker localhost:9025]
+#                          [--batch-size 1] [--batch-linger-ms 20] [--kafka "linger.ms=50"] [--json out.json]
+from __future__ import annotations
+import argparse
+import threading
+import time
+from pcbench import loadgen
+from pcmedia.serde import Serde
+from src.kafka.consumer import KafkaNowPlayingConsumer
+
+# What the agent's build_kafka_config() sets for its producer (--kafka overrides on top).
+AGENT_PRODUCER = {"client.id": "pc-agent-media-py", "compression.type": "lz4", "linger.ms": 10,
+                  "acks": "all", "enable.idempotence": True}
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    loadgen.add_common_args(ap)
+    ap.add_argument("--batch-linger-ms", type=int, default=100, help="consumer BATCH_LINGER_MS")
+    ap.add_argument("--wire-format", default="json", choices=("json", "msgpack"))
+    args = ap.parse_args()
+
+    topic = loadgen.bench_topic("pc.activity.media", args.broker)
+    fake = loadgen.setup(args.broker, [topic], args.partitions)
+    kafka = {**AGENT_PRODUCER, **loadgen.parse_overrides(args.kafka)}
+    producer = loadgen.make_producer(args.broker, fake, kafka, args.partitions)
+    lat = loadgen.Latencies()
+    consumer = KafkaNowPlayingConsumer(args.broker, topic, "bench", batch_size=args.batch_size,
+                                       batch_linger_ms=args.batch_linger_ms,
+                                       client=loadgen.make_consumer(args.broker, fake))
+    thread = threading.Thread(target=consumer.start, args=(lambda payload, key: lat.received(payload["title"]),),
+                              name="consumer", daemon=True)
+    thread.start()
+
+    serde = Serde(default=args.wire_format)
+    keys = [f"pc-{i:04d}" for i in range(args.machines)]
+    with loadgen.Meter() as meter:
+        for i, due in enumerate(loadgen.schedule(args.rate, args.seconds, time.monotonic() + 0.1)):
+            while (delay := due - time.monotonic()) > 0:
+                producer.poll(delay)   # serve delivery reports while pacing
+            payload = {"timestamp": "2025-01-01T00:00:00+00:00", "sourceApp": "Spotify.exe",
+                       "title": str(i), "artist": "Artist", "playbackStatus": "playing"}
+            lat.sent(str(i), due)
+            producer.produce(topic, key=keys[i % args.machines], value=serde.encode(topic, "media", payload))
+            producer.poll(0)
+        producer.flush(10)
+        lat.wait(10.0)
+    consumer.stop()
+    thread.join()
+    stage = "bot.consumer" + (f"[batch x{args.batch_size}]" if args.batch_size > 1 else "[single]")
+    loadgen.report(loadgen.result(stage, args, lat, meter, kafka, wire_format=args.wire_format,
+                                  batch_linger_ms=args.batch_linger_ms), args.json)
+
+if __name__ == "__main__":
+    main()
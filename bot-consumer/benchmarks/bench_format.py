@@ -0,0 +1,100 @@
+# Formatting throughput: the per-call format_message_html() of old (kept here as the baseline) vs
+# MessageFormatter, without and with its rendered-message LRU. --repeat is the share of payloads
+# that repeat one of the last few hundred (redeliveries, status flaps back to an already seen state).
+# Run from bot-consumer/:  python -m benchmarks.bench_format --messages 200000 --repeat 0.3
+from __future__ import annotations
+import argparse
+import random
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+from src.telegram.formatters import MessageFormatter, escape_html
+
+RECENT = 500
+APPS = ["Spotify.exe", "chrome.exe", "msedge.exe", "vlc.exe", "Microsoft.ZuneMusic_8wekyb3d8bbwe!Microsoft.ZuneMusic"]
+
+def format_source_app(app: Optional[str]) -> str:
+    """Map known app ids to nicer labels."""
+    if not app:
+        return "Unknown App 💻"
+    if "Spotify" in app:
+        return "Spotify 💚"
+    return app
+
+def format_timestamp_iso_to_local(ts_iso: Optional[str]) -> str:
+    """Convierte un ISO-8601 a hora local de la computadora (dd/mm/YYYY HH:MM:SS)."""
+    if not ts_iso:
+        return ""
+    dt = datetime.fromisoformat(ts_iso)
+    # Si viene sin zona horaria, asumimos UTC (ajústalo si prefieres otra cosa)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    local_dt = dt.astimezone()  # usa la zona horaria local del sistema
+    return local_dt.strftime("%d/%m/%Y %H:%M:%S")
+
+def legacy_format(payload: Dict, prefix: str = "[NowPlaying]") -> str:
+    """format_message_html() before MessageFormatter: everything rebuilt per call."""
+    title = escape_html(payload.get("title", "Unknown title"))
+    artist = escape_html(payload.get("artist", "")) or None
+    app = escape_html(payload.get("sourceApp", "")) or None
+    status = escape_html(payload.get("playbackStatus", "")) or None
+    ts_iso = escape_html(payload.get("timestamp", "")) or None
+    lines = []
+    if status:
+        lines.append("<b><i>Playing ▶️</i></b>" if status == "playing" else "<b><i>Paused ⏸️</i></b>")
+    lines.append(f"<b>{escape_html(prefix)}</b> {title}")
+    if artist:
+        lines.append(f"— 🎤 <i>{artist}</i>")
+    if app:
+        lines.append("\n" + f"<b>App:</b> {format_source_app(app)}")
+    if ts_iso:
+        lines.append(f"🕑 {format_timestamp_iso_to_local(ts_iso)}")
+    return "\n".join(lines)
+
+def payloads(n: int, repeat: float, seed: int) -> List[Dict]:
+    rnd = random.Random(seed)
+    out: List[Dict] = []
+    base = 1_735_689_600   # 2025-01-01
+    for i in range(n):
+        if out and rnd.random() < repeat:
+            out.append(dict(rnd.choice(out[-RECENT:])))
+            continue
+        ts = time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime(base + i * 7))
+        out.append({"timestamp": ts, "sourceApp": rnd.choice(APPS), "title": f"Track {rnd.randrange(20000)} & Co",
+                    "artist": f"Artist <{rnd.randrange(2000)}>", "playbackStatus": rnd.choice(("playing", "paused"))})
+    return out
+
+def bench(fn: Callable[[Dict], str], items: List[Dict]) -> float:
+    t0 = time.perf_counter()
+    for payload in items:
+        fn(payload)
+    return time.perf_counter() - t0
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=200000)
+    ap.add_argument("--repeat", type=float, default=0.3, help="share of payloads seen before")
+    ap.add_argument("--cache-size", type=int, default=1024)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    items = payloads(args.messages, args.repeat, args.seed)
+    uncached = MessageFormatter(cache_size=0)
+    cached = MessageFormatter(cache_size=args.cache_size)
+    mismatches = sum(legacy_format(p) != uncached.format(p) for p in items[:5000])
+    if mismatches:
+        raise SystemExit(f"[!] {mismatches} messages differ from the legacy formatter")
+
+    n = len(items)
+    runs = [("legacy", legacy_format), ("compiled", uncached.format), (f"compiled + LRU {args.cache_size}", cached.format)]
+    print(f"[i] {n} payloads, {args.repeat:.0%} repeated")
+    base = None
+    for name, fn in runs:
+        elapsed = bench(fn, items)
+        base = base or elapsed
+        print(f"    {name:<22}: {n / elapsed:11.0f} msg/s  {elapsed / n * 1e6:6.2f} µs/msg  x{base / elapsed:.2f}")
+    info = cached.cache_info()
+    print(f"    LRU hits             : {info.hits / n:.1%} ({info.hits} of {n})")
+
+if __name__ == "__main__":
+    main()
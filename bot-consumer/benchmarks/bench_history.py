@@ -0,0 +1,165 @@
+# Listening history store: ingest throughput (millions of events) and query latency.
+# Events are generated on the fly (simulated machines playing tracks with pauses and idle
+# gaps) and read through HistorySink, so decode + batching + SQLite are all measured.
+# Run from bot-consumer/:  python -m benchmarks.bench_history --events 2000000 --machines 200
+from __future__ import annotations
+import argparse
+import heapq
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+import zlib
+from typing import Dict, Iterator, List, Tuple
+from confluent_kafka import TopicPartition
+from pcbench.fake_kafka import FakeMessage
+from src.history import queries
+from src.history.sink import HistorySink
+from src.history.store import HistoryStore
+
+TOPIC = "pc.activity.media"
+PARTITIONS = 12
+DAY = 86400.0
+
+def generate(n: int, machines: int, days: float, seed: int) -> Iterator[Tuple[str, float, dict]]:
+    """(machine, ts, payload) in time order: ~3.5 min per track, pauses, idle gaps."""
+    rnd = random.Random(seed)
+    artists = [f"Artist {i}" for i in range(2000)]
+    tracks = [(rnd.choice(artists[: 50 + i // 10]), f"Track {i}") for i in range(20_000)]  # skewed
+    end = time.time()
+    start = end - days * DAY
+    step = days * DAY * machines / n            # mean seconds between events of one machine
+    clock = {f"pc-{m:04d}": start + rnd.random() * step for m in range(machines)}
+    current: Dict[str, Tuple[str, str]] = {}
+    heap = sorted((ts, m) for m, ts in clock.items())
+    for _ in range(n):
+        ts, m = heapq.heappop(heap)
+        r = rnd.random()
+        if m in current and r < 0.15:
+            status = "paused" if r < 0.08 else "playing"       # pause / resume the same track
+            artist, title = current[m]
+        else:
+            hit = r < 0.6   # favourites: a small set of tracks gets most plays
+            artist, title = current[m] = tracks[rnd.randrange(500) if hit else rnd.randrange(len(tracks))]
+            status = "playing"
+        iso = time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime(ts))
+        yield m, ts, {"timestamp": iso, "sourceApp": "Spotify.exe", "title": title, "artist": artist,
+                      "album": "", "playbackStatus": status}
+        gap = rnd.expovariate(1 / step) * (8 if rnd.random() < 0.02 else 1)   # occasional long idle
+        heapq.heappush(heap, (ts + gap, m))
+
+class GeneratedLog:
+    """Minimal consumer stand-in streaming generated events (FakeConsumer keeps every message in memory)."""
+    def __init__(self, events: Iterator[Tuple[str, float, dict]], on_empty) -> None:
+        self._events = events
+        self._offsets = [0] * PARTITIONS
+        self._on_empty = on_empty
+        self.count = 0
+
+    def subscribe(self, topics, on_assign=None, **kwargs) -> None:
+        if on_assign is not None:
+            on_assign(self, [TopicPartition(TOPIC, p) for p in range(PARTITIONS)])
+
+    def assign(self, partitions) -> None:
+        pass
+
+    def consume(self, num_messages: int = 1, timeout: float = -1) -> List[FakeMessage]:
+        out = []
+        for machine, ts, payload in self._events:
+            p = zlib.crc32(machine.encode()) % PARTITIONS
+            out.append(FakeMessage(TOPIC, p, self._offsets[p], machine.encode(),
+                                   json.dumps(payload).encode("utf-8"), int(ts * 1000)))
+            self._offsets[p] += 1
+            if len(out) >= num_messages:
+                break
+        self.count += len(out)
+        if not out and self._on_empty is not None:
+            self._on_empty()
+        return out
+
+    def commit(self, *args, **kwargs) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+def ingest(path: str, n: int, machines: int, days: float, batch: int, seed: int) -> float:
+    store = HistoryStore(path)
+    log = GeneratedLog(generate(n, machines, days, seed), on_empty=lambda: sink.stop())
+    sink = HistorySink(store, "fake:9092", TOPIC, "bench", batch_size=batch, client=log)
+    t0 = time.perf_counter()
+    sink.run()
+    elapsed = time.perf_counter() - t0
+    store.close()
+    return elapsed
+
+def timed(fn, repeat: int = 3) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples)
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=1_000_000)
+    ap.add_argument("--machines", type=int, default=200)
+    ap.add_argument("--days", type=float, default=60)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        small = min(20_000, args.events)
+        print(f"[i] ingest through HistorySink ({args.machines} machines, {args.days:.0f} days)")
+        for batch in (1, 100):
+            elapsed = ingest(os.path.join(d, f"b{batch}.db"), small, args.machines, args.days, batch, args.seed)
+            print(f"    batch x{batch:<5} {small:>9} events : {small / elapsed:9.0f} events/s")
+        path = os.path.join(d, "history.db")
+        n = args.events
+        elapsed = ingest(path, n, args.machines, args.days, 2000, args.seed)
+        size = sum(os.path.getsize(os.path.join(d, f)) for f in os.listdir(d) if f.startswith("history.db"))
+        print(f"    batch x2000  {n:>9} events : {n / elapsed:9.0f} events/s  "
+              f"({elapsed:.1f}s, {size / n:.0f} bytes/event on disk)")
+
+        # Replay: a rebalance re-delivers events that are already stored.
+        store = HistoryStore(path)
+        replay = GeneratedLog(generate(min(args.events, 500_000), args.machines, args.days, args.seed), None)
+        sink = HistorySink(store, "fake:9092", TOPIC, "bench", client=replay)
+        t0 = time.perf_counter()
+        stored = 0
+        while True:
+            msgs = replay.consume(2000)
+            if not msgs:
+                break
+            stored += store.ingest(TOPIC, sink._records(msgs))
+        elapsed = time.perf_counter() - t0
+        print(f"    replay of {replay.count} stored events : {replay.count / elapsed:9.0f} events/s, {stored} re-inserted")
+        store.close()
+
+        db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        now = time.time()
+        machine = "pc-0007"
+        cases = [
+            ("top artists, all machines, 1 day", lambda: queries.top_artists(db, now - DAY, now)),
+            ("top artists, all machines, 7 days", lambda: queries.top_artists(db, now - 7 * DAY, now)),
+            ("top artists, all machines, 30 days", lambda: queries.top_artists(db, now - 30 * DAY, now)),
+            ("top artists, one machine, 30 days", lambda: queries.top_artists(db, now - 30 * DAY, now, machine)),
+            ("top tracks by plays, 7 days", lambda: queries.top_tracks(db, now - 7 * DAY, now, by="plays")),
+            ("listen time per machine, 7 days", lambda: queries.listen_time(db, now - 7 * DAY, now)),
+            ("sessions, one machine, 30 days", lambda: queries.sessions(db, machine, now - 30 * DAY, now)),
+        ]
+        print(f"[i] query latency (median of 3) over {args.events} events")
+        for label, fn in cases:
+            print(f"    {label:<36}: {timed(fn) * 1000:9.1f} ms")
+        top = queries.top_artists(db, now - 7 * DAY, now, limit=1)
+        sess = queries.sessions(db, machine, now - 30 * DAY, now)
+        print(f"    (7-day top artist: {top[0]['artist']} {top[0]['seconds'] / 3600:.1f} h; "
+              f"{machine}: {len(sess)} sessions in 30 days)")
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# Per-event logging overhead: print() vs queue-backed JSON logging, and a poison stream of invalid payloads.
+# --sink file: block-buffered temp file; --sink pipe: line-buffered pipe drained by a reader
+# thread (unbuffered service log pipe); --sink slow: same pipe drained at ~4 MB/s (a console).
+# Run from bot-consumer/:  python -m benchmarks.bench_logging --events 100000 --sink pipe
+from __future__ import annotations
+import argparse
+import contextlib
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from pcbench.fake_kafka import FakeConsumer, FakeMessage
+from pcmedia.logs import JsonFormatter, setup_logging
+from src.kafka import consumer as consumer_mod
+from src.kafka.consumer import KafkaNowPlayingConsumer
+
+TOPIC = "pc.activity.media"
+TEXT = "[NowPlaying] 🎵 <b>Some Track</b> — Some Artist (Spotify.exe)"
+
+def bench_print(n: int, out) -> float:
+    stdout, sys.stdout = sys.stdout, out
+    try:
+        t0 = time.perf_counter()
+        for _ in range(n):
+            print(f"[→] {TEXT}")
+        return time.perf_counter() - t0
+    finally:
+        sys.stdout = stdout
+
+def bench_sync_json(n: int, out) -> float:
+    handler = logging.StreamHandler(out)
+    handler.setFormatter(JsonFormatter())
+    _reset(handler, "INFO")
+    log = logging.getLogger("bench")
+    t0 = time.perf_counter()
+    for _ in range(n):
+        log.info("→ %s", TEXT, extra={"event": "telegram.sent"})
+    return time.perf_counter() - t0
+
+def bench_queue(n: int, out, rate: float, sample: str = "") -> tuple[float, float]:
+    """Returns (caller time, time until the writer thread has drained everything)."""
+    listener = setup_logging("INFO", "json", rate_per_sec=rate, burst=20, sample=sample,
+                             queue_size=n + 1, stream=out)
+    log = logging.getLogger("bench")
+    t0 = time.perf_counter()
+    for _ in range(n):
+        log.info("→ %s", TEXT, extra={"event": "telegram.sent"})
+    caller = time.perf_counter() - t0
+    listener.stop()
+    return caller, time.perf_counter() - t0
+
+class _PrintLog:
+    """Stand-in for the consumer's logger that behaves like the old print() calls."""
+    def __init__(self, out) -> None:
+        self._out = out
+
+    def warning(self, msg, *args, **kwargs) -> None:
+        print(f"[warn] {msg % args}", file=self._out)
+
+    info = warning
+
+def poison(n: int, out, mode: str) -> float:
+    """n invalid payloads through the consumer; each one logs 'invalid payload'."""
+    listener = None
+    saved = consumer_mod.log
+    if mode == "print":
+        consumer_mod.log = _PrintLog(out)
+    elif mode == "queue":
+        listener = setup_logging("INFO", "json", rate_per_sec=10, burst=20, stream=out)
+    else:
+        handler = logging.StreamHandler(out)
+        handler.setFormatter(JsonFormatter())
+        _reset(handler, "INFO")
+    msgs = [FakeMessage(TOPIC, i % 6, i // 6, b"pc-1", b"{not json") for i in range(n)]
+    fake = FakeConsumer(msgs)
+    consumer = KafkaNowPlayingConsumer("fake:9092", TOPIC, "bench", batch_size=500, client=fake)
+    fake.on_empty = consumer.stop
+    t0 = time.perf_counter()
+    consumer.start(lambda payload, key: None)
+    elapsed = time.perf_counter() - t0
+    consumer_mod.log = saved
+    if listener is not None:
+        listener.stop()
+    return elapsed
+
+def _reset(handler: logging.Handler, level: str) -> None:
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+@contextlib.contextmanager
+def open_sink(kind: str):
+    if kind == "file":
+        with tempfile.TemporaryFile("w", encoding="utf-8") as out:
+            yield out
+        return
+    r, w = os.pipe()
+
+    def drain() -> None:
+        chunk = 4096 if kind == "slow" else 1 << 16
+        while os.read(r, chunk):
+            if kind == "slow":
+                time.sleep(0.001)
+
+    reader = threading.Thread(target=drain, daemon=True)
+    reader.start()
+    out = open(w, "w", encoding="utf-8", buffering=1)
+    try:
+        yield out
+    finally:
+        out.close()
+        reader.join()
+        os.close(r)
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=100_000)
+    ap.add_argument("--sink", choices=("file", "pipe", "slow"), default="pipe")
+    args = ap.parse_args()
+    n = args.events
+
+    with open_sink(args.sink) as out:
+        print(f"[i] {n} events per run, sink={args.sink} (µs per event, caller thread)")
+        print(f"    print()                        : {bench_print(n, out) / n * 1e6:7.2f}")
+        print(f"    logging, sync JSON handler     : {bench_sync_json(n, out) / n * 1e6:7.2f}")
+        caller, total = bench_queue(n, out, rate=0)
+        print(f"    queue + JSON, no limit         : {caller / n * 1e6:7.2f}  (drained {total / n * 1e6:.2f})")
+        caller, total = bench_queue(n, out, rate=0, sample="telegram.sent=0.1")
+        print(f"    queue + JSON, 1-in-10 sampled  : {caller / n * 1e6:7.2f}  (drained {total / n * 1e6:.2f})")
+        caller, total = bench_queue(n, out, rate=10)
+        print(f"    queue + JSON, 10/s rate limit  : {caller / n * 1e6:7.2f}  (drained {total / n * 1e6:.2f})")
+
+        print(f"[i] poison stream: {n} invalid payloads through KafkaNowPlayingConsumer (msg/s)")
+        print(f"    print() (before)               : {n / poison(n, out, 'print'):10.0f}")
+        print(f"    sync JSON handler, unlimited   : {n / poison(n, out, 'sync'):10.0f}")
+        print(f"    queue + rate limit             : {n / poison(n, out, 'queue'):10.0f}")
+
+if __name__ == "__main__":
+    main()
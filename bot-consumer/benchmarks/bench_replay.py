@@ -0,0 +1,89 @@
+# Replay (replay.py) against the in-process broker: range resolution by time and by offsets checked
+# against the log, then read throughput into each sink (gzip JSONL, Parquet if pyarrow is installed,
+# re-publish to another topic).
+# Run from bot-consumer/:  python -m benchmarks.bench_replay --messages 200000 --partitions 6
+from __future__ import annotations
+import argparse
+import gzip
+import json
+import os
+import tempfile
+from pcbench.fake_kafka import FakeBroker, FakeConsumer, FakeMessage, FakeProducer
+from src.kafka.consumer import KafkaNowPlayingConsumer
+from src.replay.replayer import replay, resolve_ranges
+from src.replay.sinks import JsonlSink, ParquetSink, RepublishSink
+
+TOPIC = "pc.activity.media"
+T0 = 1_735_689_600_000   # 2025-01-01T00:00:00Z in ms
+
+def build_broker(n: int, partitions: int, machines: int) -> FakeBroker:
+    """One message per second of log time, spread over `machines` keys."""
+    msgs, offsets = [], [0] * partitions
+    for i in range(n):
+        machine = i % machines
+        p = machine % partitions
+        value = json.dumps({"timestamp": "2025-01-01T00:00:00+00:00", "sourceApp": "Spotify.exe",
+                            "title": f"Track {i // machines}", "artist": "Artist",
+                            "playbackStatus": "playing"}).encode("utf-8")
+        msgs.append(FakeMessage(TOPIC, p, offsets[p], f"pc-{machine}".encode(), value, timestamp_ms=T0 + i * 1000))
+        offsets[p] += 1
+    return FakeBroker(msgs)
+
+def check(broker: FakeBroker, n: int) -> None:
+    client = FakeConsumer(broker)
+    everything = resolve_ranges(client, [TOPIC], "earliest", "latest")
+    assert sum(e - s for s, e in everything.values()) == n, everything
+    lo, hi = T0 + (n // 4) * 1000, T0 + (n // 2) * 1000
+    window = resolve_ranges(client, [TOPIC], lo, hi)
+    expected = sum(1 for log in broker.log.values() for m in log if lo <= m.timestamp()[1] < hi)
+    got = sum(e - s for s, e in window.values())
+    assert got == expected, (got, expected)
+    explicit = resolve_ranges(client, [TOPIC], {0: 10, 1: 5}, {0: 20, 1: 10**9})
+    assert explicit[(TOPIC, 0)] == (10, 20) and explicit[(TOPIC, 1)] == (5, len(broker.log[(TOPIC, 1)]))
+    print(f"[i] ranges ok: all {n}, time window {got}, explicit offsets {sorted(explicit.items())}")
+
+def run(broker: FakeBroker, sink, start="earliest", end="latest", changes_only: bool = False) -> dict:
+    client = FakeConsumer(broker)
+    ranges = resolve_ranges(client, [TOPIC], start, end)
+    consumer = KafkaNowPlayingConsumer("fake", TOPIC, "bench-replay", batch_size=5000, client=client)
+    return replay(consumer, ranges, sink, changes_only=changes_only, progress_interval=3600)
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=200000)
+    ap.add_argument("--partitions", type=int, default=6)
+    ap.add_argument("--machines", type=int, default=500)
+    args = ap.parse_args()
+
+    broker = build_broker(args.messages, args.partitions, args.machines)
+    check(broker, args.messages)
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "replay.jsonl.gz")
+        stats = run(broker, JsonlSink(path))
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            lines = sum(1 for _ in f)
+        assert lines == args.messages, (lines, args.messages)
+        print(f"    jsonl.gz    : {stats['per_sec']:10.0f} msg/s  {os.path.getsize(path) / 1e6:7.2f} MB")
+
+        try:
+            sink = ParquetSink(os.path.join(d, "replay.parquet"))
+        except RuntimeError as e:
+            print(f"    parquet     : skipped ({e})")
+        else:
+            stats = run(broker, sink)
+            print(f"    parquet     : {stats['per_sec']:10.0f} msg/s  "
+                  f"{os.path.getsize(os.path.join(d, 'replay.parquet')) / 1e6:7.2f} MB")
+
+    target = "pc.activity.media.backfill"
+    broker.create_topic(target, args.partitions)
+    stats = run(broker, RepublishSink(target, producer=FakeProducer(broker, partitions=args.partitions)))
+    copied = sum(len(log) for (t, _), log in broker.log.items() if t == target)
+    assert copied == args.messages, (copied, args.messages)
+    print(f"    republish   : {stats['per_sec']:10.0f} msg/s  ({copied} records in {target})")
+
+    sink = JsonlSink(os.devnull)
+    stats = run(broker, sink, changes_only=True)
+    print(f"    changes-only: {stats['per_sec']:10.0f} msg/s  ({sink.written} of {stats['messages']} kept)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# Routing cost per event with thousands of rules: linear rule evaluation vs the compiled RoutingTable
+# (uncached and with its result LRU), plus compile (= reload) time. Rules mix exact machine keys,
+# machine prefixes (fleets), apps and app+artist pairs; events come from --machines machines.
+# Run from bot-consumer/:  python -m benchmarks.bench_routing --rules 5000 --machines 20000 --events 200000
+from __future__ import annotations
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List, Tuple
+from src.delivery.routing import FIELDS, ChatRouter, RoutingTable, Rule, parse_rules
+
+APPS = ["Spotify.exe", "chrome.exe", "msedge.exe", "vlc.exe", "firefox.exe", "Microsoft.ZuneMusic"]
+FLEETS = 50
+
+def machine(i: int) -> str:
+    return f"fleet{i % FLEETS:02d}-pc-{i:05d}"
+
+def rules_doc(n: int, machines: int, artists: int, rnd: random.Random) -> dict:
+    rules = []
+    for i in range(n):
+        chat = str(-1000000000000 - i)
+        kind = i % 4
+        if kind == 0:
+            rule = {"machine": [machine(rnd.randrange(machines)) for _ in range(rnd.randint(1, 5))]}
+        elif kind == 1:
+            rule = {"machine": f"fleet{rnd.randrange(FLEETS):02d}-*"}
+        elif kind == 2:
+            rule = {"machine": f"fleet{rnd.randrange(FLEETS):02d}-*", "app": rnd.choice(APPS)}
+        else:
+            rule = {"app": "Spotify*", "artist": [f"Artist {rnd.randrange(artists)}" for _ in range(3)]}
+        rules.append({"chats": [chat], **rule})
+    return {"default": ["-1"], "rules": rules}
+
+def events(n: int, machines: int, artists: int, rnd: random.Random) -> List[Tuple[str, Dict]]:
+    return [(machine(rnd.randrange(machines)), {"sourceApp": rnd.choice(APPS),
+                                                "artist": f"Artist {int(rnd.paretovariate(1.2)) % artists}"})
+            for _ in range(n)]
+
+def linear_route(rules: List[Rule], default: Tuple[str, ...], machine_key: str, payload: Dict) -> Tuple[str, ...]:
+    """Every rule evaluated per event (what the index replaces)."""
+    values = dict(zip(FIELDS, (machine_key.casefold(), (payload.get("sourceApp") or "").casefold(),
+                               (payload.get("artist") or "").casefold())))
+    chats = tuple(dict.fromkeys(chat for rule in rules if rule.matches(values) for chat in rule.chats))
+    return chats or default
+
+def timed(fn, items) -> float:
+    t0 = time.perf_counter()
+    for key, payload in items:
+        fn(key, payload)
+    return time.perf_counter() - t0
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rules", type=int, default=5000)
+    ap.add_argument("--machines", type=int, default=20000)
+    ap.add_argument("--artists", type=int, default=2000)
+    ap.add_argument("--events", type=int, default=200000)
+    ap.add_argument("--linear-events", type=int, default=2000, help="linear evaluation is slow; fewer events")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    rnd = random.Random(args.seed)
+    doc = rules_doc(args.rules, args.machines, args.artists, rnd)
+    items = events(args.events, args.machines, args.artists, rnd)
+    default, rules = parse_rules(doc)
+
+    t0 = time.perf_counter()
+    uncached = RoutingTable(rules, default, cache_size=0)
+    compile_ms = (time.perf_counter() - t0) * 1000
+    cached = RoutingTable(rules, default)
+    sample = items[: args.linear_events]
+    wrong = sum(linear_route(rules, default, k, p) != uncached.route(k, p) for k, p in sample)
+    if wrong:
+        raise SystemExit(f"[!] {wrong} events routed differently from linear evaluation")
+
+    linear = timed(lambda k, p: linear_route(rules, default, k, p), sample) / len(sample)
+    indexed = timed(uncached.route, items) / len(items)
+    lru = timed(cached.route, items) / len(items)
+    fanout = sum(len(uncached.route(k, p)) for k, p in sample) / len(sample)
+    info = cached._lookup.cache_info()
+
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "routes.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(doc, f)
+        router = ChatRouter(path, reload_sec=0)
+        t0 = time.perf_counter()
+        router.reload()
+        reload_ms = (time.perf_counter() - t0) * 1000
+        router.close()
+
+    print(f"[i] {args.rules} rules, {args.machines} machines, {len(items)} events "
+          f"({fanout:.2f} chats per event)")
+    print(f"    linear           : {linear * 1e6:9.2f} µs/event  {1 / linear:11.0f} events/s")
+    print(f"    indexed          : {indexed * 1e6:9.2f} µs/event  {1 / indexed:11.0f} events/s  x{linear / indexed:.0f}")
+    print(f"    indexed + LRU    : {lru * 1e6:9.2f} µs/event  {1 / lru:11.0f} events/s  x{linear / lru:.0f}"
+          f"  ({info.hits / len(items):.0%} hits)")
+    print(f"    compile          : {compile_ms:9.1f} ms   reload from file: {reload_ms:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# Scaling of the multiprocess mode (WORKERS): the same backlog consumed by 1..N supervised worker
+# processes in a fresh consumer group each, with the bot's per-message CPU work (decode, dedup,
+# formatting; no HTTP). Progress comes from the workers' merged stats, as in production.
+# Needs a real broker (processes can't share the in-process fake), e.g. the docker-compose.yml one.
+# Run from bot-consumer/:  python -m benchmarks.bench_workers --broker localhost:9092 --messages 200000
+#                          [--partitions 12] [--max-workers 8] [--json out.json]
+from __future__ import annotations
+import argparse
+import json
+import os
+import signal
+import threading
+import time
+import uuid
+from typing import Dict, List
+from pcbench import loadgen
+from pcmedia.metrics import Registry
+from src.supervisor import Supervisor
+
+def consume(index: int, broker: str, topic: str, group: str, batch_size: int) -> None:
+    """Worker process: one KafkaNowPlayingConsumer formatting every change like the bot does."""
+    from src.kafka.consumer import KafkaNowPlayingConsumer
+    from src.telegram.formatters import MessageFormatter
+
+    formatter = MessageFormatter(cache_size=0)
+    consumer = KafkaNowPlayingConsumer(broker, topic, group, auto_offset_reset="earliest", batch_size=batch_size)
+    signal.signal(signal.SIGTERM, lambda *_: consumer.stop())
+    consumer.start(lambda payload, key: formatter.format(payload))
+
+def produce(broker: str, topic: str, n: int, machines: int, partitions: int) -> None:
+    producer = loadgen.make_producer(broker, None, {"linger.ms": 50, "compression.type": "lz4"}, partitions)
+    for i in range(n):
+        payload = {"timestamp": "2025-01-01T00:00:00+00:00", "sourceApp": "Spotify.exe",
+                   "title": f"Track {i}", "artist": f"Artist {i % 97}", "playbackStatus": "playing"}
+        producer.produce(topic, key=f"pc-{i % machines:04d}", value=json.dumps(payload).encode("utf-8"))
+        if i % 10000 == 0:
+            producer.poll(0)
+    producer.flush(60)
+
+def run(workers: int, args: argparse.Namespace, topic: str) -> Dict[str, float]:
+    registry = Registry()
+    handled = registry.counter("consumer_messages_total", "Decoded messages by outcome", ["outcome"])
+    sup = Supervisor(consume, workers, args=(args.broker, topic, f"bench-{uuid.uuid4().hex[:8]}", args.batch_size),
+                     stats_interval_sec=0.2, stop_timeout_sec=15, registry=registry)
+    marks: Dict[str, float] = {}
+
+    def watch() -> None:
+        deadline = time.monotonic() + args.timeout
+        while time.monotonic() < deadline:
+            done = handled.value("changed") + handled.value("duplicate")
+            if done and "first" not in marks:
+                marks["first"] = time.monotonic()
+            if done >= args.messages:
+                break
+            time.sleep(0.05)
+        marks["done"] = time.monotonic()
+        marks["handled"] = handled.value("changed") + handled.value("duplicate")
+        sup.stop()
+
+    threading.Thread(target=watch, name="bench-watch", daemon=True).start()
+    t0 = time.monotonic()
+    sup.run()   # main thread: installs the SIGTERM/SIGINT handlers
+    first = marks.get("first", marks["done"])
+    steady = marks["done"] - first
+    return {"workers": workers, "handled": int(marks["handled"]), "wall_sec": round(marks["done"] - t0, 2),
+            "throughput_per_sec": round(marks["handled"] / steady, 1) if steady > 0 else 0.0}
+
+def worker_counts(top: int) -> List[int]:
+    counts, n = [], 1
+    while n < top:
+        counts.append(n)
+        n *= 2
+    return counts + [top]
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--broker", default="localhost:9092", help="bootstrap servers of a real broker")
+    ap.add_argument("--messages", type=int, default=200000)
+    ap.add_argument("--machines", type=int, default=500)
+    ap.add_argument("--partitions", type=int, default=12)
+    ap.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--batch-size", type=int, default=500)
+    ap.add_argument("--timeout", type=float, default=300.0, help="per run")
+    ap.add_argument("--json", default="", help="write the results to this file")
+    args = ap.parse_args()
+    if args.broker == "fake":
+        raise SystemExit("bench_workers needs a real broker: worker processes can't share the in-process fake")
+
+    topic = loadgen.bench_topic("pc.activity.media", args.broker)
+    loadgen.setup(args.broker, [topic], args.partitions)
+    t0 = time.monotonic()
+    produce(args.broker, topic, args.messages, args.machines, args.partitions)
+    print(f"[i] {args.messages} messages in {topic} ({args.partitions} partitions), "
+          f"produced in {time.monotonic() - t0:.1f}s")
+
+    results = []
+    for n in worker_counts(args.max_workers):
+        r = run(n, args, topic)
+        base = results[0]["throughput_per_sec"] if results else r["throughput_per_sec"]
+        r["speedup"] = round(r["throughput_per_sec"] / base, 2) if base else 0.0
+        results.append(r)
+        print(f"    {n:3d} worker(s): {r['throughput_per_sec']:10.1f} msg/s  x{r['speedup']:<5}"
+              f"  wall {r['wall_sec']:6.1f}s (spawn + rebalance included)  handled {r['handled']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"params": vars(args), "results": results}, f, indent=2)
+            f.write("\n")
+        print(f"    -> {args.json}")
+
+if __name__ == "__main__":
+    main()
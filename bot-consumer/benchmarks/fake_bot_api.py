@@ -0,0 +1,77 @@
+# Local HTTP stand-in for the Telegram Bot API (benchmarks only)
+from __future__ import annotations
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class FakeBotAPI:
+    """
+    Serves POST /bot<token>/<method> with a fixed artificial latency.
+    Counts calls per method; answers {"ok": true, ...}, except that every
+    `throttle_every`-th call gets a 429 with `retry_after`.
+    """
+    def __init__(self, latency_ms: float = 50.0, host: str = "127.0.0.1", port: int = 0,
+                 throttle_every: int = 0, retry_after: int = 1) -> None:
+        self.latency_ms = latency_ms
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.calls: dict[str, int] = {}
+        self.throttled = 0
+        self._seen = 0
+        self._lock = threading.Lock()
+        self._next_message_id = 1
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # keep-alive clients would otherwise hit delayed ACKs
+
+            def do_POST(self) -> None:  # noqa: N802
+                length = int(self.headers.get("Content-Length") or 0)
+                self.rfile.read(length)
+                status, body = api._handle(self.path.rsplit("/", 1)[-1])
+                raw = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handle(self, method: str) -> tuple[int, dict]:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        with self._lock:
+            self._seen += 1
+            if self.throttle_every and self._seen % self.throttle_every == 0:
+                self.throttled += 1
+                return 429, {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after},
+                }
+            self.calls[method] = self.calls.get(method, 0) + 1
+            message_id = self._next_message_id
+            self._next_message_id += 1
+        return 200, {"ok": True, "result": {"message_id": message_id}}
+
+    def __enter__(self) -> "FakeBotAPI":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
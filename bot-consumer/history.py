@@ -0,0 +1,99 @@
+# Listening history: run the Kafka -> SQLite sink, or query the store.
+#   python history.py ingest
+#   python history.py top-artists --since 7d [--machine PC-01] [--by plays] [--limit 20]
+#   python history.py top-tracks --since 30d
+#   python history.py listen-time --since 1d
+#   python history.py sessions --machine PC-01 --since 2d
+from __future__ import annotations
+import argparse
+import re
+import sqlite3
+import time
+from datetime import datetime
+from pcmedia.logs import setup_logging
+from src.config import get_settings
+from src.history import queries
+
+_SPAN = re.compile(r"^(\d+(?:\.\d+)?)([smhdw])$")
+_UNIT = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+def parse_time(value: str, now: float) -> float:
+    """"7d" / "12h" / "30m" (ago), or an ISO date/time."""
+    m = _SPAN.match(value)
+    if m:
+        return now - float(m.group(1)) * _UNIT[m.group(2)]
+    return datetime.fromisoformat(value).timestamp()
+
+def _fmt_seconds(s: float) -> str:
+    return f"{int(s // 3600)}h{int(s % 3600 // 60):02d}m"
+
+def _fmt_ts(ts: float) -> str:
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M")
+
+def ingest() -> None:
+    from src.history.sink import HistorySink
+    from src.history.store import HistoryStore
+    from pcmedia.metrics import serve
+    from pcmedia.serde import SchemaRegistry, Serde
+
+    settings = get_settings()
+    serve(settings.metrics_port, settings.metrics_host)
+    store = HistoryStore(settings.history_db_path)
+    sink = HistorySink(
+        store,
+        brokers=settings.brokers,
+        topic=settings.history_topic,
+        group_id=settings.history_group_id,
+        serde=Serde(SchemaRegistry(settings.schema_registry_path)),
+        batch_size=settings.history_batch_size,
+        batch_linger_ms=settings.history_batch_linger_ms,
+        stats_interval_ms=settings.kafka_stats_interval_ms if settings.metrics_port else 0,
+    )
+    try:
+        sink.run()
+    finally:
+        store.close()
+
+def query(args) -> None:
+    settings = get_settings()
+    now = time.time()
+    start, end = parse_time(args.since, now), parse_time(args.until, now) if args.until else now
+    # Read-only connection: safe next to a running sink (WAL).
+    db = sqlite3.connect(f"file:{settings.history_db_path}?mode=ro", uri=True)
+    cap = settings.history_max_segment_sec
+    if args.command == "top-artists":
+        for r in queries.top_artists(db, start, end, args.machine, args.limit, args.by, cap):
+            print(f"{r['plays']:6d}  {_fmt_seconds(r['seconds']):>8}  {r['artist']}")
+    elif args.command == "top-tracks":
+        for r in queries.top_tracks(db, start, end, args.machine, args.limit, args.by, cap):
+            print(f"{r['plays']:6d}  {_fmt_seconds(r['seconds']):>8}  {r['artist']} — {r['title']}")
+    elif args.command == "listen-time":
+        for machine, seconds in queries.listen_time(db, start, end, args.machine, cap).items():
+            print(f"{_fmt_seconds(seconds):>8}  {machine}")
+    else:
+        if not args.machine:
+            raise SystemExit("sessions needs --machine")
+        for s in queries.sessions(db, args.machine, start, end, settings.history_session_gap_sec, cap):
+            print(f"{_fmt_ts(s['start'])} → {_fmt_ts(s['end'])}  {_fmt_seconds(s['seconds']):>8}  {s['plays']} plays")
+    db.close()
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Listening history sink and queries")
+    ap.add_argument("command", choices=("ingest", "top-artists", "top-tracks", "listen-time", "sessions"))
+    ap.add_argument("--since", default="7d", help='window start: "7d", "12h", "30m" ago or an ISO date')
+    ap.add_argument("--until", default="", help="window end (default: now)")
+    ap.add_argument("--machine", default=None)
+    ap.add_argument("--by", choices=("time", "plays"), default="time")
+    ap.add_argument("--limit", type=int, default=10)
+    args = ap.parse_args()
+
+    if args.command == "ingest":
+        settings = get_settings()
+        setup_logging(settings.log_level, settings.log_format, settings.log_rate_per_sec,
+                      settings.log_burst, settings.log_sample, settings.log_queue_size)
+        ingest()
+    else:
+        query(args)
+
+if __name__ == "__main__":
+    main()
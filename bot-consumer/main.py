@@ -1,5 +1,13 @@
 # Entry point
-from src.app import run
+from pcmedia.logs import setup_logging
+from src.app import run, run_workers
+from src.config import get_settings
 
 if __name__ == "__main__":
-    run()
+    settings = get_settings()
+    setup_logging(settings.log_level, settings.log_format, settings.log_rate_per_sec,
+                  settings.log_burst, settings.log_sample, settings.log_queue_size)
+    if settings.workers > 1:
+        run_workers()
+    else:
+        run()
@@ -0,0 +1,64 @@
+# Replay / backfill of the media topic into a file or another topic. Nothing is sent to Telegram and
+# no consumer-group offsets are committed, so it is safe next to the running bot.
+#   python replay.py --from 2h --out missed.jsonl.gz
+#   python replay.py --from 2025-01-01T00:00 --to 2025-01-02T00:00 --out day.parquet
+#   python replay.py --from offsets:0=1200,3=980 --out topic:pc.activity.media.backfill
+#   python replay.py --from earliest --changes-only --out changes.jsonl.gz
+from __future__ import annotations
+import argparse
+import json
+import signal
+import time
+from pcmedia.logs import setup_logging
+from src.config import get_settings
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Replay a range of the media topic into a sink")
+    ap.add_argument("--from", dest="start", required=True,
+                    help='"earliest", "2h"/"7d" ago, an ISO date/time (UTC) or "offsets:0=1200,1=980"')
+    ap.add_argument("--to", dest="end", default="latest", help="range end (exclusive), same forms; default: latest")
+    ap.add_argument("--out", required=True, help="FILE.jsonl[.gz], FILE.parquet or topic:NAME")
+    ap.add_argument("--topic", default=None, help="topics to read (default: TOPIC; no patterns)")
+    ap.add_argument("--changes-only", action="store_true", help="skip messages the bot would dedupe away")
+    ap.add_argument("--batch-size", type=int, default=5000)
+    ap.add_argument("--progress-sec", type=float, default=5.0)
+    args = ap.parse_args()
+
+    settings = get_settings()
+    setup_logging(settings.log_level, settings.log_format, settings.log_rate_per_sec,
+                  settings.log_burst, settings.log_sample, settings.log_queue_size)
+    from confluent_kafka import Consumer
+    from pcmedia.dedupe import parse_fields, signature_fn
+    from pcmedia.serde import SchemaRegistry, Serde
+    from src.kafka.consumer import KafkaNowPlayingConsumer, parse_topics
+    from src.replay.replayer import parse_bound, replay, resolve_ranges
+    from src.replay.sinks import open_sink
+
+    now = time.time()
+    start, end = parse_bound(args.start, now), parse_bound(args.end, now)
+    topics = parse_topics(args.topic or settings.topic)
+    client = Consumer({
+        "bootstrap.servers": settings.brokers,
+        "group.id": f"{settings.group_id}-replay",   # never committed: assign() + manual reads only
+        "enable.auto.commit": False,
+        "enable.partition.eof": True,                # ends a range whose last offsets no longer exist
+        "fetch.min.bytes": 64 * 1024,
+    })
+    ranges = resolve_ranges(client, topics, start, end)
+    if not ranges:
+        client.close()
+        raise SystemExit("nothing to replay in that range")
+    consumer = KafkaNowPlayingConsumer(
+        settings.brokers, topics, f"{settings.group_id}-replay",
+        serde=Serde(SchemaRegistry(settings.schema_registry_path)),
+        batch_size=args.batch_size,
+        signature=signature_fn(parse_fields(settings.signature_fields), digest=settings.signature_digest),
+        client=client,
+    )
+    signal.signal(signal.SIGTERM, lambda *_: consumer.stop())
+    stats = replay(consumer, ranges, open_sink(args.out, settings.brokers), changes_only=args.changes_only,
+                   progress_interval=args.progress_sec)
+    print(json.dumps(stats))
+
+if __name__ == "__main__":
+    main()
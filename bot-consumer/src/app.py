@@ -1,22 +1,196 @@
 # Application wiring: builds components and runs the loop
 from __future__ import annotations
-from src.config import settings
-from src.kafka.consumer import KafkaNowPlayingConsumer
-from src.telegram.client import TelegramClient
-from src.telegram.formatters import format_message_html
+import dataclasses
+import logging
+import signal
+from typing import Callable, Optional
+from pcmedia.coalesce import Coalescer
+from pcmedia.dedupe import parse_fields, signature_fn
+from pcmedia.logs import setup_logging
+from pcmedia.metrics import REGISTRY, age_seconds, serve
+from pcmedia.serde import SchemaRegistry, Serde
+from src.config import Settings, get_settings
+from src.delivery.debounce import CoalescingStage
+from src.delivery.pipeline import DeliveryPipeline, countdown
+from src.delivery.routing import ChatRouter
+from src.state.dedupe import DedupeStore
+from src.telegram.ratelimit import ChatRateLimiter
+from src.telegram.formatters import MessageFormatter
 
-def run() -> None:
-    tg = TelegramClient(settings.bot_token, settings.chat_id)
+log = logging.getLogger(__name__)
+
+_DELIVERY_AGE = REGISTRY.histogram(
+    "telegram_delivery_age_seconds", "Payload timestamp to Telegram update done (end to end)"
+)
+
+def run(serve_metrics: bool = True) -> None:
+    settings = get_settings()
+    settings.validate()
+    # Imported once the settings are known to be usable: confluent_kafka and aiohttp are
+    # most of the startup time, and a misconfigured service should fail before paying it.
+    from src.kafka.consumer import KafkaNowPlayingConsumer
+    from src.telegram.client import TelegramClient
+    from src.telegram.now_playing import NowPlayingMessages
+
+    signature = signature_fn(parse_fields(settings.signature_fields), digest=settings.signature_digest)
+    if serve_metrics:
+        serve(settings.metrics_port, settings.metrics_host)
+    limiter = ChatRateLimiter(
+        global_rate=settings.telegram_global_rate,
+        chat_rate=settings.telegram_chat_rate,
+        chat_burst=settings.telegram_chat_burst,
+    )
+    tg = TelegramClient(
+        settings.bot_token,
+        settings.chat_id,
+        api_base=settings.telegram_api_base,
+        limiter=limiter,
+        pool_size=settings.telegram_pool_size,
+        max_retries=settings.telegram_max_retries,
+        max_throttle_sec=settings.telegram_max_throttle_sec,
+    )
     consumer = KafkaNowPlayingConsumer(
         brokers=settings.brokers,
         topic=settings.topic,
         group_id=settings.group_id,
         auto_offset_reset=settings.auto_offset_reset,
+        serde=Serde(SchemaRegistry(settings.schema_registry_path)),
+        batch_size=settings.batch_size,
+        batch_linger_ms=settings.batch_linger_ms,
+        dedupe=DedupeStore(
+            max_entries=settings.dedupe_max_entries,
+            ttl_sec=settings.dedupe_ttl_sec,
+            snapshot_path=settings.dedupe_snapshot_path,
+            snapshot_interval_sec=settings.dedupe_snapshot_interval_sec,
+        ),
+        signature=signature,
+        stats_interval_ms=settings.kafka_stats_interval_ms if settings.metrics_port else 0,
     )
+    now_playing = NowPlayingMessages(
+        tg,
+        state_path=settings.now_playing_state_path,
+        session_gap_sec=settings.now_playing_session_gap_sec,
+    ) if settings.edit_in_place else None
+    router = ChatRouter(settings.routes_path, default=[settings.chat_id], reload_sec=settings.routes_reload_sec)
+    formatter = MessageFormatter(
+        settings.prefix,
+        locale=settings.message_locale,
+        app_labels=settings.app_labels,
+        tz=settings.message_timezone,
+        cache_size=settings.format_cache_size,
+    )
+    pipeline = DeliveryPipeline(
+        workers=settings.delivery_workers,
+        max_pending=settings.delivery_queue_size,
+    )
+
+    def deliver(machine_key: str, payload: dict, done: Callable[[], None]) -> None:
+        chats = router.route(machine_key, payload)
+        if not chats:
+            log.info("no chat for %s", machine_key, extra={"event": "telegram.unrouted", "machine": machine_key})
+            done()
+            return
+        text = formatter.format(payload)
+        # The consumer commits the source offsets once every chat's job ran (sent, or failed and logged).
+        finished = countdown(len(chats), done)
+
+        def job(chat_id: str) -> None:
+            try:
+                send(chat_id)
+            finally:
+                finished()
+
+        def send(chat_id: str) -> None:
+            if now_playing is None:
+                try:
+                    tg.send_text_html(text, chat_id=chat_id)
+                except Exception as exc:
+                    log.warning("telegram send failed: %s", exc,
+                                extra={"event": "telegram.failed", "machine": machine_key, "chat": chat_id})
+                    return
+                log.info("→ %s", text, extra={"event": "telegram.sent", "machine": machine_key, "chat": chat_id})
+            else:
+                try:
+                    outcome = now_playing.publish(machine_key or "-", chat_id, text)
+                except Exception as exc:
+                    log.warning("telegram update failed: %s", exc, extra={"event": "telegram.failed"})
+                    return
+                log.info("→ (%s) %s", outcome, text,
+                         extra={"event": "telegram.sent", "machine": machine_key, "chat": chat_id, "outcome": outcome})
+            age = age_seconds(payload.get("timestamp"))
+            if age is not None:
+                _DELIVERY_AGE.observe(age)
+
+        # Keyed by chat so messages for one chat keep their order.
+        for chat_id in chats:
+            # False once closed: left unfinished, so the offset is not committed and the update is redelivered.
+            pipeline.submit(chat_id, lambda chat_id=chat_id: job(chat_id))
+
+    # Only the latest state per machine within the window reaches Telegram (COALESCE_WINDOW_MS=0: every change).
+    debounce: Optional[CoalescingStage] = None
+    on_change = lambda payload, key, done: deliver(key, payload, done)
+    if settings.coalesce_window_ms > 0:
+        debounce = CoalescingStage(
+            Coalescer(
+                settings.coalesce_window_ms / 1000.0,
+                settings.coalesce_max_delay_ms / 1000.0,
+                suppress_statuses=parse_fields(settings.coalesce_suppress_statuses, default=()),
+                signature=signature,
+            ),
+            emit=deliver,
+        )
+        on_change = lambda payload, key, done: debounce.offer(key, payload, done)
+
+    def drain() -> None:
+        if debounce is not None:
+            debounce.close()
+        pipeline.close(timeout=settings.delivery_drain_timeout_sec)
+
+    # SIGTERM (docker stop, the supervisor) ends the loop like Ctrl-C: drain, then a final commit.
+    signal.signal(signal.SIGTERM, lambda *_: consumer.stop())
+    try:
+        # Batch mode commits an offset only once its update was delivered (or dropped by the coalescer).
+        consumer.start(on_change, backpressure=pipeline, deferred=True, drain=drain)
+    finally:
+        drain()   # no-op unless start() failed before its own drain
+        if now_playing is not None:
+            now_playing.close()
+            log.info("Now-playing messages: %s", now_playing.stats())
+        router.close()
+        tg.close()
+        log.info("Delivery pipeline drained")
+
+def worker_settings(settings: Settings, index: int) -> Settings:
+    """
+    Settings for worker `index` of settings.workers: an equal share of the bot's
+    Telegram rate limits. The state files stay shared (merged under a file lock), so
+    a partition moved to another worker by a rebalance takes its state along.
+    """
+    share = 1.0 / settings.workers
+    return dataclasses.replace(
+        settings,
+        telegram_global_rate=settings.telegram_global_rate * share,
+        telegram_chat_rate=settings.telegram_chat_rate * share,
+    )
+
+def run_worker(index: int, settings: Settings) -> None:
+    """Worker process entry (Supervisor target): the bot on this worker's settings, no metrics endpoint."""
+    setup_logging(settings.log_level, settings.log_format, settings.log_rate_per_sec,
+                  settings.log_burst, settings.log_sample, settings.log_queue_size)
+    get_settings.set(worker_settings(settings, index))
+    run(serve_metrics=False)
 
-    def on_media_change(payload: dict) -> None:
-        text = format_message_html(payload, settings.prefix)
-        tg.send_text_html(text)
-        print(f"[→] {text}")
+def run_workers() -> None:
+    """settings.workers consumer processes in GROUP_ID; the metrics endpoint serves their merged stats."""
+    settings = get_settings()
+    settings.validate()
+    from src.supervisor import Supervisor
 
-    consumer.start(on_media_change)
+    serve(settings.metrics_port, settings.metrics_host)
+    Supervisor(
+        run_worker,
+        settings.workers,
+        args=(settings,),
+        stop_timeout_sec=settings.worker_stop_timeout_sec,
+        stats_interval_sec=settings.worker_stats_interval_sec,
+    ).run()
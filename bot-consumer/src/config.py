@@ -1,29 +1,115 @@
-# Loads and validates environment variables
+# Settings from environment variables (and .env), loaded on first use
 from __future__ import annotations
 import os
 from dataclasses import dataclass
-from dotenv import load_dotenv
-
-load_dotenv()
+from datetime import tzinfo
+from typing import Mapping, Optional, Tuple
+from pcmedia.envconfig import Lazy, env_field, load
+from src.telegram.formatters import locale_name, parse_app_labels, timezone_name
 
 @dataclass(frozen=True)
 class Settings:
     # Kafka
-    brokers: str = os.getenv("KAFKA_BROKERS", "localhost:9092")
-    topic: str = os.getenv("TOPIC", "pc.activity.media")
-    group_id: str = os.getenv("GROUP_ID", "pc-media-telegram-bot")
+    brokers: str = env_field("KAFKA_BROKERS", "localhost:9092")
+    topic: str = env_field("TOPIC", "pc.activity.media")   # comma-separated topics and/or "^regex" patterns
+    group_id: str = env_field("GROUP_ID", "pc-media-telegram-bot")
+    schema_registry_path: str | None = env_field("SCHEMA_REGISTRY_PATH")   # binary payload schemas (e.g., schemas.json)
 
     # Telegram
-    bot_token: str = os.getenv("TELEGRAM_BOT_TOKEN") or ""
-    chat_id: str = os.getenv("TELEGRAM_CHAT_ID") or ""
-    prefix: str = os.getenv("BOT_PREFIX", "[NowPlaying]")
+    bot_token: str = env_field("TELEGRAM_BOT_TOKEN", "")
+    chat_id: str = env_field("TELEGRAM_CHAT_ID", "")   # default chat (events no routing rule claims)
+    prefix: str = env_field("BOT_PREFIX", "[NowPlaying]")
+    # Message text: locale (en, es), time zone for timestamps (IANA name; empty = system local time),
+    # extra app labels ("id=label,..."; an id also matches app ids containing it) and rendered-message LRU size
+    message_locale: str = env_field("MESSAGE_LOCALE", "en", parse=locale_name)
+    message_timezone: Optional[tzinfo] = env_field("MESSAGE_TIMEZONE", None, parse=timezone_name)
+    app_labels: Tuple[Tuple[str, str], ...] = env_field("APP_LABELS", (), parse=parse_app_labels)
+    format_cache_size: int = env_field("FORMAT_CACHE_SIZE", 1024)
+    # Routing rules by machine / app / artist (src/delivery/routing.py), reloaded when the file changes
+    routes_path: str | None = env_field("ROUTES_PATH")   # e.g., routes.json
+    routes_reload_sec: float = env_field("ROUTES_RELOAD_SEC", 5.0)
+    telegram_api_base: str = env_field("TELEGRAM_API_BASE", "https://api.telegram.org")
+    # Bot API limits: ~30 msg/s overall, ~1 msg/s per chat (0 disables a limit)
+    telegram_global_rate: float = env_field("TELEGRAM_GLOBAL_RATE", 30.0)
+    telegram_chat_rate: float = env_field("TELEGRAM_CHAT_RATE", 1.0)
+    telegram_chat_burst: float = env_field("TELEGRAM_CHAT_BURST", 1.0)
+    telegram_pool_size: int = env_field("TELEGRAM_POOL_SIZE", 20)
+    telegram_max_retries: int = env_field("TELEGRAM_MAX_RETRIES", 8)
+    telegram_max_throttle_sec: float = env_field("TELEGRAM_MAX_THROTTLE_SEC", 300.0)   # 429 waits per call, then give up
+    # One message per machine per chat, edited as the track changes (new message after the session gap)
+    edit_in_place: bool = env_field("EDIT_IN_PLACE", True)
+    now_playing_state_path: str | None = env_field("NOW_PLAYING_STATE_PATH")   # e.g., data/now_playing.json
+    now_playing_session_gap_sec: float = env_field("NOW_PLAYING_SESSION_GAP_SEC", 1800.0)
 
     # Consumer
-    auto_offset_reset: str = os.getenv("AUTO_OFFSET_RESET", "latest")
+    auto_offset_reset: str = env_field("AUTO_OFFSET_RESET", "latest")
+    # 1 = poll() one message at a time with auto commit (the original loop).
+    # Batch mode (BATCH_SIZE > 1): consume() batches + manual async commits once updates are delivered
+    batch_size: int = env_field("BATCH_SIZE", 1)
+    batch_linger_ms: int = env_field("BATCH_LINGER_MS", 100)
+
+    # Per-machine dedup state (LRU + TTL), optionally snapshotted to disk
+    dedupe_max_entries: int = env_field("DEDUPE_MAX_ENTRIES", 100000)
+    dedupe_ttl_sec: float = env_field("DEDUPE_TTL_SEC", 86400.0)
+    dedupe_snapshot_path: str | None = env_field("DEDUPE_SNAPSHOT_PATH")   # e.g., data/dedupe.json
+    dedupe_snapshot_interval_sec: float = env_field("DEDUPE_SNAPSHOT_INTERVAL_SEC", 30.0)
+    signature_fields: str = env_field("SIGNATURE_FIELDS", "sourceApp,title,artist,playbackStatus")
+    signature_digest: bool = env_field("SIGNATURE_DIGEST", False)  # 8-byte digests per machine
+
+    # Coalescing: per machine, hold changes until quiet for the window (max delay caps the wait) and drop
+    # COALESCE_SUPPRESS_STATUSES; 0 (default) disables it: every change is sent as soon as it is consumed
+    coalesce_window_ms: int = env_field("COALESCE_WINDOW_MS", 0)
+    coalesce_max_delay_ms: int = env_field("COALESCE_MAX_DELAY_MS", 10000)
+    coalesce_suppress_statuses: str = env_field("COALESCE_SUPPRESS_STATUSES", "changing")
+
+    # Delivery (worker pool between Kafka and Telegram)
+    delivery_workers: int = env_field("DELIVERY_WORKERS", 4)
+    delivery_queue_size: int = env_field("DELIVERY_QUEUE_SIZE", 1000)
+    delivery_drain_timeout_sec: float = env_field("DELIVERY_DRAIN_TIMEOUT_SEC", 10.0)
+
+    # Worker processes (main.py): 1 runs in this process; N > 1 (0: one per CPU core) runs N consumers
+    # of GROUP_ID under a supervisor (src/supervisor.py) that restarts them and merges their metrics
+    workers: int = env_field("WORKERS", 1)
+    worker_stop_timeout_sec: float = env_field("WORKER_STOP_TIMEOUT_SEC", 30.0)   # drain + final commit
+    worker_stats_interval_sec: float = env_field("WORKER_STATS_INTERVAL_SEC", 5.0)
+
+    # Listening history sink (history.py): SQLite database fed by its own consumer group
+    history_db_path: str = env_field("HISTORY_DB_PATH", os.path.join("data", "history.db"))
+    history_topic: str = env_field("HISTORY_TOPIC", "")   # default: the first of TOPIC
+    history_group_id: str = env_field("HISTORY_GROUP_ID", "pc-media-history")
+    history_batch_size: int = env_field("HISTORY_BATCH_SIZE", 2000)
+    history_batch_linger_ms: int = env_field("HISTORY_BATCH_LINGER_MS", 500)
+    history_max_segment_sec: float = env_field("HISTORY_MAX_SEGMENT_SEC", 1800.0)   # cap per "playing" event
+    history_session_gap_sec: float = env_field("HISTORY_SESSION_GAP_SEC", 1800.0)
+
+    # Metrics: Prometheus text on http://METRICS_HOST:METRICS_PORT/metrics (0 disables)
+    metrics_port: int = env_field("METRICS_PORT", 0)
+    metrics_host: str = env_field("METRICS_HOST", "127.0.0.1")
+    kafka_stats_interval_ms: int = env_field("KAFKA_STATS_INTERVAL_MS", 15000)   # consumer lag (with metrics)
+
+    # Logging: JSON lines (or "text") from a background thread; LOG_RATE_PER_SEC/LOG_BURST cap each
+    # message type, LOG_SAMPLE keeps 1 in N of chatty events (e.g. "telegram.sent=0.1")
+    log_level: str = env_field("LOG_LEVEL", "INFO", parse=str.upper)
+    log_format: str = env_field("LOG_FORMAT", "json", parse=str.lower)
+    log_rate_per_sec: float = env_field("LOG_RATE_PER_SEC", 10.0)
+    log_burst: float = env_field("LOG_BURST", 20.0)
+    log_sample: str = env_field("LOG_SAMPLE", "")
+    log_queue_size: int = env_field("LOG_QUEUE_SIZE", 10000)
+
+    def __post_init__(self) -> None:
+        if self.workers <= 0:
+            object.__setattr__(self, "workers", os.cpu_count() or 1)
+        if not self.history_topic:
+            object.__setattr__(self, "history_topic", self.topic.split(",")[0].strip())
 
     def validate(self) -> None:
-        if not self.bot_token or not self.chat_id:
-            raise SystemExit("Set TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID in .env")
+        """Telegram settings are required by the bot (app.run), not by the history sink."""
+        if not self.bot_token or not (self.chat_id or self.routes_path):
+            raise SystemExit("Set TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID (or ROUTES_PATH) in .env")
+
+def load_settings(env: Optional[Mapping[str, str]] = None) -> Settings:
+    """Settings from `env` (default: the process environment, after reading .env)."""
+    return load(Settings, env)
 
-settings = Settings()
-settings.validate()
+# The process-wide settings, loaded on first call; get_settings.set(...) swaps them (tests, benchmarks).
+get_settings = Lazy(load_settings)
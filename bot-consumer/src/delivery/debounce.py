@@ -0,0 +1,87 @@
+# Threaded wrapper that runs a Coalescer between the consumer and the delivery pipeline
+from __future__ import annotations
+import logging
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+from pcmedia.coalesce import Coalescer
+
+log = logging.getLogger(__name__)
+
+Done = Callable[[], None]
+
+class CoalescingStage:
+    """
+    offer() holds updates in the Coalescer; a timer thread hands due ones to
+    `emit(key, payload, done)` (e.g. a DeliveryPipeline submit). close() emits the rest.
+    done() callbacks given to offer() are called once their update was delivered
+    (through emit's done), superseded by a delivered one, or dropped (suppressed,
+    unchanged), so consumer offsets can be committed behind them.
+    """
+    def __init__(self, coalescer: Coalescer, emit: Callable[[Hashable, Dict, Done], None]) -> None:
+        self.coalescer = coalescer
+        self._emit = emit
+        self._cond = threading.Condition()
+        self._closed = False
+        self._held: Dict[Hashable, List[Done]] = {}
+        self._thread = threading.Thread(target=self._run, name="coalescer", daemon=True)
+        self._thread.start()
+
+    def offer(self, key: Hashable, payload: Dict, done: Optional[Done] = None) -> None:
+        with self._cond:
+            if self.coalescer.offer(key, payload):
+                if done is not None:
+                    self._held.setdefault(key, []).append(done)
+                self._cond.notify()
+                return
+        if done is not None:
+            done()   # suppressed: nothing to deliver
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                deadline = self.coalescer.next_deadline()
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                if timeout is None or timeout > 0:
+                    self._cond.wait(timeout)
+                unchanged = self.coalescer.unchanged
+                items = self.coalescer.due()
+                batch, dropped = self._take(items, unchanged)
+            self._finish(dropped)
+            self._deliver(batch)
+
+    def _take(self, items, unchanged: int) -> Tuple[List[Tuple[Hashable, Dict, List[Done]]], List[Done]]:
+        """Pair emitted items with their held done() callbacks; collect those of updates skipped as unchanged."""
+        batch = [(key, payload, self._held.pop(key, [])) for key, payload in items]
+        dropped: List[Done] = []
+        if self.coalescer.unchanged != unchanged:
+            for key in [k for k in self._held if k not in self.coalescer]:
+                dropped.extend(self._held.pop(key))
+        return batch, dropped
+
+    @staticmethod
+    def _finish(dones: List[Done]) -> None:
+        for done in dones:
+            done()
+
+    def _deliver(self, batch) -> None:
+        for key, payload, dones in batch:
+            try:
+                self._emit(key, payload, lambda dones=dones: self._finish(dones))
+            except Exception as exc:
+                log.warning("coalesced emit failed: %s", exc)
+                self._finish(dones)
+
+    def close(self) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            unchanged = self.coalescer.unchanged
+            batch, dropped = self._take(self.coalescer.drain(), unchanged)
+            self._cond.notify()
+        self._thread.join(timeout=1.0)
+        self._finish(dropped)
+        self._deliver(batch)
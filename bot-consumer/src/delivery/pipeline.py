@@ -0,0 +1,109 @@
+# Bounded, concurrent delivery stage between the Kafka consumer and Telegram
+from __future__ import annotations
+import logging
+import queue
+import threading
+import zlib
+from typing import Callable, List, Optional
+
+log = logging.getLogger(__name__)
+
+Job = Callable[[], None]
+
+_STOP = object()
+
+def countdown(n: int, done: Callable[[], None]) -> Callable[[], None]:
+    """A callback that calls `done` on its n-th call (from any thread), e.g. once every chat's job ran."""
+    left = [n]
+    lock = threading.Lock()
+
+    def tick() -> None:
+        with lock:
+            left[0] -= 1
+            last = left[0] == 0
+        if last:
+            done()
+    return tick
+
+class DeliveryPipeline:
+    """
+    Runs delivery jobs on a worker pool.
+    - Jobs submitted with the same key (e.g. chat_id) run on the same worker, in order.
+    - At most `max_pending` jobs are queued; `saturated()` / `drained()` drive
+      consumer backpressure (pause at the limit, resume at `resume_ratio`).
+    """
+    def __init__(self, workers: int = 4, max_pending: int = 1000, resume_ratio: float = 0.5) -> None:
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        if max_pending < 1:
+            raise ValueError("max_pending must be >= 1")
+        self._max_pending = max_pending
+        self._resume_at = int(max_pending * resume_ratio)
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._queues: List[queue.SimpleQueue] = [queue.SimpleQueue() for _ in range(workers)]
+        self._threads = [
+            threading.Thread(target=self._worker, args=(q,), name=f"delivery-{i}", daemon=True)
+            for i, q in enumerate(self._queues)
+        ]
+        for t in self._threads:
+            t.start()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def saturated(self) -> bool:
+        """True when the queue is full and the consumer should pause."""
+        return self._pending >= self._max_pending
+
+    def drained(self) -> bool:
+        """True when enough room was freed for the consumer to resume."""
+        return self._pending <= self._resume_at
+
+    def submit(self, key: object, job: Job, timeout: Optional[float] = None) -> bool:
+        """Queue a job; blocks while the pipeline is full. Returns False on timeout/close."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._closed or self._pending < self._max_pending, timeout):
+                return False
+            if self._closed:
+                return False
+            self._pending += 1
+        self._queues[self._slot(key)].put(job)
+        return True
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued job has run. Returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Drain outstanding jobs (up to `timeout`) and stop the workers."""
+        if self._closed:
+            return
+        self.join(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for q in self._queues:
+            q.put(_STOP)
+        for t in self._threads:
+            t.join(timeout=1.0)
+
+    def _slot(self, key: object) -> int:
+        return zlib.crc32(str(key).encode("utf-8")) % len(self._queues)
+
+    def _worker(self, q: queue.SimpleQueue) -> None:
+        while True:
+            job = q.get()
+            if job is _STOP:
+                return
+            try:
+                job()
+            except Exception as exc:
+                log.warning("delivery job failed: %s", exc, extra={"event": "delivery.failed"})
+            finally:
+                with self._cond:
+                    self._pending -= 1
+                    self._cond.notify_all()
@@ -0,0 +1,177 @@
+# Event -> chats routing: rules compiled into lookup indexes, reloaded when the rules file changes
+#
+# Rules file (ROUTES_PATH, JSON):
+#   {
+#     "default": ["-1001111"],                                   # chats for events no rule matches
+#     "rules": [
+#       {"chats": ["-1002222"], "machine": ["pc-0001", "pc-0002"]},
+#       {"chats": ["-1003333"], "machine": "lab-*"},             # trailing * = prefix
+#       {"chats": ["-1004444"], "app": "Spotify*", "artist": ["Daft Punk", "Justice"]}
+#     ]
+#   }
+# A rule matches when every field it names matches (any of its values; case-insensitive); an event
+# goes to the chats of every matching rule, or to "default" (TELEGRAM_CHAT_ID if absent) if none does.
+from __future__ import annotations
+import json
+import logging
+import os
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+from pcmedia.metrics import REGISTRY
+
+log = logging.getLogger(__name__)
+
+# Rule fields: the message key, payload["sourceApp"] and payload["artist"]
+FIELDS: Tuple[str, ...] = ("machine", "app", "artist")
+
+_RULES = REGISTRY.gauge("router_rules", "Routing rules in the active table")
+_RELOADS = REGISTRY.counter("router_reloads_total", "Rules file reloads by outcome", ["outcome"])
+_UNROUTED = REGISTRY.counter("router_unrouted_total", "Events that matched no rule and had no default chat")
+
+class Rule(NamedTuple):
+    chats: Tuple[str, ...]
+    conditions: Dict[str, Tuple[str, ...]]   # field -> accepted values (casefolded; "x*" = prefix)
+
+    def matches(self, values: Mapping[str, str]) -> bool:
+        """Linear evaluation; RoutingTable reaches the same answer through its indexes."""
+        for field, accepted in self.conditions.items():
+            value = values[field]
+            if not any(value.startswith(a[:-1]) if a.endswith("*") else value == a for a in accepted):
+                return False
+        return True
+
+def _strings(value, what: str) -> Tuple[str, ...]:
+    items = [value] if isinstance(value, (str, int)) else value
+    if not isinstance(items, list) or not items or not all(isinstance(v, (str, int)) and str(v) for v in items):
+        raise ValueError(f"{what}: expected a string or a non-empty list of strings")
+    return tuple(str(v) for v in items)
+
+def parse_rules(doc: Mapping) -> Tuple[Tuple[str, ...], List[Rule]]:
+    """(default chats, rules) from a decoded rules file; ValueError names the offending rule."""
+    if not isinstance(doc, dict):
+        raise ValueError("expected a JSON object with \"rules\"")
+    default = _strings(doc["default"], "default") if doc.get("default") else ()
+    rules = []
+    for i, raw in enumerate(doc.get("rules", [])):
+        if not isinstance(raw, dict) or "chats" not in raw:
+            raise ValueError(f"rule {i}: expected an object with \"chats\"")
+        unknown = set(raw) - {"chats", *FIELDS}
+        if unknown:
+            raise ValueError(f"rule {i}: unknown field(s) {', '.join(sorted(unknown))}")
+        conditions = {f: tuple(v.casefold() for v in _strings(raw[f], f"rule {i} {f}")) for f in FIELDS if f in raw}
+        rules.append(Rule(_strings(raw["chats"], f"rule {i} chats"), conditions))
+    return default, rules
+
+class RoutingTable:
+    """
+    Rules compiled for lookup: per field, exact values and prefixes (grouped by
+    length) map to the rules that accept them, so routing an event costs a few
+    dict lookups per field however many rules there are. A rule matches when
+    every one of its fields did. Results are cached per (machine, app, artist).
+    Immutable: a reload builds a new table.
+    """
+    def __init__(self, rules: Sequence[Rule], default: Sequence[str] = (), cache_size: int = 65536) -> None:
+        self.rules = list(rules)
+        self.default = tuple(default)
+        self._needed = [len(r.conditions) for r in self.rules]
+        self._always = [i for i, n in enumerate(self._needed) if n == 0]
+        self._exact: Dict[str, Dict[str, List[int]]] = {f: {} for f in FIELDS}
+        self._prefixes: Dict[str, Dict[int, Dict[str, List[int]]]] = {f: {} for f in FIELDS}
+        for i, rule in enumerate(self.rules):
+            for field, accepted in rule.conditions.items():
+                for value in set(accepted):
+                    if value.endswith("*"):
+                        value = value[:-1]
+                        self._prefixes[field].setdefault(len(value), {}).setdefault(value, []).append(i)
+                    else:
+                        self._exact[field].setdefault(value, []).append(i)
+        self._lookup = self._match if cache_size <= 0 else lru_cache(maxsize=cache_size)(self._match)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def route(self, machine_key: str, payload: Mapping) -> Tuple[str, ...]:
+        """Chats for one event (empty when nothing matches and there is no default)."""
+        return self._lookup(machine_key.casefold(), (payload.get("sourceApp") or "").casefold(),
+                            (payload.get("artist") or "").casefold())
+
+    def _match(self, *values: str) -> Tuple[str, ...]:
+        hits: Dict[int, int] = {}
+        for field, value in zip(FIELDS, values):
+            matched = set(self._exact[field].get(value, ()))
+            for length, table in self._prefixes[field].items():
+                if len(value) >= length:
+                    matched.update(table.get(value[:length], ()))
+            for i in matched:
+                hits[i] = hits.get(i, 0) + 1
+        chosen = sorted(self._always + [i for i, n in hits.items() if n == self._needed[i]])
+        chats = tuple(dict.fromkeys(chat for i in chosen for chat in self.rules[i].chats))
+        return chats or self.default
+
+def load_table(path: str, default: Sequence[str] = (), cache_size: int = 65536) -> RoutingTable:
+    """Read and compile a rules file; `default` applies when the file names no default chats."""
+    with open(path, "r", encoding="utf-8") as f:
+        file_default, rules = parse_rules(json.load(f))
+    return RoutingTable(rules, file_default or default, cache_size)
+
+class ChatRouter:
+    """
+    The active RoutingTable, swapped in whole when the rules file changes: a
+    thread checks its mtime every `reload_sec` (0 disables) and a file that
+    fails to load keeps the previous table. Without a path every event goes
+    to `default`.
+    """
+    def __init__(self, path: Optional[str] = None, default: Iterable[str] = (), reload_sec: float = 5.0,
+                 cache_size: int = 65536) -> None:
+        self._path = path
+        self._default = tuple(c for c in default if c)
+        self._cache_size = cache_size
+        self._mtime = self._stat()
+        self.table = load_table(path, self._default, cache_size) if path else RoutingTable([], self._default)
+        _RULES.set(len(self.table))
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if path and reload_sec > 0:
+            self._thread = threading.Thread(target=self._watch, args=(reload_sec,), name="routes-reload",
+                                            daemon=True)
+            self._thread.start()
+        log.info("Routing: %d rule(s), default %s", len(self.table), ", ".join(self.table.default) or "none")
+
+    def route(self, machine_key: str, payload: Mapping) -> Tuple[str, ...]:
+        chats = self.table.route(machine_key, payload)
+        if not chats:
+            _UNROUTED.inc()
+        return chats
+
+    def _stat(self) -> Optional[float]:
+        try:
+            return os.stat(self._path).st_mtime if self._path else None
+        except OSError:
+            return None
+
+    def reload(self) -> bool:
+        """Load the rules file again; True if the new table is active."""
+        try:
+            table = load_table(self._path, self._default, self._cache_size)
+        except (OSError, ValueError) as e:
+            _RELOADS.inc(1, "failed")
+            log.warning("routing rules not reloaded (%s): %s", self._path, e, extra={"event": "routes.invalid"})
+            return False
+        self.table = table
+        _RULES.set(len(table))
+        _RELOADS.inc(1, "ok")
+        log.info("Routing rules reloaded: %d rule(s)", len(table), extra={"event": "routes.reloaded"})
+        return True
+
+    def _watch(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            mtime = self._stat()
+            if mtime is not None and mtime != self._mtime:
+                self._mtime = mtime
+                self.reload()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
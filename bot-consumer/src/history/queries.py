@@ -0,0 +1,99 @@
+# Aggregate queries over the listening history (see src/history/store.py for the schema)
+from __future__ import annotations
+import sqlite3
+from typing import Dict, List, Optional
+
+# Listening segments: each event of a machine lasts until that machine's next event. A
+# "playing" segment is listen time, capped at `max_segment` (agent offline, no further
+# events) and clipped to the query window. A play is a "playing" event whose track differs
+# from the machine's previous event (pause/resume of the same track is not a new play).
+# Events up to `max_segment` before the window are read so segments running into it count.
+_SEGMENTS = """
+WITH ev AS (
+    SELECT e.machine_id, e.track_id, e.status, e.ts,
+           LEAD(e.ts) OVER w AS next_ts,
+           LAG(e.track_id) OVER w AS prev_track
+    FROM events e
+    WHERE e.ts >= :lo AND e.ts < :end {machine_filter}
+    WINDOW w AS (PARTITION BY e.machine_id ORDER BY e.ts)
+),
+seg AS (
+    SELECT machine_id, track_id, ts,
+           CASE WHEN status = 'playing'
+                THEN max(0.0, min(coalesce(next_ts, :end), ts + :max_segment, :end) - max(ts, :start))
+                ELSE 0.0 END AS listened,
+           CASE WHEN status = 'playing' AND ts >= :start
+                     AND (prev_track IS NULL OR prev_track != track_id) THEN 1 ELSE 0 END AS play
+    FROM ev
+)
+"""
+
+def _segments_sql(machine: Optional[str]) -> str:
+    # The IN list over all machines is not a no-op: it makes SQLite walk events_machine_ts
+    # one machine at a time, already in window order, instead of sorting the range by hand.
+    machine_filter = ("AND e.machine_id = (SELECT id FROM machines WHERE key = :machine)" if machine
+                      else "AND e.machine_id IN (SELECT id FROM machines)")
+    return _SEGMENTS.format(machine_filter=machine_filter)
+
+def _params(start: float, end: float, machine: Optional[str], max_segment: float, **extra) -> dict:
+    return dict(start=start, end=end, lo=start - max_segment, machine=machine, max_segment=max_segment, **extra)
+
+def top_artists(db: sqlite3.Connection, start: float, end: float, machine: Optional[str] = None,
+                limit: int = 10, by: str = "time", max_segment: float = 1800.0) -> List[Dict]:
+    """[{artist, plays, seconds}] in [start, end) (epoch seconds), ordered by listen time or plays."""
+    order = "seconds" if by == "time" else "plays"
+    sql = _segments_sql(machine) + f"""
+        SELECT t.artist, sum(seg.play) AS plays, sum(seg.listened) AS seconds
+        FROM seg JOIN tracks t ON t.id = seg.track_id
+        WHERE t.artist != ''
+        GROUP BY t.artist
+        HAVING plays > 0 OR seconds > 0
+        ORDER BY {order} DESC
+        LIMIT :limit"""
+    rows = db.execute(sql, _params(start, end, machine, max_segment, limit=limit)).fetchall()
+    return [{"artist": a, "plays": p, "seconds": s} for a, p, s in rows]
+
+def top_tracks(db: sqlite3.Connection, start: float, end: float, machine: Optional[str] = None,
+               limit: int = 10, by: str = "time", max_segment: float = 1800.0) -> List[Dict]:
+    """[{artist, title, plays, seconds}] in [start, end), ordered by listen time or plays."""
+    order = "seconds" if by == "time" else "plays"
+    sql = _segments_sql(machine) + f"""
+        SELECT t.artist, t.title, p.plays, p.seconds
+        FROM (SELECT track_id, sum(play) AS plays, sum(listened) AS seconds
+              FROM seg GROUP BY track_id
+              HAVING plays > 0 OR seconds > 0
+              ORDER BY {order} DESC LIMIT :limit) p
+        JOIN tracks t ON t.id = p.track_id
+        ORDER BY p.{order} DESC"""
+    rows = db.execute(sql, _params(start, end, machine, max_segment, limit=limit)).fetchall()
+    return [{"artist": a, "title": t, "plays": p, "seconds": s} for a, t, p, s in rows]
+
+def listen_time(db: sqlite3.Connection, start: float, end: float, machine: Optional[str] = None,
+                max_segment: float = 1800.0) -> Dict[str, float]:
+    """Machine key -> seconds spent playing in [start, end)."""
+    sql = _segments_sql(machine) + """
+        SELECT m.key, sum(seg.listened)
+        FROM seg JOIN machines m ON m.id = seg.machine_id
+        GROUP BY seg.machine_id
+        ORDER BY 2 DESC"""
+    return dict(db.execute(sql, _params(start, end, machine, max_segment)).fetchall())
+
+def sessions(db: sqlite3.Connection, machine: str, start: float, end: float, gap: float = 1800.0,
+             max_segment: float = 1800.0) -> List[Dict]:
+    """
+    Listening sessions of one machine: runs of "playing" segments separated by less
+    than `gap` seconds of silence. [{start, end, seconds, plays}], oldest first.
+    """
+    sql = _segments_sql(machine) + """
+        SELECT ts, listened, play FROM seg WHERE listened > 0 ORDER BY ts"""
+    out: List[Dict] = []
+    cur: Optional[Dict] = None
+    for ts, listened, play in db.execute(sql, _params(start, end, machine, max_segment)):
+        seg_start = max(ts, start)
+        if cur is None or seg_start - cur["end"] > gap:
+            cur = {"start": seg_start, "end": seg_start, "seconds": 0.0, "plays": 0}
+            out.append(cur)
+        cur["end"] = seg_start + listened
+        cur["seconds"] += listened
+        cur["plays"] += play
+    return out
@@ -0,0 +1,98 @@
+# Kafka -> HistoryStore: batched, idempotent ingest of the media topic
+from __future__ import annotations
+import logging
+from typing import List, Optional
+from confluent_kafka import Consumer as KConsumer, KafkaException, KafkaError, TopicPartition
+from pcmedia.metrics import record_kafka_stats
+from pcmedia.serde import Serde
+from src.history.store import HistoryStore, Record
+
+log = logging.getLogger(__name__)
+
+class HistorySink:
+    """
+    Reads the media topic with its own consumer group and appends every event to
+    a HistoryStore, one transaction per consume() batch. The store keeps the
+    next offset per partition; on assignment the consumer starts from there, so
+    a restart neither loses nor re-reads events (Kafka commits are informational
+    only, e.g. for lag monitoring). Replayed messages are skipped by offset.
+    """
+    def __init__(self, store: HistoryStore, brokers: str, topic: str, group_id: str,
+                 auto_offset_reset: str = "earliest", serde: Optional[Serde] = None,
+                 batch_size: int = 2000, batch_linger_ms: int = 500, stats_interval_ms: int = 0,
+                 client=None) -> None:
+        conf = {
+            "bootstrap.servers": brokers,
+            "group.id": group_id,
+            "enable.auto.commit": False,
+            "auto.offset.reset": auto_offset_reset,
+            "session.timeout.ms": 10000,
+            "fetch.min.bytes": 64 * 1024,    # bulk reads: fewer, larger fetches
+        }
+        if stats_interval_ms:
+            conf["statistics.interval.ms"] = stats_interval_ms
+            conf["stats_cb"] = record_kafka_stats
+        self._store = store
+        self._topic = topic
+        # `client` lets tests/benchmarks inject an in-process stand-in for confluent_kafka.Consumer.
+        self._c = client if client is not None else KConsumer(conf)
+        self._serde = serde or Serde()
+        self._batch_size = batch_size
+        self._linger = batch_linger_ms / 1000.0
+        self._running = False
+
+    def stop(self) -> None:
+        self._running = False
+
+    def _on_assign(self, consumer, partitions) -> None:
+        # Resume from the store's position where it has one, the committed/reset offset otherwise.
+        stored = self._store.next_offsets(self._topic)
+        for tp in partitions:
+            if tp.partition in stored:
+                tp.offset = stored[tp.partition]
+        consumer.assign(partitions)
+
+    def _records(self, msgs: List) -> List[Record]:
+        stored = self._store.next_offsets(self._topic)
+        records = []
+        for msg in msgs:
+            if msg.error():
+                if msg.error().code() != KafkaError._PARTITION_EOF:
+                    log.warning("kafka error: %s", msg.error(), extra={"event": "kafka.error"})
+                continue
+            if msg.offset() < stored.get(msg.partition(), 0):
+                continue   # replayed (rebalance, seek): already in the store, skip without decoding
+            try:
+                payload = self._serde.decode(msg.value())
+            except Exception as e:
+                log.warning("invalid payload: %s", e, extra={"event": "payload.invalid"})
+                payload = None   # still advances the stored offset
+            key = msg.key()
+            records.append((msg.partition(), msg.offset(), key.decode("utf-8", "replace") if key else "",
+                            payload, msg.timestamp()[1]))
+        return records
+
+    def run(self) -> None:
+        self._c.subscribe([self._topic], on_assign=self._on_assign)
+        log.info("History sink: %s -> %s (batch x%d)", self._topic, self._store.path, self._batch_size)
+        self._running = True
+        try:
+            while self._running:
+                msgs = self._c.consume(self._batch_size, self._linger)
+                if not msgs:
+                    continue
+                records = self._records(msgs)
+                if not records:
+                    continue
+                self._store.ingest(self._topic, records)
+                stored = self._store.next_offsets(self._topic)
+                self._c.commit(offsets=[
+                    TopicPartition(self._topic, p, stored[p]) for p in {r[0] for r in records}
+                ], asynchronous=True)
+        except KeyboardInterrupt:
+            log.info("Interrupted by user")
+        except KafkaException as e:
+            log.critical("kafka exception: %s", e)
+        finally:
+            self._c.close()
+            log.info("History sink closed")
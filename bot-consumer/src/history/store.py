@@ -0,0 +1,161 @@
+# Listening history: media events in a local SQLite database (WAL), ingested in batches
+from __future__ import annotations
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+from pcmedia.metrics import REGISTRY
+
+log = logging.getLogger(__name__)
+
+_INGESTED = REGISTRY.counter("history_events_total", "Media events offered to the history store", ["outcome"])
+_BATCH_SECONDS = REGISTRY.histogram("history_batch_seconds", "History store ingest transaction time")
+
+# Events reference interned machines and tracks, so a row is a handful of integers plus
+# the status. (kafka_partition, kafka_offset) is the primary key: re-ingesting a
+# replayed message is a no-op. `offsets` holds the next offset per partition, written
+# in the same transaction as the events, so the store itself is the consumer position.
+# One media topic per database.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS machines (
+    id  INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS tracks (
+    id         INTEGER PRIMARY KEY,
+    source_app TEXT NOT NULL,
+    title      TEXT NOT NULL,
+    artist     TEXT NOT NULL,
+    album      TEXT NOT NULL,
+    UNIQUE (artist, title, album, source_app)
+);
+CREATE TABLE IF NOT EXISTS events (
+    kafka_partition INTEGER NOT NULL,
+    kafka_offset    INTEGER NOT NULL,
+    machine_id      INTEGER NOT NULL REFERENCES machines (id),
+    ts              REAL    NOT NULL,          -- payload timestamp, epoch seconds
+    track_id        INTEGER NOT NULL REFERENCES tracks (id),
+    status          TEXT    NOT NULL,
+    PRIMARY KEY (kafka_partition, kafka_offset)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS events_machine_ts ON events (machine_id, ts);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS events_track_ts ON events (track_id, ts);
+CREATE TABLE IF NOT EXISTS offsets (
+    topic           TEXT    NOT NULL,
+    kafka_partition INTEGER NOT NULL,
+    next_offset     INTEGER NOT NULL,
+    PRIMARY KEY (topic, kafka_partition)
+);
+"""
+
+# (partition, offset, machine key, decoded payload or None if undecodable, Kafka timestamp in ms)
+Record = Tuple[int, int, str, Optional[dict], int]
+
+def parse_ts(value, fallback: float) -> float:
+    """ISO-8601 payload timestamp -> epoch seconds (fallback when missing or malformed)."""
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            pass
+    return fallback
+
+class HistoryStore:
+    """
+    Append-optimized event store.
+    - ingest(): one transaction per batch; messages below the stored next offset of
+      their partition are skipped before touching SQLite, others are INSERT OR IGNORE.
+    - Machines and tracks are interned through in-memory caches.
+    - Read queries live in src/history/queries.py; they can run from other
+      connections/processes while ingesting (WAL).
+    """
+    def __init__(self, path: str, cache_mb: int = 64) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")   # WAL: durable at checkpoints, never corrupt
+        self.db.execute(f"PRAGMA cache_size=-{cache_mb * 1024}")
+        self.db.execute("PRAGMA temp_store=MEMORY")
+        self.db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._machines: Dict[str, int] = dict(self.db.execute("SELECT key, id FROM machines"))
+        self._tracks: Dict[Tuple[str, str, str, str], int] = {
+            (a, t, al, s): i for i, s, t, a, al in self.db.execute("SELECT * FROM tracks")
+        }
+        self._next: Dict[Tuple[str, int], int] = {
+            (t, p): o for t, p, o in self.db.execute("SELECT * FROM offsets")
+        }
+
+    def next_offsets(self, topic: str) -> Dict[int, int]:
+        """Partition -> next offset to read (resume point after a restart)."""
+        return {p: o for (t, p), o in self._next.items() if t == topic}
+
+    def _machine_id(self, key: str) -> int:
+        mid = self._machines.get(key)
+        if mid is None:
+            self.db.execute("INSERT OR IGNORE INTO machines (key) VALUES (?)", (key,))
+            mid = self._machines[key] = self.db.execute("SELECT id FROM machines WHERE key = ?", (key,)).fetchone()[0]
+        return mid
+
+    def _track_id(self, payload: dict) -> int:
+        track = (payload.get("artist") or "", payload.get("title") or "",
+                 payload.get("album") or "", payload.get("sourceApp") or "")
+        tid = self._tracks.get(track)
+        if tid is None:
+            cur = self.db.execute(
+                "INSERT OR IGNORE INTO tracks (artist, title, album, source_app) VALUES (?, ?, ?, ?)", track)
+            tid = cur.lastrowid if cur.rowcount else self.db.execute(
+                "SELECT id FROM tracks WHERE artist = ? AND title = ? AND album = ? AND source_app = ?", track
+            ).fetchone()[0]
+            self._tracks[track] = tid
+        return tid
+
+    def ingest(self, topic: str, records: Iterable[Record]) -> int:
+        """Store a batch atomically; returns how many records were new."""
+        with self._lock, _BATCH_SECONDS.time():
+            nexts: Dict[Tuple[str, int], int] = {}
+            rows = []
+            skipped = invalid = 0
+            now = time.time()
+            self.db.execute("BEGIN")
+            try:
+                for partition, offset, key, payload, kafka_ts in records:
+                    tp = (topic, partition)
+                    if offset < nexts.get(tp, self._next.get(tp, 0)):
+                        skipped += 1
+                        continue
+                    nexts[tp] = offset + 1
+                    if payload is None:
+                        invalid += 1
+                        continue
+                    ts = parse_ts(payload.get("timestamp"), kafka_ts / 1000.0 if kafka_ts else now)
+                    rows.append((partition, offset, self._machine_id(key), ts, self._track_id(payload),
+                                 (payload.get("playbackStatus") or "unknown").lower()))
+                self.db.executemany("INSERT OR IGNORE INTO events VALUES (?, ?, ?, ?, ?, ?)", rows)
+                self.db.executemany(
+                    "INSERT INTO offsets VALUES (?, ?, ?) ON CONFLICT (topic, kafka_partition) "
+                    "DO UPDATE SET next_offset = max(next_offset, excluded.next_offset)",
+                    [(t, p, o) for (t, p), o in nexts.items()])
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                # Ids handed out inside the rolled back transaction are gone.
+                self._machines = dict(self.db.execute("SELECT key, id FROM machines"))
+                self._tracks.clear()
+                raise
+            self._next.update(nexts)
+        _INGESTED.inc(len(rows), "stored")
+        _INGESTED.inc(skipped, "replayed")
+        _INGESTED.inc(invalid, "invalid")
+        return len(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self.db.execute("PRAGMA optimize")
+            self.db.close()
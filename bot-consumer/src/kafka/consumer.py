@@ -1,57 +1,343 @@
 # Kafka consumer wrapper with dedup by signature
 from __future__ import annotations
-import json
-from typing import Callable, Dict, Optional
-from confluent_kafka import Consumer as KConsumer, KafkaException, KafkaError
+import logging
+from typing import Callable, Dict, List, Optional, Protocol, Sequence, Tuple, Union
+from confluent_kafka import Consumer as KConsumer, KafkaException, KafkaError, TopicPartition
+from pcmedia.dedupe import Signature, build_signature
+from pcmedia.metrics import REGISTRY, age_seconds, record_kafka_stats
+from pcmedia.retry import RetryBackoff
+from pcmedia.serde import Serde
+from src.kafka.offsets import OffsetTracker
+from src.state.dedupe import DedupeStore
+
+log = logging.getLogger(__name__)
+
+# on_change(payload, machine_key): machine_key is the decoded message key ("" if none).
+# With start(..., deferred=True): on_change(payload, machine_key, done), done() once the message is handled.
+OnChange = Callable[..., None]
+# on_message(msg, payload): a decoded message of a replayed range (see read_range).
+OnMessage = Callable[[object, Dict], None]
+# (topic, partition) -> [start, end) offsets
+Ranges = Dict[Tuple[str, int], Tuple[int, int]]
+
+_CONSUMED = REGISTRY.counter("consumer_messages_total", "Decoded messages by outcome", ["outcome"])
+_HANDLER_SECONDS = REGISTRY.histogram("consumer_handler_seconds", "on_change() time per changed message")
+_CONSUME_AGE = REGISTRY.histogram("media_consume_age_seconds", "Payload timestamp to consume time (agent -> bot)")
+
+def parse_topics(spec: Union[str, Sequence[str]]) -> List[str]:
+    """TOPIC: one topic, a comma-separated list, or regex patterns (librdkafka: a leading "^")."""
+    items = spec.split(",") if isinstance(spec, str) else spec
+    return [t.strip() for t in items if t.strip()]
+
+def _noop() -> None:
+    pass
+
+class Backpressure(Protocol):
+    """Downstream stage that can ask the consumer to pause/resume fetching."""
+    def saturated(self) -> bool: ...
+    def drained(self) -> bool: ...
 
 class KafkaNowPlayingConsumer:
-    """Consumes media events and invokes a callback on change."""
-    def __init__(self, brokers: str, topic: str, group_id: str, auto_offset_reset: str = "latest") -> None:
+    """
+    Consumes media events and invokes a callback when a machine's track/status changes.
+    `topic` may name several topics or patterns (parse_topics); one subscription covers them all.
+    Dedup state is kept per message key (the producer's machine_key) in `dedupe`.
+    - Single mode (batch_size <= 1): poll() one message at a time, auto commit.
+    - Batch mode: consume(batch_size, linger) and commit offsets asynchronously
+      once their messages are handled: when on_change returned, or with
+      start(deferred=True) when it called done() for them (and for every earlier
+      message of the partition, see OffsetTracker).
+    A failing handler (either mode) rewinds its partition so the message is
+    redelivered (at-least-once); the partition stays paused for `retry` backoff
+    meanwhile, while the poll loop keeps serving the others.
+    """
+    def __init__(self, brokers: str, topic: Union[str, Sequence[str]], group_id: str, auto_offset_reset: str = "latest",
+                 serde: Optional[Serde] = None, batch_size: int = 1, batch_linger_ms: int = 100,
+                 dedupe: Optional[DedupeStore] = None, signature: Signature = build_signature,
+                 stats_interval_ms: int = 0, client=None, retry: Optional[RetryBackoff] = None) -> None:
+        self._batch_size = batch_size
+        self._batch_linger = batch_linger_ms / 1000.0
         conf = {
             "bootstrap.servers": brokers,
             "group.id": group_id,
-            "enable.auto.commit": True,
+            "enable.auto.commit": not self.batch_mode,
             "auto.offset.reset": auto_offset_reset,
             "session.timeout.ms": 10000,
         }
-        self._topic = topic
-        self._c = KConsumer(conf)
-        self._last_sig: Optional[str] = None
+        if stats_interval_ms:
+            # Consumer lag per partition etc. (see metrics.record_kafka_stats)
+            conf["statistics.interval.ms"] = stats_interval_ms
+            conf["stats_cb"] = record_kafka_stats
+        self._topics = parse_topics(topic)
+        # `client` lets tests/benchmarks inject an in-process stand-in for confluent_kafka.Consumer.
+        self._c = client if client is not None else KConsumer(conf)
+        self._serde = serde or Serde()
+        self._dedupe = dedupe if dedupe is not None else DedupeStore()
+        self._signature = signature
+        self._paused = False
+        self._retry = retry if retry is not None else RetryBackoff()
+        self._running = False
+        self._deferred = False
+        self._offsets = OffsetTracker()
+        self._committed: Dict[Tuple[str, int], int] = {}
+
+    @property
+    def batch_mode(self) -> bool:
+        return self._batch_size > 1
+
+    def stop(self) -> None:
+        """Ask the loop to exit after the current poll/batch."""
+        self._running = False
 
-    def start(self, on_change: Callable[[Dict], None]) -> None:
-        self._c.subscribe([self._topic])
-        print(f"[i] Subscribed to {self._topic}")
+    def _pause(self) -> None:
+        # Re-pausing is harmless and also covers partitions assigned while paused.
+        self._c.pause(self._c.assignment())
+        if not self._paused:
+            self._paused = True
+            log.info("Delivery queue full: partitions paused")
 
+    def _resume(self) -> None:
+        # Partitions waiting for a retry stay paused until their backoff is over.
+        self._c.resume([tp for tp in self._c.assignment() if (tp.topic, tp.partition) not in self._retry])
+        self._paused = False
+        log.info("Delivery queue drained: partitions resumed")
+
+    @staticmethod
+    def _log_error(msg) -> None:
+        if msg.error().code() != KafkaError._PARTITION_EOF:
+            log.warning("kafka error: %s", msg.error(), extra={"event": "kafka.error"})
+
+    def _decode(self, msg) -> Optional[Dict]:
+        if msg.error():
+            self._log_error(msg)
+            return None
         try:
-            while True:
-                msg = self._c.poll(1.0)
-                if msg is None:
-                    continue
-                if msg.error():
-                    if msg.error().code() != KafkaError._PARTITION_EOF:
-                        print(f"[warn] kafka error: {msg.error()}")
-                    continue
+            return self._serde.decode(msg.value())
+        except Exception as e:
+            log.warning("invalid payload: %s", e, extra={"event": "payload.invalid"})
+            return None
+
+    def _failed(self, msg, exc: Exception) -> None:
+        """Rewind the partition to `msg` and hold it back for the retry backoff."""
+        tp = (msg.topic(), msg.partition())
+        delay = self._retry.fail(tp)
+        log.warning("handler failed at %s[%d]@%d: %s; retry in %.0fs", tp[0], tp[1], msg.offset(), exc, delay,
+                    extra={"event": "handler.failed"})
+        self._c.pause([TopicPartition(tp[0], tp[1])])
+        self._c.seek(TopicPartition(tp[0], tp[1], msg.offset()))
+
+    def _resume_retries(self) -> None:
+        due = self._retry.due()
+        if due:
+            self._c.resume([TopicPartition(t, p) for t, p in due])
+
+    def _dispatch(self, msg, payload: Dict, on_change: OnChange, done: Callable[[], None] = _noop) -> None:
+        tp = (msg.topic(), msg.partition())
+        raw_key = msg.key()
+        key = raw_key.decode("utf-8", "replace") if raw_key is not None else ""
+        sig = self._signature(payload)
+        age = age_seconds(payload.get("timestamp"))
+        if age is not None:
+            _CONSUME_AGE.observe(age)
+
+        if self._dedupe.is_new(tp, key, sig):
+            with _HANDLER_SECONDS.time():
+                if self._deferred:
+                    on_change(payload, key, done)
+                else:
+                    on_change(payload, key)
+            # Only remember the signature once the handler succeeded, so retries are not deduped away.
+            self._dedupe.remember(tp, key, sig)
+            _CONSUMED.inc(1, "changed")
+            self._retry.ok(tp)
+            if not self._deferred:
+                done()
+        else:
+            _CONSUMED.inc(1, "duplicate")
+            done()
 
+    def _handle_batch(self, msgs: List, on_change: OnChange) -> None:
+        failed = set()
+        for msg in msgs:
+            if msg.error():
+                self._log_error(msg)
+                continue
+            tp = (msg.topic(), msg.partition())
+            if tp in failed:
+                continue  # rest of this partition is redelivered after the seek
+            payload = self._decode(msg)
+            if payload is not None:
+                # Without `deferred` a message is finished when on_change returns: no tracking needed.
+                done = self._offsets.begin(tp, msg.offset()) if self._deferred else _noop
                 try:
-                    payload = json.loads(msg.value().decode("utf-8"))
+                    self._dispatch(msg, payload, on_change, done)
                 except Exception as e:
-                    print(f"[warn] invalid json: {e}")
+                    failed.add(tp)
+                    self._offsets.rewind(tp, msg.offset())
+                    self._failed(msg, e)
                     continue
+                if self._deferred:
+                    continue
+            self._offsets.skip(tp, msg.offset())
+
+        self._commit_ready()
+
+    def _commit_ready(self) -> None:
+        """Asynchronously commit partitions whose completion watermark moved since the last commit."""
+        ready = {tp: o for tp, o in self._offsets.committable().items() if self._committed.get(tp) != o}
+        if ready:
+            self._c.commit(
+                offsets=[TopicPartition(t, p, o) for (t, p), o in ready.items()],
+                asynchronous=True,
+            )
+            self._committed.update(ready)
+
+    def _commit_sync(self, partitions: Optional[List] = None) -> None:
+        """Synchronously commit the completion watermarks (all, or only `partitions`) and forget them."""
+        ready = self._offsets.committable()
+        keys = list(ready) if partitions is None else [
+            (tp.topic, tp.partition) for tp in partitions if (tp.topic, tp.partition) in ready
+        ]
+        if keys:
+            try:
+                self._c.commit(
+                    offsets=[TopicPartition(t, p, ready[(t, p)]) for t, p in keys],
+                    asynchronous=False,
+                )
+            except KafkaException as e:
+                log.warning("offset commit failed: %s", e)
+        self._forget(keys)
+
+    def _forget(self, keys: List[Tuple[str, int]]) -> None:
+        self._offsets.forget(keys)
+        for key in keys:
+            self._committed.pop(key, None)
+
+    def _on_assign(self, consumer, partitions) -> None:
+        self._dedupe.on_assign(partitions)
+
+    def _on_revoke(self, consumer, partitions) -> None:
+        self._retry.forget([(tp.topic, tp.partition) for tp in partitions])
+        if self.batch_mode:
+            self._commit_sync(partitions)
+        self._dedupe.on_revoke(partitions)
+
+    def _on_lost(self, consumer, partitions) -> None:
+        # Ownership is already gone: offsets can't be committed, just drop the state.
+        self._forget([(tp.topic, tp.partition) for tp in partitions])
+        self._retry.forget([(tp.topic, tp.partition) for tp in partitions])
+        self._dedupe.on_revoke(partitions)
+
+    def read_range(self, ranges: Ranges, on_message: OnMessage, changes_only: bool = False,
+                   on_read: Optional[Callable[[object], None]] = None) -> int:
+        """
+        Replay: assign the partitions of `ranges` directly (no group membership, no
+        commits) and hand every decodable message in [start, end) to `on_message`,
+        as fast as consume() delivers them. With `changes_only`, messages the dedup
+        state would drop are skipped too. `on_read(msg)` sees every message of the
+        range, skipped or not (progress). Returns once every range is read (a
+        partition EOF also ends its range: offsets may be missing under compaction
+        or transactions) or after stop(); returns the number of messages read.
+        """
+        remaining = {tp: end for tp, (start, end) in ranges.items() if end > start}
+        self._c.assign([TopicPartition(t, p, ranges[(t, p)][0]) for t, p in remaining])
+        log.info("Replaying %d partition(s), %d message(s)", len(remaining),
+                 sum(end - ranges[tp][0] for tp, end in remaining.items()))
+        read = 0
+        self._running = True
+        try:
+            while self._running and remaining:
+                for msg in self._c.consume(max(self._batch_size, 1), self._batch_linger or 0.1):
+                    tp = (msg.topic(), msg.partition())
+                    if msg.error():
+                        if msg.error().code() == KafkaError._PARTITION_EOF:
+                            self._end_range(remaining, tp)
+                        else:
+                            self._log_error(msg)
+                        continue
+                    end = remaining.get(tp)
+                    if end is None or msg.offset() >= end:
+                        continue
+                    read += 1
+                    if on_read is not None:
+                        on_read(msg)
+                    payload = self._decode(msg)
+                    if payload is not None:
+                        if not changes_only:
+                            on_message(msg, payload)
+                        else:
+                            raw_key = msg.key()
+                            key = raw_key.decode("utf-8", "replace") if raw_key is not None else ""
+                            sig = self._signature(payload)
+                            if self._dedupe.is_new(tp, key, sig):
+                                on_message(msg, payload)
+                                self._dedupe.remember(tp, key, sig)
+                    if msg.offset() + 1 >= end:
+                        self._end_range(remaining, tp)
+        finally:
+            self._c.close()
+        return read
+
+    def _end_range(self, remaining: Dict[Tuple[str, int], int], tp: Tuple[str, int]) -> None:
+        if remaining.pop(tp, None) is not None:
+            self._c.pause([TopicPartition(tp[0], tp[1])])
+
+    def start(self, on_change: OnChange, backpressure: Optional[Backpressure] = None, deferred: bool = False,
+              drain: Optional[Callable[[], None]] = None) -> None:
+        """
+        Poll loop. `on_change` should return quickly; when `backpressure` is given,
+        partitions are paused while it is saturated (poll keeps the session alive).
+        With `deferred`, on_change also gets a done() callback and batch mode commits
+        a message's offset only after done() (single mode keeps auto commit).
+        `drain` runs when the loop ends, before the final commit (flush downstream stages).
+        """
+        self._deferred = deferred
+        self._c.subscribe(self._topics, on_assign=self._on_assign, on_revoke=self._on_revoke,
+                          on_lost=self._on_lost)
+        mode = f"batch x{self._batch_size}" if self.batch_mode else "single"
+        log.info("Subscribed to %s (%s)", ", ".join(self._topics), mode)
+
+        self._running = True
+        try:
+            while self._running:
+                if self._paused and backpressure is not None and backpressure.drained():
+                    self._resume()
+                if not self._paused:
+                    self._resume_retries()
+                # Poll more often while paused or retrying so resume is not delayed by a full second.
+                timeout = 0.1 if self._paused or self._retry else 1.0
 
-                sig = json.dumps([
-                    payload.get("sourceApp"),
-                    payload.get("title"),
-                    payload.get("artist"),
-                    payload.get("playbackStatus"),
-                ], ensure_ascii=False)
+                if self.batch_mode:
+                    msgs = self._c.consume(self._batch_size, min(timeout, self._batch_linger))
+                    if not msgs:
+                        self._commit_ready()   # deliveries keep finishing while the topic is idle
+                        continue
+                    self._handle_batch(msgs, on_change)
+                else:
+                    msg = self._c.poll(timeout)
+                    if msg is None:
+                        continue
+                    payload = self._decode(msg)
+                    if payload is None:
+                        continue
+                    try:
+                        self._dispatch(msg, payload, on_change)
+                    except Exception as e:
+                        self._failed(msg, e)
 
-                if sig != self._last_sig:
-                    self._last_sig = sig
-                    on_change(payload)
+                if backpressure is not None and backpressure.saturated():
+                    self._pause()
         except KeyboardInterrupt:
-            print("\n[!] Interrupted by user")
+            log.info("Interrupted by user")
         except KafkaException as e:
-            print(f"[fatal] kafka exception: {e}")
+            log.critical("kafka exception: %s", e)
         finally:
+            if drain is not None:
+                drain()
+            if self.batch_mode:
+                if self._offsets.in_flight():
+                    log.warning("%d message(s) not handled: redelivered after restart", self._offsets.in_flight())
+                self._commit_sync()
+            self._dedupe.snapshot()
             self._c.close()
-            print("[i] Consumer closed")
+            log.info("Consumer closed")
@@ -0,0 +1,62 @@
+# Per-partition completion watermarks: which offsets are safe to commit
+from __future__ import annotations
+import threading
+from typing import Callable, Dict, Iterable, Tuple
+
+TP = Tuple[str, int]
+
+class OffsetTracker:
+    """
+    Batch-mode commit positions when messages finish after the handler returned
+    (queued for coalescing / delivery). begin() marks an offset in flight and
+    returns its done() callback, callable once from any thread; committable()
+    gives, per partition, the offset after the last message of an unbroken run
+    of finished ones, so nothing still in flight is ever committed.
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # tp -> {offset: token} in consume order (offsets only grow within a partition)
+        self._pending: Dict[TP, Dict[int, object]] = {}
+        self._next: Dict[TP, int] = {}
+
+    def begin(self, tp: TP, offset: int) -> Callable[[], None]:
+        token = object()
+        with self._lock:
+            self._pending.setdefault(tp, {})[offset] = token
+            self._next[tp] = offset + 1
+        return lambda: self._done(tp, offset, token)
+
+    def _done(self, tp: TP, offset: int, token: object) -> None:
+        with self._lock:
+            pending = self._pending.get(tp)
+            # A token from before a revoke/rewind no longer matches and is ignored.
+            if pending is not None and pending.get(offset) is token:
+                del pending[offset]
+
+    def skip(self, tp: TP, offset: int) -> None:
+        """A message with nothing to wait for (undecodable, or handled once on_change returned)."""
+        with self._lock:
+            self._next[tp] = offset + 1
+
+    def rewind(self, tp: TP, offset: int) -> None:
+        """The handler failed at `offset` and the partition was seeked back to it."""
+        with self._lock:
+            pending = self._pending.get(tp)
+            if pending is not None:
+                pending.pop(offset, None)
+            self._next[tp] = offset
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return sum(len(p) for p in self._pending.values())
+
+    def committable(self) -> Dict[TP, int]:
+        with self._lock:
+            return {tp: next(iter(self._pending.get(tp) or ()), nxt) for tp, nxt in self._next.items()}
+
+    def forget(self, tps: Iterable[TP]) -> None:
+        """Drop revoked/lost partitions; their late done() calls are ignored."""
+        with self._lock:
+            for tp in tps:
+                self._pending.pop(tp, None)
+                self._next.pop(tp, None)
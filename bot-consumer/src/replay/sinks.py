@@ -0,0 +1,137 @@
+# Replay sinks: where replayed media events go (compressed JSONL, Parquet, another topic)
+from __future__ import annotations
+import gzip
+import json
+import logging
+from typing import Dict, List, Optional, Protocol
+
+log = logging.getLogger(__name__)
+
+# Parquet columns taken from the payload (others are dropped); Kafka metadata comes first.
+MEDIA_FIELDS = ("timestamp", "sourceApp", "title", "artist", "album", "playbackStatus")
+
+class Sink(Protocol):
+    def write(self, msg, payload: Dict) -> None: ...
+    def close(self) -> None: ...
+
+def record(msg, payload: Dict) -> Dict:
+    """A replayed message as exported: where it was in Kafka, its key and the decoded payload."""
+    key = msg.key()
+    return {"topic": msg.topic(), "partition": msg.partition(), "offset": msg.offset(),
+            "ts": msg.timestamp()[1], "key": key.decode("utf-8", "replace") if key is not None else None,
+            "payload": payload}
+
+class JsonlSink:
+    """One JSON object per line (see record()), gzip-compressed when `path` ends in .gz."""
+    def __init__(self, path: str, compresslevel: int = 6) -> None:
+        self.path = path
+        if path.endswith(".gz"):
+            self._f = gzip.open(path, "wt", encoding="utf-8", compresslevel=compresslevel)
+        else:
+            self._f = open(path, "w", encoding="utf-8")
+        self.written = 0
+
+    def write(self, msg, payload: Dict) -> None:
+        self._f.write(json.dumps(record(msg, payload), ensure_ascii=False))
+        self._f.write("\n")
+        self.written += 1
+
+    def close(self) -> None:
+        self._f.close()
+
+class ParquetSink:
+    """
+    Columnar export (requires pyarrow): topic, partition, offset, ts (ms), key and the
+    MEDIA_FIELDS of the payload, written in row groups of `row_group_size`, zstd-compressed.
+    """
+    def __init__(self, path: str, row_group_size: int = 100_000, compression: str = "zstd") -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export requires the pyarrow package") from None
+        self.path = path
+        self._pa = pa
+        self._schema = pa.schema(
+            [("topic", pa.string()), ("partition", pa.int32()), ("offset", pa.int64()),
+             ("ts", pa.int64()), ("key", pa.string())]
+            + [(f, pa.string()) for f in MEDIA_FIELDS]
+        )
+        self._writer = pq.ParquetWriter(path, self._schema, compression=compression)
+        self._rows = row_group_size
+        self._columns: Dict[str, List] = {name: [] for name in self._schema.names}
+        self.written = 0
+
+    def write(self, msg, payload: Dict) -> None:
+        row = record(msg, payload)
+        cols = self._columns
+        for name in ("topic", "partition", "offset", "ts", "key"):
+            cols[name].append(row[name])
+        for f in MEDIA_FIELDS:
+            value = payload.get(f)
+            cols[f].append(None if value is None else str(value))
+        self.written += 1
+        if len(cols["offset"]) >= self._rows:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._columns["offset"]:
+            self._writer.write_table(self._pa.Table.from_pydict(self._columns, schema=self._schema))
+            self._columns = {name: [] for name in self._schema.names}
+
+    def close(self) -> None:
+        self._flush()
+        self._writer.close()
+
+class RepublishSink:
+    """
+    Produces every replayed message, unchanged (key, value bytes, headers), to `topic`,
+    on `brokers` or through `producer` (e.g. an in-process stand-in). close() flushes
+    and fails if any record was not delivered.
+    """
+    def __init__(self, topic: str, brokers: str = "", producer=None, linger_ms: int = 50) -> None:
+        if producer is None:
+            from confluent_kafka import Producer
+            producer = Producer({"bootstrap.servers": brokers, "linger.ms": linger_ms, "compression.type": "lz4",
+                                 "acks": "all", "enable.idempotence": True, "client.id": "pc-media-replay"})
+        self.topic = topic
+        self._p = producer
+        self.written = 0
+        self.failed = 0
+        self._error: Optional[str] = None
+
+    def _on_delivery(self, err, msg) -> None:
+        if err is not None:
+            self.failed += 1
+            self._error = str(err)
+
+    def write(self, msg, payload: Dict) -> None:
+        while True:
+            try:
+                self._p.produce(self.topic, value=msg.value(), key=msg.key(), headers=msg.headers(),
+                                on_delivery=self._on_delivery)
+                break
+            except BufferError:
+                self._p.poll(0.1)   # local queue full: serve deliveries and retry
+        self.written += 1
+        if self.written % 1000 == 0:
+            self._p.poll(0)
+
+    def close(self) -> None:
+        left = self._p.flush(60)
+        if left or self.failed:
+            raise RuntimeError(f"republish to {self.topic}: {self.failed} failed, {left} undelivered"
+                               + (f" (last error: {self._error})" if self._error else ""))
+
+def open_sink(spec: str, brokers: str = "") -> Sink:
+    """
+    "events.jsonl.gz" / "events.jsonl" (JSONL), "events.parquet" (Parquet) or
+    "topic:NAME" (re-publish to NAME on `brokers`).
+    """
+    if spec.startswith("topic:"):
+        return RepublishSink(spec[len("topic:"):], brokers)
+    if spec.endswith(".parquet"):
+        return ParquetSink(spec)
+    if spec.endswith((".jsonl", ".jsonl.gz", ".json.gz")):
+        return JsonlSink(spec)
+    raise ValueError(f"unknown sink {spec!r}: use a .jsonl[.gz] or .parquet path, or topic:NAME")
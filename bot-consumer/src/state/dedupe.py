@@ -0,0 +1,123 @@
+# Per-machine dedup state: last change signature per (partition, message key)
+from __future__ import annotations
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, Optional, Tuple
+from src.state.files import locked, write_json
+
+log = logging.getLogger(__name__)
+
+Partition = Tuple[str, int]               # (topic, partition)
+Slot = Tuple[str, int, str]               # (topic, partition, machine key)
+
+def _dump_sig(sig: Hashable):
+    if isinstance(sig, bytes):
+        return {"digest": sig.hex()}
+    return list(sig) if isinstance(sig, tuple) else sig
+
+def _load_sig(raw) -> Hashable:
+    # JSON turns tuples into lists and can't hold bytes; signatures must stay hashable.
+    if isinstance(raw, dict):
+        return bytes.fromhex(raw["digest"])
+    return tuple(raw) if isinstance(raw, list) else raw
+
+class DedupeStore:
+    """
+    Bounded LRU + TTL map of the last signature seen for each machine.
+    Partition-aware: on_revoke() drops (after snapshotting) the state of partitions
+    this consumer no longer owns; on_assign() reloads them from the snapshot.
+    The snapshot file can be shared by every consumer of the group (worker processes):
+    each one merges its partitions into it under a file lock.
+    """
+    def __init__(self, max_entries: int = 100_000, ttl_sec: float = 86_400,
+                 snapshot_path: Optional[str] = None, snapshot_interval_sec: float = 30.0,
+                 clock: Callable[[], float] = time.time) -> None:
+        self._max = max_entries
+        self._ttl = ttl_sec
+        self._path = snapshot_path
+        self._interval = snapshot_interval_sec
+        self._clock = clock
+        self._entries: "OrderedDict[Slot, Tuple[Hashable, float]]" = OrderedDict()
+        self._dirty = False
+        self._last_snapshot = clock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def is_new(self, tp: Partition, key: str, sig: Hashable) -> bool:
+        """True if `sig` differs from the last remembered signature for this machine."""
+        slot = (tp[0], tp[1], key)
+        entry = self._entries.get(slot)
+        if entry is None:
+            return True
+        old_sig, stamp = entry
+        if self._ttl and self._clock() - stamp > self._ttl:
+            del self._entries[slot]
+            return True
+        return old_sig != sig
+
+    def remember(self, tp: Partition, key: str, sig: Hashable) -> None:
+        slot = (tp[0], tp[1], key)
+        now = self._clock()
+        self._entries[slot] = (sig, now)
+        self._entries.move_to_end(slot)
+        if len(self._entries) > self._max:
+            self._entries.popitem(last=False)
+        self._dirty = True
+        if self._path and now - self._last_snapshot >= self._interval:
+            self.snapshot()
+
+    # ---- rebalance hooks ----
+    def on_assign(self, partitions: Iterable) -> None:
+        """Rebuild state for newly assigned partitions from the snapshot (if any)."""
+        wanted = {(tp.topic, tp.partition) for tp in partitions}
+        if not wanted or not self._path:
+            return
+        now = self._clock()
+        loaded = 0
+        for (topic, partition, key), (sig, stamp) in self._read_snapshot():
+            if (topic, partition) in wanted and (not self._ttl or now - stamp <= self._ttl):
+                self._entries.setdefault((topic, partition, key), (sig, stamp))
+                loaded += 1
+        if loaded:
+            log.info("Dedup state restored for %d machine(s)", loaded)
+
+    def on_revoke(self, partitions: Iterable) -> None:
+        """Snapshot, then forget partitions that move to another consumer."""
+        gone = {(tp.topic, tp.partition) for tp in partitions}
+        if not gone:
+            return
+        if self._path:
+            self.snapshot()
+        for slot in [s for s in self._entries if (s[0], s[1]) in gone]:
+            del self._entries[slot]
+
+    # ---- persistence ----
+    def snapshot(self) -> None:
+        """Write the state to disk atomically, merged with partitions owned elsewhere."""
+        if not self._path:
+            return
+        if self._dirty:
+            with locked(self._path):
+                merged: Dict[Slot, Tuple[Hashable, float]] = dict(self._read_snapshot())
+                for slot, entry in self._entries.items():
+                    # The newest signature wins: a partition's last owner may have written it after us.
+                    if slot not in merged or merged[slot][1] <= entry[1]:
+                        merged[slot] = entry
+                now = self._clock()
+                write_json(self._path, [[t, p, k, _dump_sig(sig), stamp]
+                                        for (t, p, k), (sig, stamp) in merged.items()
+                                        if not self._ttl or now - stamp <= self._ttl])
+            self._dirty = False
+        self._last_snapshot = self._clock()
+
+    def _read_snapshot(self) -> Iterable[Tuple[Slot, Tuple[Hashable, float]]]:
+        try:
+            with open(self._path, "r", encoding="utf-8") as f:
+                rows = json.load(f)
+        except (OSError, ValueError):
+            return []
+        return [((t, p, k), (_load_sig(sig), stamp))
+                for t, p, k, sig, stamp in rows]
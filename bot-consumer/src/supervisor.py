@@ -0,0 +1,168 @@
+# Multiprocess mode: N worker processes in one consumer group, restarted on crash, stats merged here
+from __future__ import annotations
+import logging
+import multiprocessing as mp
+import queue
+import signal
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+from pcmedia.metrics import REGISTRY, Registry, Snapshot, merge_snapshots
+
+log = logging.getLogger(__name__)
+
+_WORKERS = REGISTRY.gauge("supervisor_workers_alive", "Worker processes currently running")
+_RESTARTS = REGISTRY.counter("supervisor_restarts_total", "Worker processes restarted after exiting", ["worker"])
+
+def _child(target: Callable, index: int, args: Sequence, stats: "mp.Queue", interval: float) -> None:
+    """Worker process body: ships REGISTRY snapshots to the parent while target(index, *args) runs."""
+    # Ctrl-C reaches the whole process group; the supervisor turns it into one orderly SIGTERM.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    done = threading.Event()
+
+    def report() -> None:
+        while not done.wait(interval):
+            stats.put((index, REGISTRY.snapshot()))
+
+    threading.Thread(target=report, name="worker-stats", daemon=True).start()
+    try:
+        target(index, *args)
+    finally:
+        done.set()
+        stats.put((index, REGISTRY.snapshot()))
+
+class _Slot:
+    __slots__ = ("index", "process", "started", "backoff", "restart_at")
+
+    def __init__(self, index: int) -> None:
+        self.index = index
+        self.process: Optional[mp.Process] = None
+        self.started = 0.0
+        self.backoff = 1.0
+        self.restart_at = 0.0
+
+class Supervisor:
+    """
+    Runs target(index, *args) in `workers` processes ("spawn": no librdkafka state is
+    forked) and keeps them running:
+    - A worker that exits while the supervisor is running is restarted; one that
+      dies within `stable_sec` of starting waits twice as long as last time (up to
+      `max_backoff_sec`) before the next attempt.
+    - SIGTERM/SIGINT (or stop()) forwards SIGTERM to every worker and waits up to
+      `stop_timeout_sec` for them to drain and commit before killing stragglers.
+    - Workers send REGISTRY snapshots every `stats_interval_sec`; `registry` holds
+      their merge (counters of restarted workers keep counting), so one /metrics
+      endpoint covers the fleet.
+    """
+    def __init__(self, target: Callable, workers: int, args: Sequence = (), stop_timeout_sec: float = 30.0,
+                 stats_interval_sec: float = 5.0, stable_sec: float = 30.0, max_backoff_sec: float = 30.0,
+                 registry: Registry = REGISTRY) -> None:
+        self._target = target
+        self._args = tuple(args)
+        self._stop_timeout = stop_timeout_sec
+        self._stats_interval = stats_interval_sec
+        self._stable = stable_sec
+        self._max_backoff = max_backoff_sec
+        self.registry = registry
+        self._ctx = mp.get_context("spawn")
+        self._stats = self._ctx.Queue()
+        self._slots = [_Slot(i) for i in range(max(1, workers))]
+        self._live: Dict[str, Snapshot] = {}
+        self._retired: Dict[str, Snapshot] = {}
+        self._stopping = threading.Event()
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def snapshot(self) -> Snapshot:
+        """The merged worker stats received so far."""
+        return merge_snapshots({**self._retired, **self._live})
+
+    def _start(self, slot: _Slot) -> None:
+        slot.process = self._ctx.Process(
+            target=_child, args=(self._target, slot.index, self._args, self._stats, self._stats_interval),
+            name=f"worker-{slot.index}", daemon=False,
+        )
+        slot.process.start()
+        slot.started = time.monotonic()
+        log.info("worker %d started (pid %s)", slot.index, slot.process.pid, extra={"event": "worker.started"})
+
+    def _retire(self, index: int) -> None:
+        """Fold an exited worker's last counters into the totals so its successor adds to them."""
+        snapshot = self._live.pop(str(index), None)
+        if snapshot is None:
+            return
+        counts = {name: m for name, m in snapshot.items() if m[0] != "gauge"}
+        key = f"{index}.{len(self._retired)}"
+        self._retired[key] = counts
+
+    def _collect(self, timeout: float) -> None:
+        try:
+            index, snapshot = self._stats.get(timeout=timeout)
+        except queue.Empty:
+            return
+        self._live[str(index)] = snapshot
+        while True:
+            try:
+                index, snapshot = self._stats.get_nowait()
+            except queue.Empty:
+                break
+            self._live[str(index)] = snapshot
+        self.registry.restore(self.snapshot())
+
+    def _check(self, slot: _Slot) -> None:
+        now = time.monotonic()
+        proc = slot.process
+        if proc is not None and not proc.is_alive():
+            proc.join()
+            uptime = now - slot.started
+            slot.backoff = 1.0 if uptime >= self._stable else min(slot.backoff * 2, self._max_backoff)
+            slot.restart_at = now + (0.0 if uptime >= self._stable else slot.backoff)
+            log.warning("worker %d exited with code %s after %.0fs; restarting in %.0fs", slot.index,
+                        proc.exitcode, uptime, slot.restart_at - now, extra={"event": "worker.exited"})
+            self._collect(0.0)
+            self._retire(slot.index)
+            slot.process = None
+            _RESTARTS.inc(1, str(slot.index))
+        if slot.process is None and now >= slot.restart_at:
+            self._start(slot)
+
+    def _alive(self) -> List[mp.Process]:
+        return [s.process for s in self._slots if s.process is not None and s.process.is_alive()]
+
+    def run(self) -> None:
+        """Start the workers and supervise them until SIGTERM/SIGINT or stop()."""
+        previous = {sig: signal.signal(sig, lambda *_: self._stopping.set()) for sig in (signal.SIGTERM, signal.SIGINT)}
+        log.info("Starting %d worker process(es)", len(self._slots))
+        try:
+            for slot in self._slots:
+                self._start(slot)
+            while not self._stopping.is_set():
+                self._collect(0.5)
+                for slot in self._slots:
+                    self._check(slot)
+                _WORKERS.set(len(self._alive()))
+        finally:
+            self._shutdown()
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+
+    def _shutdown(self) -> None:
+        alive = self._alive()
+        log.info("Stopping %d worker(s)", len(alive))
+        for proc in alive:
+            proc.terminate()   # SIGTERM: the worker stops consuming, drains and commits
+        deadline = time.monotonic() + self._stop_timeout
+        while self._alive() and time.monotonic() < deadline:
+            self._collect(0.2)
+        for proc in self._alive():
+            log.warning("worker %s did not stop in %.0fs; killing it", proc.name, self._stop_timeout,
+                        extra={"event": "worker.killed"})
+            proc.kill()
+        for slot in self._slots:
+            if slot.process is not None:
+                slot.process.join()
+        self._collect(0.2)
+        self.registry.restore(self.snapshot())
+        _WORKERS.set(0)
+        log.info("Workers stopped")
@@ -0,0 +1,127 @@
+# Async Telegram Bot API client: pooled keep-alive session, rate limits and retries
+from __future__ import annotations
+import asyncio
+import logging
+import random
+import time
+from typing import Optional
+import aiohttp
+from pcmedia.metrics import REGISTRY
+from src.telegram.ratelimit import ChatRateLimiter
+
+log = logging.getLogger(__name__)
+
+TELEGRAM_API_BASE = "https://api.telegram.org"
+
+_REQUEST_SECONDS = REGISTRY.histogram("telegram_request_seconds", "Bot API HTTP round trip", ["method"])
+_RESPONSES = REGISTRY.counter("telegram_responses_total", "Bot API responses by HTTP status", ["method", "status"])
+_THROTTLED = REGISTRY.counter("telegram_throttled_total", "Bot API 429 responses", ["method"])
+
+class TelegramAPIError(Exception):
+    """Non-retryable Bot API error (or retries exhausted)."""
+    def __init__(self, description: str, status: Optional[int] = None) -> None:
+        super().__init__(description)
+        self.status = status
+
+class AsyncTelegramClient:
+    """
+    Bot API client backed by one aiohttp session (persistent connection pool).
+    - 429: waits `parameters.retry_after` and retries (does not count as an attempt),
+      until a call has waited `max_throttle_sec` in total (0: no limit).
+    - 5xx / network errors: jittered exponential backoff, up to `max_retries`.
+    - Other 4xx: raises TelegramAPIError immediately.
+    """
+    def __init__(self, bot_token: str, chat_id: str, api_base: str = TELEGRAM_API_BASE,
+                 limiter: Optional[ChatRateLimiter] = None, pool_size: int = 20,
+                 timeout: float = 10.0, max_retries: int = 8, max_throttle_sec: float = 300.0,
+                 backoff_base: float = 0.5, backoff_cap: float = 30.0) -> None:
+        self._chat_id = chat_id
+        self._base = f"{api_base.rstrip('/')}/bot{bot_token}"
+        self._limiter = limiter if limiter is not None else ChatRateLimiter()
+        self._pool_size = pool_size
+        self._timeout = timeout
+        self._max_retries = max_retries
+        self._max_throttle = max_throttle_sec
+        self._backoff_base = backoff_base
+        self._backoff_cap = backoff_cap
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def chat_id(self) -> str:
+        return self._chat_id
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Created lazily so it binds to the running loop.
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self._pool_size, keepalive_timeout=60, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self._timeout),
+            )
+        return self._session
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter": uniform in [0, min(cap, base * 2^attempt)].
+        return random.uniform(0, min(self._backoff_cap, self._backoff_base * (2 ** attempt)))
+
+    async def call(self, method: str, params: dict) -> dict:
+        """Call a Bot API method and return its `result`."""
+        chat_id = str(params.get("chat_id") or "")
+        attempt = 0
+        throttled = 0.0
+        while True:
+            await self._limiter.acquire(chat_id)
+            started = time.perf_counter()
+            try:
+                async with self._get_session().post(f"{self._base}/{method}", json=params) as resp:
+                    body = await resp.json(content_type=None)
+                    status = resp.status
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as exc:
+                body, status = {"description": f"{type(exc).__name__}: {exc}"}, None
+            _REQUEST_SECONDS.observe(time.perf_counter() - started, method)
+            _RESPONSES.inc(1, method, status or "error")
+
+            if status == 200 and body.get("ok"):
+                return body.get("result") or {}
+
+            description = body.get("description") or f"HTTP {status}"
+            if status == 429:
+                _THROTTLED.inc(1, method)
+                retry_after = (body.get("parameters") or {}).get("retry_after")
+                retry_after = 1.0 if retry_after is None else float(retry_after)
+                throttled += retry_after
+                if self._max_throttle and throttled > self._max_throttle:
+                    # Give the delivery worker back instead of holding it for a chat that stays limited.
+                    raise TelegramAPIError(f"still rate limited after {throttled - retry_after:.0f}s: {description}",
+                                           status)
+                log.warning("telegram 429 on chat %s: retry in %.0fs", chat_id, retry_after,
+                            extra={"event": "telegram.throttled"})
+                if not self._limiter.penalize(chat_id, retry_after):
+                    await asyncio.sleep(retry_after)
+                continue
+            if status is not None and 400 <= status < 500:
+                raise TelegramAPIError(description, status)
+
+            attempt += 1
+            if attempt > self._max_retries:
+                raise TelegramAPIError(f"giving up after {attempt} attempts: {description}", status)
+            await asyncio.sleep(self._backoff(attempt))
+
+    async def send_text_html(self, html: str, chat_id: Optional[str] = None) -> dict:
+        return await self.call("sendMessage", {
+            "chat_id": chat_id or self._chat_id,
+            "text": html,
+            "parse_mode": "HTML",
+        })
+
+    async def edit_text_html(self, chat_id: str, message_id: int, html: str) -> dict:
+        return await self.call("editMessageText", {
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "text": html,
+            "parse_mode": "HTML",
+        })
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
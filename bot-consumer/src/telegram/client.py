@@ -1,22 +1,46 @@
 # Minimal Telegram client for sendMessage (HTML mode)
 from __future__ import annotations
-import requests
+import asyncio
+import threading
+from typing import Optional
+from src.telegram.async_client import TELEGRAM_API_BASE, AsyncTelegramClient
 
 class TelegramClient:
-    """Tiny wrapper around Telegram Bot API for sendMessage."""
-    def __init__(self, bot_token: str, chat_id: str) -> None:
-        self._chat_id = chat_id
-        self._url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-
-    def send_text_html(self, html: str) -> None:
-        try:
-            resp = requests.post(self._url, json={
-                "chat_id": self._chat_id,
-                "text": html,
-                "parse_mode": "HTML",
-                # "disable_web_page_preview": True,
-                # "disable_notification": True,
-            }, timeout=10)
-            resp.raise_for_status()
-        except Exception as exc:
-            print(f"[warn] telegram send failed: {exc}")
+    """
+    Blocking facade over AsyncTelegramClient for thread-based callers.
+    All calls share one event loop thread, one connection pool and one rate limiter.
+    """
+    def __init__(self, bot_token: str, chat_id: str, api_base: str = TELEGRAM_API_BASE, **client_kwargs) -> None:
+        self._client = AsyncTelegramClient(bot_token, chat_id, api_base=api_base, **client_kwargs)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="telegram-http", daemon=True)
+        self._thread.start()
+
+    @property
+    def chat_id(self) -> str:
+        return self._client.chat_id
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def call(self, method: str, params: dict) -> dict:
+        """Run a Bot API call on the client loop and wait for its result."""
+        return self._run(self._client.call(method, params))
+
+    def send_html(self, html: str, chat_id: Optional[str] = None) -> int:
+        """sendMessage; returns the new message_id. Raises TelegramAPIError on failure."""
+        result = self._run(self._client.send_text_html(html, chat_id=chat_id))
+        return int(result.get("message_id") or 0)
+
+    def edit_html(self, chat_id: str, message_id: int, html: str) -> None:
+        """editMessageText. Raises TelegramAPIError on failure."""
+        self._run(self._client.edit_text_html(chat_id, message_id, html))
+
+    def send_text_html(self, html: str, chat_id: Optional[str] = None) -> None:
+        """sendMessage. Raises TelegramAPIError when rejected or once retries are exhausted."""
+        self._run(self._client.send_text_html(html, chat_id=chat_id))
+
+    def close(self, timeout: float = 5.0) -> None:
+        asyncio.run_coroutine_threadsafe(self._client.close(), self._loop).result(timeout)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
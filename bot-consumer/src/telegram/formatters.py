@@ -1,60 +1,166 @@
 # Helpers for HTML escaping and message formatting
 from __future__ import annotations
-from datetime import datetime, timezone
-from typing import Optional, Dict
+import os
+from datetime import datetime, timezone, tzinfo
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Mapping, NamedTuple, Optional, Tuple, Union
 
 def escape_html(s: Optional[str]) -> str:
     """Escape HTML for Telegram parse_mode=HTML."""
     s = s or ""
     return s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
 
-def format_source_app(app: Optional[str]) -> str:
-    """Map known app ids to nicer labels."""
-    if not app:
-        return "Unknown App 💻"
-    if "Spotify" in app:
-        return "Spotify 💚"
-    return app
-
-def format_timestamp_iso_to_local(ts_iso: Optional[str]) -> str:
-    """Convierte un ISO-8601 a hora local de la computadora (dd/mm/YYYY HH:MM:SS)."""
-    if not ts_iso:
-        return ""
-    dt = datetime.fromisoformat(ts_iso)
-    # Si viene sin zona horaria, asumimos UTC (ajústalo si prefieres otra cosa)
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
-    local_dt = dt.astimezone()  # usa la zona horaria local del sistema
-    return local_dt.strftime("%d/%m/%Y %H:%M:%S")
-
-def format_message_html(payload: Dict, prefix: str = "[NowPlaying]") -> str:
-    """Build a rich HTML message with bold/italic and an icon for status."""
-    title   = escape_html(payload.get("title", "Unknown title"))
-    artist  = escape_html(payload.get("artist", "")) or None
-    app     = escape_html(payload.get("sourceApp", "")) or None
-    status  = escape_html(payload.get("playbackStatus", "")) or None
-    ts_iso  = escape_html(payload.get("timestamp", "")) or None
-
-    # Leading status icon
-    icon = ""
-    if status:
-        icon = "<b><i>Playing ▶️</i></b>" if status == "playing" else "<b><i>Paused ⏸️</i></b>"
-
-    lines = []
-    if icon:
-        lines.append(icon)
-
-    lines.append(f"<b>{escape_html(prefix)}</b> {title}")
-    if artist:
-        lines.append(f"— 🎤 <i>{artist}</i>")
-
-    meta = []
-    if app:
-        meta.append(f"<b>App:</b> {format_source_app(app)}")
-    if meta:
-        lines.append("\n" + "\n".join(meta))
-
-    if ts_iso:
-        lines.append(f"🕑 {format_timestamp_iso_to_local(ts_iso)}")
-
-    return "\n".join(lines)
+# Per-locale message text (MESSAGE_LOCALE); add a locale by adding an entry with the same keys.
+LOCALES: Dict[str, Dict[str, str]] = {
+    "en": {
+        "playing": "Playing ▶️",
+        "paused": "Paused ⏸️",
+        "app": "App:",
+        "unknown_title": "Unknown title",
+        "time_format": "%d/%m/%Y %H:%M:%S",
+    },
+    "es": {
+        "playing": "Reproduciendo ▶️",
+        "paused": "En pausa ⏸️",
+        "app": "App:",
+        "unknown_title": "Título desconocido",
+        "time_format": "%d/%m/%Y %H:%M:%S",
+    },
+}
+
+# App id (or a part of it) -> label; APP_LABELS adds to / overrides these.
+APP_LABELS: Dict[str, str] = {
+    "Spotify": "Spotify 💚",
+}
+
+def locale_name(value: str) -> str:
+    """MESSAGE_LOCALE parser."""
+    name = value.strip().lower()
+    if name not in LOCALES:
+        raise ValueError(f"expected one of {', '.join(LOCALES)}")
+    return name
+
+def parse_app_labels(spec: str) -> Tuple[Tuple[str, str], ...]:
+    """APP_LABELS parser: "id=label,..." (e.g. "chrome.exe=Chrome 🌐,vlc=VLC 🎬") -> ((id, label), ...)."""
+    labels = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        app, sep, label = item.partition("=")
+        if not sep or not app.strip() or not label.strip():
+            raise ValueError(f"expected id=label, got {item!r}")
+        labels.append((app.strip(), label.strip()))
+    return tuple(labels)
+
+def timezone_name(value: str) -> Optional[tzinfo]:
+    """MESSAGE_TIMEZONE parser: an IANA name (e.g. "Europe/Madrid"); empty -> system local time."""
+    if not value.strip():
+        return None
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+    try:
+        return ZoneInfo(value.strip())
+    except (ZoneInfoNotFoundError, ValueError) as e:
+        raise ValueError(f"unknown time zone: {e}") from None
+
+@lru_cache(maxsize=1)
+def local_timezone() -> Optional[tzinfo]:
+    """
+    The system time zone as a tzinfo (DST rules included), looked up once; None when
+    it cannot be resolved here (e.g. Windows without tzdata), and callers fall back
+    to datetime.astimezone() per timestamp.
+    """
+    from zoneinfo import ZoneInfo
+    try:
+        name = os.environ.get("TZ", "").lstrip(":")
+        if name:
+            return ZoneInfo(name)
+        with open("/etc/localtime", "rb") as f:
+            return ZoneInfo.from_file(f, key="localtime")
+    except Exception:
+        return None
+
+class Template(NamedTuple):
+    """A locale's message with every static part escaped and marked up once."""
+    playing: str        # status line, newline included
+    paused: str
+    head: str           # "<b>prefix</b> "
+    artist_open: str
+    artist_close: str
+    app: str            # blank line + "App:" label
+    time: str
+    unknown_title: str
+    time_format: str
+
+def compile_template(locale: str = "en", prefix: str = "[NowPlaying]") -> Template:
+    text = LOCALES[locale]
+    return Template(
+        playing=f"<b><i>{escape_html(text['playing'])}</i></b>\n",
+        paused=f"<b><i>{escape_html(text['paused'])}</i></b>\n",
+        head=f"<b>{escape_html(prefix)}</b> ",
+        artist_open="\n— 🎤 <i>",
+        artist_close="</i>",
+        app=f"\n\n<b>{escape_html(text['app'])}</b> ",
+        time="\n🕑 ",
+        unknown_title=text["unknown_title"],
+        time_format=text["time_format"],
+    )
+
+class MessageFormatter:
+    """
+    Renders the now-playing HTML, with the per-message work done at construction: the
+    template (prefix and labels escaped once), the app-label lookup (exact id
+    first, then the first label whose id is part of the app id, memoised per app)
+    and the time zone. Rendered messages are kept in an LRU keyed by the fields
+    they are made of, so redelivered and repeated payloads cost a dict lookup
+    (cache_size=0 disables it).
+    """
+    def __init__(self, prefix: str = "[NowPlaying]", locale: str = "en",
+                 app_labels: Union[Mapping[str, str], Iterable[Tuple[str, str]], None] = None, tz: Optional[tzinfo] = None,
+                 cache_size: int = 1024) -> None:
+        self.template = compile_template(locale, prefix)
+        labels = {**APP_LABELS, **dict(app_labels or ())}
+        self._labels = {app: escape_html(label) for app, label in labels.items()}
+        self._tz = tz or local_timezone()
+        self._app_label = lru_cache(maxsize=256)(self._lookup_app)
+        render: Callable[..., str] = self._render
+        self._cached = lru_cache(maxsize=cache_size)(render) if cache_size > 0 else None
+        self._render_fn = self._cached or render
+
+    def __call__(self, payload: Dict) -> str:
+        return self.format(payload)
+
+    def format(self, payload: Dict) -> str:
+        get = payload.get
+        return self._render_fn(get("title", self.template.unknown_title), get("artist"), get("sourceApp"),
+                               get("playbackStatus"), get("timestamp"))
+
+    def cache_info(self):
+        return self._cached.cache_info() if self._cached else None
+
+    def _lookup_app(self, app: str) -> str:
+        label = self._labels.get(app)
+        if label is not None:
+            return label
+        for known, label in self._labels.items():
+            if known in app:
+                return label
+        return app
+
+    def _timestamp(self, ts_iso: str) -> str:
+        dt = datetime.fromisoformat(ts_iso)
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.astimezone(self._tz).strftime(self.template.time_format)
+
+    def _render(self, title: Optional[str], artist: Optional[str], app: Optional[str],
+                status: Optional[str], ts_iso: Optional[str]) -> str:
+        t = self.template
+        parts = []
+        if status:
+            parts.append(t.playing if status == "playing" else t.paused)
+        parts += (t.head, escape_html(title))
+        if artist:
+            parts += (t.artist_open, escape_html(artist), t.artist_close)
+        if app:
+            parts += (t.app, self._app_label(escape_html(app)))
+        if ts_iso:
+            parts += (t.time, self._timestamp(escape_html(ts_iso)))
+        return "".join(parts)
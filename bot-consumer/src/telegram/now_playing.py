@@ -0,0 +1,137 @@
+# Edit-in-place "now playing" messages: one Telegram message per (machine, chat) session
+from __future__ import annotations
+import json
+import logging
+import os
+import threading
+import time
+from hashlib import blake2b
+from typing import Callable, Dict, Optional, Tuple
+from src.state.files import locked, write_json
+from src.telegram.async_client import TelegramAPIError
+from src.telegram.client import TelegramClient
+
+log = logging.getLogger(__name__)
+
+def _html_hash(html: str) -> str:
+    return blake2b(html.encode("utf-8"), digest_size=8).hexdigest()
+
+class NowPlayingMessages:
+    """
+    Keeps the message_id of the current now-playing message per (machine, chat).
+    - Same HTML as last time: no API call ("skipped").
+    - Within `session_gap_sec` of the last update: editMessageText ("edited").
+    - Otherwise, or if the old message can't be edited: sendMessage ("sent").
+    The map is persisted to `state_path` so a restart keeps editing the same message.
+    Worker processes share the file: saves merge under a file lock (the newest update
+    of a slot wins), and publish() picks up what other workers wrote since, so a machine
+    whose partition moved here keeps editing the message its previous worker sent.
+    """
+    def __init__(self, tg: TelegramClient, state_path: Optional[str] = None, session_gap_sec: float = 1800,
+                 save_interval_sec: float = 5.0, clock: Callable[[], float] = time.time) -> None:
+        self._tg = tg
+        self._path = state_path
+        self._gap = session_gap_sec
+        self._save_interval = save_interval_sec
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: Dict[str, dict] = {}   # "chat|machine" -> {id, hash, at}
+        self._seen: Optional[Tuple[int, int]] = None   # (mtime_ns, size) of the file last merged
+        self._dirty = False
+        self._refresh_locked()
+        self._last_save = clock()
+        self.sent = 0
+        self.edited = 0
+        self.skipped = 0
+
+    @property
+    def api_calls_saved(self) -> int:
+        """Calls avoided compared with one sendMessage per change."""
+        return self.skipped
+
+    def stats(self) -> Dict[str, int]:
+        return {"sent": self.sent, "edited": self.edited, "skipped": self.skipped,
+                "api_calls_saved": self.api_calls_saved}
+
+    def publish(self, machine_key: str, chat_id: str, html: str) -> str:
+        """Show `html` as the machine's now-playing message; returns "sent", "edited" or "skipped"."""
+        slot = f"{chat_id}|{machine_key}"
+        digest = _html_hash(html)
+        now = self._clock()
+        with self._lock:
+            self._refresh_locked()
+            entry = self._entries.get(slot)
+        if entry is not None and now - entry["at"] <= self._gap:
+            if entry["hash"] == digest:
+                self.skipped += 1
+                return "skipped"
+            try:
+                self._tg.edit_html(chat_id, entry["id"], html)
+                self._remember(slot, entry["id"], digest, now, urgent=False)
+                self.edited += 1
+                return "edited"
+            except TelegramAPIError as exc:
+                if "not modified" in str(exc):
+                    self._remember(slot, entry["id"], digest, now, urgent=False)
+                    self.skipped += 1
+                    return "skipped"
+                # Deleted / too old / not editable: fall back to a new message.
+                log.info("edit failed (%s); sending a new message", exc)
+
+        message_id = self._tg.send_html(html, chat_id=chat_id)
+        self._remember(slot, message_id, digest, now, urgent=True)
+        self.sent += 1
+        return "sent"
+
+    # ---- persistence ----
+    def _remember(self, slot: str, message_id: int, digest: str, now: float, urgent: bool) -> None:
+        with self._lock:
+            self._entries[slot] = {"id": message_id, "hash": digest, "at": now}
+            self._dirty = True
+            # New message ids are saved right away; edit timestamps can wait.
+            if urgent or now - self._last_save >= self._save_interval:
+                self._save_locked()
+
+    def _refresh_locked(self) -> None:
+        """Merge the state file if another worker wrote it since we last did."""
+        if not self._path:
+            return
+        seen = self._stat()
+        if seen is not None and seen != self._seen:
+            with locked(self._path):
+                self._merge(self._read())
+                self._seen = self._stat()
+
+    def _merge(self, entries: Dict[str, dict]) -> None:
+        for slot, entry in entries.items():
+            mine = self._entries.get(slot)
+            if mine is None or mine["at"] < entry["at"]:
+                self._entries[slot] = entry
+
+    def _read(self) -> Dict[str, dict]:
+        try:
+            with open(self._path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self._path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _save_locked(self) -> None:
+        self._last_save = self._clock()
+        if not self._path or not self._dirty:
+            return
+        with locked(self._path):
+            self._merge(self._read())
+            write_json(self._path, self._entries)
+            self._seen = self._stat()
+        self._dirty = False
+
+    def close(self) -> None:
+        with self._lock:
+            self._save_locked()
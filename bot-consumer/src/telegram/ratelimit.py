@@ -0,0 +1,87 @@
+# Token-bucket rate limiting for the Telegram Bot API (global + per chat)
+from __future__ import annotations
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+class TokenBucket:
+    """
+    Reservation-style token bucket: every caller takes a token immediately and
+    is told how long to wait, so waiters are served in FIFO order.
+    """
+    def __init__(self, rate: float, capacity: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be > 0")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._stamp = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def reserve(self) -> float:
+        """Take one token; return the delay (seconds) before it may be used."""
+        self._refill()
+        self._tokens -= 1.0
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def block_for(self, seconds: float) -> None:
+        """Drain the bucket so nothing is admitted for `seconds` (e.g. 429 retry_after)."""
+        self._refill()
+        self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+    async def acquire(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class ChatRateLimiter:
+    """Global bucket plus one bucket per chat (idle chat buckets are evicted LRU)."""
+    def __init__(self, global_rate: Optional[float] = 30.0, chat_rate: Optional[float] = 1.0,
+                 chat_burst: float = 1.0, max_chats: int = 10_000,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self._clock = clock
+        self._global = TokenBucket(global_rate, clock=clock) if global_rate else None
+        self._chat_rate = chat_rate
+        self._chat_burst = chat_burst
+        self._max_chats = max_chats
+        self._chats: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def _chat_bucket(self, chat_id: str) -> Optional[TokenBucket]:
+        if not self._chat_rate:
+            return None
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self._chat_rate, self._chat_burst, clock=self._clock)
+            self._chats[chat_id] = bucket
+            if len(self._chats) > self._max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    async def acquire(self, chat_id: str) -> None:
+        bucket = self._chat_bucket(chat_id)
+        if bucket is not None:
+            await bucket.acquire()
+        if self._global is not None:
+            await self._global.acquire()
+
+    def penalize(self, chat_id: Optional[str], retry_after: float) -> bool:
+        """
+        Apply a server-imposed cooldown to a chat (or globally when chat is unknown).
+        Returns False when no bucket is configured, so the caller must wait itself.
+        """
+        bucket = self._chat_bucket(chat_id) if chat_id else None
+        if bucket is None:
+            bucket = self._global
+        if bucket is None:
+            return False
+        bucket.block_for(retry_after)
+        return True
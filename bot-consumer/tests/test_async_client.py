@@ -0,0 +1,34 @@
+# AsyncTelegramClient against the local Bot API stand-in: a chat that keeps getting 429s is given
+# up on once the call has waited max_throttle_sec, instead of holding its delivery worker forever.
+from __future__ import annotations
+import asyncio
+import time
+import pytest
+from benchmarks.fake_bot_api import FakeBotAPI
+from src.telegram.async_client import AsyncTelegramClient, TelegramAPIError
+from src.telegram.ratelimit import ChatRateLimiter
+
+def client(base_url: str, **kwargs) -> AsyncTelegramClient:
+    return AsyncTelegramClient("test-token", "1", api_base=base_url,
+                               limiter=ChatRateLimiter(global_rate=None, chat_rate=None), **kwargs)
+
+async def send(tg: AsyncTelegramClient) -> dict:
+    try:
+        return await tg.send_text_html("<b>t</b>")
+    finally:
+        await tg.close()
+
+def test_gives_up_on_a_chat_that_stays_rate_limited():
+    with FakeBotAPI(latency_ms=0, throttle_every=1, retry_after=1) as api:
+        t0 = time.monotonic()
+        with pytest.raises(TelegramAPIError) as err:
+            asyncio.run(send(client(api.base_url, max_throttle_sec=1.5)))
+        assert err.value.status == 429 and "rate limited after 1s" in str(err.value)
+        assert api.throttled == 2 and time.monotonic() - t0 < 1.5
+
+def test_retries_a_429_within_the_limit():
+    with FakeBotAPI(latency_ms=0, throttle_every=2, retry_after=0) as api:
+        tg = client(api.base_url)
+        assert asyncio.run(send(tg))["message_id"] == 1   # first call served
+        assert asyncio.run(send(tg))["message_id"] == 2   # second one throttled once, then served
+        assert api.throttled == 1
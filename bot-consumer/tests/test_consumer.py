@@ -0,0 +1,50 @@
+# A failing handler, in batch and single mode: its partition is paused and rewound for the retry
+# backoff while the other partitions keep flowing, and the message is handled once the delay is over.
+from __future__ import annotations
+import json
+from typing import List
+import pytest
+from pcbench.fake_kafka import FakeBroker, FakeConsumer, FakeMessage
+from pcmedia.retry import RetryBackoff
+from src.kafka.consumer import KafkaNowPlayingConsumer
+
+TOPIC = "pc.activity.media"
+
+def build_broker() -> FakeBroker:
+    msgs = []
+    for p in range(2):
+        for offset in range(3):
+            value = json.dumps({"sourceApp": "Spotify.exe", "title": f"p{p}-t{offset}", "artist": "A",
+                                "playbackStatus": "playing"}).encode("utf-8")
+            msgs.append(FakeMessage(TOPIC, p, offset, f"pc-{p}".encode(), value))
+    return FakeBroker(msgs)
+
+@pytest.mark.parametrize("batch_size", [1, 10])
+def test_failed_partition_waits_without_blocking_the_others(batch_size):
+    now = [0.0]
+    retry = RetryBackoff(base_sec=1.0, clock=lambda: now[0])
+    fake = FakeConsumer(build_broker())
+    consumer = KafkaNowPlayingConsumer("fake", TOPIC, "test", batch_size=batch_size, client=fake, retry=retry)
+    handled: List[str] = []
+    failures = {"p0-t1": 2}   # fails twice, then succeeds
+
+    def on_change(payload, key) -> None:
+        title = payload["title"]
+        if failures.get(title):
+            failures[title] -= 1
+            raise RuntimeError("telegram down")
+        handled.append(title)
+
+    def on_empty() -> None:
+        # Nothing left to fetch: only the paused partition remains, so let its backoff run out.
+        if retry:
+            assert not [t for t in handled if t.startswith("p0-") and t != "p0-t0"]
+            now[0] += retry.next_in()
+        else:
+            consumer.stop()
+
+    fake.on_empty = on_empty
+    consumer.start(on_change)
+    assert [t for t in handled if t.startswith("p0-")] == ["p0-t0", "p0-t1", "p0-t2"]
+    assert [t for t in handled if t.startswith("p1-")] == ["p1-t0", "p1-t1", "p1-t2"]
+    assert now[0] == 3.0   # 1 s, then 2 s of backoff; nobody slept
@@ -0,0 +1,83 @@
+# Replay against the in-process broker (benchmarks/pcbench): range resolution by timestamp and by
+# offsets, and progress that counts every message of the range, written or skipped.
+from __future__ import annotations
+import json
+from typing import Dict, List
+from pcbench.fake_kafka import FakeBroker, FakeConsumer, FakeMessage
+from src.kafka.consumer import KafkaNowPlayingConsumer
+from src.replay.replayer import Progress, parse_bound, replay, resolve_ranges
+
+TOPIC = "pc.activity.media"
+T0 = 1_735_689_600_000   # 2025-01-01T00:00:00Z in ms
+PARTITIONS = 2
+
+def payload(title: str) -> bytes:
+    return json.dumps({"sourceApp": "Spotify.exe", "title": title, "artist": "A",
+                       "playbackStatus": "playing"}).encode("utf-8")
+
+def build_broker() -> FakeBroker:
+    """
+    Per partition, one message per second: 10 changes, each sent twice (the repeat is
+    unchanged), then 2 undecodable messages; partition p starts p * 100 s later.
+    """
+    msgs = []
+    for p in range(PARTITIONS):
+        values = [payload(f"t{i}") for i in range(10) for _ in range(2)] + [b"\xff not json", b"{"]
+        for offset, value in enumerate(values):
+            msgs.append(FakeMessage(TOPIC, p, offset, f"pc-{p}".encode(), value,
+                                    timestamp_ms=T0 + (p * 100 + offset) * 1000))
+    return FakeBroker(msgs)
+
+class ListSink:
+    def __init__(self) -> None:
+        self.rows: List[tuple] = []
+        self.closed = False
+
+    def write(self, msg, payload: Dict) -> None:
+        self.rows.append((msg.partition(), msg.offset(), payload["title"]))
+
+    def close(self) -> None:
+        self.closed = True
+
+def consumer(broker: FakeBroker) -> KafkaNowPlayingConsumer:
+    return KafkaNowPlayingConsumer("fake", TOPIC, "test-replay", batch_size=7, client=FakeConsumer(broker))
+
+def test_resolves_the_whole_topic():
+    ranges = resolve_ranges(FakeConsumer(build_broker()), [TOPIC], "earliest", "latest")
+    assert ranges == {(TOPIC, 0): (0, 22), (TOPIC, 1): (0, 22)}
+
+def test_seeks_by_timestamp():
+    client = FakeConsumer(build_broker())
+    # [T0 + 5 s, T0 + 105 s): partition 0 from offset 5 to its end, partition 1 up to offset 5
+    ranges = resolve_ranges(client, [TOPIC], T0 + 5_000, T0 + 105_000)
+    assert ranges == {(TOPIC, 0): (5, 22), (TOPIC, 1): (0, 5)}
+    # past the end of the log: nothing to replay
+    assert resolve_ranges(client, [TOPIC], T0 + 10**9, "latest") == {}
+
+def test_seeks_by_offsets_clamped_to_the_log():
+    client = FakeConsumer(build_broker())
+    ranges = resolve_ranges(client, [TOPIC], parse_bound("offsets:0=3,1=20"), parse_bound("offsets:0=8,1=999"))
+    assert ranges == {(TOPIC, 0): (3, 8), (TOPIC, 1): (20, 22)}
+    # partitions missing from the start bound are skipped
+    assert list(resolve_ranges(client, [TOPIC], {1: 0}, "latest")) == [(TOPIC, 1)]
+
+def test_replay_writes_the_range_in_offset_order():
+    broker = build_broker()
+    ranges = resolve_ranges(FakeConsumer(broker), [TOPIC], {0: 4}, {0: 10})
+    sink = ListSink()
+    stats = replay(consumer(broker), ranges, sink, progress_interval=3600)
+    assert sink.rows == [(0, o, f"t{o // 2}") for o in range(4, 10)] and sink.closed
+    assert (stats["messages"], stats["written"]) == (6, 6)
+
+def test_progress_counts_skipped_messages():
+    broker = build_broker()
+    ranges = resolve_ranges(FakeConsumer(broker), [TOPIC], "earliest", "latest")
+    sink = ListSink()
+    progress = Progress(sink, ranges, interval=3600)
+    try:
+        read = consumer(broker).read_range(ranges, progress.write, changes_only=True, on_read=progress.read)
+    finally:
+        progress.close()
+    # 44 messages: 20 changes written, 20 unchanged repeats and 4 undecodable skipped
+    assert (read, progress.written, len(sink.rows)) == (44, 20, 20)
+    assert progress.done == progress.total == 44
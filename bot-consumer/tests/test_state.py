@@ -0,0 +1,58 @@
+# State shared by the worker processes: a partition (or machine) handed to another worker by a
+# rebalance keeps its dedup signatures and keeps editing the same now-playing message.
+from __future__ import annotations
+from collections import namedtuple
+from typing import List
+from src.state.dedupe import DedupeStore
+from src.telegram.now_playing import NowPlayingMessages
+
+TP = namedtuple("TP", "topic partition")
+TOPIC = "pc.activity.media"
+
+class FakeTelegram:
+    def __init__(self) -> None:
+        self.calls: List[tuple] = []
+        self._next_id = 100
+
+    def send_html(self, html: str, chat_id: str) -> int:
+        self._next_id += 1
+        self.calls.append(("send", chat_id, self._next_id))
+        return self._next_id
+
+    def edit_html(self, chat_id: str, message_id: int, html: str) -> None:
+        self.calls.append(("edit", chat_id, message_id))
+
+def test_dedupe_state_follows_the_partition(tmp_path):
+    path = str(tmp_path / "dedupe.json")
+    a = DedupeStore(snapshot_path=path, snapshot_interval_sec=3600)
+    b = DedupeStore(snapshot_path=path, snapshot_interval_sec=3600)
+    a.on_assign([TP(TOPIC, 0)])
+    b.on_assign([TP(TOPIC, 1)])
+    a.remember((TOPIC, 0), "pc-0", ("t1",))
+    b.remember((TOPIC, 1), "pc-1", ("t9",))
+    b.snapshot()
+
+    a.on_revoke([TP(TOPIC, 0)])   # partition 0 moves from a to b
+    b.on_assign([TP(TOPIC, 0)])
+    assert not b.is_new((TOPIC, 0), "pc-0", ("t1",))
+    assert b.is_new((TOPIC, 0), "pc-0", ("t2",))
+
+    c = DedupeStore(snapshot_path=path)
+    c.on_assign([TP(TOPIC, 1)])   # b's partition survived a's merge
+    assert not c.is_new((TOPIC, 1), "pc-1", ("t9",))
+
+def test_now_playing_edits_the_message_another_worker_sent(tmp_path):
+    path = str(tmp_path / "now_playing.json")
+    tg = FakeTelegram()
+    a = NowPlayingMessages(tg, state_path=path)
+    b = NowPlayingMessages(tg, state_path=path)
+    assert b.publish("pc-1", "chat", "<b>other</b>") == "sent"
+    assert a.publish("pc-0", "chat", "<b>one</b>") == "sent"
+    assert b.publish("pc-0", "chat", "<b>two</b>") == "edited"
+    assert tg.calls[-1] == ("edit", "chat", tg.calls[1][2])
+
+    a.close()
+    b.close()
+    restarted = NowPlayingMessages(tg, state_path=path)
+    assert restarted.publish("pc-1", "chat", "<b>other</b>") == "skipped"
+    assert restarted.publish("pc-0", "chat", "<b>two</b>") == "skipped"
@@ -0,0 +1,136 @@
+# Fleet command fan-out and ack aggregation.
+# 1. Outbox fan-out of one command to N machines: send() per machine vs send_batch() (one fsync).
+# 2. Thousands of acks through AckAggregator (decode + apply, JSON and msgpack), and the number of
+#    Telegram edits needed with periodic refresh vs one edit per ack.
+# Run from device-handle-bot/:  python -m benchmarks.bench_acks --machines 5000 --commands 20
+from __future__ import annotations
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from pcbench.fake_kafka import FakeConsumer, FakeMessage
+from pcmedia.outbox import Outbox, OutboxProducer
+from pcmedia.serde import Serde
+from src.kafka.acks import AckAggregator
+
+TOPIC = "pc.activity.control"
+ACK_TOPIC = f"{TOPIC}.ack"
+
+class NullProducer:
+    """confluent_kafka.Producer stand-in that acknowledges everything on poll()."""
+    def __init__(self) -> None:
+        self._queue: list = []
+
+    def produce(self, topic, key=None, value=None, on_delivery=None, **kwargs) -> None:
+        self._queue.append(on_delivery)
+
+    def poll(self, timeout: float = 0) -> int:
+        queue, self._queue = self._queue, []
+        for cb in queue:
+            cb(None, None)
+        return len(queue)
+
+    def flush(self, timeout: float = 0) -> int:
+        self.poll(0)
+        return 0
+
+def bench_fanout(machines: list[str], batched: bool) -> float:
+    serde = Serde()
+    records = []
+    for m in machines:
+        payload = {"type": "control", "action": "lock", "target": m, "by": "telegram:1",
+                   "ts": "2025-01-01T00:00:00+00:00", "id": "0123456789abcdef"}
+        records.append((TOPIC, m, serde.encode(TOPIC, "control", payload)))
+    with tempfile.TemporaryDirectory() as d:
+        out = OutboxProducer(NullProducer(), Outbox(d, fsync_every=1))
+        t0 = time.perf_counter()
+        if batched:
+            out.send_batch(records)
+        else:
+            for topic, key, value in records:
+                out.send(topic, key, value)
+        elapsed = time.perf_counter() - t0
+        out.close()
+    return elapsed
+
+def build_acks(commands: list[str], machines: list[str], fmt: str, fail: float, dup: float,
+               seed: int) -> list[FakeMessage]:
+    rnd = random.Random(seed)
+    serde = Serde(default=fmt)
+    acks = []
+    for cid in commands:
+        for m in machines:
+            status = "failed" if rnd.random() < fail else "ok"
+            ack = {"type": "ack", "id": cid, "machine": m, "action": "lock", "status": status,
+                   "ts": "2025-01-01T00:00:01+00:00"}
+            value = serde.encode(ACK_TOPIC, "ack", ack)
+            acks.append(value)
+            if rnd.random() < dup:
+                acks.append(value)  # redelivered
+    rnd.shuffle(acks)
+    return [FakeMessage(ACK_TOPIC, i % 6, i // 6, None, v) for i, v in enumerate(acks)]
+
+def bench_ingest(msgs: list[FakeMessage], commands: list[str], machines: list[str], refresh_every: int) -> dict:
+    """
+    Consume `msgs` through the aggregator. Simulated time: every `refresh_every` acks
+    count as one refresh interval, after which due() is collected (what the refresh
+    task would edit).
+    """
+    clock = {"now": 0.0}
+    edits = {"n": 0}
+
+    async def edit(progress) -> None:
+        edits["n"] += 1
+
+    fake = FakeConsumer(msgs)
+    agg = AckAggregator(fake, ACK_TOPIC, Serde(), edit, timeout=3600, refresh=1.0, clock=lambda: clock["now"])
+    expected = frozenset(machines)
+    for i, cid in enumerate(commands):
+        agg.track(cid, 1, i, {}, expected)
+
+    loop = asyncio.new_event_loop()
+    t0 = time.perf_counter()
+    seen = 0
+    while True:
+        batch = fake.consume(500, 0)
+        if not batch:
+            break
+        agg.on_acks(agg._decode(batch))
+        seen += len(batch)
+        if seen >= refresh_every:
+            seen = 0
+            clock["now"] += 1.0
+            loop.run_until_complete(agg.refresh())
+    loop.run_until_complete(agg.refresh())
+    elapsed = time.perf_counter() - t0
+    loop.close()
+    return {"elapsed": elapsed, "edits": edits["n"], "left": agg.in_flight}
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--machines", type=int, default=5000)
+    ap.add_argument("--commands", type=int, default=20)
+    ap.add_argument("--fail", type=float, default=0.02, help="fraction of failed acks")
+    ap.add_argument("--dup", type=float, default=0.05, help="fraction of acks delivered twice")
+    ap.add_argument("--ack-rate", type=int, default=5000, help="acks/s arriving (sets acks per refresh)")
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    machines = [f"pc-{i:05d}" for i in range(args.machines)]
+    commands = [f"{i:016x}" for i in range(args.commands)]
+
+    print(f"[i] fan-out of one command to {args.machines} machines through the outbox (fsync every 1)")
+    print(f"    send() per machine (before)  : {bench_fanout(machines, batched=False) * 1000:8.1f} ms")
+    print(f"    send_batch()                 : {bench_fanout(machines, batched=True) * 1000:8.1f} ms")
+
+    for fmt in ("json", "msgpack"):
+        msgs = build_acks(commands, machines, fmt, args.fail, args.dup, args.seed)
+        r = bench_ingest(msgs, commands, machines, refresh_every=args.ack_rate * 2)
+        print(f"[i] {len(msgs)} acks ({fmt}) for {args.commands} commands x {args.machines} machines")
+        print(f"    aggregator throughput        : {len(msgs) / r['elapsed']:10.0f} acks/s")
+        print(f"    Telegram edits (2 s refresh) : {r['edits']:10d}   vs {len(msgs)} with one edit per ack")
+        print(f"    commands still pending       : {r['left']:10d}")
+
+if __name__ == "__main__":
+    main()
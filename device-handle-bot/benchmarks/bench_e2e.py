@@ -0,0 +1,85 @@
+# End-to-end: ControlProducer.send_command() -> broker -> a plain consumer of the control topics,
+# for N target machines at an offered rate (control events/s; --fanout targets per command).
+# Latency runs from the intended send time to receipt; CPU per message covers both sides.
+# Also reports produce requests (librdkafka statistics). See benchmarks/pcbench/loadgen.py.
+# Run from device-handle-bot/:  python -m benchmarks.bench_e2e --rate 500 --machines 50 [--broker localhost:9025]
+#                               [--routing partition] [--fanout 10] [--profile balanced] [--adaptive]
+#                               [--outbox] [--json out.json]
+from __future__ import annotations
+import argparse
+import asyncio
+import dataclasses
+import tempfile
+import time
+from pcbench import loadgen
+from pcmedia.profiles import PROFILES
+from pcmedia.routing import MODES, machine_topic
+from pcmedia.serde import Serde
+from src.config import build_kafka_config, get_settings, load_settings
+from src.kafka.producer import ControlProducer
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    loadgen.add_common_args(ap)
+    ap.add_argument("--routing", default="shared", choices=MODES, help="ROUTING_MODE")
+    ap.add_argument("--fanout", type=int, default=1, help="targets per command (one event each)")
+    ap.add_argument("--outbox", action="store_true", help="OUTBOX_ENABLED=true (AsyncOutboxProducer)")
+    ap.add_argument("--wire-format", default="json", choices=("json", "msgpack"))
+    ap.add_argument("--profile", default="low-latency", choices=list(PROFILES), help="PRODUCER_PROFILE")
+    ap.add_argument("--adaptive", action="store_true", help="ADAPTIVE_LINGER=true")
+    args = ap.parse_args()
+
+    topic = loadgen.bench_topic("pc.activity.control", args.broker)
+    machines = [f"pc-{i:04d}" for i in range(args.machines)]
+    settings = dataclasses.replace(load_settings({}), brokers=args.broker, topic_control=topic, broadcast_topic="",
+                                   routing_mode=args.routing, control_partitions=args.partitions,
+                                   wire_format=args.wire_format, outbox_enabled=args.outbox, metrics_port=0,
+                                   producer_profile=args.profile, adaptive_linger=args.adaptive)
+    topics = [topic, settings.broadcast_topic]
+    if args.routing == "topic":
+        topics += [machine_topic(topic, m) for m in machines]
+    fake = loadgen.setup(args.broker, topics, args.partitions)
+    get_settings.set(settings)
+    kafka = {**build_kafka_config(), **loadgen.parse_overrides(args.kafka)}
+    stats = loadgen.ProduceStats()
+    lat = loadgen.Latencies()
+    serde = Serde()
+
+    def on_message(msg) -> None:
+        payload = serde.decode(msg.value())
+        lat.received(f"{payload['id']}/{payload['target']}")
+
+    receiver = loadgen.Receiver(loadgen.make_consumer(args.broker, fake), topics, on_message)
+
+    async def load(outbox_dir: str) -> loadgen.Meter:
+        get_settings.set(dataclasses.replace(settings, outbox_dir=outbox_dir))
+        raw = loadgen.make_producer(args.broker, fake, stats.attach(kafka), args.partitions)
+        producer = ControlProducer(raw)
+        if producer.adaptive is not None:
+            stats.hooks.append(producer.adaptive.on_stats)
+        commands = loadgen.schedule(args.rate / args.fanout, args.seconds, asyncio.get_running_loop().time() + 0.1)
+        with loadgen.Meter() as meter:
+            for i, due in enumerate(commands):
+                await loadgen.asleep_until(due)
+                command_id = f"{i:016x}"
+                targets = [machines[(i * args.fanout + j) % args.machines] for j in range(args.fanout)]
+                for target in targets:
+                    lat.sent(f"{command_id}/{target}", due)
+                await producer.send_command("lock", targets, "bench:1", command_id)
+            await producer.flush(10)
+            await asyncio.get_running_loop().run_in_executor(None, lat.wait, 10.0)
+        if fake is None:
+            time.sleep(loadgen.ProduceStats.INTERVAL_MS / 1000.0 + 0.2)   # final statistics
+            raw.poll(0)
+        return meter
+
+    with tempfile.TemporaryDirectory() as outbox_dir:
+        meter = asyncio.run(load(outbox_dir))
+    receiver.close()
+    stage = (f"device.control[{args.routing}][{args.profile}{'+adaptive' if args.adaptive else ''}]"
+             + ("+outbox" if args.outbox else ""))
+    loadgen.report(loadgen.result(stage, args, lat, meter, kafka, fanout=args.fanout, wire_format=args.wire_format,
+                                  **loadgen.request_counts([stats])), args.json)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# Load test: thousands of concurrent button presses through the bot's dispatch path.
+# Presses arrive at --rate per second against a simulated broker that drains slower than
+# that, so the bounded local queue fills. Every mode runs the same dispatch() (target
+# resolution, status edit, metrics); only the producer differs: the old synchronous
+# produce()+poll(0) inside the coroutine (as is, and with the usual "poll(1) and retry on
+# BufferError") vs the asyncio producer (poll thread, awaitable deliveries, await-based
+# backpressure), with and without the outbox.
+# Reports failed presses, worst event-loop stall and records undelivered at shutdown.
+# Run from device-handle-bot/:  python -m benchmarks.bench_presses --presses 5000 --rate 10000
+from __future__ import annotations
+import argparse
+import asyncio
+import dataclasses
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from src.config import get_settings, load_settings
+
+class SimulatedProducer:
+    """
+    confluent_kafka.Producer stand-in: `queue_max` local queue (BufferError when full),
+    deliveries `latency` after produce at up to `rate` msg/s, served only by poll()/flush().
+    """
+    def __init__(self, queue_max: int = 500, rate: float = 5_000, latency: float = 0.005) -> None:
+        self._queue: list = []
+        self._queue_max = queue_max
+        self._rate = rate
+        self._latency = latency
+        self._lock = threading.Lock()
+        self._last = time.monotonic()
+        self._tokens = 0.0
+        self.delivered = 0
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def produce(self, topic, key=None, value=None, on_delivery=None, **kwargs) -> None:
+        with self._lock:
+            if len(self._queue) >= self._queue_max:
+                raise BufferError("Local: Queue full")
+            self._queue.append((time.monotonic(), on_delivery))
+
+    def poll(self, timeout: float = 0) -> int:
+        now = time.monotonic()
+        with self._lock:
+            self._tokens = min(self._queue_max, self._tokens + (now - self._last) * self._rate)
+            self._last = now
+            n = 0
+            while n < len(self._queue) and n < int(self._tokens) and self._queue[n][0] <= now - self._latency:
+                n += 1
+            self._tokens -= n
+            due, self._queue = self._queue[:n], self._queue[n:]
+        for _, cb in due:
+            if cb is not None:
+                cb(None, None)
+        self.delivered += len(due)
+        if not due and timeout:
+            time.sleep(min(timeout, 0.001))
+        return len(due)
+
+    def flush(self, timeout: float = 5.0) -> int:
+        deadline = time.monotonic() + timeout
+        while self._queue and time.monotonic() < deadline:
+            self.poll(0.001)
+        return len(self._queue)
+
+class FakeMessage:
+    """The Telegram message the press edits (edit_text simulates an API round trip)."""
+    chat_id = 1
+    message_id = 1
+
+    def __init__(self, api_latency: float) -> None:
+        self._api_latency = api_latency
+
+    async def edit_text(self, text, **kwargs) -> None:
+        await asyncio.sleep(self._api_latency)
+
+async def _lag_monitor(stop: asyncio.Event, out: dict, interval: float = 0.005) -> None:
+    """Max delay of a 5 ms timer: how long the event loop was blocked at worst."""
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(interval)
+        out["max"] = max(out["max"], time.perf_counter() - t0 - interval)
+
+async def _run(presses: int, rate: float, press) -> dict:
+    stop, lag = asyncio.Event(), {"max": 0.0}
+    monitor = asyncio.create_task(_lag_monitor(stop, lag))
+    t0 = time.perf_counter()
+
+    async def arrive(i: int) -> None:
+        await asyncio.sleep(i / rate)
+        await press(i)
+
+    results = await asyncio.gather(*(arrive(i) for i in range(presses)), return_exceptions=True)
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await monitor
+    failed = sum(1 for r in results if isinstance(r, BaseException))
+    return {"elapsed": elapsed, "failed": failed, "lag": lag["max"]}
+
+class SyncControlProducer:
+    """
+    Before: ControlProducer.send_command with produce() + poll(0) straight from the
+    coroutine and no flush at shutdown. `block`: on BufferError, poll(1) and retry
+    (blocks the loop instead of failing the press).
+    """
+    def __init__(self, producer: SimulatedProducer, block: bool) -> None:
+        from src.kafka.producer import ControlProducer
+        self._p = producer
+        self._block = block
+        self._encoder = ControlProducer(producer=producer)   # same serde and routing, its send path unused
+
+    async def send_command(self, action: str, targets, actor: str, command_id: str) -> str:
+        records = self._encoder.encode_command(action, targets, actor, command_id)
+        for topic, target, value in records:
+            while True:
+                try:
+                    self._p.produce(topic, key=target, value=value)
+                    break
+                except BufferError:
+                    if not self._block:
+                        raise
+                    self._p.poll(1)
+        self._p.poll(0)
+        return command_id
+
+async def legacy(presses: int, rate: float, api_latency: float, queue_max: int, block: bool) -> dict:
+    """dispatch() over the synchronous producer (SyncControlProducer)."""
+    from src.telegram.bot import dispatch
+    p = SimulatedProducer(queue_max)
+    context = SimpleNamespace(bot_data={"producer": SyncControlProducer(p, block), "groups": {}})
+
+    async def press(i: int) -> None:
+        await dispatch(context, "lock", "all", f"telegram:{i}", FakeMessage(api_latency))
+
+    r = await _run(presses, rate, press)
+    r["undelivered"] = len(p)
+    return r
+
+async def current(presses: int, rate: float, api_latency: float, queue_max: int, block: bool) -> dict:
+    """dispatch() with ControlProducer over the asyncio producer, then the graceful flush."""
+    from src.kafka.producer import ControlProducer
+    from src.telegram.bot import dispatch
+    p = SimulatedProducer(queue_max)
+    producer = ControlProducer(producer=p)
+    context = SimpleNamespace(bot_data={"producer": producer, "groups": {}})
+
+    async def press(i: int) -> None:
+        await dispatch(context, "lock", "all", f"telegram:{i}", FakeMessage(api_latency))
+
+    r = await _run(presses, rate, press)
+    await producer.flush(10.0)
+    r["undelivered"] = len(p)
+    return r
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--presses", type=int, default=5000)
+    ap.add_argument("--rate", type=float, default=10_000, help="press arrivals per second")
+    ap.add_argument("--queue-max", type=int, default=500, help="simulated librdkafka queue size (drains at 5000/s)")
+    ap.add_argument("--api-latency", type=float, default=0.02, help="simulated Telegram edit latency (s)")
+    args = ap.parse_args()
+
+    print(f"[i] {args.presses} presses at {args.rate:.0f}/s, local queue {args.queue_max}, "
+          f"edit latency {args.api_latency * 1000:.0f} ms")
+    print(f"    {'mode':<28} {'wall':>8} {'failed':>7} {'max loop stall':>15} {'undelivered at exit':>20}")
+    runs = [("sync produce (before)", False, legacy, False),
+            ("sync produce + poll(1) retry", False, legacy, True),
+            ("asyncio producer", False, current, False),
+            ("asyncio producer + outbox", True, current, False)]
+    for label, outbox, fn, block in runs:
+        with tempfile.TemporaryDirectory() as d:
+            get_settings.set(dataclasses.replace(load_settings(), outbox_enabled=outbox, outbox_dir=d))
+            r = asyncio.run(fn(args.presses, args.rate, args.api_latency, args.queue_max, block))
+        print(f"    {label:<28} {r['elapsed']:7.2f}s {r['failed']:7d} {r['lag'] * 1000:12.1f} ms {r['undelivered']:20d}")
+
+if __name__ == "__main__":
+    main()
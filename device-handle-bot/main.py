@@ -1,6 +1,13 @@
+import logging
+from pcmedia.logs import setup_logging
+from src.config import get_settings
 from src.telegram.bot import build_app
 
 if __name__ == "__main__":
+    settings = get_settings()
+    setup_logging(settings.log_level, settings.log_format, settings.log_rate_per_sec,
+                  settings.log_burst, settings.log_sample, settings.log_queue_size)
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # one INFO line per getUpdates poll otherwise
     app = build_app()
-    print("[i] Telegram control bot is running. Press Ctrl+C to stop.")
+    logging.getLogger(__name__).info("Telegram control bot is running. Press Ctrl+C to stop.")
     app.run_polling(close_loop=False)
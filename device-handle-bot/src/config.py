@@ -1,51 +1,144 @@
-# Load environment & provide settings and Kafka config builder
+# Settings from environment variables (and .env), loaded on first use; Kafka config builders
 from __future__ import annotations
 import os
 from dataclasses import dataclass
-from dotenv import load_dotenv
+from typing import Mapping, Optional, Tuple
+from pcmedia.envconfig import Lazy, env_field, load
+from pcmedia.metrics import record_kafka_stats
+from pcmedia.profiles import AdaptiveLinger, fan_out, profile_config, profile_name
 
-load_dotenv()
+def _user_ids(value: str) -> Tuple[int, ...]:
+    return tuple(int(x) for x in value.split(",") if x.strip().isdigit())
 
 @dataclass(frozen=True)
 class Settings:
     # Kafka
-    brokers: str = os.getenv("KAFKA_BROKERS", "localhost:9092")
-    topic_control: str = os.getenv("KAFKA_TOPIC_CONTROL", "pc.activity.control")
-    machine_target: str = os.getenv("MACHINE_TARGET", "all")
+    brokers: str = env_field("KAFKA_BROKERS", "localhost:9092")
+    topic_control: str = env_field("KAFKA_TOPIC_CONTROL", "pc.activity.control")
+    machine_target: str = env_field("MACHINE_TARGET", "all")
+    # Routing (must match the lock consumers): "shared" | "partition" | "topic"; see pcmedia/routing.py
+    routing_mode: str = env_field("ROUTING_MODE", "shared", parse=str.lower)
+    broadcast_topic: str = env_field("BROADCAST_TOPIC", "")             # default: <KAFKA_TOPIC_CONTROL>.all
+    control_partitions: int = env_field("CONTROL_PARTITIONS", 0)   # 0: read from topic metadata
+
+    # Targets: MACHINE_TARGET / "/lock <target>" take a machine, "all", "tag:<name>" (machines with that
+    # MACHINE_TAGS entry), "@<group>" (a list in GROUPS_PATH) or a comma list of those
+    groups_path: str = env_field("GROUPS_PATH", "groups.json")                # {"group": ["pc-01", ...]}
+    # Acknowledgements published by the lock consumers (ACK_TOPIC= disables tracking)
+    ack_topic: str | None = env_field("ACK_TOPIC", parse=str)          # default: <KAFKA_TOPIC_CONTROL>.ack
+    ack_group_id: str = env_field("ACK_GROUP_ID", "telegram-control-bot-acks")
+    ack_timeout_sec: float = env_field("ACK_TIMEOUT_SEC", 60.0)       # then pending machines are reported
+    ack_refresh_sec: float = env_field("ACK_REFRESH_SEC", 2.0)        # Telegram message edit interval
+
+    # Wire format: WIRE_FORMAT default ("json" | "msgpack"), WIRE_FORMATS per topic ("topic=msgpack,...")
+    wire_format: str = env_field("WIRE_FORMAT", "json", parse=str.lower)
+    wire_formats: str = env_field("WIRE_FORMATS", "")
+    schema_registry_path: str | None = env_field("SCHEMA_REGISTRY_PATH")       # e.g., schemas.json
 
     # Optional security
-    security_protocol: str | None = os.getenv("KAFKA_SECURITY_PROTOCOL")
-    sasl_mechanism: str | None     = os.getenv("KAFKA_SASL_MECHANISM")
-    sasl_username: str | None      = os.getenv("KAFKA_SASL_USERNAME")
-    sasl_password: str | None      = os.getenv("KAFKA_SASL_PASSWORD")
-    ssl_ca_location: str | None    = os.getenv("KAFKA_SSL_CA_LOCATION")
+    security_protocol: str | None = env_field("KAFKA_SECURITY_PROTOCOL")
+    sasl_mechanism: str | None     = env_field("KAFKA_SASL_MECHANISM")
+    sasl_username: str | None      = env_field("KAFKA_SASL_USERNAME")
+    sasl_password: str | None      = env_field("KAFKA_SASL_PASSWORD")
+    ssl_ca_location: str | None    = env_field("KAFKA_SSL_CA_LOCATION")
+
+    # Durable local outbox (control events kept on disk until Kafka acks them); opt-in, see .env.template
+    outbox_enabled: bool = env_field("OUTBOX_ENABLED", False)
+    outbox_dir: str = env_field("OUTBOX_DIR", os.path.join("data", "outbox"))
+    outbox_segment_bytes: int = env_field("OUTBOX_SEGMENT_BYTES", 4 << 20)
+    outbox_fsync_every: int = env_field("OUTBOX_FSYNC_EVERY", 64)
+    outbox_fsync_interval_ms: int = env_field("OUTBOX_FSYNC_INTERVAL_MS", 200)
+    # Without the outbox: undelivered records allowed before send() waits (backpressure)
+    producer_max_in_flight: int = env_field("PRODUCER_MAX_IN_FLIGHT", 10000)
+
+    # Producer tuning: PRODUCER_PROFILE low-latency | balanced | high-throughput (src/kafka/profiles.py);
+    # ADAPTIVE_LINGER holds records (up to ADAPTIVE_LINGER_MAX_MS) while the send rate can fill batches
+    producer_profile: str = env_field("PRODUCER_PROFILE", "low-latency", parse=profile_name)
+    adaptive_linger: bool = env_field("ADAPTIVE_LINGER", False)
+    adaptive_linger_max_ms: float = env_field("ADAPTIVE_LINGER_MAX_MS", 50.0)
+    adaptive_target_batch: int = env_field("ADAPTIVE_TARGET_BATCH", 100)
+    adaptive_stats_interval_ms: int = env_field("ADAPTIVE_STATS_INTERVAL_MS", 1000)
+
+    # Metrics: Prometheus text on http://METRICS_HOST:METRICS_PORT/metrics (0 disables)
+    metrics_port: int = env_field("METRICS_PORT", 0)
+    metrics_host: str = env_field("METRICS_HOST", "127.0.0.1")
+    kafka_stats_interval_ms: int = env_field("KAFKA_STATS_INTERVAL_MS", 15000)   # librdkafka stats (with metrics)
+
+    # Logging: JSON lines (or "text") from a background thread; LOG_RATE_PER_SEC/LOG_BURST cap each
+    # message type, LOG_SAMPLE keeps 1 in N of chatty events (e.g. "control.sent=0.1")
+    log_level: str = env_field("LOG_LEVEL", "INFO", parse=str.upper)
+    log_format: str = env_field("LOG_FORMAT", "json", parse=str.lower)
+    log_rate_per_sec: float = env_field("LOG_RATE_PER_SEC", 10.0)
+    log_burst: float = env_field("LOG_BURST", 20.0)
+    log_sample: str = env_field("LOG_SAMPLE", "")
+    log_queue_size: int = env_field("LOG_QUEUE_SIZE", 10000)
 
     # Telegram
-    bot_token: str = os.getenv("TELEGRAM_BOT_TOKEN", "")
-    allowed_user_ids: list[int] = tuple(
-        int(x) for x in os.getenv("ALLOWED_USER_IDS", "").split(",") if x.strip().isdigit()
-    )
-    bot_title: str = os.getenv("BOT_TITLE", "[AdminPC]")
+    bot_token: str = env_field("TELEGRAM_BOT_TOKEN", "")
+    allowed_user_ids: Tuple[int, ...] = env_field("ALLOWED_USER_IDS", (), parse=_user_ids)
+    bot_title: str = env_field("BOT_TITLE", "[AdminPC]")
+
+    def __post_init__(self) -> None:
+        if not self.broadcast_topic:
+            object.__setattr__(self, "broadcast_topic", f"{self.topic_control}.all")
+        if self.ack_topic is None:
+            object.__setattr__(self, "ack_topic", f"{self.topic_control}.ack")
 
     def validate(self) -> None:
+        """The token is required to run the bot (build_app), not to load the settings."""
         if not self.bot_token:
             raise SystemExit("Set TELEGRAM_BOT_TOKEN in .env")
 
-settings = Settings()
-settings.validate()
+def load_settings(env: Optional[Mapping[str, str]] = None) -> Settings:
+    """Settings from `env` (default: the process environment, after reading .env)."""
+    return load(Settings, env)
 
-def build_kafka_config() -> dict:
-    """Build confluent-kafka Producer config from settings."""
-    cfg = {
+# The process-wide settings, loaded on first call; get_settings.set(...) swaps them (tests, benchmarks).
+get_settings = Lazy(load_settings)
+
+def build_adaptive_linger() -> Optional[AdaptiveLinger]:
+    """The ADAPTIVE_LINGER controller (None when disabled); pass it to build_kafka_config()."""
+    settings = get_settings()
+    if not settings.adaptive_linger:
+        return None
+    return AdaptiveLinger(settings.adaptive_linger_max_ms, settings.adaptive_target_batch)
+
+def build_kafka_config(adaptive: Optional[AdaptiveLinger] = None) -> dict:
+    """Build confluent-kafka Producer config from settings (PRODUCER_PROFILE on top of the basics)."""
+    settings = get_settings()
+    return _common_config(settings, {
         "bootstrap.servers": settings.brokers,
         "client.id": "telegram-control-bot",
-        "compression.type": "lz4",
         "socket.keepalive.enable": True,
-        "linger.ms": 5,
         "acks": "all",
         "retries": 5,
         "enable.idempotence": True,
-    }
+        **profile_config(settings.producer_profile),
+    }, adaptive)
+
+def build_ack_consumer_config() -> dict:
+    """Consumer config for the ack topic (only acks for commands sent after startup matter)."""
+    settings = get_settings()
+    return _common_config(settings, {
+        "bootstrap.servers": settings.brokers,
+        "client.id": "telegram-control-bot-acks",
+        "group.id": settings.ack_group_id,
+        "auto.offset.reset": "latest",
+        "enable.auto.commit": True,
+        "socket.keepalive.enable": True,
+    })
+
+def _common_config(settings: Settings, cfg: dict, adaptive: Optional[AdaptiveLinger] = None) -> dict:
+    hooks, interval = [], 0
+    if settings.metrics_port and settings.kafka_stats_interval_ms:
+        hooks.append(record_kafka_stats)
+        interval = settings.kafka_stats_interval_ms
+    if adaptive is not None:
+        hooks.append(adaptive.on_stats)
+        interval = min(interval or settings.adaptive_stats_interval_ms, settings.adaptive_stats_interval_ms)
+    if hooks:
+        cfg["statistics.interval.ms"] = interval
+        cfg["stats_cb"] = fan_out(hooks)
     if settings.security_protocol: cfg["security.protocol"] = settings.security_protocol
     if settings.sasl_mechanism:   cfg["sasl.mechanism"]     = settings.sasl_mechanism
     if settings.sasl_username:    cfg["sasl.username"]      = settings.sasl_username
@@ -0,0 +1,205 @@
+# Correlates control acks (published by the lock consumers) with the commands the bot sent
+from __future__ import annotations
+import asyncio
+import logging
+import threading
+import time
+from typing import Awaitable, Callable, Dict, FrozenSet, Iterable, List, NamedTuple, Optional
+from pcmedia.metrics import REGISTRY
+from pcmedia.routing import normalize
+from pcmedia.serde import Serde
+
+log = logging.getLogger(__name__)
+
+_ACKS = REGISTRY.counter("control_acks_total", "Acks received by outcome", ["outcome"])
+_COMMANDS = REGISTRY.counter("control_commands_total", "Tracked commands by final state", ["state"])
+_COMPLETION = REGISTRY.histogram("control_command_seconds", "Command sent to last expected ack")
+
+_FAILED_SAMPLE = 5   # failed machine names carried in each Progress
+
+class Command:
+    """
+    Ack state of one command. Sets, not per-ack records: a redelivered or repeated
+    ack costs a membership test, and counts are O(1) to read.
+    """
+    __slots__ = ("id", "chat_id", "message_id", "meta", "expected", "acked", "failed",
+                 "started", "deadline", "dirty")
+
+    def __init__(self, command_id: str, chat_id: int, message_id: int, meta: dict,
+                 expected: Optional[FrozenSet[str]], started: float, deadline: float) -> None:
+        self.id = command_id
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.meta = meta
+        self.expected = expected
+        self.acked: set = set()
+        self.failed: Dict[str, str] = {}   # machine -> status
+        self.started = started
+        self.deadline = deadline
+        self.dirty = False
+
+    @property
+    def open_ended(self) -> bool:
+        """Target was "all" or "tag:..." : nobody knows how many machines will answer."""
+        return self.expected is None
+
+    @property
+    def pending(self) -> Optional[int]:
+        if self.expected is None:
+            return None
+        return len(self.expected) - len(self.acked) - len(self.failed)
+
+class Progress(NamedTuple):
+    """Snapshot handed to the edit callback (taken under the aggregator's lock)."""
+    command: Command
+    acked: int
+    failed: int
+    pending: Optional[int]     # None when the target was open-ended ("all", "tag:...")
+    failed_machines: List[str]
+    final: bool
+    timed_out: bool            # never for open-ended targets: they just close at the deadline
+
+class AckAggregator:
+    """
+    Tracks in-flight commands by id. A consumer thread decodes acks in batches and
+    updates counters under one lock per batch; an asyncio task calls `edit` for
+    commands whose counts changed at most every `refresh` seconds, and once more
+    when a command completes or times out. Telegram edits therefore scale with the
+    number of commands, not acks.
+    """
+    def __init__(self, consumer, topic: str, serde: Serde, edit: Callable[[Progress], Awaitable[None]],
+                 timeout: float = 60.0, refresh: float = 2.0, batch_size: int = 500,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self._c = consumer
+        self._topic = topic
+        self._serde = serde
+        self._edit = edit
+        self._timeout = timeout
+        self._refresh = refresh
+        self._batch_size = batch_size
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._commands: Dict[str, Command] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # ---- command registry ----
+    def track(self, command_id: str, chat_id: int, message_id: int, meta: dict,
+              expected: Optional[FrozenSet[str]]) -> None:
+        """Register a command before sending it, so no ack can arrive unannounced."""
+        now = self._clock()
+        with self._lock:
+            self._commands[command_id] = Command(command_id, chat_id, message_id, meta, expected,
+                                                 now, now + self._timeout)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._commands)
+
+    # ---- ack ingestion (consumer thread) ----
+    def on_acks(self, acks: Iterable[dict]) -> int:
+        """Apply decoded ack payloads; returns how many matched a tracked command."""
+        matched = unknown = ok = failed = 0
+        with self._lock:
+            for ack in acks:
+                cmd = self._commands.get(ack.get("id") or "")
+                if cmd is None:
+                    unknown += 1   # another bot instance's command, or already finished
+                    continue
+                machine = normalize(ack.get("machine") or "")
+                if cmd.expected is not None and machine not in cmd.expected:
+                    unknown += 1
+                    continue
+                status = ack.get("status") or "ok"
+                if status == "ok":
+                    ok += 1
+                    if machine not in cmd.acked:
+                        cmd.failed.pop(machine, None)
+                        cmd.acked.add(machine)
+                        cmd.dirty = True
+                else:
+                    failed += 1
+                    if machine not in cmd.acked and cmd.failed.get(machine) != status:
+                        cmd.failed[machine] = status
+                        cmd.dirty = True
+                matched += 1
+        _ACKS.inc(ok, "ok")
+        _ACKS.inc(failed, "failed")
+        _ACKS.inc(unknown, "unknown")
+        return matched
+
+    def _decode(self, msgs) -> List[dict]:
+        acks = []
+        for msg in msgs:
+            if msg.error():
+                continue
+            try:
+                acks.append(self._serde.decode(msg.value()))
+            except Exception as e:
+                _ACKS.inc(1, "invalid")
+                log.warning("invalid ack: %s", e, extra={"event": "ack.invalid"})
+        return acks
+
+    def _consume_loop(self) -> None:
+        while not self._stop.is_set():
+            msgs = self._c.consume(self._batch_size, 0.5)
+            if msgs:
+                self.on_acks(self._decode(msgs))
+
+    # ---- Telegram updates (event loop) ----
+    def due(self) -> List[Progress]:
+        """
+        Snapshots of changed, completed and expired commands; the last two are dropped.
+        Open-ended commands have no completion point, so they close at their deadline with
+        whatever acks arrived (final, not timed out).
+        """
+        now = self._clock()
+        out = []
+        with self._lock:
+            for cid in list(self._commands):
+                cmd = self._commands[cid]
+                complete = cmd.pending == 0
+                expired = not complete and now >= cmd.deadline
+                if not (cmd.dirty or complete or expired):
+                    continue
+                cmd.dirty = False
+                timed_out = expired and not cmd.open_ended
+                if complete or expired:
+                    del self._commands[cid]
+                    _COMMANDS.inc(1, "complete" if complete else "timed_out" if timed_out else "closed")
+                    if complete:
+                        _COMPLETION.observe(now - cmd.started)
+                out.append(Progress(cmd, len(cmd.acked), len(cmd.failed), cmd.pending,
+                                    sorted(cmd.failed)[:_FAILED_SAMPLE], complete or expired, timed_out))
+        return out
+
+    async def refresh(self) -> None:
+        for progress in self.due():
+            try:
+                await self._edit(progress)
+            except Exception as e:
+                log.warning("ack progress edit failed (id=%s): %s", progress.command.id, e,
+                            extra={"event": "ack.edit_failed"})
+
+    async def _refresh_loop(self) -> None:
+        while not self._stop.is_set():
+            await asyncio.sleep(self._refresh)
+            await self.refresh()
+
+    # ---- lifecycle ----
+    def start(self) -> None:
+        """Subscribe, start the consumer thread and (on the running loop) the refresh task."""
+        self._c.subscribe([self._topic])
+        self._thread = threading.Thread(target=self._consume_loop, name="ack-consumer", daemon=True)
+        self._thread.start()
+        self._task = asyncio.get_running_loop().create_task(self._refresh_loop())
+        log.info("Tracking acks on %s", self._topic)
+
+    async def close(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+        if self._thread is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._thread.join, 5.0)
+        self._c.close()
@@ -1,41 +1,117 @@
 # Thin Kafka producer wrapper for control messages
 from __future__ import annotations
-import json
+import logging
+import uuid
 from datetime import datetime, timezone
+from typing import Sequence
 from confluent_kafka import Producer
-from src.config import build_kafka_config, settings
+from pcmedia.aio import AsyncOutboxProducer, AsyncProducer
+from pcmedia.metrics import REGISTRY, record_delivery
+from pcmedia.outbox import Outbox, OutboxProducer
+from pcmedia.profiles import LingerGate
+from pcmedia.routing import Router, partition_count
+from pcmedia.serde import SchemaRegistry, Serde, parse_formats
+from src.config import build_adaptive_linger, build_kafka_config, get_settings
+
+log = logging.getLogger(__name__)
+
+_CONTROL_SENT = REGISTRY.counter("control_sent_total", "Control events handed to Kafka", ["action"])
 
 class ControlProducer:
-    """Encapsulates Kafka producer for lock/unlock control events."""
-    def __init__(self) -> None:
-        self._p = Producer(build_kafka_config())
+    """
+    Encapsulates Kafka producer for lock/unlock control events; sends are
+    coroutines that never block the bot's event loop (see src/kafka/aio.py).
+    With OUTBOX_ENABLED, events are kept in a local on-disk outbox until Kafka
+    acknowledges them. `producer` may be an in-process stand-in.
+    """
+    def __init__(self, producer=None) -> None:
+        settings = get_settings()
+        self._topic = settings.topic_control
+        self.adaptive = build_adaptive_linger()
+        if producer is None:
+            producer = Producer(build_kafka_config(self.adaptive))
+        self._p = LingerGate(producer, self.adaptive) if self.adaptive is not None else producer
+        partitions = settings.control_partitions
+        if settings.routing_mode == "partition" and not partitions:
+            partitions = partition_count(self._p, settings.topic_control)
+        self._router = Router(settings.routing_mode, settings.topic_control, settings.broadcast_topic, partitions)
+        self._serde = Serde(
+            SchemaRegistry(settings.schema_registry_path),
+            parse_formats(settings.wire_formats),
+            default=settings.wire_format,
+        )
+        self._aio: AsyncProducer | AsyncOutboxProducer
+        if settings.outbox_enabled:
+            self._aio = AsyncOutboxProducer(OutboxProducer(
+                self._p,
+                Outbox(
+                    settings.outbox_dir,
+                    segment_bytes=settings.outbox_segment_bytes,
+                    fsync_every=settings.outbox_fsync_every,
+                    fsync_interval=settings.outbox_fsync_interval_ms / 1000.0,
+                ),
+                route=self._router.produce_args,
+            ))
+        else:
+            self._aio = AsyncProducer(
+                self._p,
+                max_in_flight=settings.producer_max_in_flight,
+                on_delivery=_log_delivery_error,
+            )
 
-    def send_control(self, action: str, target: str, actor: str) -> None:
+    async def send_control(self, action: str, target: str, actor: str, command_id: str | None = None) -> str:
         """
-        Send a control event to Kafka.
+        Send a control event to Kafka; returns its command id.
 
         Schema example:
         {
           "type": "control",
           "action": "lock" | "unlock",
-          "target": "all" | "<machineKey>",
+          "target": "all" | "tag:<name>" | "<machineKey>",
           "by": "telegram:<user_id>",
-          "ts": "<ISO8601 UTC>"
+          "ts": "<ISO8601 UTC>",
+          "id": "<command id>"          # echoed back in the consumers' acks
         }
         """
-        payload = {
-            "type": "control",
-            "action": action,
-            "target": target,
-            "by": actor,
-            "ts": datetime.now(timezone.utc).isoformat(),
-        }
-        self._p.produce(
-            settings.topic_control,
-            key=target,
-            value=json.dumps(payload, ensure_ascii=False).encode("utf-8")
-        )
-        self._p.poll(0)
+        return await self.send_command(action, [target], actor, command_id)
+
+    async def send_command(self, action: str, targets: Sequence[str], actor: str, command_id: str | None = None) -> str:
+        """
+        Fan one command out to several targets: one event per target, all with the
+        same command id, appended to the outbox with a single fsync. Returns once
+        every event is queued (or on disk, with the outbox).
+        """
+        command_id = command_id or new_command_id()
+        records = self.encode_command(action, targets, actor, command_id)
+        _CONTROL_SENT.inc(len(records), action)
+        label = targets[0] if len(targets) == 1 else f"{len(targets)} targets"
+        log.info("control %s -> %s by %s (id=%s)", action, label, actor, command_id, extra={"event": "control.sent"})
+        if isinstance(self._aio, AsyncOutboxProducer):
+            await (await self._aio.produce_batch(records))
+            return command_id
+        for topic, target, value in records:
+            await self._aio.produce(topic, target, value, **self._router.produce_args(topic, target.encode("utf-8")))
+        return command_id
+
+    def encode_command(self, action: str, targets: Sequence[str], actor: str, command_id: str) -> list:
+        """(topic, key, value) records of a command, one per target."""
+        ts = datetime.now(timezone.utc).isoformat()
+        records = []
+        for target in targets:
+            payload = {"type": "control", "action": action, "target": target, "by": actor, "ts": ts, "id": command_id}
+            # Wire format is configured for the control topic as a whole (machine/broadcast topics included).
+            value = self._serde.encode(self._topic, "control", payload)
+            records.append((self._router.topic_for(target), target, value))
+        return records
+
+    async def flush(self, timeout: float = 5.0) -> None:
+        """Deliver (or persist) everything queued and stop the background threads."""
+        await self._aio.close(timeout)
+
+def new_command_id() -> str:
+    return uuid.uuid4().hex[:16]
 
-    def flush(self, timeout: float = 5.0) -> None:
-        self._p.flush(timeout)
+def _log_delivery_error(err, msg) -> None:
+    record_delivery(err, msg)
+    if err is not None:
+        log.warning("control delivery failed: %s", err, extra={"event": "kafka.delivery_failed"})
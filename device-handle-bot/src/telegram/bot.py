@@ -1,26 +1,29 @@
-# Telegram bot with inline buttons: Lock / Unlock
+# Telegram bot with inline buttons (Lock / Unlock) and /lock, /unlock <target> commands
 from __future__ import annotations
-from typing import Final
+import functools
+import html
+from typing import TYPE_CHECKING, Optional, Sequence
 from datetime import datetime
-from telegram import (
-    Update,
-    InlineKeyboardButton,
-    InlineKeyboardMarkup,
-)
-from telegram.constants import ParseMode
-from telegram.ext import (
-    Application,
-    ApplicationBuilder,
-    CallbackQueryHandler,
-    CommandHandler,
-    ContextTypes,
-)
-from src.config import settings
-from src.kafka.producer import ControlProducer
-
-# Build inline keyboard (two actions)
+from pcmedia.metrics import REGISTRY, serve
+from pcmedia.serde import SchemaRegistry, Serde
+from src.config import build_ack_consumer_config, get_settings
+from src.kafka.acks import AckAggregator, Progress
+from src.telegram.targets import load_groups, resolve
+
+# python-telegram-bot and confluent_kafka are most of the startup time: imported by build_app()
+# and the handlers it registers, once the settings are known to be usable.
+if TYPE_CHECKING:
+    from telegram import InlineKeyboardMarkup, Message, Update
+    from telegram.ext import Application, ContextTypes
+    from src.kafka.producer import ControlProducer
+
+_PRESS_SECONDS = REGISTRY.histogram("bot_button_seconds", "Button press handling time", ["action"])
+
+# Build inline keyboard (two actions); telegram objects are immutable, so one per target label is reused
+@functools.lru_cache(maxsize=64)
 def main_keyboard(target_label: str) -> InlineKeyboardMarkup:
     """Return the main inline keyboard."""
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
     buttons = [
         [
             InlineKeyboardButton(text="🔒 Bloquear", callback_data="lock"),
@@ -34,17 +37,20 @@ def main_keyboard(target_label: str) -> InlineKeyboardMarkup:
 
 def user_allowed(user_id: int) -> bool:
     """Check if user is in allowlist (if provided)."""
-    if not settings.allowed_user_ids:
+    allowed = get_settings().allowed_user_ids
+    if not allowed:
         return True
-    return user_id in settings.allowed_user_ids
+    return user_id in allowed
 
 async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show welcome and keyboard."""
+    from telegram.constants import ParseMode
     user = update.effective_user
     if not user_allowed(user.id):
         await update.message.reply_text("⛔ No autorizado.")
         return
 
+    settings = get_settings()
     target = settings.machine_target
     title  = settings.bot_title
     msg = (
@@ -58,8 +64,62 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         parse_mode=ParseMode.HTML
     )
 
+def progress_text(meta: dict, acked: int = 0, failed: int = 0, pending: Optional[int] = None,
+                  failed_machines: Sequence[str] = (), final: bool = False, timed_out: bool = False,
+                  tracked: bool = True) -> str:
+    """Command status message: sent/complete/timed out plus ack counts (when acks are tracked)."""
+    lock = meta["action"] == "lock"
+    if timed_out:
+        status = "⌛ Bloqueo: tiempo de espera agotado" if lock else "⌛ Desbloqueo: tiempo de espera agotado"
+    elif final and tracked and pending is None:
+        # open-ended target ("all", "tag:..."): closed at ACK_TIMEOUT_SEC with whatever answered
+        status = (f"🏁 {'Bloqueo' if lock else 'Desbloqueo'} finalizado: "
+                  f"{acked} confirmado(s) / {failed} con error")
+    elif final:
+        status = "🔒 Bloqueo completado" if lock else "🔓 Desbloqueo completado"
+    else:
+        status = "🔒 Bloqueo enviado" if lock else "🔓 Desbloqueo enviado"
+    lines = [f"<b>{get_settings().bot_title}</b>", status, f"🎯 Destino: <code>{html.escape(meta['target'])}</code>"]
+    if tracked:
+        counts = f"✅ {acked} · ❌ {failed}"
+        if pending is not None:
+            counts += f" · ⏳ {pending}"
+        lines.append(counts)
+        if failed_machines:
+            more = "…" if failed > len(failed_machines) else ""
+            lines.append("❌ " + ", ".join(html.escape(m) for m in failed_machines) + more)
+    lines.append(f"🕑 {meta['time']}")
+    return "\n".join(lines)
+
+async def dispatch(context: ContextTypes.DEFAULT_TYPE, action: str, spec: str, actor: str, message: Message) -> None:
+    """Send `action` to the target expression `spec`; `message` shows its progress (edited in place)."""
+    from telegram.constants import ParseMode
+    from src.kafka.producer import new_command_id
+    keyboard = main_keyboard(target_label=get_settings().machine_target)
+    try:
+        targets, expected = resolve(spec, context.bot_data["groups"])
+    except ValueError as e:
+        await message.edit_text(f"⚠️ Destino no válido: {html.escape(str(e))}", reply_markup=keyboard)
+        return
+
+    producer: ControlProducer = context.bot_data["producer"]
+    acks: Optional[AckAggregator] = context.bot_data.get("acks")
+    meta = {"action": action, "target": spec, "time": datetime.now().strftime("%d/%m/%Y %H:%M:%S")}
+    command_id = new_command_id()
+    # The initial "sent" state goes out before the command is tracked: from then on the
+    # aggregator owns the message, so this edit can never overwrite newer ack counts.
+    await message.edit_text(
+        progress_text(meta, pending=len(expected) if expected is not None else None, tracked=acks is not None),
+        reply_markup=keyboard,
+        parse_mode=ParseMode.HTML
+    )
+    if acks is not None:
+        acks.track(command_id, message.chat_id, message.message_id, meta, expected)
+    with _PRESS_SECONDS.time(action):
+        await producer.send_command(action, targets, actor, command_id)
+
 async def on_press(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Handle lock/unlock button presses."""
+    """Handle lock/unlock button presses (target: MACHINE_TARGET)."""
     q = update.callback_query
     await q.answer()
 
@@ -75,33 +135,68 @@ async def on_press(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if action == "noop":
         return
 
-    # Send control event to Kafka
-    producer: ControlProducer = context.bot_data["producer"]
-    actor = f"telegram:{user.id}"
-    producer.send_control(action=action, target=settings.machine_target, actor=actor)
-
-    # Feedback to user (keep keyboard)
-    status = "🔒 Bloqueo enviado" if action == "lock" else "🔓 Desbloqueo enviado"
-    time_str = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-    text = (
-        f"<b>{settings.bot_title}</b>\n"
-        f"{status}\n"
-        f"🎯 Destino: <code>{settings.machine_target}</code>\n"
-        f"🕑 {time_str}"
+    await dispatch(context, action, get_settings().machine_target, f"telegram:{user.id}", q.message)
+
+async def cmd_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/lock <target> and /unlock <target>, e.g. "/lock @office", "/lock pc-01,pc-02", "/lock tag:lab"."""
+    user = update.effective_user
+    if not user_allowed(user.id):
+        await update.message.reply_text("⛔ No autorizado.")
+        return
+    action = update.message.text.split()[0].lstrip("/").split("@")[0].lower()
+    spec = ",".join(context.args) if context.args else get_settings().machine_target
+    message = await update.message.reply_text("⏳ Enviando…")
+    await dispatch(context, action, spec, f"telegram:{user.id}", message)
+
+async def _start_acks(app: Application) -> None:
+    from confluent_kafka import Consumer
+    settings = get_settings()
+    if not settings.ack_topic:
+        return
+    acks = AckAggregator(
+        Consumer(build_ack_consumer_config()),
+        settings.ack_topic,
+        Serde(SchemaRegistry(settings.schema_registry_path)),
+        edit=lambda p: _edit_progress(app, p),
+        timeout=settings.ack_timeout_sec,
+        refresh=settings.ack_refresh_sec,
     )
-    await q.edit_message_text(
-        text,
-        reply_markup=main_keyboard(target_label=settings.machine_target),
-        parse_mode=ParseMode.HTML
+    acks.start()
+    app.bot_data["acks"] = acks
+
+async def _shutdown(app: Application) -> None:
+    """Stop ack tracking and flush the producer (outbox records stay on disk for the next start)."""
+    acks: Optional[AckAggregator] = app.bot_data.pop("acks", None)
+    if acks is not None:
+        await acks.close()
+    producer: ControlProducer = app.bot_data["producer"]
+    await producer.flush(5.0)
+
+async def _edit_progress(app: Application, p: Progress) -> None:
+    from telegram.constants import ParseMode
+    await app.bot.edit_message_text(
+        progress_text(p.command.meta, p.acked, p.failed, p.pending, p.failed_machines, p.final, p.timed_out),
+        chat_id=p.command.chat_id,
+        message_id=p.command.message_id,
+        reply_markup=main_keyboard(target_label=get_settings().machine_target),
+        parse_mode=ParseMode.HTML,
     )
 
 def build_app() -> Application:
-    """Wire Telegram app with Kafka producer in bot_data."""
-    app = ApplicationBuilder().token(settings.bot_token).build()
+    """Wire Telegram app with Kafka producer (and the ack aggregator) in bot_data."""
+    settings = get_settings()
+    settings.validate()
+    from telegram.ext import ApplicationBuilder, CallbackQueryHandler, CommandHandler
+    from src.kafka.producer import ControlProducer
+
+    app = ApplicationBuilder().token(settings.bot_token).post_init(_start_acks).post_shutdown(_shutdown).build()
+    serve(settings.metrics_port, settings.metrics_host)
     # Store a singleton producer in bot_data
     app.bot_data["producer"] = ControlProducer()
+    app.bot_data["groups"] = load_groups(settings.groups_path)
 
     app.add_handler(CommandHandler("start", cmd_start))
+    app.add_handler(CommandHandler(["lock", "unlock"], cmd_action))
     app.add_handler(CallbackQueryHandler(on_press))
 
     return app
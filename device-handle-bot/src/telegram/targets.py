@@ -0,0 +1,55 @@
+# Target expressions for control commands: machines, "all", tags and named groups
+from __future__ import annotations
+import json
+import logging
+import os
+from typing import Dict, FrozenSet, List, Optional, Tuple
+from pcmedia.routing import BROADCAST, TAG_PREFIX, normalize
+
+log = logging.getLogger(__name__)
+
+GROUP_PREFIX = "@"
+
+def load_groups(path: Optional[str]) -> Dict[str, List[str]]:
+    """Read {"group": ["pc-01", ...]} from `path`; a missing file means no groups."""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    groups = {normalize(name): [normalize(m) for m in machines] for name, machines in data.items()}
+    log.info("Loaded %d machine group(s) from %s", len(groups), path)
+    return groups
+
+def resolve(spec: str, groups: Dict[str, List[str]]) -> Tuple[List[str], Optional[FrozenSet[str]]]:
+    """
+    Expand a target expression into (targets to send to, machines expected to ack).
+
+    "pc-01"            -> one machine
+    "pc-01,pc-02"      -> those machines
+    "@office"          -> the machines of group "office"
+    "all" / "tag:lab"  -> one broadcast event; who receives it is unknown here, so
+                          the expected set is None (acks are counted, pending is not)
+    Machines named several times are sent one event. Raises ValueError for an
+    unknown group or an empty expression.
+    """
+    targets: List[str] = []
+    seen = set()
+    open_ended = False
+    for part in spec.split(","):
+        part = normalize(part)
+        if not part:
+            continue
+        if part.startswith(GROUP_PREFIX):
+            members = groups.get(part[len(GROUP_PREFIX):])
+            if members is None:
+                raise ValueError(f"unknown group: {part}")
+        else:
+            members = [part]
+            open_ended = open_ended or part == BROADCAST or part.startswith(TAG_PREFIX)
+        for m in members:
+            if m not in seen:
+                seen.add(m)
+                targets.append(m)
+    if not targets:
+        raise ValueError("empty target")
+    return targets, None if open_ended else frozenset(targets)
@@ -0,0 +1,47 @@
+# AckAggregator completion: known target sets complete or time out, open-ended ones close at the deadline
+from __future__ import annotations
+from src.kafka.acks import AckAggregator
+
+def aggregator(clock: dict) -> AckAggregator:
+    async def edit(progress) -> None:
+        pass
+    return AckAggregator(None, "pc.activity.control.ack", None, edit, timeout=60.0, clock=lambda: clock["now"])
+
+def ack(command_id: str, machine: str, status: str = "ok") -> dict:
+    return {"type": "ack", "id": command_id, "machine": machine, "action": "lock", "status": status}
+
+def test_known_targets_complete_when_every_machine_answered():
+    clock = {"now": 0.0}
+    agg = aggregator(clock)
+    agg.track("c1", 1, 10, {}, frozenset({"pc-01", "pc-02"}))
+    agg.on_acks([ack("c1", "pc-01")])
+    [p] = agg.due()
+    assert (p.acked, p.pending, p.final) == (1, 1, False)
+    agg.on_acks([ack("c1", "PC-02", "failed")])
+    [p] = agg.due()
+    assert (p.acked, p.failed, p.pending, p.final, p.timed_out) == (1, 1, 0, True, False)
+    assert agg.in_flight == 0
+
+def test_known_targets_time_out_with_machines_pending():
+    clock = {"now": 0.0}
+    agg = aggregator(clock)
+    agg.track("c1", 1, 10, {}, frozenset({"pc-01", "pc-02"}))
+    agg.on_acks([ack("c1", "pc-01"), ack("c1", "pc-99")])   # pc-99 was not targeted
+    agg.due()
+    clock["now"] = 60.0
+    [p] = agg.due()
+    assert (p.acked, p.pending, p.final, p.timed_out) == (1, 1, True, True)
+
+def test_open_ended_targets_close_at_the_deadline_without_timing_out():
+    clock = {"now": 0.0}
+    agg = aggregator(clock)
+    agg.track("c1", 1, 10, {}, None)
+    agg.on_acks([ack("c1", "pc-01"), ack("c1", "pc-02"), ack("c1", "pc-03", "failed")])
+    [p] = agg.due()
+    assert (p.acked, p.failed, p.pending, p.final) == (2, 1, None, False)
+    clock["now"] = 59.0
+    assert agg.due() == []
+    clock["now"] = 60.0
+    [p] = agg.due()
+    assert (p.acked, p.failed, p.pending, p.final, p.timed_out) == (2, 1, None, True, False)
+    assert agg.in_flight == 0
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Platform backends for the control actions (PLATFORM_BACKEND):
+- "windows": user32/kernel32 through ctypes (LockWorkStation, wake the display).
+- "sim": records each action instead (memory, optionally a JSONL file), so the
+  consumer runs headless on any OS for load tests and fleet simulations.
+"""
+
+from __future__ import annotations
+import ctypes
+import json
+import logging
+import threading
+import time
+from typing import List, Optional, Protocol, Tuple
+
+log = logging.getLogger("consumer_lock")
+
+# SetThreadExecutionState constants
+ES_AWAYMODE_REQUIRED   = 0x00000040
+ES_CONTINUOUS          = 0x80000000
+ES_DISPLAY_REQUIRED    = 0x00000002
+ES_SYSTEM_REQUIRED     = 0x00000001
+
+# keybd_event constants
+KEYEVENTF_KEYUP = 0x0002
+VK_SHIFT        = 0x10
+
+BACKENDS = ("windows", "sim")
+
+class Actions(Protocol):
+    def lock(self) -> bool:
+        """Lock the workstation; True if it was locked."""
+        ...
+
+    def wake(self) -> bool:
+        """Wake the display (a locked session stays locked); True on success."""
+        ...
+
+class User32Actions:
+    """The real thing (requires an interactive Windows session)."""
+    def __init__(self) -> None:
+        # windll is missing off Windows; calls then fail and are logged
+        windll = getattr(ctypes, "windll", None)
+        self._user32 = windll.user32 if windll else None
+        self._kernel32 = windll.kernel32 if windll else None
+
+    def lock(self) -> bool:
+        """Locks the current workstation (requires interactive session)."""
+        try:
+            return bool(self._user32.LockWorkStation())
+        except Exception as exc:
+            log.warning("LockWorkStation failed: %s", exc)
+            return False
+
+    def wake(self) -> bool:
+        """
+        Try to wake the display and keep the system from sleeping briefly.
+        Note: This does NOT unlock a Windows locked session (login required).
+        """
+        try:
+            # Keep system/display on for a short period
+            self._kernel32.SetThreadExecutionState(
+                ES_CONTINUOUS | ES_SYSTEM_REQUIRED | ES_DISPLAY_REQUIRED
+            )
+            # Send a SHIFT key tap to wake displays
+            self._user32.keybd_event(VK_SHIFT, 0, 0, 0)
+            self._user32.keybd_event(VK_SHIFT, 0, KEYEVENTF_KEYUP, 0)
+            return True
+        except Exception as exc:
+            log.warning("wake_display failed: %s", exc)
+            return False
+
+class RecordingActions:
+    """
+    Simulated machine: every action succeeds and is recorded as (action, epoch
+    seconds) in `actions`, and appended to `path` as a JSON line when given
+    ({"machine", "action", "ts"}), so a fleet run can be checked afterwards.
+    """
+    def __init__(self, machine: str = "", path: Optional[str] = None) -> None:
+        self.machine = machine
+        self.actions: List[Tuple[str, float]] = []
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8", buffering=1) if path else None
+
+    def _record(self, action: str) -> bool:
+        ts = time.time()
+        with self._lock:
+            self.actions.append((action, ts))
+            if self._file is not None:
+                self._file.write(json.dumps({"machine": self.machine, "action": action, "ts": ts}) + "\n")
+        return True
+
+    def lock(self) -> bool:
+        return self._record("lock")
+
+    def wake(self) -> bool:
+        return self._record("wake")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+def build_actions(name: str, machine: str = "", record_path: Optional[str] = None) -> Actions:
+    if name == "windows":
+        return User32Actions()
+    if name == "sim":
+        return RecordingActions(machine, record_path)
+    raise SystemExit(f"Unknown PLATFORM_BACKEND={name} (expected one of {', '.join(BACKENDS)})")
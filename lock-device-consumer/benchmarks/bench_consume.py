@@ -0,0 +1,51 @@
+# Messages/second through the lock consumer loop: single poll() mode vs batch consume() mode.
+# Uses an in-process fake broker; handler output goes to /dev/null so both modes pay the same.
+# Run from lock-device-consumer/:  python -m benchmarks.bench_consume --messages 100000
+from __future__ import annotations
+import argparse
+import contextlib
+import dataclasses
+import json
+import os
+import time
+import consumer_lock
+from pcbench.fake_kafka import FakeConsumer, FakeMessage
+
+# Defaults, whatever the local environment says; the logs carry fixed 2025 timestamps, so no age limit.
+CONFIG = dataclasses.replace(consumer_lock.load_config({}), max_command_age_sec=0)
+
+def build_log(n: int, partitions: int) -> list[FakeMessage]:
+    msgs, offsets = [], [0] * partitions
+    for i in range(n):
+        target = f"pc-{i % 1000}"  # never this machine: measures the ignore path
+        p = i % partitions
+        value = json.dumps({"type": "control", "action": "lock", "target": target,
+                            "by": "telegram:1", "ts": "2025-01-01T00:00:00+00:00"}).encode("utf-8")
+        msgs.append(FakeMessage(CONFIG.topic, p, offsets[p], target.encode(), value))
+        offsets[p] += 1
+    return msgs
+
+def run(msgs: list[FakeMessage], batch_size: int) -> tuple[float, int]:
+    consumer_lock.get_config.set(dataclasses.replace(CONFIG, batch_size=batch_size))
+    fake = FakeConsumer(msgs, on_empty=consumer_lock.stop_consumer)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        t0 = time.perf_counter()
+        consumer_lock.run_consumer(consumer=fake)
+        elapsed = time.perf_counter() - t0
+    return elapsed, fake.commits
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=100_000)
+    ap.add_argument("--partitions", type=int, default=6)
+    args = ap.parse_args()
+    msgs = build_log(args.messages, args.partitions)
+
+    print(f"[i] {args.messages} control messages, {args.partitions} partitions")
+    for batch_size in (1, 50, 500):
+        elapsed, commits = run(msgs, batch_size)
+        mode = "single poll()" if batch_size == 1 else f"batch x{batch_size}"
+        print(f"    {mode:<14}: {args.messages / elapsed:10.0f} msg/s  commits={commits}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# End-to-end: control events produced like the control bot's -> broker -> run_consumer() (sim platform)
+# -> ack -> broker -> a plain consumer of the ack topic. The consumer under test is pc-0000; with
+# --machines N the events are spread over N machines and only 1 in N is executed and acked (the
+# rest exercise the header pre-filter). Latency runs from the intended send time to the ack's receipt;
+# CPU per message covers every stage (same process). See benchmarks/pcbench/loadgen.py.
+# Run from lock-device-consumer/:  python -m benchmarks.bench_e2e --rate 1000 [--machines 20]
+#                                  [--broker localhost:9025] [--routing partition] [--batch-size 1] [--json out.json]
+from __future__ import annotations
+import argparse
+import dataclasses
+import threading
+import time
+from datetime import datetime, timezone
+import consumer_lock
+from actions import RecordingActions
+from pcbench import loadgen
+from pcmedia.routing import MODES, Router, machine_topic
+from pcmedia.serde import Serde
+
+# What the control bot's build_kafka_config() sets for its producer (--kafka overrides the ack producer).
+BOT_PRODUCER = {"client.id": "telegram-control-bot", "compression.type": "lz4", "linger.ms": 5, "acks": "all"}
+ACK_PRODUCER = {"linger.ms": 5, "compression.type": "lz4"}   # as run_consumer() configures it
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    loadgen.add_common_args(ap)
+    ap.set_defaults(machines=1, batch_size=50)
+    ap.add_argument("--batch-linger-ms", type=int, default=200, help="consumer BATCH_LINGER_MS")
+    ap.add_argument("--routing", default="shared", choices=MODES, help="ROUTING_MODE")
+    args = ap.parse_args()
+
+    topic = loadgen.bench_topic("pc.activity.control", args.broker)
+    machines = [f"pc-{i:04d}" for i in range(args.machines)]
+    cfg = dataclasses.replace(consumer_lock.load_config({}), brokers=args.broker, topic=topic, machine_key=machines[0],
+                              broadcast_topic="", ack_topic=None, routing_mode=args.routing,
+                              control_partitions=args.partitions, batch_size=args.batch_size,
+                              batch_linger_ms=args.batch_linger_ms, platform_backend="sim", metrics_port=0)
+    topics = [topic, cfg.broadcast_topic, cfg.ack_topic]
+    if args.routing == "topic":
+        topics += [machine_topic(topic, m) for m in machines]
+    fake = loadgen.setup(args.broker, topics, args.partitions)
+    kafka = {**ACK_PRODUCER, **loadgen.parse_overrides(args.kafka)}
+
+    consumer_lock.get_config.set(cfg)
+    actions = RecordingActions(cfg.machine_key)
+    consumer_lock.get_actions.set(actions)
+    lat = loadgen.Latencies()
+    serde = Serde()
+    receiver = loadgen.Receiver(loadgen.make_consumer(args.broker, fake), [cfg.ack_topic],
+                                lambda msg: lat.received(serde.decode(msg.value())["id"]))
+    thread = threading.Thread(target=consumer_lock.run_consumer, name="consumer",
+                              kwargs={"consumer": loadgen.make_consumer(args.broker, fake),
+                                      "ack_producer": loadgen.make_producer(args.broker, fake, kafka, args.partitions)})
+    thread.start()
+
+    producer = loadgen.make_producer(args.broker, fake, BOT_PRODUCER, args.partitions)
+    router = Router(args.routing, topic, cfg.broadcast_topic, args.partitions)
+    offered = 0
+    with loadgen.Meter() as meter:
+        for i, due in enumerate(loadgen.schedule(args.rate, args.seconds, time.monotonic() + 0.5)):
+            while (delay := due - time.monotonic()) > 0:
+                producer.poll(delay)   # serve delivery reports while pacing
+            target = machines[i % args.machines]
+            command_id = f"{i:016x}"
+            payload = {"type": "control", "action": "lock", "target": target, "by": "bench:1",
+                       "ts": datetime.now(timezone.utc).isoformat(), "id": command_id}
+            if target == cfg.machine_key:
+                lat.sent(command_id, due)
+            dest = router.topic_for(target)
+            producer.produce(dest, key=target, value=serde.encode(topic, "control", payload),
+                             **router.produce_args(dest, target.encode("utf-8")))
+            producer.poll(0)
+            offered += 1
+        producer.flush(10)
+        lat.wait(10.0)
+    consumer_lock.stop_consumer()
+    thread.join()
+    receiver.close()
+    stage = f"lock.consumer[{args.routing}]" + (f"[batch x{args.batch_size}]" if args.batch_size > 1 else "[single]")
+    loadgen.report(loadgen.result(stage, args, lat, meter, kafka, offered=offered, executed=len(actions.actions),
+                                  batch_linger_ms=args.batch_linger_ms), args.json)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# Fleet simulation: control commands for thousands of machines through each ROUTING_MODE.
+# Every simulated machine runs the real consumer loop against an in-process broker stand-in;
+# reports messages fetched/decoded per machine, fleet CPU time and whether every machine
+# executed exactly the commands addressed to it.
+# Run from lock-device-consumer/:  python -m benchmarks.bench_routing --machines 2000 --commands 2000
+from __future__ import annotations
+import argparse
+import dataclasses
+import json
+import random
+import time
+import zlib
+import consumer_lock
+from pcbench.fake_kafka import FakeBroker, FakeConsumer, FakeMessage
+from pcmedia import routing
+from confluent_kafka import TopicPartition
+
+# Defaults, whatever the local environment says; the logs carry fixed 2025 timestamps, so no age limit.
+CONFIG = dataclasses.replace(consumer_lock.load_config({}), max_command_age_sec=0)
+TOPIC = CONFIG.topic
+BROADCAST_TOPIC = f"{TOPIC}.all"
+
+def commands(n: int, machines: list[str], broadcast: float, seed: int) -> list[str]:
+    rnd = random.Random(seed)
+    return [routing.BROADCAST if rnd.random() < broadcast else rnd.choice(machines) for _ in range(n)]
+
+def build_broker(targets: list[str], mode: str, partitions: int, headers: bool) -> FakeBroker:
+    """Lay the commands out the way ControlProducer would for `mode`."""
+    router = routing.Router(mode, TOPIC, BROADCAST_TOPIC, partitions)
+    offsets: dict = {}
+    msgs = []
+    for target in targets:
+        value = json.dumps({"type": "control", "action": "lock", "target": target,
+                            "by": "telegram:1", "ts": "2025-01-01T00:00:00+00:00"}).encode("utf-8")
+        key = target.encode("utf-8")
+        topic = router.topic_for(target)
+        args = router.produce_args(topic, key)
+        # Default partitioner stand-in: hash of the key.
+        p = args.get("partition", zlib.crc32(key) % partitions if topic == TOPIC else 0)
+        off = offsets.get((topic, p), 0)
+        offsets[(topic, p)] = off + 1
+        msgs.append(FakeMessage(topic, p, off, key, value, headers=args["headers"] if headers else None))
+    return FakeBroker(msgs)
+
+class _SharedGroup(FakeConsumer):
+    """Legacy setup: one group for the whole fleet, so each machine only gets its share of partitions."""
+    index = 0
+    fleet = 1
+
+    def subscribe(self, topics, on_assign=None, on_revoke=None, on_lost=None) -> None:
+        owned = [tp for i, tp in enumerate(sorted(tp for tp in self._log if tp[0] in topics))
+                 if i % self.fleet == self.index]
+        self.assign([TopicPartition(t, p) for t, p in owned])
+
+def simulate(broker: FakeBroker, machines: list[str], targets: list[str], mode: str, partitions: int,
+             shared_group: bool = False) -> dict:
+    executed = {m: 0 for m in machines}
+    current = {"machine": ""}
+
+    def lock_workstation() -> bool:
+        executed[current["machine"]] += 1
+        return True
+
+    consumer_lock.lock_workstation = lock_workstation
+    config = dataclasses.replace(CONFIG, routing_mode=mode, broadcast_topic=BROADCAST_TOPIC,
+                                 control_partitions=partitions, batch_size=500)
+    messages = consumer_lock.REGISTRY.counter("control_messages_total", "", ["outcome"])
+    before = {k: messages.value(k) for k in ("filtered", "handled", "ignored", "invalid")}
+
+    fetched = 0
+    t0 = time.process_time()
+    for i, machine in enumerate(machines):
+        current["machine"] = machine
+        consumer_lock.get_config.set(dataclasses.replace(config, machine_key=machine))
+        if shared_group:
+            fake = _SharedGroup(broker, on_empty=consumer_lock.stop_consumer)
+            fake.index, fake.fleet = i, len(machines)
+        else:
+            fake = FakeConsumer(broker, on_empty=consumer_lock.stop_consumer)
+        consumer_lock.run_consumer(consumer=fake)
+        fetched += sum(len(fake._log[tp]) for tp in fake._rr)
+    cpu = time.process_time() - t0
+
+    expected = {m: 0 for m in machines}
+    for t in targets:
+        if t == routing.BROADCAST:
+            for m in machines:
+                expected[m] += 1
+        else:
+            expected[t] += 1
+    decoded = sum(messages.value(k) - before[k] for k in ("handled", "ignored", "invalid"))
+    return {
+        "fetched": fetched / len(machines),
+        "decoded": decoded / len(machines),
+        "filtered": (messages.value("filtered") - before["filtered"]) / len(machines),
+        "cpu": cpu,
+        "wrong": sum(1 for m in machines if executed[m] != expected[m]),
+    }
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--machines", type=int, default=2000)
+    ap.add_argument("--commands", type=int, default=2000)
+    ap.add_argument("--partitions", type=int, default=24)
+    ap.add_argument("--broadcast", type=float, default=0.05, help="fraction of commands with target=all")
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    machines = [f"pc-{i:05d}" for i in range(args.machines)]
+    targets = commands(args.commands, machines, args.broadcast, args.seed)
+    P = args.partitions
+    runs = [
+        ("shared group (before)", "shared", False, True),
+        ("per-machine group, decode all", "shared", False, False),
+        ("per-machine group + headers", "shared", True, False),
+        ("partition routing", "partition", True, False),
+        ("topic routing", "topic", True, False),
+    ]
+    print(f"[i] {args.machines} machines, {args.commands} commands "
+          f"({args.broadcast:.0%} broadcast), {P} partitions")
+    print(f"    {'mode':<31} {'fetched/pc':>10} {'decoded/pc':>10} {'filtered/pc':>11} {'fleet CPU':>10} {'wrong pcs':>9}")
+    for label, mode, headers, shared_group in runs:
+        broker = build_broker(targets, mode, P, headers)
+        r = simulate(broker, machines, targets, mode, P, shared_group)
+        print(f"    {label:<31} {r['fetched']:10.1f} {r['decoded']:10.1f} {r['filtered']:11.1f} "
+              f"{r['cpu']:9.2f}s {r['wrong']:9d}")
+
+if __name__ == "__main__":
+    main()
@@ -1,155 +1,376 @@
 # -*- coding: utf-8 -*-
 """
 Kafka -> Windows control consumer (lock / wake).
-- Listens to control topic (JSON messages).
-- If action == "lock" and target == this machine (or "all"), calls LockWorkStation.
+- Listens to control topic (JSON or schema-tagged msgpack messages, see pcmedia/serde.py).
+- If action == "lock" and target == this machine (or "all", or one of its MACHINE_TAGS), calls LockWorkStation.
 - If action == "unlock": wakes display (can't bypass Windows login).
+- Commands carrying an "id" are acknowledged on ACK_TOPIC with the execution result.
 """
 
-import os
-import json
-import time
-import ctypes
-from ctypes import wintypes
-from datetime import datetime
-from typing import Optional
+from __future__ import annotations
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import FrozenSet, Mapping, Optional
 
-# Optional .env
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-except Exception:
-    pass
+from confluent_kafka import Consumer, KafkaException, KafkaError, Producer, TopicPartition
+from actions import Actions, build_actions
+from pcmedia.envconfig import Lazy, env_field, load
+from pcmedia.logs import setup_logging
+from pcmedia.metrics import REGISTRY, age_seconds, record_delivery, record_kafka_stats, serve
+from pcmedia.retry import RetryBackoff
+from pcmedia.routing import MODES, machine_topic, matches, normalize, partition_count, partition_for, wanted
+from pcmedia.serde import SchemaRegistry, Serde
 
-from confluent_kafka import Consumer, KafkaException, KafkaError
+log = logging.getLogger("consumer_lock")
 
 # -------- Config --------
-BROKERS     = os.getenv("KAFKA_BROKERS", "localhost:9092")
-TOPIC       = os.getenv("TOPIC_CONTROL", "pc.activity.control")
-GROUP_ID    = os.getenv("GROUP_ID", "pc-lock-consumer")
-MACHINE_KEY = os.getenv("MACHINE_KEY") or os.environ.get("COMPUTERNAME") or "pc"
-
-# -------- Windows helpers --------
-# user32.LockWorkStation
-_user32 = ctypes.windll.user32
-_kernel32 = ctypes.windll.kernel32
-
-# SetThreadExecutionState constants
-ES_AWAYMODE_REQUIRED   = 0x00000040
-ES_CONTINUOUS          = 0x80000000
-ES_DISPLAY_REQUIRED    = 0x00000002
-ES_SYSTEM_REQUIRED     = 0x00000001
-
-# keybd_event constants
-KEYEVENTF_KEYUP = 0x0002
-VK_SHIFT        = 0x10
+def _tags(value: str) -> FrozenSet[str]:
+    return frozenset(normalize(t) for t in value.split(",") if t.strip())
+
+@dataclass(frozen=True)
+class Config:
+    """Environment variables (and an optional .env), read by load_config()."""
+    brokers: str     = env_field("KAFKA_BROKERS", "localhost:9092")
+    topic: str       = env_field("TOPIC_CONTROL", "pc.activity.control")
+    machine_key: str = env_field(("MACHINE_KEY", "COMPUTERNAME"), "pc")
+    # Commands targeted "tag:<name>" reach every machine listing <name> here (comma separated)
+    machine_tags: FrozenSet[str] = env_field("MACHINE_TAGS", frozenset(), parse=_tags)
+    # One consumer group per machine ("{machine}" is replaced): a shared group would split the
+    # partitions between machines, and each would miss the commands on the others' partitions.
+    group_id: str    = env_field("GROUP_ID", "pc-lock-consumer-{machine}")
+    schema_registry_path: str | None = env_field("SCHEMA_REGISTRY_PATH")  # only needed for non-builtin binary schemas
+
+    # Platform: "windows" (user32) or "sim" (actions recorded, optionally as JSON lines in
+    # SIM_ACTIONS_PATH) -- see actions.py
+    platform_backend: str = env_field("PLATFORM_BACKEND", "windows", parse=str.lower)
+    sim_actions_path: str | None = env_field("SIM_ACTIONS_PATH")
+
+    # Commands older than this (control `ts` to consume time) are dropped and acked "expired": each
+    # machine resumes its own group at logon, and must not replay e.g. a "lock all" sent overnight.
+    # 0 disables the check (clocks of the bot host and the machines should agree within a few seconds).
+    max_command_age_sec: float = env_field("MAX_COMMAND_AGE_SEC", 300.0)
+
+    # Acks: {"id", "machine", "action", "status": "ok" | "failed" | "unsupported" | "expired"} per command
+    # (empty ACK_TOPIC disables them; default <TOPIC_CONTROL>.ack); WIRE_FORMAT applies to the acks
+    ack_topic: str | None = env_field("ACK_TOPIC", parse=str)
+    wire_format: str      = env_field("WIRE_FORMAT", "json", parse=str.lower)
+
+    # Routing (same values as the control bot): shared | partition | topic -- see pcmedia/routing.py
+    routing_mode: str       = env_field("ROUTING_MODE", "shared", parse=str.lower)
+    broadcast_topic: str    = env_field("BROADCAST_TOPIC", "")      # default <TOPIC_CONTROL>.all
+    control_partitions: int = env_field("CONTROL_PARTITIONS", 0)    # partition mode; 0 reads topic metadata
+
+    # 1 = poll() one message at a time with auto commit (the original loop).
+    # Batch mode (BATCH_SIZE > 1): consume() + manual async commits after handlers succeed
+    batch_size: int      = env_field("BATCH_SIZE", 1)
+    batch_linger_ms: int = env_field("BATCH_LINGER_MS", 200)
+
+    # Metrics on http://127.0.0.1:METRICS_PORT/metrics (0 disables); consumer lag comes from librdkafka stats
+    metrics_port: int            = env_field("METRICS_PORT", 0)
+    kafka_stats_interval_ms: int = env_field("KAFKA_STATS_INTERVAL_MS", 15000)
+
+    # Logging: JSON lines (or "text") from a background thread, rate limited per message type
+    log_level: str          = env_field("LOG_LEVEL", "INFO", parse=str.upper)
+    log_format: str         = env_field("LOG_FORMAT", "json", parse=str.lower)
+    log_rate_per_sec: float = env_field("LOG_RATE_PER_SEC", 10.0)
+    log_burst: float        = env_field("LOG_BURST", 20.0)
+    log_sample: str         = env_field("LOG_SAMPLE", "")
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "group_id", self.group_id.replace("{machine}", self.machine_key))
+        if not self.broadcast_topic:
+            object.__setattr__(self, "broadcast_topic", f"{self.topic}.all")
+        if self.ack_topic is None:
+            object.__setattr__(self, "ack_topic", f"{self.topic}.ack")
+
+def load_config(env: Optional[Mapping[str, str]] = None) -> Config:
+    """Config from `env` (default: the process environment, after reading .env)."""
+    return load(Config, env)
+
+# Loaded on first use (not at import); get_config.set(...) swaps it for tests and benchmarks.
+get_config = Lazy(load_config)
+
+# -------- Platform actions --------
+def _platform_actions() -> Actions:
+    cfg = get_config()
+    return build_actions(cfg.platform_backend, cfg.machine_key, cfg.sim_actions_path)
+
+# Built on first use from PLATFORM_BACKEND; get_actions.set(...) swaps them (e.g. RecordingActions).
+get_actions = Lazy(_platform_actions)
 
 def lock_workstation() -> bool:
     """Locks the current workstation (requires interactive session)."""
-    try:
-        res = _user32.LockWorkStation()
-        return bool(res)
-    except Exception as exc:
-        print(f"[warn] LockWorkStation failed: {exc}")
-        return False
+    return get_actions().lock()
 
 def wake_display() -> None:
     """
     Try to wake the display and keep the system from sleeping briefly.
     Note: This does NOT unlock a Windows locked session (login required).
     """
-    try:
-        # Keep system/display on for a short period
-        _kernel32.SetThreadExecutionState(
-            ES_CONTINUOUS | ES_SYSTEM_REQUIRED | ES_DISPLAY_REQUIRED
-        )
-        # Send a SHIFT key tap to wake displays
-        _user32.keybd_event(VK_SHIFT, 0, 0, 0)
-        _user32.keybd_event(VK_SHIFT, 0, KEYEVENTF_KEYUP, 0)
-    except Exception as exc:
-        print(f"[warn] wake_display failed: {exc}")
+    get_actions().wake()
 
 # -------- Message handling --------
 def is_for_me(target: Optional[str]) -> bool:
-    """Returns True if target matches this machine or 'all'."""
+    """Returns True if target matches this machine, 'all' or 'tag:<t>' for one of MACHINE_TAGS."""
     if not target:
         return False
-    t = str(target).strip().lower()
-    return t == "all" or t == MACHINE_KEY.lower()
+    cfg = get_config()
+    return matches(target, cfg.machine_key, cfg.machine_tags)
 
-def handle_control(payload: dict) -> None:
+def handle_control(payload: dict) -> Optional[str]:
     """
     Expected schema:
       {
         "type": "control",
         "action": "lock" | "unlock",
-        "target": "all" | "<machineKey>",
+        "target": "all" | "tag:<name>" | "<machineKey>",
         "by": "telegram:<user_id>",
-        "ts": "<ISO8601>"
+        "ts": "<ISO8601>",
+        "id": "<command id>"            (optional; acked when present)
       }
+    Returns the execution result ("ok" | "failed" | "unsupported"), or None when
+    the command is not for this machine.
     """
     action = (payload.get("action") or "").lower()
     target = payload.get("target")
     origin = payload.get("by")
-    print(f"[i] Received action={action} target={target} by={origin}")
+    log.info("Received action=%s target=%s by=%s", action, target, origin,
+             extra={"event": "control.received"})
 
     if not is_for_me(target):
-        print(f"[i] Ignored (target={target}, this={MACHINE_KEY})")
-        return
+        log.info("Ignored (target=%s, this=%s)", target, get_config().machine_key, extra={"event": "control.ignored"})
+        return None
 
     if action == "lock":
         ok = lock_workstation()
-        print("[→] Lock command executed." if ok else "[warn] Lock command failed.")
-    elif action == "unlock":
+        if ok:
+            log.info("→ Lock command executed.")
+            return "ok"
+        log.warning("Lock command failed.")
+        return "failed"
+    if action == "unlock":
         # We cannot unlock Windows login; we just wake the screen.
         wake_display()
-        print("[→] Wake command executed (unlock not possible at OS login).")
-    else:
-        print(f"[warn] Unknown action: {action}")
+        log.info("→ Wake command executed (unlock not possible at OS login).")
+        return "ok"
+    log.warning("Unknown action: %s", action)
+    return "unsupported"
+
+# -------- Acks --------
+_ack_producer = None
+_ack_serde: Optional[Serde] = None
+
+_ACKS_SENT = REGISTRY.counter("control_acks_sent_total", "Acks produced by status", ["status"])
+
+def send_ack(payload: dict, status: str) -> None:
+    """Publish the result of a command to ACK_TOPIC (best effort: a lost ack is reported as pending)."""
+    if _ack_producer is None or not payload.get("id"):
+        return
+    cfg = get_config()
+    ack = {
+        "type": "ack",
+        "id": str(payload["id"]),
+        "machine": cfg.machine_key,
+        "action": payload.get("action"),
+        "status": status,
+        "ts": datetime.now(timezone.utc).isoformat(),
+    }
+    try:
+        _ack_producer.produce(cfg.ack_topic, key=ack["id"], value=_ack_serde.encode(cfg.ack_topic, "ack", ack),
+                              on_delivery=record_delivery)
+        _ack_producer.poll(0)
+    except (BufferError, KafkaException) as e:
+        log.warning("ack not sent: %s", e, extra={"event": "ack.failed"})
+        return
+    _ACKS_SENT.inc(1, status)
 
 # -------- Kafka consumer loop --------
-def run_consumer() -> None:
+_stop = threading.Event()
+
+_MESSAGES = REGISTRY.counter("control_messages_total", "Control messages by outcome", ["outcome"])
+_HANDLER_SECONDS = REGISTRY.histogram("control_handler_seconds", "handle_control() time")
+_CONTROL_AGE = REGISTRY.histogram("control_age_seconds", "Control `ts` to consume time (bot -> machine)")
+
+def stop_consumer() -> None:
+    """Ask run_consumer() to exit after the current poll/batch."""
+    _stop.set()
+
+def _log_kafka_error(msg) -> None:
+    if msg.error().code() != KafkaError._PARTITION_EOF:
+        log.warning("kafka error: %s", msg.error(), extra={"event": "kafka.error"})
+
+def process_message(msg, serde: Serde) -> None:
+    """Decode one message and act on it. Handler errors propagate to the caller."""
+    # Routing headers decide most messages without touching the payload.
+    cfg = get_config()
+    if wanted(msg.headers(), cfg.machine_key, cfg.machine_tags) is False:
+        _MESSAGES.inc(1, "filtered")
+        return
+    try:
+        payload = serde.decode(msg.value())
+    except Exception as e:
+        log.warning("invalid payload: %s", e, extra={"event": "payload.invalid"})
+        _MESSAGES.inc(1, "invalid")
+        return
+
+    # Only process control messages
+    if (payload.get("type") or "").lower() == "control":
+        age = age_seconds(payload.get("ts"))
+        if age is not None:
+            _CONTROL_AGE.observe(age)
+            if cfg.max_command_age_sec and age > cfg.max_command_age_sec:
+                if is_for_me(payload.get("target")):
+                    log.warning("Dropped stale command action=%s target=%s (%.0fs old)", payload.get("action"),
+                                payload.get("target"), age, extra={"event": "control.expired"})
+                    send_ack(payload, "expired")
+                _MESSAGES.inc(1, "expired")
+                return
+        with _HANDLER_SECONDS.time():
+            status = handle_control(payload)
+        if status is not None:
+            send_ack(payload, status)
+        _MESSAGES.inc(1, "handled")
+    else:
+        log.info("Non-control message ignored.", extra={"event": "control.ignored"})
+        _MESSAGES.inc(1, "ignored")
+
+def process_batch(c, msgs: list, serde: Serde, retry: RetryBackoff) -> dict:
+    """
+    Handle a batch and commit it asynchronously. If a handler fails, its
+    partition is rewound to that message, the rest of it is skipped and it stays
+    paused until `retry` says it is due (see resume_retries).
+    Returns the committed (topic, partition) -> next offset of the handled messages.
+    """
+    offsets = {}
+    failed = set()
+    for msg in msgs:
+        if msg.error():
+            _log_kafka_error(msg)
+            continue
+        tp = (msg.topic(), msg.partition())
+        if tp in failed:
+            continue
+        try:
+            process_message(msg, serde)
+        except Exception as e:
+            delay = retry.fail(tp)
+            log.warning("handler failed at offset %d: %s; retry in %.0fs", msg.offset(), e, delay,
+                        extra={"event": "handler.failed"})
+            failed.add(tp)
+            c.pause([TopicPartition(tp[0], tp[1])])
+            c.seek(TopicPartition(tp[0], tp[1], msg.offset()))
+            continue
+        retry.ok(tp)
+        offsets[tp] = msg.offset() + 1
+
+    if offsets:
+        c.commit(offsets=[TopicPartition(t, p, o) for (t, p), o in offsets.items()], asynchronous=True)
+    return offsets
+
+def resume_retries(c, retry: RetryBackoff) -> None:
+    """Resume the failed partitions whose backoff is over (and that are still assigned)."""
+    due = set(retry.due())
+    if due:
+        c.resume([tp for tp in c.assignment() if (tp.topic, tp.partition) in due])
+
+def subscribe_routes(c) -> str:
+    """Subscribe (or assign) per ROUTING_MODE; returns what is being read, for the startup log."""
+    cfg = get_config()
+    mode, topic, broadcast = cfg.routing_mode, cfg.topic, cfg.broadcast_topic
+    if mode not in MODES:
+        raise SystemExit(f"Unknown ROUTING_MODE={mode} (expected one of {', '.join(MODES)})")
+    if mode == "partition":
+        # Static assignment: no rebalances, and only this machine's partition is fetched.
+        partitions = cfg.control_partitions or partition_count(c, topic)
+        own = partition_for(cfg.machine_key, partitions)
+        c.assign([TopicPartition(topic, own), TopicPartition(broadcast, 0)])
+        return f"{topic}[{own}/{partitions}] + {broadcast}"
+    topics = [topic] if mode == "shared" else [machine_topic(topic, cfg.machine_key), broadcast]
+    c.subscribe(topics)
+    return " + ".join(topics)
+
+def run_consumer(consumer=None, ack_producer=None) -> None:
+    """
+    Consume control messages until interrupted. `consumer` (and `ack_producer`)
+    may be in-process stand-ins; with a stand-in consumer, acks are only sent
+    through `ack_producer`.
+    """
+    global _ack_producer, _ack_serde
+    cfg = get_config()
+    batch_mode = cfg.batch_size > 1
     conf = {
-        "bootstrap.servers": BROKERS,
-        "group.id": GROUP_ID,
-        "enable.auto.commit": True,
+        "bootstrap.servers": cfg.brokers,
+        "group.id": cfg.group_id,
+        "enable.auto.commit": not batch_mode,
         "auto.offset.reset": "latest",
         "session.timeout.ms": 10000,
     }
-    c = Consumer(conf)
-    c.subscribe([TOPIC])
+    if cfg.metrics_port and cfg.kafka_stats_interval_ms:
+        conf["statistics.interval.ms"] = cfg.kafka_stats_interval_ms
+        conf["stats_cb"] = record_kafka_stats
+    serve(cfg.metrics_port)
+    c = consumer if consumer is not None else Consumer(conf)
+    routes = subscribe_routes(c)
+    serde = Serde(SchemaRegistry(cfg.schema_registry_path))
+    _ack_serde = Serde(SchemaRegistry(cfg.schema_registry_path), default=cfg.wire_format)
+    if ack_producer is None and consumer is None and cfg.ack_topic:
+        ack_producer = Producer({
+            "bootstrap.servers": cfg.brokers,
+            "client.id": f"pc-lock-consumer-{cfg.machine_key}",
+            "linger.ms": 5,
+            "compression.type": "lz4",
+        })
+    _ack_producer = ack_producer
 
-    print(f"[i] {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - "
-          f"Listening topic='{TOPIC}' as group='{GROUP_ID}', machine='{MACHINE_KEY}'")
+    mode = f"batch x{cfg.batch_size}" if batch_mode else "single"
+    log.info("Listening %s as group='%s', machine='%s' (%s, %s routing)",
+             routes, cfg.group_id, cfg.machine_key, mode, cfg.routing_mode)
 
+    _stop.clear()
+    handled = {}   # batch mode: (topic, partition) -> offset after the last handled message
+    retry = RetryBackoff()   # batch mode: failed partitions, paused while they wait
     try:
-        while True:
+        while not _stop.is_set():
+            if batch_mode:
+                resume_retries(c, retry)
+                msgs = c.consume(cfg.batch_size, cfg.batch_linger_ms / 1000.0)
+                if msgs:
+                    handled.update(process_batch(c, msgs, serde, retry))
+                continue
+
             msg = c.poll(1.0)
             if msg is None:
                 continue
             if msg.error():
-                if msg.error().code() != KafkaError._PARTITION_EOF:
-                    print(f"[warn] kafka error: {msg.error()}")
+                _log_kafka_error(msg)
                 continue
-
             try:
-                payload = json.loads(msg.value().decode("utf-8"))
+                process_message(msg, serde)
             except Exception as e:
-                print(f"[warn] invalid json: {e}")
-                continue
-
-            # Only process control messages
-            if (payload.get("type") or "").lower() == "control":
-                handle_control(payload)
-            else:
-                print("[i] Non-control message ignored.")
+                log.warning("handler failed: %s", e, extra={"event": "handler.failed"})
     except KeyboardInterrupt:
-        print("\n[!] Interrupted by user")
+        log.info("Interrupted by user")
     except KafkaException as e:
-        print(f"[fatal] kafka exception: {e}")
+        log.critical("kafka exception: %s", e)
     finally:
+        if batch_mode:
+            # Only offsets of handled messages: the consume position may be past a failed or unread one.
+            try:
+                owned = {(tp.topic, tp.partition) for tp in c.assignment()}
+                offsets = [TopicPartition(t, p, o) for (t, p), o in handled.items() if (t, p) in owned]
+                if offsets:
+                    c.commit(offsets=offsets, asynchronous=False)
+            except KafkaException as e:
+                log.warning("offset commit failed: %s", e)
         c.close()
-        print("[i] Consumer closed")
+        if _ack_producer is not None:
+            _ack_producer.flush(2.0)
+            _ack_producer = None
+        log.info("Consumer closed")
 
 if __name__ == "__main__":
+    cfg = get_config()
+    setup_logging(cfg.log_level, cfg.log_format, cfg.log_rate_per_sec, cfg.log_burst, cfg.log_sample)
     run_consumer()
@@ -0,0 +1,9 @@
+# Modules shared by the services:
+#   envconfig - settings from the environment    logs     - logging
+#   metrics   - Prometheus metrics               serde    - wire format and schema ids
+#   outbox    - on-disk outbox of the producers  aio      - asyncio producers (plain and over the outbox)
+#   profiles  - producer profiles and adaptive linger
+#   dedupe    - change signatures (agent and bot must agree on what counts as a change)
+#   coalesce  - per-machine debounce of media updates
+#   routing   - control-message routing (control bot and lock consumers must agree)
+#   retry     - retry backoff of failed consumer partitions (pause + seek, no sleeping)
@@ -0,0 +1,241 @@
+# asyncio front end for confluent-kafka producers: no blocking calls on the event loop.
+from __future__ import annotations
+import asyncio
+import collections
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, List, Optional, Tuple
+from confluent_kafka import KafkaException
+from pcmedia.metrics import REGISTRY, record_delivery
+
+log = logging.getLogger(__name__)
+
+_BACKPRESSURE = REGISTRY.counter("producer_backpressure_waits_total", "produce() calls that waited for queue space")
+_IN_FLIGHT = REGISTRY.gauge("producer_in_flight_records", "Records produced and not yet reported delivered")
+
+class AsyncProducer:
+    """
+    Wraps a confluent_kafka.Producer for coroutines.
+    - A dedicated thread runs poll(), so delivery reports are served continuously
+      (not only when the next message is produced).
+    - produce() returns an asyncio.Future resolved with the delivered message (or a
+      KafkaException) from the delivery report; reports are handed to the loop in
+      batches, one wake-up per poll() call.
+    - Backpressure is an await: at most `max_in_flight` undelivered records, and a
+      full librdkafka queue (BufferError) queues the caller; each delivery report
+      wakes one waiter, in arrival order (so a full queue costs one retry per freed
+      slot, not one per waiting coroutine every `retry_interval`).
+    - close() flushes what is queued and stops the poll thread.
+    A failed delivery sets a KafkaException on the record's future; when `on_delivery`
+    is set it owns reporting failures, so the future is marked retrieved and callers
+    that never await it (fire and forget) don't also log "Future exception was never
+    retrieved". Awaiting it still raises.
+    """
+    def __init__(self, producer, max_in_flight: int = 10_000, poll_interval: float = 0.1,
+                 retry_interval: float = 0.05,
+                 on_delivery: Optional[Callable] = record_delivery) -> None:
+        self._p = producer
+        self._max_in_flight = max_in_flight
+        self._poll_interval = poll_interval
+        self._retry_interval = retry_interval
+        self._on_delivery = on_delivery
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._reports: List[Tuple[asyncio.Future, object, object]] = []
+        self._reports_lock = threading.Lock()   # reports come from the poll thread and from flush()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = collections.deque()   # callers waiting for queue space
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(self._max_in_flight)
+        self._thread = threading.Thread(target=self._poll_loop, name="kafka-poll", daemon=True)
+        self._thread.start()
+
+    async def produce(self, topic: str, key=None, value=None, **kwargs) -> asyncio.Future:
+        """Queue a record; waits (does not raise) while the producer is saturated."""
+        if self._loop is None:
+            self._start()
+        elif self._stop.is_set():
+            raise RuntimeError("producer is closed")
+        await self._slots.acquire()
+        fut = self._loop.create_future()
+        callback = lambda err, msg: self._report(fut, err, msg)
+        try:
+            if self._waiters:
+                await self._wait_for_space()   # don't overtake callers already waiting
+            while True:
+                try:
+                    self._p.produce(topic, key=key, value=value, on_delivery=callback, **kwargs)
+                    break
+                except BufferError:
+                    _BACKPRESSURE.inc()
+                    await self._wait_for_space()
+        except BaseException:
+            self._slots.release()
+            self._wake(1)   # pass a wake-up this caller may have consumed on
+            raise
+        self._in_flight += 1
+        _IN_FLIGHT.set(self._in_flight)
+        return fut
+
+    async def send(self, topic: str, key=None, value=None, **kwargs):
+        """produce() and wait for the delivery report; returns the message."""
+        return await (await self.produce(topic, key, value, **kwargs))
+
+    async def _wait_for_space(self) -> None:
+        """Queue up until a delivery report frees space (or `retry_interval`, as a fallback)."""
+        waiter = self._loop.create_future()
+        self._waiters.append(waiter)
+        timer = self._loop.call_later(self._retry_interval, _wake_one, waiter)
+        try:
+            await waiter
+        finally:
+            timer.cancel()
+            if waiter in self._waiters:   # timed out (or cancelled) while still queued
+                self._waiters.remove(waiter)
+
+    def _wake(self, n: int) -> None:
+        while n > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                n -= 1
+
+    def _poll_loop(self) -> None:
+        while not self._stop.is_set():
+            self._p.poll(self._poll_interval)
+            self._hand_over()
+
+    def _report(self, fut: asyncio.Future, err, msg) -> None:
+        with self._reports_lock:   # delivery callback: runs inside poll()/flush(), off the loop
+            self._reports.append((fut, err, msg))
+
+    def _hand_over(self) -> None:
+        if self._reports:
+            with self._reports_lock:
+                batch, self._reports = self._reports, []
+            self._loop.call_soon_threadsafe(self._resolve, batch)
+
+    def _resolve(self, batch) -> None:
+        for fut, err, msg in batch:
+            self._in_flight -= 1
+            self._slots.release()
+            if self._on_delivery is not None:
+                self._on_delivery(err, msg)
+            if fut.done():
+                continue  # caller gave up waiting
+            if err is not None:
+                fut.set_exception(KafkaException(err))
+                if self._on_delivery is not None:
+                    fut.exception()   # reported by on_delivery; see the class docstring
+            else:
+                fut.set_result(msg)
+        _IN_FLIGHT.set(self._in_flight)
+        self._wake(len(batch))
+
+    async def flush(self, timeout: float = 5.0) -> int:
+        """Wait (off the loop) until queued records are delivered; returns how many are left."""
+        if self._loop is None:
+            return 0
+        left = await self._loop.run_in_executor(None, self._p.flush, timeout)
+        self._hand_over()
+        await asyncio.sleep(0)  # let the last reports resolve
+        return left
+
+    async def close(self, timeout: float = 5.0) -> None:
+        """Flush, then stop the poll thread. Safe to call more than once."""
+        if self._loop is None or self._stop.is_set():
+            return
+        left = await self.flush(timeout)
+        self._stop.set()
+        await self._loop.run_in_executor(None, self._thread.join, self._poll_interval * 5)
+        self._hand_over()
+        await asyncio.sleep(0)
+        if left:
+            log.warning("producer closed with %d undelivered record(s)", left, extra={"event": "kafka.flush_incomplete"})
+
+def _wake_one(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+class AsyncOutboxProducer:
+    """
+    Same interface over an OutboxProducer. Appends run on one worker thread, in
+    call order, as group commits: everything queued while the previous append
+    was on disk goes out in one send_batch() (one write, at most one fsync) and
+    resolves with one loop wake-up. A record's future resolves once it is in the
+    outbox; delivery to Kafka is then the outbox's job (it survives restarts).
+    A failed append is logged and set on the futures of its group (marked retrieved).
+    """
+    def __init__(self, outbox) -> None:
+        self._outbox = outbox
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox-io")
+        self._closed = False
+        self._lock = threading.Lock()
+        self._queued: List[Tuple[list, asyncio.Future, bool]] = []   # (records, future, single record)
+        self._writing = False
+
+    def _queue(self, records: list, single: bool) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        with self._lock:
+            self._queued.append((records, fut, single))
+            start, self._writing = not self._writing, True
+        if start:
+            self._io.submit(self._write, loop)
+        return fut
+
+    async def produce(self, topic: str, key: Optional[str] = None, value: bytes = b"", **kwargs) -> asyncio.Future:
+        """Resolves to the record's outbox sequence number."""
+        return self._queue([(topic, key, value)], True)
+
+    async def produce_batch(self, records) -> asyncio.Future:
+        """(topic, key, value) records appended together; resolves to their sequence numbers."""
+        return self._queue(list(records), False)
+
+    async def send(self, topic: str, key: Optional[str] = None, value: bytes = b"", **kwargs):
+        return await (await self.produce(topic, key, value))
+
+    def _write(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Worker thread: append queued groups until none are left."""
+        while True:
+            with self._lock:
+                groups, self._queued = self._queued, []
+                if not groups:
+                    self._writing = False
+                    return
+            try:
+                seqs, error = self._outbox.send_batch([r for records, _, _ in groups for r in records]), None
+            except Exception as e:
+                log.error("outbox append failed: %s", e, extra={"event": "outbox.error"})
+                seqs, error = [], e
+            loop.call_soon_threadsafe(_resolve_groups, groups, seqs, error)
+
+    async def close(self, timeout: float = 5.0) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._io, self._outbox.close, timeout)   # after queued appends (one worker)
+        self._io.shutdown(wait=False)
+
+def _resolve_groups(groups, seqs: List[int], error: Optional[Exception]) -> None:
+    pos = 0
+    for records, fut, single in groups:
+        mine = seqs[pos:pos + len(records)]
+        pos += len(records)
+        if fut.done():
+            continue  # caller gave up waiting
+        if error is not None:
+            fut.set_exception(error)
+            fut.exception()   # logged by _write; produce() callers need not await the future
+        else:
+            fut.set_result(mine[0] if single else mine)
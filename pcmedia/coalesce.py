@@ -0,0 +1,99 @@
+# Time-windowed coalescing of media updates (collapses bursts of track skips).
+from __future__ import annotations
+import heapq
+import itertools
+import time
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+class Coalescer:
+    """
+    Per-key debounce. An update is held until its key has been quiet for
+    `window` seconds, but never longer than `max_delay` after the first held
+    update; only the latest payload per key is emitted.
+    - Payloads whose playbackStatus is in `suppress_statuses` (e.g. "changing")
+      are dropped outright.
+    - With `signature`, an emitted payload equal to the last one emitted for
+      that key is skipped (A -> B -> A within a window emits nothing).
+    Time comes from `clock`; call due() when next_deadline() is reached.
+    """
+    def __init__(self, window: float, max_delay: float, clock: Callable[[], float] = time.monotonic,
+                 suppress_statuses: Iterable[str] = ("changing",),
+                 signature: Optional[Callable[[Dict], Hashable]] = None) -> None:
+        self.window = window
+        self.max_delay = max(window, max_delay)
+        self._clock = clock
+        self._suppress = frozenset(suppress_statuses)
+        self._signature = signature
+        self._pending: Dict[Hashable, list] = {}  # key -> [payload, first_at, deadline]
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._seq = itertools.count()
+        self._last_emitted: Dict[Hashable, Hashable] = {}
+        # Counters (for metrics / benchmarks)
+        self.offered = 0
+        self.suppressed = 0
+        self.coalesced = 0
+        self.unchanged = 0
+        self.emitted = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._pending
+
+    def offer(self, key: Hashable, payload: Dict) -> bool:
+        """Hold `payload` as the latest state for `key`. Returns False if suppressed."""
+        self.offered += 1
+        if payload.get("playbackStatus") in self._suppress:
+            self.suppressed += 1
+            return False
+        now = self._clock()
+        entry = self._pending.get(key)
+        if entry is None:
+            entry = self._pending[key] = [payload, now, 0.0]
+        else:
+            self.coalesced += 1
+            entry[0] = payload
+        entry[2] = min(now + self.window, entry[1] + self.max_delay)
+        heapq.heappush(self._heap, (entry[2], next(self._seq), key))
+        return True
+
+    def next_deadline(self) -> Optional[float]:
+        """Clock time at which the earliest held update becomes due (None if idle)."""
+        while self._heap:
+            deadline, _, key = self._heap[0]
+            entry = self._pending.get(key)
+            if entry is not None and entry[2] == deadline:
+                return deadline
+            heapq.heappop(self._heap)  # stale: re-offered or already emitted
+        return None
+
+    def due(self) -> List[Tuple[Hashable, Dict]]:
+        """Pop and return (key, payload) pairs whose deadline has passed."""
+        now = self._clock()
+        out = []
+        while True:
+            deadline = self.next_deadline()
+            if deadline is None or deadline > now:
+                return out
+            _, _, key = heapq.heappop(self._heap)
+            self._emit(key, self._pending.pop(key)[0], out)
+
+    def drain(self) -> List[Tuple[Hashable, Dict]]:
+        """Emit everything still held (shutdown)."""
+        out = []
+        for key, entry in list(self._pending.items()):
+            self._emit(key, entry[0], out)
+        self._pending.clear()
+        self._heap.clear()
+        return out
+
+    def _emit(self, key: Hashable, payload: Dict, out: list) -> None:
+        if self._signature is not None:
+            sig = self._signature(payload)
+            if self._last_emitted.get(key) == sig:
+                self.unchanged += 1
+                return
+            self._last_emitted[key] = sig
+        self.emitted += 1
+        out.append((key, payload))
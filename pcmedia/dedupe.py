@@ -0,0 +1,40 @@
+# Signature builders to detect changes (hot path: no JSON, no allocation beyond a tuple).
+from __future__ import annotations
+from hashlib import blake2b
+from typing import Callable, Dict, Hashable, Iterable, Tuple
+
+DEFAULT_FIELDS: Tuple[str, ...] = ("sourceApp", "title", "artist", "playbackStatus")
+
+Signature = Callable[[Dict], Hashable]
+
+def build_signature(payload: Dict) -> Tuple:
+    """Stable signature for media change detection (DEFAULT_FIELDS)."""
+    get = payload.get
+    return (get("sourceApp"), get("title"), get("artist"), get("playbackStatus"))
+
+def parse_fields(spec: str, default: Tuple[str, ...] = DEFAULT_FIELDS) -> Tuple[str, ...]:
+    """Parse a comma-separated list (e.g. SIGNATURE_FIELDS) into a tuple."""
+    fields = tuple(f.strip() for f in spec.split(",") if f.strip())
+    return fields or default
+
+def signature_fn(fields: Iterable[str] = DEFAULT_FIELDS, digest: bool = False) -> Signature:
+    """
+    Return a signature function over `fields`, e.g. add "album" or drop
+    "playbackStatus" to ignore status flaps.
+    digest=True returns a stable 8-byte blake2b digest instead of a tuple
+    (smaller to keep per machine and to persist).
+    """
+    fields = tuple(fields)
+    if not digest:
+        if fields == DEFAULT_FIELDS:
+            return build_signature
+        return lambda payload: tuple(map(payload.get, fields))
+
+    def digest_signature(payload: Dict) -> bytes:
+        h = blake2b(digest_size=8)
+        for value in map(payload.get, fields):
+            # Tag each field so None, "" and field boundaries can't collide.
+            h.update(b"\x00" if value is None else b"\x01" + str(value).encode("utf-8") + b"\x1f")
+        return h.digest()
+
+    return digest_signature
@@ -0,0 +1,100 @@
+# Environment-backed settings: dataclass fields name their variables, nothing is read at import
+from __future__ import annotations
+import os
+import threading
+from dataclasses import field, fields
+from typing import Any, Callable, Generic, Mapping, Optional, Tuple, Type, TypeVar, Union
+
+T = TypeVar("T")
+
+def flag(value: str) -> bool:
+    """"true" / "1" / "yes" / "on" (any case) -> True; anything else -> False."""
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+def optional(value: str) -> Optional[str]:
+    """Empty -> None."""
+    return value or None
+
+# Parsers by (string) annotation; fields of any other type declare their own `parse`.
+_PARSERS: Mapping[str, Callable[[str], Any]] = {
+    "str": str, "int": int, "float": float, "bool": flag, "str | None": optional,
+}
+
+def env_field(names: Union[str, Tuple[str, ...]], default: Any = None,
+              parse: Optional[Callable[[str], Any]] = None) -> Any:
+    """
+    A dataclass field that load() reads from the environment: the first of `names`
+    that is set (with several names, an empty value counts as unset), converted by
+    `parse` or by the field's annotation. `default` applies when none is set.
+    """
+    names = (names,) if isinstance(names, str) else tuple(names)
+    return field(default=default, metadata={"env": (names, parse)})
+
+def _lookup(env: Mapping[str, str], names: Tuple[str, ...]) -> Optional[str]:
+    for i, name in enumerate(names):
+        raw = env.get(name)
+        if raw is not None and (raw or i == len(names) - 1):
+            return raw
+    return None
+
+_dotenv_loaded = False
+
+def load_dotenv() -> None:
+    """Read .env into os.environ once (variables already set win); python-dotenv is optional."""
+    global _dotenv_loaded
+    if _dotenv_loaded:
+        return
+    _dotenv_loaded = True
+    try:
+        from dotenv import load_dotenv as _load_dotenv
+    except ImportError:
+        return
+    _load_dotenv()
+
+def load(cls: Type[T], env: Optional[Mapping[str, str]] = None) -> T:
+    """
+    Build the settings dataclass `cls` from `env` (default: os.environ, after .env).
+    Fields without env_field() keep their defaults. A malformed value exits with
+    the variable's name.
+    """
+    if env is None:
+        load_dotenv()
+        env = os.environ
+    values = {}
+    for f in fields(cls):
+        spec = f.metadata.get("env")
+        if spec is None:
+            continue
+        names, parse = spec
+        raw = _lookup(env, names)
+        if raw is None:
+            continue
+        try:
+            values[f.name] = (parse or _PARSERS[f.type])(raw)
+        except ValueError as e:
+            raise SystemExit(f"Invalid {names[0]}={raw!r}: {e}")
+    return cls(**values)
+
+class Lazy(Generic[T]):
+    """
+    Lazily built singleton: calling it builds the value on first use (thread-safe)
+    and returns the same object afterwards. set() replaces it, e.g. in tests and
+    benchmarks; set(None) rebuilds on the next call.
+    """
+    def __init__(self, factory: Callable[[], T]) -> None:
+        self._factory = factory
+        self._value: Optional[T] = None
+        self._lock = threading.Lock()
+
+    def __call__(self) -> T:
+        value = self._value
+        if value is None:
+            with self._lock:
+                if self._value is None:
+                    self._value = self._factory()
+                value = self._value
+        return value
+
+    def set(self, value: Optional[T]) -> None:
+        with self._lock:
+            self._value = value
@@ -0,0 +1,154 @@
+# Structured, non-blocking logging: JSON lines written by a background thread, rate limited per event.
+from __future__ import annotations
+import atexit
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, TextIO
+
+# LogRecord attributes that are not user fields (anything else passed via `extra` is).
+_RESERVED = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "event"}
+_TAGS = {logging.DEBUG: "d", logging.INFO: "i", logging.WARNING: "warn", logging.ERROR: "error", logging.CRITICAL: "fatal"}
+
+def event_key(record: logging.LogRecord) -> str:
+    """Message type used for rate limiting/sampling: `extra={"event": ...}` or the call site's format string."""
+    return getattr(record, "event", None) or f"{record.name}:{record.msg}"
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, event, msg, plus any `extra` fields."""
+    def format(self, record: logging.LogRecord) -> str:
+        doc = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": getattr(record, "event", None),
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                doc[key] = value
+        if record.exc_info:
+            doc["exc"] = self.formatException(record.exc_info)
+        return json.dumps(doc, ensure_ascii=False, default=str)
+
+class TextFormatter(logging.Formatter):
+    """Console style of the original prints: "[i] message", "[warn] message"."""
+    def format(self, record: logging.LogRecord) -> str:
+        text = f"[{_TAGS.get(record.levelno, record.levelname.lower())}] {record.getMessage()}"
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            text += f" (+{suppressed} suppressed)"
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text
+
+def parse_sample(spec: str) -> Dict[str, float]:
+    """Parse "event=fraction,..." (e.g. LOG_SAMPLE="media.sent=0.1") into a dict."""
+    rates = {}
+    for item in spec.split(","):
+        if "=" in item:
+            event, rate = item.split("=", 1)
+            rates[event.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+class RateLimitFilter(logging.Filter):
+    """
+    Per-event token bucket (`rate` records/s, `burst` deep) plus optional 1-in-N
+    sampling. Runs in the caller's thread before anything is formatted, so a flood
+    of identical errors costs a dict lookup each. The next record let through
+    carries `suppressed=<n>`. CRITICAL records always pass.
+    """
+    def __init__(self, rate: float = 10.0, burst: float = 20.0, sample: Optional[Dict[str, float]] = None,
+                 max_keys: int = 10_000, clock=time.monotonic) -> None:
+        super().__init__()
+        self._rate = rate
+        self._burst = max(1.0, burst)
+        self._every = {k: (round(1 / v) if v > 0 else 0) for k, v in (sample or {}).items()}
+        self._max_keys = max_keys
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, list] = {}   # key -> [tokens, last, suppressed, seen]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.CRITICAL:
+            return True
+        key = event_key(record)
+        with self._lock:
+            b = self._buckets.get(key)
+            if b is None:
+                if len(self._buckets) >= self._max_keys:
+                    self._buckets.clear()  # unbounded distinct messages: start over rather than grow
+                now = self._clock()
+                b = self._buckets[key] = [self._burst, now, 0, 0]
+            b[3] += 1
+            every = self._every.get(key)
+            if every is not None and (every == 0 or b[3] % every):
+                return False          # sampled out (not counted as suppressed)
+            if self._rate > 0:
+                now = self._clock()
+                b[0] = min(self._burst, b[0] + (now - b[1]) * self._rate)
+                b[1] = now
+                if b[0] < 1.0:
+                    b[2] += 1
+                    return False
+                b[0] -= 1.0
+            if b[2]:
+                record.suppressed = b[2]
+                b[2] = 0
+        return True
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    QueueHandler for an in-process bounded queue: skips the default eager
+    formatting (the listener thread formats) and drops records when the queue
+    is full instead of blocking the caller.
+    """
+    def __init__(self, q: queue.Queue) -> None:
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class _Listener(QueueListener):
+    def stop(self) -> None:
+        if self._thread is not None:  # idempotent: called explicitly and again at exit
+            super().stop()
+
+def setup_logging(level: str = "INFO", fmt: str = "json", rate_per_sec: float = 10.0, burst: float = 20.0,
+                  sample: str = "", queue_size: int = 10_000, stream: Optional[TextIO] = None) -> QueueListener:
+    """
+    Route the root logger through a bounded queue to a writer thread.
+    Returns the listener (stopped, i.e. flushed, automatically at exit).
+    """
+    # Neither formatter prints caller/thread/process info: skip collecting it per record.
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    writer = logging.StreamHandler(stream or sys.stdout)
+    writer.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    handler = NonBlockingQueueHandler(queue.Queue(queue_size))
+    handler.addFilter(RateLimitFilter(rate_per_sec, burst, parse_sample(sample)))
+
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+    listener = _Listener(handler.queue, writer, respect_handler_level=False)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
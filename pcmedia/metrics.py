@@ -0,0 +1,360 @@
+# In-process metrics (counters, gauges, log-bucketed histograms) with a Prometheus text endpoint.
+from __future__ import annotations
+import bisect
+import json
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+log = logging.getLogger(__name__)
+
+LabelValues = Tuple[str, ...]
+
+def log_buckets(lowest: float = 0.0001, highest: float = 60.0, per_decade: int = 5) -> List[float]:
+    """
+    Geometric bucket bounds, HDR-style: constant relative error (~58% width at
+    5 per decade) from `lowest` to `highest`, so 100 us and 30 s are resolved equally well.
+    """
+    bounds = []
+    step = 10 ** (1.0 / per_decade)
+    b = lowest
+    while b < highest * step:
+        bounds.append(float(f"{b:.3g}"))
+        b *= step
+    return bounds
+
+DEFAULT_BUCKETS = log_buckets()
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._children: Dict[LabelValues, object] = {}
+
+    def _key(self, values: Iterable) -> LabelValues:
+        key = tuple(str(v) for v in values)
+        if len(key) != len(self.label_names):
+            raise ValueError(f"{self.name}: expected labels {self.label_names}, got {key}")
+        return key
+
+    def _labels_text(self, key: LabelValues, extra: str = "") -> str:
+        parts = [f'{n}="{_escape(v)}"' for n, v in zip(self.label_names, key)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for key, child in children:
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    def _render_child(self, key: LabelValues, child) -> List[str]:
+        return [f"{self.name}{self._labels_text(key)} {_fmt(child[0])}"]
+
+class Counter(_Metric):
+    """Monotonic counter: `inc(n, *label_values)`."""
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, *labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            cell = self._children.get(key)
+            if cell is None:
+                cell = self._children[key] = [0.0]
+            cell[0] += amount
+
+    def value(self, *labels) -> float:
+        cell = self._children.get(self._key(labels))
+        return cell[0] if cell else 0.0
+
+class Gauge(Counter):
+    """Point-in-time value: `set(v, *label_values)` (inc/dec also work)."""
+    kind = "gauge"
+
+    def set(self, value: float, *labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = [float(value)]
+
+    def dec(self, amount: float = 1.0, *labels) -> None:
+        self.inc(-amount, *labels)
+
+class _HistogramCell:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, n: int) -> None:
+        self.counts = [0] * (n + 1)   # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+class Histogram(_Metric):
+    """
+    Latency histogram over fixed log-spaced buckets (seconds by default).
+    observe() is a bisect plus three increments; quantile() estimates from buckets.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Optional[Sequence[float]] = None) -> None:
+        super().__init__(name, help, labels)
+        self.bounds = list(buckets or DEFAULT_BUCKETS)
+
+    def observe(self, value: float, *labels) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            cell = self._children.get(key)
+            if cell is None:
+                cell = self._children[key] = _HistogramCell(len(self.bounds))
+            cell.counts[i] += 1
+            cell.sum += value
+            cell.count += 1
+
+    def time(self, *labels) -> "_Timer":
+        """Context manager observing the elapsed wall time of its block."""
+        return _Timer(self, labels)
+
+    def count(self, *labels) -> int:
+        cell = self._children.get(self._key(labels))
+        return cell.count if cell else 0
+
+    def quantile(self, q: float, *labels) -> float:
+        """Upper bound of the bucket holding the q-quantile (nan if empty)."""
+        cell = self._children.get(self._key(labels))
+        if cell is None or cell.count == 0:
+            return math.nan
+        rank = q * cell.count
+        seen = 0
+        for i, n in enumerate(cell.counts):
+            seen += n
+            if seen >= rank and n:
+                return self.bounds[i] if i < len(self.bounds) else math.inf
+        return math.inf
+
+    def _render_child(self, key: LabelValues, cell: _HistogramCell) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.bounds, cell.counts):
+            cumulative += n
+            le = 'le="%s"' % _fmt(bound)
+            lines.append(f"{self.name}_bucket{self._labels_text(key, le)} {cumulative}")
+        le = 'le="+Inf"'
+        lines.append(f"{self.name}_bucket{self._labels_text(key, le)} {cell.count}")
+        lines.append(f"{self.name}_sum{self._labels_text(key)} {_fmt(cell.sum)}")
+        lines.append(f"{self.name}_count{self._labels_text(key)} {cell.count}")
+        return lines
+
+class _Timer:
+    __slots__ = ("_hist", "_labels", "_start")
+
+    def __init__(self, hist: Histogram, labels: tuple) -> None:
+        self._hist = hist
+        self._labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._hist.observe(time.perf_counter() - self._start, *self._labels)
+
+class Registry:
+    """Named metrics; get-or-create so modules can declare what they use at import time."""
+    def __init__(self, prefix: str = "") -> None:
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _get(self, cls, name: str, help: str, labels: Sequence[str], **kwargs):
+        full = self.prefix + name
+        with self._lock:
+            metric = self._metrics.get(full)
+            if metric is None:
+                metric = self._metrics[full] = cls(full, help, labels, **kwargs)
+            elif type(metric) is not cls:
+                raise ValueError(f"metric {full} already registered as {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Optional[Sequence[float]] = None) -> Histogram:
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = [self._metrics[k] for k in sorted(self._metrics)]
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Snapshot:
+        """Picklable copy of every metric's values (sent by worker processes to the supervisor)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        out: Snapshot = {}
+        for m in metrics:
+            with m._lock:
+                if isinstance(m, Histogram):
+                    values = {k: (list(c.counts), c.sum, c.count) for k, c in m._children.items()}
+                else:
+                    values = {k: c[0] for k, c in m._children.items()}
+            out[m.name] = (m.kind, m.help, m.label_names, getattr(m, "bounds", None), values)
+        return out
+
+    def restore(self, snapshot: Snapshot) -> None:
+        """Replace the values of the snapshot's metrics (created if missing); empty ones are skipped."""
+        for name, (kind, help, labels, bounds, values) in snapshot.items():
+            if not values:
+                continue
+            cls = _KINDS[kind]
+            kwargs = {"buckets": bounds} if cls is Histogram else {}
+            metric = self._get(cls, name[len(self.prefix):], help, labels, **kwargs)
+            if cls is Histogram:
+                children = {}
+                for key, (counts, total, count) in values.items():
+                    cell = children[key] = _HistogramCell(len(metric.bounds))
+                    cell.counts, cell.sum, cell.count = list(counts), total, count
+            else:
+                children = {key: [value] for key, value in values.items()}
+            with metric._lock:
+                metric.label_names = tuple(labels)   # merged gauges gain a "worker" label
+                metric._children = children
+
+REGISTRY = Registry()
+
+# name -> (kind, help, label names, histogram bounds or None, {label values: value})
+Snapshot = Dict[str, Tuple[str, str, Tuple[str, ...], Optional[List[float]], Dict[LabelValues, object]]]
+
+_KINDS = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}
+
+def merge_snapshots(snapshots: Dict[str, Snapshot]) -> Snapshot:
+    """
+    One snapshot from several processes' (keyed by worker name): counters and histograms
+    are summed; gauges are point-in-time per process, so they keep a leading "worker" label.
+    """
+    out: Snapshot = {}
+    for worker, snapshot in sorted(snapshots.items()):
+        for name, (kind, help, labels, bounds, values) in snapshot.items():
+            if kind == "gauge":
+                labels = ("worker",) + tuple(labels)
+                values = {(worker,) + tuple(k): v for k, v in values.items()}
+            merged = out.setdefault(name, (kind, help, tuple(labels), bounds, {}))[4]
+            for key, value in values.items():
+                prev = merged.get(key)
+                if prev is None:
+                    merged[key] = value
+                elif kind == "histogram":
+                    merged[key] = ([a + b for a, b in zip(prev[0], value[0])], prev[1] + value[1], prev[2] + value[2])
+                else:
+                    merged[key] = prev + value
+    return out
+
+def serve(port: int, host: str = "127.0.0.1", registry: Registry = REGISTRY) -> Optional[ThreadingHTTPServer]:
+    """Expose GET /metrics on a daemon thread. Port 0 disables it (returns None)."""
+    if not port:
+        return None
+    # Imported here: http.server (and email, http.client...) is most of this module's import time.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # noqa: N802
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args) -> None:
+            pass
+
+    try:
+        server = ThreadingHTTPServer((host, port), Handler)
+    except OSError as exc:
+        log.warning("metrics endpoint not started on %s:%s: %s", host, port, exc)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    log.info("Metrics on http://%s:%s/metrics", host, port)
+    return server
+
+def age_seconds(iso_ts, now: Optional[float] = None) -> Optional[float]:
+    """Seconds since an ISO-8601 timestamp (payload `timestamp`/`ts`); None if missing/unparsable."""
+    if not iso_ts:
+        return None
+    try:
+        ts = datetime.fromisoformat(str(iso_ts).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return (time.time() if now is None else now) - ts.timestamp()
+
+def record_kafka_stats(stats_json: str, registry: Registry = REGISTRY) -> None:
+    """
+    librdkafka `stats_cb` handler (enable with statistics.interval.ms): exports
+    the local queue depth, broker round-trip times and per-partition consumer lag.
+    """
+    try:
+        stats = json.loads(stats_json)
+    except ValueError:
+        return
+    client = stats.get("client_id", "")
+    registry.gauge("kafka_queue_messages", "Messages waiting in the librdkafka queue",
+                   ["client"]).set(stats.get("msg_cnt", 0), client)
+    rtt = registry.gauge("kafka_broker_rtt_seconds", "Broker round-trip time (window average / p99)",
+                         ["client", "broker", "stat"])
+    for broker in (stats.get("brokers") or {}).values():
+        window = broker.get("rtt") or {}
+        if window.get("cnt"):
+            rtt.set(window.get("avg", 0) / 1e6, client, broker.get("nodename", ""), "avg")
+            rtt.set(window.get("p99", 0) / 1e6, client, broker.get("nodename", ""), "p99")
+    lag = registry.gauge("kafka_consumer_lag", "Messages behind the partition high watermark",
+                         ["client", "topic", "partition"])
+    for topic, tstats in (stats.get("topics") or {}).items():
+        for partition, pstats in (tstats.get("partitions") or {}).items():
+            value = pstats.get("consumer_lag", -1)
+            if partition != "-1" and value >= 0:
+                lag.set(value, client, topic, partition)
+
+def record_delivery(err, msg, registry: Registry = REGISTRY) -> None:
+    """Delivery-report hook: produce-to-ack latency (librdkafka msg.latency()) and outcome per topic."""
+    topic = msg.topic() if msg is not None else ""
+    if err is not None:
+        registry.counter("kafka_delivery_errors_total", "Failed delivery reports", ["topic"]).inc(1, topic)
+        return
+    registry.counter("kafka_delivered_total", "Successful delivery reports", ["topic"]).inc(1, topic)
+    latency = msg.latency() if msg is not None else None
+    if latency is not None:
+        registry.histogram("kafka_delivery_seconds", "Produce() to broker ack latency",
+                           ["topic"]).observe(latency, topic)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
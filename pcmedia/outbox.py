@@ -0,0 +1,356 @@
+# Append-only on-disk outbox: keeps records until Kafka acknowledges them.
+from __future__ import annotations
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from functools import partial
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Optional, Set, Tuple
+from pcmedia.metrics import REGISTRY, record_delivery
+
+log = logging.getLogger(__name__)
+
+# Record layout: header (seq, body length, crc32 of body) + body.
+# Body: topic length, key length (0xFFFF = no key), topic, key, value.
+_HEADER = struct.Struct("<QII")
+_BODY = struct.Struct("<HH")
+_NO_KEY = 0xFFFF
+_SEG_SUFFIX = ".seg"
+_ACK_FILE = "acked"
+
+Record = Tuple[int, str, Optional[bytes], bytes]  # seq, topic, key, value
+
+_PENDING = REGISTRY.gauge("outbox_pending_records", "Records in the outbox not yet acknowledged by Kafka")
+
+def _encode(seq: int, topic: str, key: Optional[bytes], value: bytes) -> bytes:
+    t = topic.encode("utf-8")
+    k = key or b""
+    body = _BODY.pack(len(t), _NO_KEY if key is None else len(k)) + t + k + value
+    return _HEADER.pack(seq, len(body), zlib.crc32(body)) + body
+
+def _decode(seq: int, body: bytes) -> Record:
+    tlen, klen = _BODY.unpack_from(body)
+    pos = _BODY.size
+    topic = body[pos:pos + tlen].decode("utf-8")
+    pos += tlen
+    if klen == _NO_KEY:
+        key = None
+    else:
+        key = body[pos:pos + klen]
+        pos += klen
+    return seq, topic, key, body[pos:]
+
+def _read_records(f: BinaryIO) -> Iterator[Tuple[Record, int]]:
+    """Yield (record, end offset) until EOF or the first torn/corrupt record."""
+    while True:
+        head = f.read(_HEADER.size)
+        if len(head) < _HEADER.size:
+            return
+        seq, length, crc = _HEADER.unpack(head)
+        body = f.read(length)
+        if len(body) < length or zlib.crc32(body) != crc:
+            return
+        yield _decode(seq, body), f.tell()
+
+class Outbox:
+    """
+    Segmented append-only log on local disk.
+    - append(): written to the OS right away (a process crash loses nothing); fsync every
+      `fsync_every` records or `fsync_interval` seconds (an OS crash or power loss can lose
+      the records since the last fsync; fsync_every=1 closes that window at one fsync per append).
+    - ack(): marks a sequence number delivered; the contiguous acked watermark is
+      checkpointed to disk and segments below it are deleted (compaction).
+    - read_from(): replays records in sequence order (after a restart or outage).
+    """
+    def __init__(self, directory: str, segment_bytes: int = 4 << 20, fsync_every: int = 64,
+                 fsync_interval: float = 0.2, checkpoint_interval: float = 1.0) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self._dir = directory
+        self._segment_bytes = segment_bytes
+        self._fsync_every = fsync_every
+        self._fsync_interval = fsync_interval
+        self._checkpoint_interval = checkpoint_interval
+
+        self.acked = self._load_ack()           # every seq <= acked is delivered
+        self._acked_above: Set[int] = set()     # out-of-order acks beyond the watermark
+        self._persisted_ack = self.acked
+        self._segments: List[int] = sorted(
+            int(name[:-len(_SEG_SUFFIX)]) for name in os.listdir(directory) if name.endswith(_SEG_SUFFIX)
+        )
+        self.next_seq = self._recover()
+        self._writer = open(self._seg_path(self._segments[-1]), "ab")
+        self._unsynced = 0
+        self._last_sync = self._last_checkpoint = time.monotonic()
+
+    # ---- paths / recovery ----
+    def _seg_path(self, base: int) -> str:
+        return os.path.join(self._dir, f"{base:020d}{_SEG_SUFFIX}")
+
+    def _load_ack(self) -> int:
+        try:
+            with open(os.path.join(self._dir, _ACK_FILE), "r", encoding="ascii") as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _recover(self) -> int:
+        """Find the next sequence number, truncating a torn tail left by a crash."""
+        if not self._segments:
+            base = self.acked + 1
+            open(self._seg_path(base), "ab").close()
+            self._segments.append(base)
+            return base
+        last = self._segments[-1]
+        path = self._seg_path(last)
+        next_seq, end = last, 0
+        with open(path, "rb") as f:
+            for (seq, *_), end in _read_records(f):
+                next_seq = seq + 1
+        if end < os.path.getsize(path):
+            with open(path, "r+b") as f:
+                f.truncate(end)
+        return max(next_seq, self.acked + 1)
+
+    # ---- write path ----
+    @property
+    def pending(self) -> int:
+        """Records appended but not yet acknowledged (upper bound)."""
+        return self.next_seq - 1 - self.acked
+
+    def append(self, topic: str, key: Optional[bytes], value: bytes) -> int:
+        return self.append_batch([(topic, key, value)])[0]
+
+    def append_batch(self, records: Iterable[Tuple[str, Optional[bytes], bytes]]) -> List[int]:
+        """Append (topic, key, value) records; the fsync_every check runs once, after the last one."""
+        seqs = []
+        for topic, key, value in records:
+            seq = self.next_seq
+            if self._writer.tell() >= self._segment_bytes:
+                self._roll(seq)
+            self._writer.write(_encode(seq, topic, key, value))
+            self.next_seq = seq + 1
+            self._unsynced += 1
+            seqs.append(seq)
+        if self._unsynced >= self._fsync_every:
+            self.sync()
+        else:
+            self._writer.flush()
+        return seqs
+
+    def _roll(self, base: int) -> None:
+        self.sync()
+        self._writer.close()
+        self._segments.append(base)
+        self._writer = open(self._seg_path(base), "ab")
+
+    def sync(self) -> None:
+        """Flush buffered appends and fsync the active segment."""
+        if self._unsynced:
+            self._writer.flush()
+            os.fsync(self._writer.fileno())
+            self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def tick(self) -> None:
+        """Time-based fsync and checkpointing; call periodically."""
+        now = time.monotonic()
+        if self._unsynced and now - self._last_sync >= self._fsync_interval:
+            self.sync()
+        if self.acked != self._persisted_ack and now - self._last_checkpoint >= self._checkpoint_interval:
+            self.checkpoint()
+
+    # ---- ack / compaction ----
+    def ack(self, seq: int) -> None:
+        if seq <= self.acked:
+            return
+        if seq != self.acked + 1:
+            self._acked_above.add(seq)
+            return
+        self.acked = seq
+        while self.acked + 1 in self._acked_above:
+            self._acked_above.remove(self.acked + 1)
+            self.acked += 1
+
+    def is_acked(self, seq: int) -> bool:
+        return seq <= self.acked or seq in self._acked_above
+
+    def checkpoint(self) -> None:
+        """Persist the acked watermark and delete fully acknowledged segments."""
+        tmp = os.path.join(self._dir, _ACK_FILE + ".tmp")
+        with open(tmp, "w", encoding="ascii") as f:
+            f.write(str(self.acked))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self._dir, _ACK_FILE))
+        self._persisted_ack = self.acked
+        self._last_checkpoint = time.monotonic()
+        # Segment i holds [base_i, base_{i+1} - 1]; the active segment is never removed.
+        while len(self._segments) > 1 and self._segments[1] - 1 <= self.acked:
+            os.remove(self._seg_path(self._segments.pop(0)))
+
+    # ---- read path ----
+    def read_from(self, seq: int) -> Iterator[Record]:
+        """Yield records with sequence >= seq, in order, up to what is appended now."""
+        self._writer.flush()
+        start = 0
+        for i, base in enumerate(self._segments):
+            if base <= seq:
+                start = i
+        for base in list(self._segments[start:]):
+            try:
+                f = open(self._seg_path(base), "rb")
+            except FileNotFoundError:
+                continue  # compacted meanwhile
+            # Read the segment and close it before yielding: checkpoint() may delete it while the
+            # caller is still iterating, and Windows refuses to remove a file that is open.
+            with f:
+                records = [record for record, _ in _read_records(f) if record[0] >= seq]
+            yield from records
+
+    def close(self) -> None:
+        self.sync()
+        self.checkpoint()
+        self._writer.close()
+
+class OutboxProducer:
+    """
+    Routes every record through an Outbox before handing it to a confluent-kafka
+    Producer. Records are acked from delivery reports; after a failed delivery
+    the unacknowledged tail is replayed in order (at-least-once). A background
+    thread serves delivery reports, time-based fsync and replay.
+    `route(topic, key)` may add produce() arguments (partition, headers); it is
+    re-evaluated on replay, so those need not be stored in the outbox.
+    """
+    def __init__(self, producer, outbox: Outbox, max_in_flight: int = 10_000,
+                 retry_backoff: float = 5.0, poll_interval: float = 0.2,
+                 route: Optional[Callable[[str, Optional[bytes]], dict]] = None) -> None:
+        self._p = producer
+        self._route = route
+        self._outbox = outbox
+        self._max_in_flight = max_in_flight
+        self._retry_backoff = retry_backoff
+        self._poll_interval = poll_interval
+        self._lock = threading.RLock()
+        self._cursor = outbox.acked + 1     # next seq to hand to the producer
+        self._in_flight = 0
+        self._failed = False
+        self._retry_at = 0.0
+        self._replay: Optional[Iterator[Record]] = None
+        self._stop = threading.Event()
+        if outbox.pending:
+            log.info("Outbox: replaying %d undelivered record(s)", outbox.pending)
+        self._thread = threading.Thread(target=self._poll_loop, name="outbox-poll", daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self) -> int:
+        return self._outbox.pending
+
+    def send(self, topic: str, key: Optional[str], value: bytes) -> int:
+        """Durably append a record and try to produce it; returns its sequence number."""
+        k = key.encode("utf-8") if key is not None else None
+        with self._lock:
+            seq = self._outbox.append(topic, k, value)
+            if seq == self._cursor and not self._failed and self._in_flight < self._max_in_flight:
+                # Fast path: nothing backlogged, produce straight from memory.
+                self._produce((seq, topic, k, value))
+            else:
+                self._pump()
+        self._p.poll(0)
+        return seq
+
+    def send_batch(self, records: Iterable[Tuple[str, Optional[str], bytes]]) -> List[int]:
+        """send() for many records with a single fsync (e.g. one command fanned out to a fleet)."""
+        batch = [(topic, key.encode("utf-8") if key is not None else None, value) for topic, key, value in records]
+        with self._lock:
+            seqs = self._outbox.append_batch(batch)
+            for seq, (topic, k, value) in zip(seqs, batch):
+                if seq != self._cursor or self._failed or self._in_flight >= self._max_in_flight:
+                    self._pump()
+                    break
+                if not self._produce((seq, topic, k, value)):
+                    break  # local queue full: the rest is on disk and the poll thread pumps it
+        self._p.poll(0)
+        return seqs
+
+    def _produce(self, record: Record) -> bool:
+        seq, topic, key, value = record
+        extra = self._route(topic, key) if self._route is not None else {}
+        try:
+            self._p.produce(topic, key=key, value=value, on_delivery=partial(self._on_delivery, seq), **extra)
+        except BufferError:
+            return False  # local queue full; stays on disk for the next pump
+        self._in_flight += 1
+        self._cursor = seq + 1
+        return True
+
+    def _on_delivery(self, seq: int, err, msg) -> None:
+        record_delivery(err, msg)
+        with self._lock:
+            self._in_flight -= 1
+            if err is None:
+                self._outbox.ack(seq)
+                return
+            if not self._failed:
+                log.warning("delivery failed (seq=%d): %s; will replay from outbox", seq, err)
+                self._failed = True
+                self._retry_at = time.monotonic() + self._retry_backoff
+
+    def _pump(self) -> None:
+        """Rewind after failures and produce backlogged records from disk."""
+        if self._failed:
+            if self._in_flight or time.monotonic() < self._retry_at:
+                return
+            self._failed = False
+            self._cursor = self._outbox.acked + 1
+            self._replay = None
+        while self._cursor < self._outbox.next_seq and self._in_flight < self._max_in_flight:
+            if self._replay is None:
+                self._replay = self._outbox.read_from(self._cursor)
+            record = next(self._replay, None)
+            if record is None:
+                self._replay = None
+                return
+            if record[0] < self._cursor:
+                continue
+            if self._outbox.is_acked(record[0]):
+                self._cursor = record[0] + 1  # delivered before the failure; skip the duplicate
+                continue
+            if not self._produce(record):
+                self._replay = None  # re-read this record next time
+                return
+
+    def _poll_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._p.poll(self._poll_interval)
+                with self._lock:
+                    self._pump()
+                    self._outbox.tick()
+                    _PENDING.set(self._outbox.pending)
+            except Exception as e:
+                # e.g. OSError from fsync/checkpoint (disk full): keep pumping, the next tick retries
+                log.error("outbox poll failed: %s", e, exc_info=True, extra={"event": "outbox.error"})
+                self._stop.wait(self._poll_interval)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until everything appended so far is acknowledged (or timeout)."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                self._pump()
+                if self._outbox.pending == 0:
+                    return True
+            self._p.flush(min(0.5, max(0.0, deadline - time.monotonic())))
+        return False
+
+    def close(self, timeout: float = 5.0) -> None:
+        self.flush(timeout)
+        self._stop.set()
+        self._thread.join(timeout=self._poll_interval * 5)
+        with self._lock:
+            if self._outbox.pending:
+                log.warning("Outbox: %d record(s) kept on disk for next start", self._outbox.pending)
+            self._outbox.close()
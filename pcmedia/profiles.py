@@ -0,0 +1,193 @@
+# Producer tuning shared by the producer services: named profiles (PRODUCER_PROFILE) and an
+# optional adaptive linger (ADAPTIVE_LINGER) driven by librdkafka statistics.
+from __future__ import annotations
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+from pcmedia.metrics import REGISTRY
+
+log = logging.getLogger(__name__)
+
+# Everything the profiles set; acks, retries and idempotence stay with the service config.
+# - low-latency:     send almost at once; small batches, fastest lz4.
+# - balanced:        a short linger and librdkafka's default batch limits.
+# - high-throughput: long linger, large batches and zstd, so fewer and denser produce requests
+#                    (max.in.flight stays at 5, the most idempotence allows).
+PROFILES: Dict[str, Dict[str, object]] = {
+    "low-latency": {
+        "linger.ms": 5,
+        "batch.size": 262144,
+        "batch.num.messages": 1000,
+        "compression.type": "lz4",
+        "compression.level": 0,
+        "queue.buffering.max.messages": 100000,
+        "queue.buffering.max.kbytes": 65536,
+        "max.in.flight.requests.per.connection": 5,
+    },
+    "balanced": {
+        "linger.ms": 10,
+        "batch.size": 1000000,
+        "batch.num.messages": 10000,
+        "compression.type": "lz4",
+        "compression.level": -1,
+        "queue.buffering.max.messages": 100000,
+        "queue.buffering.max.kbytes": 1048576,
+        "max.in.flight.requests.per.connection": 5,
+    },
+    "high-throughput": {
+        "linger.ms": 100,
+        "batch.size": 1000000,
+        "batch.num.messages": 10000,
+        "compression.type": "zstd",
+        "compression.level": 3,
+        "queue.buffering.max.messages": 1000000,
+        "queue.buffering.max.kbytes": 2097152,
+        "max.in.flight.requests.per.connection": 5,
+    },
+}
+
+_LINGER = REGISTRY.gauge("producer_adaptive_linger_ms", "Application-side linger picked by ADAPTIVE_LINGER")
+_RATE = REGISTRY.gauge("producer_send_rate", "Messages/s sent to the brokers (librdkafka stats)")
+_PER_REQUEST = REGISTRY.gauge("producer_messages_per_request", "Messages per produce request (librdkafka stats)")
+
+def profile_name(value: str) -> str:
+    """PRODUCER_PROFILE parser."""
+    name = value.strip().lower()
+    if name not in PROFILES:
+        raise ValueError(f"expected one of {', '.join(PROFILES)}")
+    return name
+
+def profile_config(name: str) -> Dict[str, object]:
+    return dict(PROFILES[name])
+
+def fan_out(hooks: Sequence[Callable[[str], None]]) -> Callable[[str], None]:
+    """One stats_cb for several consumers of librdkafka statistics."""
+    if len(hooks) == 1:
+        return hooks[0]
+
+    def stats_cb(stats_json: str) -> None:
+        for hook in hooks:
+            hook(stats_json)
+    return stats_cb
+
+class AdaptiveLinger:
+    """
+    Linger from the observed send rate. librdkafka's linger.ms is fixed once the
+    producer exists, so this one is applied in front of it (LingerGate). Holding
+    records only pays when others arrive meanwhile: below two expected records
+    per `max_ms` it is 0 (send at once), otherwise the time to collect
+    `target_batch` records, capped at `max_ms`. The rate comes from the
+    statistics callback (txmsgs deltas), smoothed over a few intervals.
+    """
+    def __init__(self, max_ms: float = 100.0, target_batch: int = 100, smoothing: float = 0.5) -> None:
+        self._max = max_ms / 1000.0
+        self._target = target_batch
+        self._smoothing = smoothing
+        self._last: Optional[tuple] = None     # (ts seconds, txmsgs, produce requests)
+        self._observed = False
+        self.rate = 0.0
+        self.per_request = 0.0
+        self.linger = 0.0
+
+    def observe(self, elapsed: float, messages: int, requests: int) -> None:
+        if elapsed <= 0:
+            return
+        rate = messages / elapsed
+        self.rate = self._smoothing * rate + (1 - self._smoothing) * self.rate if self._observed else rate
+        self._observed = True
+        if requests:
+            self.per_request = messages / requests
+        if self.rate * self._max < 2:
+            self.linger = 0.0
+        else:
+            self.linger = min(self._max, self._target / self.rate)
+        _LINGER.set(round(self.linger * 1000, 1))
+        _RATE.set(round(self.rate, 1))
+        _PER_REQUEST.set(round(self.per_request, 2))
+
+    def on_stats(self, stats_json: str) -> None:
+        """stats_cb: librdkafka statistics (JSON) every statistics.interval.ms."""
+        try:
+            stats = json.loads(stats_json)
+            now = stats["ts"] / 1e6
+            sent = int(stats.get("txmsgs", 0))
+            requests = sum(int(b.get("req", {}).get("Produce", 0)) for b in stats.get("brokers", {}).values())
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            log.debug("unusable producer stats: %s", e)
+            return
+        if self._last is not None:
+            ts, sent0, requests0 = self._last
+            self.observe(now - ts, sent - sent0, requests - requests0)
+        self._last = (now, sent, requests)
+
+class LingerGate:
+    """
+    confluent_kafka.Producer wrapper that holds records for `adaptive.linger` before
+    handing them to librdkafka together (so they share produce requests). With
+    linger 0 records pass straight through. Held records are released by poll()
+    (the services poll continuously from a thread) and flush(); a full local queue
+    (BufferError) keeps the rest held for the next poll. At most `max_held` records
+    are held: beyond that produce() raises BufferError, as librdkafka does when its
+    own queue is full.
+    """
+    def __init__(self, producer, adaptive: AdaptiveLinger, max_held: int = 10_000) -> None:
+        self._p = producer
+        self._adaptive = adaptive
+        self._max_held = max_held
+        self._held: List[tuple] = []
+        self._since = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._p) + len(self._held)
+
+    def __getattr__(self, name: str):
+        return getattr(self._p, name)   # list_topics() etc.
+
+    def produce(self, topic: str, *args, **kwargs) -> None:
+        with self._lock:
+            if not self._held and self._adaptive.linger <= 0:
+                self._p.produce(topic, *args, **kwargs)
+                return
+            if len(self._held) >= self._max_held:
+                raise BufferError(f"Local: {len(self._held)} records held for adaptive linger")
+            if not self._held:
+                self._since = time.monotonic()
+            self._held.append((topic, args, kwargs))
+
+    def _release(self, everything: bool = False) -> None:
+        with self._lock:
+            if not self._held or (not everything and time.monotonic() - self._since < self._adaptive.linger):
+                return
+            held, self._held = self._held, []
+            for i, (topic, args, kwargs) in enumerate(held):
+                try:
+                    self._p.produce(topic, *args, **kwargs)
+                except BufferError:
+                    self._held = held[i:]
+                    return
+
+    def poll(self, timeout: float = 0) -> int:
+        self._release()
+        linger = self._adaptive.linger
+        if linger > 0 and (timeout < 0 or timeout > linger):
+            timeout = linger   # wake up in time to release what is held
+        served = self._p.poll(timeout)
+        self._release()
+        return served
+
+    def flush(self, timeout: float = -1) -> int:
+        """
+        Release everything held and flush; records still held after a BufferError are
+        retried each time the inner flush frees queue space, until `timeout` (< 0: none).
+        Returns how many records are left (queued or held).
+        """
+        deadline = None if timeout is None or timeout < 0 else time.monotonic() + timeout
+        while True:
+            self._release(everything=True)
+            left = -1 if deadline is None else max(0.0, deadline - time.monotonic())
+            queued = self._p.flush(left)
+            if not self._held or (deadline is not None and time.monotonic() >= deadline):
+                return queued + len(self._held)
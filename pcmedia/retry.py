@@ -0,0 +1,61 @@
+# Retry backoff for consumer partitions whose handler failed, without sleeping on the poll thread.
+from __future__ import annotations
+import time
+from typing import Callable, Dict, Hashable, Iterable, List, Optional
+
+class RetryBackoff:
+    """
+    Partitions waiting to retry a failed message. The poll loop pauses the partition
+    and seeks it back to that message, calls fail() and keeps polling (heartbeats,
+    other partitions, backpressure); due() lists the partitions to resume once their
+    delay has passed. The delay doubles with each consecutive failure of a partition,
+    from `base_sec` up to `max_sec`; ok() resets it after a success.
+    Time comes from `clock`.
+    """
+    def __init__(self, base_sec: float = 1.0, max_sec: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.base_sec = base_sec
+        self.max_sec = max(base_sec, max_sec)
+        self._clock = clock
+        self._failures: Dict[Hashable, int] = {}
+        self._waiting: Dict[Hashable, float] = {}   # partition -> retry time
+
+    def __contains__(self, tp: Hashable) -> bool:
+        return tp in self._waiting
+
+    def __len__(self) -> int:
+        return len(self._waiting)
+
+    def fail(self, tp: Hashable) -> float:
+        """Record a failure of `tp`; returns the delay before its retry."""
+        n = self._failures.get(tp, 0)
+        self._failures[tp] = n + 1
+        delay = min(self.base_sec * 2 ** n, self.max_sec)
+        self._waiting[tp] = self._clock() + delay
+        return delay
+
+    def ok(self, tp: Hashable) -> None:
+        if self._failures:
+            self._failures.pop(tp, None)
+
+    def due(self) -> List[Hashable]:
+        """Partitions whose delay has passed (each returned once per fail())."""
+        if not self._waiting:
+            return []
+        now = self._clock()
+        ready = [tp for tp, at in self._waiting.items() if at <= now]
+        for tp in ready:
+            del self._waiting[tp]
+        return ready
+
+    def next_in(self) -> Optional[float]:
+        """Seconds until the next retry is due, or None if nothing waits."""
+        if not self._waiting:
+            return None
+        return max(0.0, min(self._waiting.values()) - self._clock())
+
+    def forget(self, tps: Iterable[Hashable]) -> None:
+        """Drop partitions this consumer no longer owns."""
+        for tp in tps:
+            self._failures.pop(tp, None)
+            self._waiting.pop(tp, None)
@@ -0,0 +1,100 @@
+# Control-message routing shared by the control bot (producer) and the lock consumers.
+from __future__ import annotations
+import re
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+# ROUTING_MODE values:
+# - "shared":    one topic keyed by target; every machine reads every message.
+# - "partition": target machine -> fixed partition of the control topic (crc32 of the key),
+#                each machine assigns only its partition (no group rebalances).
+# - "topic":     one topic per machine ("<topic>.<machine>").
+# "partition" and "topic" send target "all" to partition 0 of a broadcast topic that every machine reads.
+# Tag targets ("tag:<name>") go the same way as "all"; each machine keeps the ones in its MACHINE_TAGS.
+MODES = ("shared", "partition", "topic")
+BROADCAST = "all"
+TAG_PREFIX = "tag:"
+
+_TOPIC_UNSAFE = re.compile(r"[^a-z0-9._-]")
+
+def normalize(machine: str) -> str:
+    return str(machine).strip().lower()
+
+def is_broadcast(target: str) -> bool:
+    """True for targets every machine has to see (they may still not match it)."""
+    t = normalize(target)
+    return t == BROADCAST or t.startswith(TAG_PREFIX)
+
+def matches(target: str, machine: str, tags=()) -> bool:
+    """Does `target` address `machine` ("all", its key, or "tag:<t>" for one of its `tags`)?"""
+    t = normalize(target)
+    if t == BROADCAST or t == normalize(machine):
+        return True
+    return t.startswith(TAG_PREFIX) and t[len(TAG_PREFIX):] in tags
+
+def partition_for(machine: str, partitions: int) -> int:
+    """Partition owned by `machine` (same result on producer and consumer side)."""
+    return zlib.crc32(normalize(machine).encode("utf-8")) % partitions
+
+def machine_topic(base: str, machine: str) -> str:
+    return f"{base}.{_TOPIC_UNSAFE.sub('_', normalize(machine))}"
+
+def partition_count(client, topic: str, timeout: float = 5.0) -> int:
+    """Partition count from cluster metadata (works with Producer and Consumer)."""
+    meta = client.list_topics(topic, timeout=timeout).topics.get(topic)
+    if meta is None or meta.error is not None or not meta.partitions:
+        raise RuntimeError(f"cannot read partition count of {topic}: {getattr(meta, 'error', 'missing')}")
+    return len(meta.partitions)
+
+def control_headers(target: str, msg_type: str = "control") -> List[Tuple[str, bytes]]:
+    """Headers that let consumers route without decoding the payload."""
+    return [("type", msg_type.encode("utf-8")), ("target", normalize(target).encode("utf-8"))]
+
+def header_dict(headers) -> Dict[str, str]:
+    if not headers:
+        return {}
+    return {k: (v.decode("utf-8", "replace") if v is not None else "") for k, v in headers}
+
+def wanted(headers, machine: str, tags=()) -> Optional[bool]:
+    """
+    Header pre-filter: True/False when the headers decide it, None when they are
+    absent (older producers) and the payload has to be decoded. `tags` are the
+    machine's normalized tags.
+    """
+    h = header_dict(headers)
+    if "target" not in h:
+        return None
+    if h.get("type", "control") != "control":
+        return False
+    return matches(h["target"], machine, tags)
+
+class Router:
+    """Producer side: where a control event for `target` goes."""
+    def __init__(self, mode: str, topic: str, broadcast_topic: str, partitions: int = 0) -> None:
+        if mode not in MODES:
+            raise ValueError(f"Unknown routing mode: {mode} (expected one of {', '.join(MODES)})")
+        if mode == "partition" and partitions <= 0:
+            raise ValueError("partition routing needs the control topic's partition count")
+        self.mode = mode
+        self.topic = topic
+        self.broadcast_topic = broadcast_topic
+        self.partitions = partitions
+
+    def topic_for(self, target: str) -> str:
+        if self.mode == "shared":
+            return self.topic
+        if is_broadcast(target):
+            return self.broadcast_topic
+        if self.mode == "partition":
+            return self.topic
+        return machine_topic(self.topic, target)
+
+    def produce_args(self, topic: str, key: Optional[bytes]) -> dict:
+        """Extra produce() arguments for a record (recomputed on outbox replay, so not stored)."""
+        target = key.decode("utf-8") if key is not None else BROADCAST
+        args: dict = {"headers": control_headers(target)}
+        if self.mode == "partition" and topic == self.topic:
+            args["partition"] = partition_for(target, self.partitions)
+        elif self.mode != "shared" and topic == self.broadcast_topic:
+            args["partition"] = 0  # consumers assign broadcast partition 0
+        return args
@@ -0,0 +1,160 @@
+# Versioned wire format for pc.activity.* payloads: JSON or schema-tagged msgpack.
+from __future__ import annotations
+import json
+import os
+import struct
+import threading
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:  # optional: JSON keeps working without it
+    msgpack = None
+
+# Binary frame (Confluent-style): magic byte 0x00 + big-endian u32 schema id + body.
+# The body is a msgpack array with the schema's fields in order, so field names
+# never go on the wire. JSON payloads start with "{" and are detected by that.
+_MAGIC = 0
+_FRAME = struct.Struct(">bI")
+
+# Built-in schemas with fixed ids, so every machine agrees without a shared registry. Ids are global,
+# assigned here by hand and never reused: a new version or subject takes the next unused id in this
+# table (or in the SCHEMA_REGISTRY_PATH file, whose entries are checked against it).
+BUILTIN_SCHEMAS: Dict[str, List[Tuple[int, List[str]]]] = {
+    "media": [(1, ["timestamp", "sourceApp", "title", "artist", "album", "playbackStatus"])],
+    "control": [(2, ["type", "action", "target", "by", "ts"]),
+                (3, ["type", "action", "target", "by", "ts", "id"])],
+    "ack": [(4, ["type", "id", "machine", "action", "status", "ts"])],
+    "media_summary": [(5, ["type", "machine", "start", "end", "tracks"])],
+}
+
+class SchemaRegistry:
+    """
+    Local, file-backed stand-in for a schema registry.
+    Subjects map to versioned field lists; each version has a global integer id.
+    """
+    def __init__(self, path: Optional[str] = None) -> None:
+        self._path = path
+        self._lock = threading.Lock()
+        self._by_id: Dict[int, Tuple[str, List[str]]] = {}
+        self._subjects: Dict[str, List[Tuple[int, List[str]]]] = {}
+        for subject, versions in BUILTIN_SCHEMAS.items():
+            for schema_id, fields in versions:
+                self._add(subject, schema_id, fields)
+        self._load()
+
+    def _add(self, subject: str, schema_id: int, fields: List[str]) -> bool:
+        """False if the id is already registered as exactly this; ValueError if it means anything else."""
+        fields = list(fields)
+        known = self._by_id.get(schema_id)
+        if known is not None:
+            if known != (subject, fields):
+                raise ValueError(f"schema id {schema_id} is already {known[0]} {known[1]}, not {subject} {fields}")
+            return False
+        versions = self._subjects.setdefault(subject, [])
+        for sid, other in versions:
+            if other == fields:
+                raise ValueError(f"{subject} {fields} is already registered as schema id {sid}")
+        self._by_id[schema_id] = (subject, fields)
+        versions.append((schema_id, fields))
+        versions.sort(key=lambda v: v[0])   # latest() is the highest id, whatever the file order
+        return True
+
+    def _load(self) -> None:
+        if not self._path or not os.path.exists(self._path):
+            return
+        with open(self._path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for subject, versions in data.get("subjects", {}).items():
+            for v in versions:
+                self._add(subject, int(v["id"]), v["fields"])
+
+    def _save(self) -> None:
+        if not self._path:
+            return
+        data = {"subjects": {
+            subject: [{"id": sid, "version": i + 1, "fields": fields} for i, (sid, fields) in enumerate(versions)]
+            for subject, versions in self._subjects.items()
+        }}
+        tmp = self._path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self._path)
+
+    def register(self, subject: str, schema_id: int, fields: List[str]) -> None:
+        """
+        Add a version under an explicit id. Registering the same (id, subject, fields) again is a
+        no-op; an id already taken by another schema, or fields already registered under another
+        id, raise ValueError.
+        """
+        with self._lock:
+            if self._add(subject, schema_id, fields):
+                self._save()
+
+    def latest(self, subject: str) -> Tuple[int, List[str]]:
+        versions = self._subjects.get(subject)
+        if not versions:
+            raise KeyError(f"unknown subject: {subject}")
+        return versions[-1]
+
+    def fields(self, schema_id: int) -> List[str]:
+        """Field list for an id; unknown ids trigger a re-read of the registry file."""
+        known = self._by_id.get(schema_id)
+        if known is None:
+            with self._lock:
+                self._load()
+            known = self._by_id.get(schema_id)
+        if known is None:
+            raise KeyError(f"unknown schema id: {schema_id}")
+        return known[1]
+
+def parse_formats(spec: str) -> Dict[str, str]:
+    """Parse "topic=format,topic=format" (e.g. WIRE_FORMATS) into a dict."""
+    formats = {}
+    for item in spec.split(","):
+        if "=" in item:
+            topic, fmt = item.split("=", 1)
+            formats[topic.strip()] = fmt.strip().lower()
+    return formats
+
+class Serde:
+    """
+    Encodes payloads per topic ("json" or "msgpack") and decodes either format.
+    Payloads with keys outside the subject's latest schema fall back to JSON,
+    so nothing is dropped when producers are ahead of the schema.
+    """
+    def __init__(self, registry: Optional[SchemaRegistry] = None, formats: Optional[Dict[str, str]] = None,
+                 default: str = "json") -> None:
+        self._registry = registry or SchemaRegistry()
+        self._formats = dict(formats or {})
+        self._default = default
+        self._field_sets: Dict[int, frozenset] = {}
+        for fmt in list(self._formats.values()) + [default]:
+            if fmt not in ("json", "msgpack"):
+                raise ValueError(f"Unknown wire format: {fmt}")
+            if fmt == "msgpack" and msgpack is None:
+                raise RuntimeError("wire format 'msgpack' requires the msgpack package")
+
+    def format_for(self, topic: str) -> str:
+        return self._formats.get(topic, self._default)
+
+    def encode(self, topic: str, subject: str, payload: dict) -> bytes:
+        if self.format_for(topic) == "msgpack":
+            schema_id, fields = self._registry.latest(subject)
+            field_set = self._field_sets.get(schema_id)
+            if field_set is None:
+                field_set = self._field_sets[schema_id] = frozenset(fields)
+            if payload.keys() <= field_set:
+                body = msgpack.packb([payload.get(f) for f in fields], use_bin_type=True)
+                return _FRAME.pack(_MAGIC, schema_id) + body
+        return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+    def decode(self, data: bytes) -> dict:
+        if data[:1] == b"\x00":
+            if msgpack is None:
+                raise ValueError("binary payload received but msgpack is not installed")
+            _, schema_id = _FRAME.unpack_from(data)
+            fields = self._registry.fields(schema_id)
+            values = msgpack.unpackb(data[_FRAME.size:], raw=False)
+            return {f: v for f, v in zip(fields, values) if v is not None}
+        return json.loads(data.decode("utf-8"))
@@ -0,0 +1,75 @@
+# Coalescer driven by a fake clock: quiet window, max delay, suppressed statuses and unchanged skips
+from __future__ import annotations
+from pcmedia.coalesce import Coalescer
+from pcmedia.dedupe import build_signature
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def media(title: str, status: str = "playing") -> dict:
+    return {"sourceApp": "Spotify.exe", "title": title, "artist": "A", "playbackStatus": status}
+
+def test_emits_latest_payload_once_the_key_is_quiet_for_the_window():
+    clock = FakeClock()
+    c = Coalescer(window=2.0, max_delay=10.0, clock=clock)
+    c.offer("pc-1", media("one"))
+    clock.now = 1.5
+    c.offer("pc-1", media("two"))
+    assert c.next_deadline() == 3.5
+    clock.now = 3.4
+    assert c.due() == []
+    clock.now = 3.5
+    assert c.due() == [("pc-1", media("two"))]
+    assert (c.offered, c.coalesced, c.emitted, len(c)) == (2, 1, 1, 0)
+    assert c.next_deadline() is None
+
+def test_max_delay_caps_the_wait_of_a_key_that_never_goes_quiet():
+    clock = FakeClock()
+    c = Coalescer(window=2.0, max_delay=5.0, clock=clock)
+    for i in range(5):
+        clock.now = i * 1.0
+        c.offer("pc-1", media(f"t{i}"))
+    assert c.next_deadline() == 5.0
+    clock.now = 5.0
+    assert c.due() == [("pc-1", media("t4"))]
+
+def test_keys_are_independent():
+    clock = FakeClock()
+    c = Coalescer(window=1.0, max_delay=1.0, clock=clock)
+    c.offer("pc-1", media("a"))
+    clock.now = 0.5
+    c.offer("pc-2", media("b"))
+    clock.now = 1.0
+    assert c.due() == [("pc-1", media("a"))]
+    clock.now = 1.5
+    assert c.due() == [("pc-2", media("b"))]
+
+def test_suppressed_statuses_are_dropped_without_holding_the_key():
+    clock = FakeClock()
+    c = Coalescer(window=1.0, max_delay=1.0, clock=clock, suppress_statuses=("changing",))
+    assert c.offer("pc-1", media("x", "changing")) is False
+    assert len(c) == 0 and c.suppressed == 1
+    assert c.offer("pc-1", media("x", "paused")) is True
+
+def test_signature_skips_a_state_equal_to_the_last_emitted():
+    clock = FakeClock()
+    c = Coalescer(window=1.0, max_delay=1.0, clock=clock, signature=build_signature)
+    c.offer("pc-1", media("a"))
+    clock.now = 1.0
+    assert c.due() == [("pc-1", media("a"))]
+    c.offer("pc-1", media("b"))
+    c.offer("pc-1", media("a"))   # A -> B -> A within the window
+    clock.now = 2.0
+    assert c.due() == [] and c.unchanged == 1
+
+def test_drain_emits_everything_held():
+    clock = FakeClock()
+    c = Coalescer(window=5.0, max_delay=5.0, clock=clock)
+    c.offer("pc-1", media("a"))
+    c.offer("pc-2", media("b"))
+    assert sorted(c.drain()) == [("pc-1", media("a")), ("pc-2", media("b"))]
+    assert len(c) == 0 and c.next_deadline() is None
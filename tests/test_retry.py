@@ -0,0 +1,15 @@
+# RetryBackoff on a fake clock: per-partition delays, doubling up to the cap.
+from __future__ import annotations
+from pcmedia.retry import RetryBackoff
+
+def test_backoff_doubles_up_to_the_cap_and_resets():
+    now = [0.0]
+    retry = RetryBackoff(base_sec=1.0, max_sec=3.0, clock=lambda: now[0])
+    assert [retry.fail("a") for _ in range(4)] == [1.0, 2.0, 3.0, 3.0]
+    assert retry.due() == [] and retry.next_in() == 3.0
+    now[0] = 3.0
+    assert retry.due() == ["a"] and not retry
+    retry.ok("a")
+    assert retry.fail("a") == 1.0
+    retry.forget(["a"])
+    assert retry.next_in() is None